@@ -0,0 +1,140 @@
+"""
+Latency of concurrent clients served by the WSGI application on a pool of
+threads (as a threaded WSGI server does) against the ASGI variant
+(:py:mod:`medical_forum.asgi`) with the same number of read threads.
+
+Both run in this process, without network, on a synthetic database. Every
+client sends its requests one after the other. The ``send`` column is the
+time a client takes to receive a response body: on the WSGI path the thread
+that produced the response is busy while it is sent, on the ASGI path the
+event loop waits for the client while the thread serves another request.
+
+Usage::
+
+    python -m benchmarks.bench_asgi [threads] [clients] [requests]
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from medical_forum import asgi, database_engine, resources
+from medical_forum.database_connection import TUNED_PROFILE
+from .utils import BENCH_DB_PATH, create_database, remove_database, report
+
+USERS = 1000
+MESSAGES = 20000
+SEND_DELAYS = (0.0, 0.02)
+URLS = (
+    ('/medical_forum/api/messages/', b'limit=20'),
+    ('/medical_forum/api/users/user10/', b''),
+    ('/medical_forum/api/messages/msg-10/', b''),
+    ('/medical_forum/api/diagnoses/', b'limit=20'),
+)
+
+
+def scope(path, query):
+    """ASGI scope of a GET request"""
+    return {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '',
+            'query_string': query, 'server': ('localhost', 5000),
+            'client': ('127.0.0.1', 40000), 'headers': [(b'host', b'localhost:5000')]}
+
+
+def percentile(values, fraction):
+    """The value below which the given fraction of the sorted values fall"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def wsgi_request(path, query, delay):
+    """Serves a request with the WSGI application, sending its body to a client"""
+    environ = asgi.build_environ(scope(path, query), b'')
+    result = resources.APP(environ, lambda status, headers, exc_info=None: None)
+    try:
+        for _ in result:
+            pass
+        time.sleep(delay)
+    finally:
+        result.close()
+
+
+def run_wsgi(threads, clients, requests, delay):
+    """Latencies of the clients served by the WSGI application on threads"""
+    executor = ThreadPoolExecutor(threads)
+    latencies = []
+
+    def client():
+        for number in range(requests):
+            path, query = URLS[number % len(URLS)]
+            start = time.perf_counter()
+            executor.submit(wsgi_request, path, query, delay).result()
+            latencies.append(time.perf_counter() - start)
+    workers = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    executor.shutdown()
+    return latencies, elapsed
+
+
+def run_asgi(threads, clients, requests, delay):
+    """Latencies of the clients served by the ASGI application"""
+    app = asgi.AsgiApp(resources.APP, read_threads=threads)
+    latencies = []
+
+    async def client():
+        for number in range(requests):
+            path, query = URLS[number % len(URLS)]
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.body':
+                    await asyncio.sleep(delay)
+            start = time.perf_counter()
+            await app(scope(path, query), receive, send)
+            latencies.append(time.perf_counter() - start)
+
+    async def all_clients():
+        await asyncio.gather(*[client() for _ in range(clients)])
+    start = time.perf_counter()
+    asyncio.run(all_clients())
+    elapsed = time.perf_counter() - start
+    app.close()
+    return latencies, elapsed
+
+
+def main(threads=4, clients=32, requests=40):
+    """Runs both paths with and without slow clients and prints the latencies"""
+    create_database(users=USERS, messages=MESSAGES)
+    engine = database_engine.Engine(BENCH_DB_PATH, pool_size=threads * 2,
+                                    max_idle=threads * 2, profile=TUNED_PROFILE)
+    resources.APP.config["Engine"] = engine
+    # Warm the response cache
+    run_wsgi(threads, 1, len(URLS), 0.0)
+
+    rows = []
+    for delay in SEND_DELAYS:
+        for name, run in (('WSGI threads', run_wsgi), ('ASGI', run_asgi)):
+            latencies, elapsed = run(threads, clients, requests, delay)
+            rows.append((name, '%.0f' % (delay * 1000), len(latencies),
+                         '%.0f' % (len(latencies) / elapsed),
+                         '%.2f' % (percentile(latencies, 0.5) * 1000),
+                         '%.2f' % (percentile(latencies, 0.99) * 1000)))
+    engine.remove_database()
+    remove_database()
+    report('%d clients, %d threads' % (clients, threads), rows,
+           ('path', 'send ms', 'requests', 'per second', 'p50 ms', 'p99 ms'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
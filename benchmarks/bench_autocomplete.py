@@ -0,0 +1,86 @@
+"""
+Latency of the autocompletion of the usernames and the diseases: the lookup
+in the in-memory prefix index
+(:py:func:`medical_forum.prefix_index.complete`), the ``LIKE 'prefix%'``
+query it replaces, and the whole GET of the autocompletion resource, on a
+synthetic database.
+
+The first lookup builds the index; its time is reported apart.
+
+Usage::
+
+    python -m benchmarks.bench_autocomplete [users] [queries]
+"""
+
+import random
+import sys
+import time
+
+from medical_forum import prefix_index, resources
+from medical_forum.database_engine import Engine
+from medical_forum.database_connection import TUNED_PROFILE
+from .utils import BENCH_DB_PATH, create_database, remove_database, measure, report
+
+LIMIT = 10
+# (index, url of the resource, LIKE query, prefixes typed)
+CASES = (
+    (prefix_index.USERNAMES, '/medical_forum/api/autocomplete/usernames/',
+     'SELECT username FROM users WHERE username LIKE ? ORDER BY username LIMIT ?',
+     ('u', 'user1', 'user12', 'user123', 'user1234')),
+    (prefix_index.DISEASES, '/medical_forum/api/autocomplete/diseases/',
+     'SELECT DISTINCT disease FROM diagnosis WHERE disease LIKE ? ORDER BY disease LIMIT ?',
+     ('a', 'gas', 'inso')),
+)
+
+
+def percentile(values, fraction):
+    """The value below which the given fraction of the sorted values fall"""
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def latencies(function, arguments):
+    """Times of the calls of function with each argument, in milliseconds"""
+    times = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main(users=100000, queries=2000):
+    """Builds the database and times the lookups of every index three ways"""
+    create_database(users=users, messages=users, diagnoses=users)
+    engine = Engine(BENCH_DB_PATH, profile=TUNED_PROFILE)
+    resources.APP.config["Engine"] = engine
+    client = resources.APP.test_client()
+    con = engine.connect()
+    rand = random.Random(1)
+
+    rows = []
+    for name, url, like_query, prefixes in CASES:
+        prefix_index.clear()
+        build = measure(lambda: prefix_index.complete(con, name, '', LIMIT)) * 1000
+        typed = [rand.choice(prefixes) for _ in range(queries)]
+        index = latencies(lambda prefix: prefix_index.complete(con, name, prefix, LIMIT),
+                          typed)
+        # The scans are slow, a few of them are enough
+        like = latencies(lambda prefix: con.con.execute(like_query,
+                                                        (prefix + '%', LIMIT)).fetchall(),
+                         typed[:max(queries // 20, 1)])
+        api = latencies(lambda prefix: client.get(url, query_string={'prefix': prefix}),
+                        typed)
+        rows.append((name, '%.1f' % build,
+                     '%.3f' % percentile(index, 0.5), '%.3f' % percentile(index, 0.99),
+                     '%.3f' % percentile(like, 0.5), '%.3f' % percentile(like, 0.99),
+                     '%.3f' % percentile(api, 0.5), '%.3f' % percentile(api, 0.99)))
+    con.close()
+    remove_database()
+    report('%d users and diagnoses, %d lookups of %d values' % (users, queries, LIMIT), rows,
+           ('index', 'build ms', 'index p50', 'index p99', 'LIKE p50', 'LIKE p99',
+            'GET p50', 'GET p99'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
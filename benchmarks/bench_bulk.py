@@ -0,0 +1,75 @@
+"""
+Benchmark of an import of messages, users and diagnoses with one call (and
+one commit) per row against the ``*_bulk`` methods of the Connection.
+
+Usage::
+
+    python -m benchmarks.bench_bulk [rows]
+"""
+
+import sys
+
+from .utils import create_database, remove_database, measure, report
+
+USERS = 200
+MESSAGES = 1000
+
+
+def new_users(prefix, rows):
+    """The ``(username, user)`` tuples of ``rows`` new users"""
+    return [('%s%d' % (prefix, number),
+             {'public_profile': {'speciality': 'Asthma', 'user_type': 1},
+              'restricted_profile': {'firstname': 'First', 'lastname': 'Last',
+                                     'work_address': 'Main Street', 'gender': 'female',
+                                     'age': 40, 'email': 'new@example.com'}})
+            for number in range(rows)]
+
+
+def new_messages(rows):
+    """The arguments of ``rows`` new messages"""
+    return [{'title': 'title %d' % number, 'body': 'body of the message',
+             'sender': 'user%d' % (number % USERS + 1)}
+            for number in range(rows)]
+
+
+def new_diagnoses(rows):
+    """The arguments of ``rows`` new diagnoses, by doctors"""
+    return [{'user_id': (number % (USERS // 4) + 1) * 4,
+             'message_id': 'msg-%d' % (number % MESSAGES + 1),
+             'disease': 'Asthma', 'diagnosis_description': 'Use an inhaler'}
+            for number in range(rows)]
+
+
+def import_one_by_one(connection, rows):
+    """Imports the rows with one call per row"""
+    for username, user in new_users('single', rows):
+        connection.append_user(username, user)
+    for message in new_messages(rows):
+        connection.create_message(message['title'], message['body'], message['sender'])
+    for diagnosis in new_diagnoses(rows):
+        connection.create_diagnosis(diagnosis)
+
+
+def import_bulk(connection, rows):
+    """Imports the rows with one call per table"""
+    connection.append_users_bulk(new_users('bulk', rows))
+    connection.create_messages_bulk(new_messages(rows))
+    connection.create_diagnoses_bulk(new_diagnoses(rows))
+
+
+def main(rows=2000):
+    """Runs the import both ways and prints the throughput"""
+    results = []
+    for name, function in (('one by one', import_one_by_one), ('bulk', import_bulk)):
+        engine = create_database(users=USERS, messages=MESSAGES)
+        connection = engine.connect()
+        elapsed = measure(lambda: function(connection, rows))
+        connection.close()
+        results.append((name, rows * 3, '%.3f' % elapsed, '%.0f' % (rows * 3 / elapsed)))
+    remove_database()
+    report('Import of %d users, %d messages and %d diagnoses' % (rows, rows, rows),
+           results, ('import', 'rows', 'seconds', 'rows/s'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,85 @@
+"""
+Benchmark of the compression of the responses of the API
+(:py:mod:`medical_forum.compression`), endpoint by endpoint.
+
+For every endpoint, the body is requested once without compression and then
+compressed with gzip at several levels, giving the bytes saved and the CPU
+time spent per response. The last table compares the time of whole requests
+answered from the response cache: without compression, and with gzip when
+the compressed body is cached as well (the default) or compressed again on
+every request.
+
+Usage::
+
+    python -m benchmarks.bench_compression [requests]
+"""
+
+import sys
+import time
+
+from medical_forum import compression, resources, response_cache
+from medical_forum.database_engine import Engine
+from .utils import BENCH_DB_PATH, create_database, remove_database, report
+
+USERS = 1000
+MESSAGES = 20000
+LEVELS = (1, 6, 9)
+URLS = (
+    ('messages', '/medical_forum/api/messages/?limit=200'),
+    ('users', '/medical_forum/api/users/?limit=200'),
+    ('diagnoses', '/medical_forum/api/diagnoses/?limit=200'),
+    ('message', '/medical_forum/api/messages/msg-10/'),
+    ('user', '/medical_forum/api/users/user10/'),
+)
+
+
+def cpu_per_call(function, calls):
+    """CPU seconds of one call of the function, averaged over the calls"""
+    start = time.process_time()
+    for _ in range(calls):
+        function()
+    return (time.process_time() - start) / calls
+
+
+def main(requests=200):
+    """Compresses the body of each endpoint and prints the savings and costs"""
+    create_database(users=USERS, messages=MESSAGES)
+    engine = Engine(BENCH_DB_PATH)
+    resources.APP.config["Engine"] = engine
+    client = resources.APP.test_client()
+
+    rows = []
+    for name, url in URLS:
+        body = client.get(url).data
+        for level in LEVELS:
+            size = len(compression.compress(body, 'gzip', level))
+            elapsed = cpu_per_call(lambda: compression.compress(body, 'gzip', level), requests)
+            rows.append((name, level, len(body), size, '%.1f%%' % (100 - 100.0 * size / len(body)),
+                         '%.1f' % (elapsed * 1e6)))
+    report('gzip compression of one response', rows,
+           ('endpoint', 'level', 'bytes', 'gzip bytes', 'saved', 'CPU us'))
+
+    rows = []
+    for name, url in URLS:
+        client.get(url).data
+        identity = cpu_per_call(lambda: client.get(url).data, requests)
+        gzip = {'Accept-Encoding': 'gzip'}
+        cached = cpu_per_call(lambda: client.get(url, headers=gzip).data, requests)
+        put_encoded = response_cache.CACHE.put_encoded
+        # Drop the compressed bodies so that every request compresses again
+        response_cache.CACHE.put_encoded = lambda *args: None
+        response_cache.CACHE.clear()
+        client.get(url).data
+        uncached = cpu_per_call(lambda: client.get(url, headers=gzip).data, requests)
+        response_cache.CACHE.put_encoded = put_encoded
+        rows.append((name, '%.1f' % (identity * 1e6), '%.1f' % (cached * 1e6),
+                     '%.1f' % (uncached * 1e6)))
+    report('CPU us per request answered from the response cache', rows,
+           ('endpoint', 'identity', 'gzip cached', 'gzip compressed per request'))
+
+    engine.remove_database()
+    remove_database()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
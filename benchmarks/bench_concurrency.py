@@ -0,0 +1,127 @@
+"""
+Benchmark of N reader and M writer threads sharing one Engine.
+
+The threads borrow a connection for every operation, as the requests of the
+API do. Three setups are compared:
+
+* ``shared``: every thread borrows a read/write connection from the shared
+  pool (:py:meth:`Engine.acquire`), with the default profile (rollback
+  journal, no busy timeout).
+* ``shared tuned``: the same with the tuned profile (WAL, busy timeout).
+* ``reader/writer``: readers borrow read-only connections
+  (:py:meth:`Engine.acquire_reader`) and writers the single writer
+  connection (:py:meth:`Engine.acquire_writer`), with the tuned profile.
+
+A read is a page of the messages collection and the profile of its first
+sender, a write is a new message. Operations failing with
+``sqlite3.OperationalError`` (``database is locked``) are counted as errors.
+
+Usage::
+
+    python -m benchmarks.bench_concurrency [readers] [writers] [seconds]
+"""
+
+import sqlite3
+import sys
+import threading
+import time
+
+from medical_forum import database_engine
+from medical_forum.database_connection import TUNED_PROFILE
+from .utils import BENCH_DB_PATH, create_database, remove_database, report
+
+USERS = 200
+MESSAGES = 20000
+
+
+def reader(engine, borrow, until, results):
+    """Reads pages of messages until the deadline"""
+    latencies = []
+    errors = 0
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        connection = borrow()
+        try:
+            messages = connection.get_messages(number_of_messages=20)
+            connection.get_user(messages[0]['sender'])
+        except sqlite3.OperationalError:
+            errors += 1
+        finally:
+            engine.release(connection)
+        latencies.append(time.perf_counter() - start)
+    results.append(('read', latencies, errors))
+
+
+def writer(engine, borrow, until, results, number):
+    """Creates messages until the deadline"""
+    latencies = []
+    errors = 0
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        connection = borrow()
+        try:
+            connection.create_message('Benchmark', 'Concurrent message',
+                                      'user%d' % (number % USERS + 1))
+        except sqlite3.OperationalError:
+            errors += 1
+        finally:
+            engine.release(connection)
+        latencies.append(time.perf_counter() - start)
+    results.append(('write', latencies, errors))
+
+
+def percentile(values, fraction):
+    """The value below which the given fraction of the sorted values fall"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(name, readers, writers, seconds, profile, split):
+    """Runs the threads against a fresh database and returns the report rows"""
+    create_database(users=USERS, messages=MESSAGES, diagnoses=0)
+    engine = database_engine.Engine(BENCH_DB_PATH, pool_size=readers + writers,
+                                    max_idle=readers + writers, profile=profile)
+    read_borrow = engine.acquire_reader if split else engine.acquire
+    write_borrow = engine.acquire_writer if split else engine.acquire
+    # The writer may wait for all the other writers
+    engine.writer_pool.wait_timeout = 60
+    results = []
+    until = time.perf_counter() + seconds
+    threads = [threading.Thread(target=reader, args=(engine, read_borrow, until, results))
+               for _ in range(readers)]
+    threads.extend(threading.Thread(target=writer,
+                                    args=(engine, write_borrow, until, results, number))
+                   for number in range(writers))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.remove_database()
+
+    rows = []
+    for kind in ('read', 'write'):
+        latencies = [latency for result in results if result[0] == kind
+                     for latency in result[1]]
+        errors = sum(result[2] for result in results if result[0] == kind)
+        rows.append((name, kind, len(latencies), errors, '%.0f' % (len(latencies) / seconds),
+                     '%.2f' % (percentile(latencies, 0.5) * 1000),
+                     '%.2f' % (percentile(latencies, 0.99) * 1000)))
+    return rows
+
+
+def main(readers=8, writers=4, seconds=5):
+    """Runs the three setups and prints the throughput and latencies"""
+    rows = []
+    rows.extend(run('shared', readers, writers, seconds, None, False))
+    rows.extend(run('shared tuned', readers, writers, seconds, TUNED_PROFILE, False))
+    rows.extend(run('reader/writer', readers, writers, seconds, TUNED_PROFILE, True))
+    remove_database()
+    report('%d readers and %d writers during %d seconds' % (readers, writers, seconds),
+           rows, ('connections', 'operation', 'operations', 'errors', 'per second',
+                  'p50 ms', 'p99 ms'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,117 @@
+"""
+Benchmark of building the Mason envelope of the messages collection and of a
+user with its controls: the controls built on every call (the schemas as new
+nested dictionaries and the collection urls resolved with ``url_for``, as
+:py:class:`medical_forum.forum_object.ForumObject` did before the
+:py:mod:`medical_forum.controls` registry) against the controls spliced in
+from the registry.
+
+Both envelopes are serialized with ``json.dumps`` as well, to show the part
+of the construction in the cost of the whole body.
+
+Usage::
+
+    python -m benchmarks.bench_envelopes [envelopes]
+"""
+
+import json
+import sys
+
+from medical_forum import controls, resources
+from medical_forum.forum_object import ForumObject
+from medical_forum.resources import API
+from medical_forum import hypermedia_formats as hyper_const
+from medical_forum.message_resources import Messages, History
+from medical_forum.user_resources import User, Users
+from medical_forum.diagnosis_resources import Diagnoses
+from .utils import measure, report
+
+
+def per_call_envelopes():
+    """Envelopes with controls built on every call"""
+    envelope = ForumObject()
+    envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
+    envelope.add_control("self", href=API.url_for(Messages))
+    envelope["@controls"]["medical_forum:users-all"] = {
+        "href": API.url_for(Users),
+        "title": "List users"
+    }
+    envelope["@controls"]["medical_forum:add-message"] = {
+        "href": API.url_for(Messages),
+        "title": "Create message",
+        "encoding": "json",
+        "method": "POST",
+        "schema": controls.message_schema()
+    }
+
+    user = ForumObject(username="user1")
+    user.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
+    user.add_control("self", href=API.url_for(User, username="user1"))
+    user["@controls"]["medical_forum:messages-all"] = {
+        "href": API.url_for(Messages),
+        "title": "All messages"
+    }
+    user["@controls"]["medical_forum:diagnoses-all"] = {
+        "href": API.url_for(Diagnoses),
+        "title": "All diagnoses"
+    }
+    user["@controls"]["medical_forum:add-diagnosis"] = {
+        "href": API.url_for(Diagnoses),
+        "title": "Create diagnosis",
+        "encoding": "json",
+        "method": "POST",
+        "schema": controls.diagnosis_schema()
+    }
+    user["@controls"]["medical_forum:messages-history"] = {
+        "href": API.url_for(History, username="user1").rstrip("/") + "{?limit,before,after}",
+        "title": "Message history",
+        "isHrefTemplate": True,
+        "schema": controls.history_schema()
+    }
+    return envelope, user
+
+
+def registry_envelopes():
+    """Envelopes with the controls of the registry"""
+    envelope = ForumObject()
+    envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
+    envelope.add_control("self", href=API.url_for(Messages))
+    envelope.add_control_users_all()
+    envelope.add_control_add_message()
+
+    user = ForumObject(username="user1")
+    user.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
+    user.add_control("self", href=API.url_for(User, username="user1"))
+    user.add_control_messages_all()
+    user.add_control_diagnoses_all()
+    user.add_control_add_diagnosis()
+    user.add_control_messages_history("user1")
+    return envelope, user
+
+
+def serialized(build):
+    """Builds the envelopes and serializes them"""
+    def run():
+        for envelope in build():
+            json.dumps(envelope)
+    return run
+
+
+def main(envelopes=20000):
+    """Builds the envelopes both ways and prints the cost per envelope pair"""
+    rows = []
+    with resources.APP.test_request_context():
+        assert json.dumps(per_call_envelopes()) == json.dumps(registry_envelopes())
+        for name, build in (('per call', per_call_envelopes),
+                            ('registry', registry_envelopes)):
+            for operation, function in (('build', build), ('build + dumps', serialized(build))):
+                function()
+                elapsed = measure(function, envelopes)
+                rows.append((operation, name, envelopes, '%.1f' % (elapsed / envelopes * 1e6),
+                             '%.0f' % (envelopes / elapsed)))
+    report('Messages collection and user envelopes', rows,
+           ('operation', 'controls', 'envelopes', 'us/envelope', 'envelopes/s'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
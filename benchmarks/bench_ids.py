@@ -0,0 +1,66 @@
+"""
+Microbenchmark of parsing and formatting message ids: the regular
+expression used before :py:mod:`medical_forum.resource_ids` (compiled on
+every call through the ``re`` module cache), the same expression
+precompiled, and the slicing parser of the codec.
+
+Usage::
+
+    python -m benchmarks.bench_ids [iterations]
+"""
+
+import re
+import sys
+import timeit
+
+from medical_forum import resource_ids
+from .utils import report
+
+MESSAGE_ID_RE = re.compile(r'msg-(\d+)$')
+IDS = ['msg-%d' % key for key in (1, 42, 999, 123456, 2 ** 40, resource_ids.MAX_ID)]
+
+
+def parse_regex(message_id):
+    """Parser used before the codec (truncated the ids to 3 digits)"""
+    match = re.match(r'msg-(\d{1,3})', message_id)
+    if match is None:
+        raise ValueError("The message_id is malformed")
+    return int(match.group(1))
+
+
+def parse_precompiled(message_id):
+    """Parser with a precompiled regular expression"""
+    match = MESSAGE_ID_RE.match(message_id)
+    if match is None:
+        raise ValueError("The message_id is malformed")
+    return int(match.group(1))
+
+
+def run(function, values):
+    """Calls the function with each value"""
+    for value in values:
+        function(value)
+
+
+def main(iterations=200000):
+    """Times each parser and formatter and prints the throughput"""
+    keys = [resource_ids.parse_message_id(message_id) for message_id in IDS]
+    cases = (
+        ('parse', 're.match', parse_regex, IDS),
+        ('parse', 'precompiled', parse_precompiled, IDS),
+        ('parse', 'resource_ids', resource_ids.parse_message_id, IDS),
+        ('format', "'msg-%s' %", lambda key: 'msg-%s' % key, keys),
+        ('format', 'resource_ids', resource_ids.format_message_id, keys),
+    )
+    rows = []
+    for operation, name, function, values in cases:
+        calls = iterations // len(values) * len(values)
+        elapsed = timeit.timeit(lambda: run(function, values), number=calls // len(values))
+        rows.append((operation, name, calls, '%.0f' % (elapsed / calls * 1e9),
+                     '%.0f' % (calls / elapsed)))
+    report('Message id codec', rows, ('operation', 'implementation', 'calls', 'ns/call',
+                                      'calls/s'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,67 @@
+"""
+Cost and benefit of the number of messages of the users kept by triggers
+(:py:meth:`medical_forum.database_engine.Engine.create_message_counts`).
+
+On a synthetic database, the first page of the users with the most messages
+(:py:meth:`medical_forum.database_connection.Connection.get_users` sorted by
+``msg_count``) is timed against counting the messages of every user in the
+query. The time taken by a bulk import of messages with and without the
+triggers, and by the rebuild of the numbers, are reported too.
+
+Usage::
+
+    python -m benchmarks.bench_message_counts [messages] [imported]
+"""
+
+import sqlite3
+import sys
+
+from medical_forum import database_engine
+from medical_forum.database_connection import TUNED_PROFILE
+from .utils import BENCH_DB_PATH, create_database, remove_database, measure, report
+
+USERS = 10000
+PAGE_SIZE = 20
+REPEAT = 20
+# The first page of the users with the most messages, without msg_count
+COMPUTED_QUERY = ('SELECT users.user_id, users.username, COUNT(messages.message_id) AS count '
+                  'FROM users LEFT JOIN messages ON messages.user_id = users.user_id '
+                  'GROUP BY users.user_id ORDER BY count DESC, users.user_id DESC LIMIT ?')
+
+
+def import_messages(connection, imported):
+    """Adds messages of many users with one bulk call"""
+    connection.create_messages_bulk(
+        [{'title': 'message %d' % number, 'body': 'body',
+          'sender': 'user%d' % (number % USERS + 1)} for number in range(imported)])
+
+
+def main(messages=1000000, imported=10000):
+    """Builds the database and times the listings, the imports and the rebuild"""
+    engine = create_database(users=USERS, messages=messages, diagnoses=0)
+    connection = database_engine.Engine(BENCH_DB_PATH, profile=TUNED_PROFILE).connect()
+
+    rows = [
+        ('first page by msg_count, users.msg_count', '%.2f' % (measure(
+            lambda: connection.get_users(PAGE_SIZE, sort='msg_count'), REPEAT) / REPEAT * 1000)),
+        ('first page by msg_count, counted', '%.2f' % (measure(
+            lambda: connection.con.execute(COMPUTED_QUERY, (PAGE_SIZE,)).fetchall()) * 1000)),
+        ('import of %d messages with the triggers' % imported, '%.2f' % (measure(
+            lambda: import_messages(connection, imported)) * 1000)),
+    ]
+    con = sqlite3.connect(BENCH_DB_PATH)
+    with con:
+        for name, _, _ in database_engine.MESSAGE_COUNT_TRIGGERS:
+            con.execute('DROP TRIGGER %s' % name)
+    con.close()
+    rows.append(('import of %d messages without them' % imported, '%.2f' % (measure(
+        lambda: import_messages(connection, imported)) * 1000)))
+    rows.append(('rebuild of the numbers', '%.2f' % (measure(
+        engine.rebuild_message_counts) * 1000)))
+    connection.close()
+    remove_database()
+    report('%d messages of %d users' % (messages, USERS), rows, ('operation', 'ms'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
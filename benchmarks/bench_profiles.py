@@ -0,0 +1,56 @@
+"""
+Benchmark of the default against the tuned connection profile on a read
+heavy mix: 90% reads (single message, history of a user, single user) and
+10% writes (new message), every write commited on its own as the API does.
+
+Usage::
+
+    python -m benchmarks.bench_profiles [operations]
+"""
+
+import random
+import sys
+
+from medical_forum.database_connection import DEFAULT_PROFILE, TUNED_PROFILE
+from medical_forum import database_engine
+from .utils import BENCH_DB_PATH, create_database, remove_database, measure, report
+
+USERS = 200
+MESSAGES = 20000
+WRITE_RATIO = 0.1
+
+
+def run_mix(connection, operations, seed=2):
+    """Runs the read heavy mix of operations on the given Connection"""
+    rand = random.Random(seed)
+    for _ in range(operations):
+        if rand.random() < WRITE_RATIO:
+            connection.create_message('title', 'body', 'user%d' % rand.randint(1, USERS))
+            continue
+        choice = rand.randint(0, 2)
+        if choice == 0:
+            connection.get_message('msg-%d' % rand.randint(1, MESSAGES))
+        elif choice == 1:
+            connection.get_messages('user%d' % rand.randint(1, USERS), 20)
+        else:
+            connection.get_user('user%d' % rand.randint(1, USERS))
+
+
+def main(operations=2000):
+    """Runs the mix once per profile and prints the throughput"""
+    rows = []
+    for name, profile in (('default', DEFAULT_PROFILE), ('tuned', TUNED_PROFILE)):
+        create_database(users=USERS, messages=MESSAGES)
+        connection = database_engine.Engine(BENCH_DB_PATH, profile=profile).connect()
+        # Warm the page cache before measuring
+        run_mix(connection, operations // 10, seed=1)
+        elapsed = measure(lambda: run_mix(connection, operations))
+        connection.close()
+        rows.append((name, operations, '%.3f' % elapsed, '%.0f' % (operations / elapsed)))
+    remove_database()
+    report('Read heavy mix (%d%% writes) on %d messages' % (WRITE_RATIO * 100, MESSAGES),
+           rows, ('profile', 'operations', 'seconds', 'ops/s'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,87 @@
+"""
+Benchmark of the statements of ``get_messages`` and ``get_diagnoses`` with
+their values written into the SQL text (as they were built before the
+:py:mod:`medical_forum.database_query` builder) against the parameterized
+statements of the builder.
+
+Every call uses different values, so the interpolated statements are
+compiled again on each call while the parameterized ones are taken from the
+statement cache of sqlite3. The queries return few rows, so the time is
+dominated by preparing the statement.
+
+Usage::
+
+    python -m benchmarks.bench_queries [queries]
+"""
+
+import random
+import sqlite3
+import sys
+
+from medical_forum.database_query import Select
+from .utils import BENCH_DB_PATH, create_database, remove_database, measure, report
+
+USERS = 200
+MESSAGES = 20000
+
+
+def interpolated_messages(con, username, before, limit):
+    """History query with the values written into the SQL text"""
+    query = "SELECT * FROM messages WHERE username = '%s' AND timestamp < %s" \
+            " ORDER BY timestamp DESC, message_id DESC LIMIT %s" % (username, before, limit)
+    return con.execute(query).fetchall()
+
+
+def parameterized_messages(con, username, before, limit):
+    """History query built with Select"""
+    query = Select('*', 'messages').where('username = ?', username) \
+        .where('timestamp < ?', before).order_by('timestamp DESC, message_id DESC') \
+        .limit(limit)
+    return query.execute(con).fetchall()
+
+
+def interpolated_diagnoses(con, user_id, message_id, limit):
+    """Diagnoses query with the values written into the SQL text"""
+    query = "SELECT * FROM diagnosis WHERE user_id = '%s' AND message_id = '%s'" \
+            " ORDER BY diagnosis_id ASC LIMIT %s" % (user_id, message_id, limit)
+    return con.execute(query).fetchall()
+
+
+def parameterized_diagnoses(con, user_id, message_id, limit):
+    """Diagnoses query built with Select"""
+    query = Select('*', 'diagnosis').where('user_id = ?', user_id) \
+        .where('message_id = ?', message_id).order_by('diagnosis_id ASC').limit(limit)
+    return query.execute(con).fetchall()
+
+
+def run(con, messages_query, diagnoses_query, queries, seed=3):
+    """Runs the same random sequence of queries with the given functions"""
+    rand = random.Random(seed)
+    for _ in range(queries // 2):
+        messages_query(con, 'user%d' % rand.randint(1, USERS),
+                       1500000000 + rand.randint(1, MESSAGES), rand.randint(1, 50))
+        diagnoses_query(con, rand.randint(1, USERS), rand.randint(1, MESSAGES),
+                        rand.randint(1, 50))
+
+
+def main(queries=20000):
+    """Runs the queries both ways and prints the throughput"""
+    create_database(users=USERS, messages=MESSAGES)
+    con = sqlite3.connect(BENCH_DB_PATH)
+    # Warm the page cache before measuring
+    run(con, parameterized_messages, parameterized_diagnoses, queries // 10, seed=1)
+    rows = []
+    for name, messages_query, diagnoses_query in (
+            ('interpolated', interpolated_messages, interpolated_diagnoses),
+            ('parameterized', parameterized_messages, parameterized_diagnoses)):
+        elapsed = measure(lambda: run(con, messages_query, diagnoses_query, queries))
+        rows.append((name, queries, '%.3f' % elapsed, '%.1f' % (elapsed / queries * 1e6),
+                     '%.0f' % (queries / elapsed)))
+    con.close()
+    remove_database()
+    report('get_messages and get_diagnoses statements, different values on every call',
+           rows, ('statements', 'queries', 'seconds', 'us/query', 'queries/s'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,95 @@
+"""
+Latency of the full-text search of the messages
+(:py:meth:`medical_forum.database_connection.Connection.search_messages`,
+first page of 20 messages) against the ``LIKE`` scan of the titles and bodies
+it replaces, on a synthetic database.
+
+A few messages get rare words, so that the searches go from words found in
+almost every message to words found in one message out of ten thousand. The
+time taken by ``rebuild_search_index`` is reported too.
+
+Usage::
+
+    python -m benchmarks.bench_search [messages] [queries]
+"""
+
+import sys
+import time
+
+from medical_forum import database_engine
+from medical_forum.database_connection import TUNED_PROFILE
+from .utils import BENCH_DB_PATH, create_database, remove_database, measure, report
+
+USERS = 10000
+PAGE_SIZE = 20
+# Rare words added to the bodies of the messages whose id is a multiple of
+# the number
+RARE_WORDS = (('migraine', 100), ('rash', 10000))
+# (description, words searched)
+SEARCHES = (
+    ('word in most messages', 'fever'),
+    ('two words in most messages', 'fever cough'),
+    ('word in 1% of the messages', 'migraine'),
+    ('word in 0.01% of the messages', 'rash'),
+    ('prefix of a word in 1%', 'migr*'),
+)
+
+
+def like_search(con, text, limit):
+    """The messages containing all the words, found with LIKE"""
+    query = 'SELECT message_id, title FROM messages WHERE %s ORDER BY message_id LIMIT ?' % (
+        ' AND '.join('(title LIKE ? OR body LIKE ?)' for _ in text.split()))
+    params = []
+    for word in text.split():
+        pattern = '%' + word.rstrip('*') + '%'
+        params.extend((pattern, pattern))
+    return con.execute(query, params + [limit]).fetchall()
+
+
+def percentile(values, fraction):
+    """The value below which the given fraction of the sorted values fall"""
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def latencies(function, queries):
+    """Times of ``queries`` calls of function, in milliseconds"""
+    times = []
+    for _ in range(queries):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main(messages=1000000, queries=20):
+    """Builds the database, the index and times every search both ways"""
+    start = time.perf_counter()
+    engine = create_database(users=USERS, messages=messages, diagnoses=0)
+    created = time.perf_counter() - start
+    con = database_engine.Engine(BENCH_DB_PATH, profile=TUNED_PROFILE).connect()
+    with con.con:
+        for word, every in RARE_WORDS:
+            con.con.execute("UPDATE messages SET body = body || ' ' || ? "
+                            "WHERE message_id % ? = 0", (word, every))
+    rebuild = measure(engine.rebuild_search_index)
+
+    rows = []
+    for description, text in SEARCHES:
+        found = len(con.search_messages(text, PAGE_SIZE))
+        fts = latencies(lambda: con.search_messages(text, PAGE_SIZE), queries)
+        # The scans are slow, a few of them are enough
+        like = latencies(lambda: like_search(con.con, text, PAGE_SIZE), max(queries // 5, 1))
+        rows.append((description, found,
+                     '%.2f' % percentile(fts, 0.5), '%.2f' % percentile(fts, 0.99),
+                     '%.2f' % percentile(like, 0.5), '%.2f' % percentile(like, 0.99)))
+    con.close()
+    remove_database()
+    print('%d messages created (index kept by the triggers) in %.1f s, '
+          'index rebuilt in %.1f s' % (messages, created, rebuild))
+    report('first page of %d messages, %d queries' % (PAGE_SIZE, queries), rows,
+           ('search', 'found', 'FTS p50 ms', 'FTS p99 ms', 'LIKE p50 ms', 'LIKE p99 ms'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,72 @@
+"""
+Benchmark of the JSON encoders on large envelopes of the messages and users
+collections: ``json.dumps`` with its default separators (as the resources
+serialized before :py:mod:`medical_forum.serializer`) against each encoder
+of the serializer installed here (orjson, ujson, json with compact
+separators).
+
+The envelopes, with all their items, are built once before measuring, so
+only the serialization is timed.
+
+Usage::
+
+    python -m benchmarks.bench_serializers [messages] [users]
+"""
+
+import json
+import sys
+
+from medical_forum import forum_object as forum_obj
+from medical_forum import hypermedia_formats as hyper_const
+from medical_forum import resources, serializer
+from medical_forum.message_resources import Messages, _message_items
+from medical_forum.user_resources import Users, _user_items
+from .utils import create_database, remove_database, measure, report
+
+REPEAT = 5
+
+
+def collection_envelope(resource, items):
+    """The envelope of a collection resource with all its items"""
+    envelope = forum_obj.ForumObject()
+    envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
+    envelope.add_control("self", href=resources.API.url_for(resource))
+    envelope.add_control_users_all()
+    envelope.add_control_add_message()
+    envelope["items"] = list(items)
+    return envelope
+
+
+def default_dumps(value):
+    """Serialization used before the serializer module"""
+    return json.dumps(value).encode('utf-8')
+
+
+def main(messages=20000, users=20000):
+    """Serializes the envelopes with each encoder and prints the throughput"""
+    engine = create_database(users=users, messages=messages, diagnoses=0)
+    connection = engine.connect()
+    with resources.APP.test_request_context():
+        envelopes = (
+            ('messages', collection_envelope(
+                Messages, _message_items(connection.get_messages()))),
+            ('users', collection_envelope(Users, _user_items(connection.get_users()))))
+    connection.close()
+    remove_database()
+
+    encoders = [('json default', default_dumps)]
+    encoders.extend(('%s compact' % name if name == 'json' else name, function)
+                    for name, function in serializer.ENCODERS.items())
+    rows = []
+    for collection, envelope in envelopes:
+        for name, function in encoders:
+            size = len(function(envelope))
+            elapsed = measure(lambda: function(envelope), REPEAT) / REPEAT
+            rows.append((collection, len(envelope['items']), name, size,
+                         '%.1f' % (elapsed * 1000), '%.0f' % (size / elapsed / 1e6)))
+    report('Serialization of whole collection envelopes', rows,
+           ('collection', 'items', 'encoder', 'body bytes', 'ms', 'MB/s'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
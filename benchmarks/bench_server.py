@@ -0,0 +1,126 @@
+"""
+Throughput of the development server (``python main.py run``, werkzeug's
+``run_simple`` with the debugger and without the reloader) against the
+production server (``python main.py serve``) with one and several worker
+processes.
+
+Each server is started as a separate process on a synthetic database, and
+client processes send requests to a few endpoints of the API during a fixed
+time, one connection per request. The response cache is warm after the
+first requests, so the numbers mostly measure the server itself.
+
+Usage::
+
+    python -m benchmarks.bench_server [workers] [clients] [seconds]
+"""
+
+import http.client
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from .utils import BENCH_DB_PATH, create_database, remove_database, report
+
+USERS = 1000
+MESSAGES = 20000
+PORT = 5099
+URLS = (
+    '/medical_forum/api/messages/?limit=20',
+    '/medical_forum/api/users/user10/',
+    '/medical_forum/api/messages/msg-10/',
+    '/medical_forum/api/diagnoses/?limit=20',
+)
+
+
+def percentile(values, fraction):
+    """The value below which the given fraction of the sorted values fall"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def client(number, until, results):
+    """Sends requests until the deadline"""
+    latencies = []
+    errors = 0
+    while time.perf_counter() < until:
+        url = URLS[len(latencies) % len(URLS)]
+        start = time.perf_counter()
+        connection = http.client.HTTPConnection('localhost', PORT, timeout=30)
+        try:
+            connection.request('GET', url)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except OSError:
+            errors += 1
+        finally:
+            connection.close()
+        latencies.append(time.perf_counter() - start)
+    results.put((number, latencies, errors))
+
+
+def wait_listening(timeout=30):
+    """Waits until the server accepts connections"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('localhost', PORT), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("The server did not start")
+
+
+def run(name, command, clients, seconds):
+    """Starts a server, loads it with the clients and returns the report row"""
+    server = subprocess.Popen([sys.executable, 'main.py'] + command +
+                              ['--port', str(PORT), '--database', BENCH_DB_PATH],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              start_new_session=True)
+    try:
+        wait_listening()
+        results = multiprocessing.Queue()
+        until = time.perf_counter() + seconds
+        processes = [multiprocessing.Process(target=client, args=(number, until, results))
+                     for number in range(clients)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+    latencies = [latency for outcome in outcomes for latency in outcome[1]]
+    errors = sum(outcome[2] for outcome in outcomes)
+    return (name, len(latencies), errors, '%.0f' % (len(latencies) / seconds),
+            '%.2f' % (percentile(latencies, 0.5) * 1000),
+            '%.2f' % (percentile(latencies, 0.99) * 1000))
+
+
+def main(workers=4, clients=8, seconds=5):
+    """Runs the servers one after the other and prints their throughput"""
+    create_database(users=USERS, messages=MESSAGES)
+    rows = [
+        run('run_simple', ['run', '--no-reload'], clients, seconds),
+        run('prefork, 1 worker', ['serve', '--workers', '1'], clients, seconds),
+        run('prefork, %d workers' % workers, ['serve', '--workers', str(workers)],
+            clients, seconds),
+        run('prefork, %d workers, recycled' % workers,
+            ['serve', '--workers', str(workers), '--max-requests', '500',
+             '--max-requests-jitter', '50'], clients, seconds),
+    ]
+    remove_database()
+    report('%d clients during %d seconds' % (clients, seconds), rows,
+           ('server', 'requests', 'errors', 'per second', 'p50 ms', 'p99 ms'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,79 @@
+"""
+Benchmark of the peak memory used to render the whole messages collection,
+materialized (``get_messages``, a list of items and one ``json.dumps``)
+against streamed (``iter_messages`` and :py:mod:`medical_forum.streaming`).
+
+The peak is measured with tracemalloc, so it only counts the memory
+allocated by Python objects, not the page cache of SQLite.
+
+Usage::
+
+    python -m benchmarks.bench_streaming [messages ...]
+
+The default sizes are 10000, 100000 and 1000000 messages. The database of
+the largest one takes a few minutes to generate and about 500MB of disk.
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+
+from medical_forum import forum_object as forum_obj
+from medical_forum import resources, streaming
+from medical_forum.message_resources import _message_items
+from .utils import create_database, remove_database, report
+
+SIZES = (10000, 100000, 1000000)
+
+
+def render_materialized(connection):
+    """Renders the collection the way the resources did before streaming"""
+    envelope = forum_obj.ForumObject()
+    envelope["items"] = list(_message_items(connection.get_messages()))
+    return len(json.dumps(envelope))
+
+
+def render_streamed(connection):
+    """Renders the collection chunk by chunk, dropping each chunk once written"""
+    envelope = forum_obj.ForumObject()
+    return sum(len(chunk) for chunk in
+               streaming.stream_envelope(envelope, _message_items(connection.iter_messages())))
+
+
+def measure_peak(function, connection):
+    """
+    Calls ``function(connection)``.
+
+    :return: the size of the body, the elapsed seconds and the peak of
+        memory allocated during the call, in MB.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = function(connection)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak / (1024.0 * 1024.0)
+
+
+def main(*sizes):
+    """Renders the collection both ways for each size and prints the peaks"""
+    rows = []
+    for messages in sizes or SIZES:
+        engine = create_database(users=max(messages // 100, 10), messages=messages,
+                                 diagnoses=0)
+        connection = engine.connect()
+        with resources.APP.test_request_context():
+            for name, function in (('materialized', render_materialized),
+                                   ('streamed', render_streamed)):
+                size, elapsed, peak = measure_peak(function, connection)
+                rows.append((messages, name, size, '%.2f' % elapsed, '%.1f' % peak))
+        connection.close()
+    remove_database()
+    report('Peak memory to render the whole messages collection',
+           rows, ('messages', 'rendering', 'body bytes', 'seconds', 'peak MB'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
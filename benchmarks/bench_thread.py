@@ -0,0 +1,89 @@
+"""
+Latency of the thread of a message
+(:py:meth:`medical_forum.database_connection.Connection.get_thread`, one
+recursive query) against walking the replies one message at a time, as a
+client following the links of the messages does, on a synthetic database.
+
+A thread of ``size`` messages is added to the database; each message replies
+to a random earlier message of the thread, so the tree is both wide and
+deep. The first page, a page in the middle of the thread (reached with a
+cursor), the last page (reached backwards) and the whole thread are timed.
+
+Usage::
+
+    python -m benchmarks.bench_thread [size] [messages]
+"""
+
+import random
+import sys
+
+from medical_forum import database_engine
+from medical_forum.database_connection import TUNED_PROFILE
+from .utils import BENCH_DB_PATH, create_database, remove_database, measure, report
+
+PAGE_SIZE = 50
+REPEAT = 20
+
+
+def add_thread(con, size, rand):
+    """Adds a thread of size messages and returns the id of its first one"""
+    first = con.execute('SELECT MAX(message_id) FROM messages').fetchone()[0] + 1
+    with con:
+        con.executemany(
+            'INSERT INTO messages(message_id, user_id, username, reply_to, title, body, '
+            'views, timestamp) VALUES(?,1,?,?,?,?,0,?)',
+            ((first + number, 'user1',
+              first + rand.randrange(number) if number else None,
+              'reply %d' % number, 'body of the reply %d' % number, 1600000000 + number)
+             for number in range(size)))
+    return first
+
+
+def walk_replies(con, message_id):
+    """The messages of a thread, read one message at a time"""
+    found = []
+    pending = [message_id]
+    while pending:
+        message_id = pending.pop()
+        found.append(con.execute('SELECT * FROM messages WHERE message_id = ?',
+                                 (message_id,)).fetchone())
+        pending.extend(row[0] for row in con.execute(
+            'SELECT message_id FROM messages WHERE reply_to = ? ORDER BY message_id DESC',
+            (message_id,)))
+    return found
+
+
+def main(size=100000, messages=100000):
+    """Builds the database and the thread, and times its pages"""
+    create_database(users=100, messages=messages, diagnoses=0)
+    connection = database_engine.Engine(BENCH_DB_PATH, profile=TUNED_PROFILE).connect()
+    root = 'msg-%d' % add_thread(connection.con, size, random.Random(1))
+    thread = connection.get_thread(root)
+    depth = max(message['depth'] for message in thread)
+    middle = (int(thread[len(thread) // 2]['message_id'][4:]),)
+    last = (int(thread[-1]['message_id'][4:]),)
+
+    cases = (
+        ('first page', lambda: connection.get_thread(root, number_of_messages=PAGE_SIZE)),
+        ('page in the middle', lambda: connection.get_thread(
+            root, number_of_messages=PAGE_SIZE, start_after=middle)),
+        ('last page (backwards)', lambda: connection.get_thread(
+            root, number_of_messages=PAGE_SIZE, end_before=last)),
+        ('first page, depth 3', lambda: connection.get_thread(
+            root, max_depth=3, number_of_messages=PAGE_SIZE)),
+        ('whole thread', lambda: connection.get_thread(root)),
+    )
+    rows = [(description, '%.2f' % (measure(function, REPEAT) / REPEAT * 1000))
+            for description, function in cases]
+    rows.append(('whole thread, one message at a time',
+                 '%.2f' % (measure(lambda: walk_replies(connection.con, int(root[4:])))
+                           * 1000)))
+    connection.close()
+    remove_database()
+    report('thread of %d messages, %d levels deep, pages of %d' % (len(thread), depth,
+                                                                   PAGE_SIZE),
+           rows, ('read', 'ms'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,69 @@
+"""
+Cost and benefit of the aggregates of the threads kept by triggers
+(:py:meth:`medical_forum.database_engine.Engine.create_thread_stats`).
+
+On a synthetic database, where a third of the messages reply to an earlier
+one, the first page of the threads by last activity
+(:py:meth:`medical_forum.database_connection.Connection.get_threads`) is
+timed against computing the aggregates of every thread in the query. The
+time taken by a bulk import of replies with and without the triggers, and
+by the consistency check, are reported too.
+
+Usage::
+
+    python -m benchmarks.bench_thread_stats [messages] [replies]
+"""
+
+import sqlite3
+import sys
+
+from medical_forum import database_engine
+from medical_forum.database_connection import TUNED_PROFILE
+from .utils import BENCH_DB_PATH, create_database, remove_database, measure, report
+
+PAGE_SIZE = 20
+REPEAT = 20
+# The first page of the threads by last activity, without the aggregates
+COMPUTED_QUERY = (database_engine.THREAD_TREE +
+                  'SELECT root_id, COUNT(*) - 1, MAX(timestamp) AS last, '
+                  'COUNT(DISTINCT username) FROM tree JOIN messages USING(message_id) '
+                  'GROUP BY root_id ORDER BY last DESC, root_id DESC LIMIT ?')
+
+
+def import_replies(connection, replies):
+    """Adds replies to the first messages with one bulk call"""
+    connection.create_messages_bulk(
+        [{'title': 'reply %d' % number, 'body': 'body', 'sender': 'user1',
+          'reply_to': 'msg-%d' % (number % 1000 + 1)} for number in range(replies)])
+
+
+def main(messages=100000, replies=10000):
+    """Builds the database and times the listings, the imports and the check"""
+    engine = create_database(users=1000, messages=messages, diagnoses=0)
+    connection = database_engine.Engine(BENCH_DB_PATH, profile=TUNED_PROFILE).connect()
+    threads = connection.con.execute('SELECT COUNT(*) FROM thread_stats').fetchone()[0]
+
+    rows = [
+        ('first page by activity, thread_stats', '%.2f' % (measure(
+            lambda: connection.get_threads(PAGE_SIZE), REPEAT) / REPEAT * 1000)),
+        ('first page by activity, computed', '%.2f' % (measure(
+            lambda: connection.con.execute(COMPUTED_QUERY, (PAGE_SIZE,)).fetchall()) * 1000)),
+        ('import of %d replies with the triggers' % replies, '%.2f' % (measure(
+            lambda: import_replies(connection, replies)) * 1000)),
+    ]
+    con = sqlite3.connect(BENCH_DB_PATH)
+    with con:
+        for name, _, _ in database_engine.THREAD_TRIGGERS:
+            con.execute('DROP TRIGGER %s' % name)
+    con.close()
+    rows.append(('import of %d replies without them' % replies, '%.2f' % (measure(
+        lambda: import_replies(connection, replies)) * 1000)))
+    rows.append(('consistency check and repair', '%.2f' % (measure(
+        lambda: engine.check_thread_stats(repair=True)) * 1000)))
+    connection.close()
+    remove_database()
+    report('%d messages in %d threads' % (messages, threads), rows, ('operation', 'ms'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
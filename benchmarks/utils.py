@@ -0,0 +1,124 @@
+"""
+Helper functions for the benchmarks.
+
+The benchmarks run against a throwaway database file filled with synthetic
+users, messages and diagnoses, generated here with plain sqlite3 so that
+the code under measurement is not used to build its own fixture.
+"""
+
+import random
+import sqlite3
+import time
+
+from medical_forum import database_engine
+
+BENCH_DB_PATH = 'db/medical_forum_data_bench.db'
+
+WORDS = ('throat', 'fever', 'knee', 'pain', 'dizzy', 'running', 'cough', 'head',
+         'sleep', 'week', 'doctor', 'help', 'worse', 'better', 'morning', 'night')
+DISEASES = ('Influenza', 'Migraine', 'Pharyngitis', 'Anemia', 'Asthma',
+            'Bronchitis', 'Tendinitis', 'Vertigo', 'Gastritis', 'Insomnia')
+
+
+def _sentence(rand, length):
+    """Random sequence of words of the given length"""
+    return ' '.join(rand.choice(WORDS) for _ in range(length))
+
+
+def create_database(db_path=BENCH_DB_PATH, users=100, messages=1000, diagnoses=None,
+                    seed=1):
+    """
+    Creates (or re-creates) a database file with synthetic data.
+
+    A quarter of the users are doctors. A third of the messages are replies
+    to an earlier message.
+
+    :param str db_path: location of the database file.
+    :param int users: number of users to create.
+    :param int messages: number of messages to create.
+    :param int diagnoses: number of diagnoses to create. Defaults to a tenth
+        of the messages.
+    :param int seed: seed of the random generator, for repeatable data.
+    :return: an Engine for the created database.
+    """
+    engine = database_engine.Engine(db_path)
+    engine.remove_database()
+    engine.create_tables()
+    if diagnoses is None:
+        diagnoses = messages // 10
+    rand = random.Random(seed)
+
+    con = sqlite3.connect(db_path)
+    with con:
+        con.executemany(
+            'INSERT INTO users(user_id, username, pass_hash, reg_date, last_login, msg_count) '
+            'VALUES(?,?,?,?,?,0)',
+            ((uid, 'user%d' % uid, 'pass_hash', 1500000000 + uid, 1500000000 + uid)
+             for uid in range(1, users + 1)))
+        con.executemany(
+            'INSERT INTO users_profile(user_id, user_type, firstname, lastname, work_address, '
+            'gender, age, email, picture, phone, height, weight, speciality) '
+            'VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)',
+            ((uid, 1 if uid % 4 == 0 else 0, 'First%d' % uid, 'Last%d' % uid,
+              '%d Main Street' % uid, rand.choice(('male', 'female')), 20 + uid % 60,
+              'user%d@example.com' % uid, 'user%d.png' % uid, 5550000 + uid,
+              150 + uid % 50, 50 + uid % 50,
+              rand.choice(DISEASES) if uid % 4 == 0 else '')
+             for uid in range(1, users + 1)))
+
+        def message_rows():
+            for mid in range(1, messages + 1):
+                uid = rand.randint(1, users)
+                reply_to = rand.randint(1, mid - 1) if mid > 1 and mid % 3 == 0 else None
+                yield (mid, uid, 'user%d' % uid, reply_to, _sentence(rand, 4),
+                       _sentence(rand, 60), rand.randint(0, 1000), 1500000000 + mid)
+        con.executemany(
+            'INSERT INTO messages(message_id, user_id, username, reply_to, title, body, '
+            'views, timestamp) VALUES(?,?,?,?,?,?,?,?)', message_rows())
+
+        doctors = [uid for uid in range(1, users + 1) if uid % 4 == 0] or [1]
+        con.executemany(
+            'INSERT INTO diagnosis(diagnosis_id, user_id, message_id, disease, '
+            'diagnosis_description) VALUES(?,?,?,?,?)',
+            ((did, rand.choice(doctors), rand.randint(1, max(messages, 1)),
+              rand.choice(DISEASES), _sentence(rand, 20))
+             for did in range(1, diagnoses + 1)))
+    con.close()
+    return engine
+
+
+def remove_database(db_path=BENCH_DB_PATH):
+    """Removes the benchmark database file and its journals"""
+    database_engine.Engine(db_path).remove_database()
+
+
+def measure(function, repeat=1):
+    """
+    Calls ``function`` ``repeat`` times.
+
+    :return: total elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return time.perf_counter() - start
+
+
+def report(title, rows, headers):
+    """
+    Prints a small fixed width table.
+
+    :param str title: title printed above the table.
+    :param rows: sequence of rows, each one a sequence of values.
+    :param headers: column names.
+    """
+    print()
+    print(title)
+    widths = [max(len(str(value)) for value in column)
+              for column in zip(headers, *rows)]
+    line = '  '.join('%%-%ds' % width for width in widths)
+    print(line % tuple(headers))
+    print(line % tuple('-' * width for width in widths))
+    for row in rows:
+        print(line % tuple(row))
+
@@ -1,16 +1,178 @@
 """
 Main medical forum server
+
+The API and the web client are imported, and mounted together, when this
+module is loaded, so the production server forks its workers with the whole
+application already loaded.
+
+Usage::
+
+    # development server with reloader and debugger (the default command)
+    python main.py run
+    # production server: 4 worker processes, recycled every 1000 requests
+    python main.py serve --workers 4 --max-requests 1000
+    # ASGI server (needs uvicorn), the database calls on 4 threads
+    python main.py serve-asgi --threads 4
+    # create or rebuild the full-text index of the messages of a database
+    python main.py rebuild-search --database db/medical_forum_data.db
+    # compare the aggregates of the threads with the messages, and fix them
+    python main.py check-threads --database db/medical_forum_data.db --repair
+    # count again the messages of every user and fix users.msg_count
+    python main.py rebuild-message-counts --database db/medical_forum_data.db
 """
 
+import argparse
+import sys
+
 from werkzeug.serving import run_simple
-from werkzeug.wsgi import DispatcherMiddleware
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from medical_forum.resources import APP as forum_server
+from medical_forum import database_engine
+from medical_forum.database_connection import TUNED_PROFILE
+from medical_forum import prefork
+from medical_forum import asgi
 from client_web.client import APP as client_web
 
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
 CLIENT = DispatcherMiddleware(forum_server, {
     '/medical_forum/client': client_web
 })
+# The same application for ASGI servers
+ASGI_CLIENT = asgi.AsgiApp(CLIENT)
+
+
+def use_database(db_path):
+    """Serves the database file at the given path instead of the default one"""
+    forum_server.config["Engine"] = database_engine.Engine(db_path, profile=TUNED_PROFILE)
+
+
+def run(args):
+    """Runs the development server"""
+    if args.database:
+        use_database(args.database)
+    run_simple(args.host, args.port, CLIENT,
+               use_reloader=args.reload, use_debugger=True, use_evalex=True)
+
+
+def serve(args):
+    """Runs the production server, with the debugger disabled"""
+    forum_server.debug = False
+    client_web.debug = False
+    if args.database:
+        use_database(args.database)
+    server = prefork.PreforkServer(CLIENT, args.host, args.port, workers=args.workers,
+                                   max_requests=args.max_requests,
+                                   max_requests_jitter=args.max_requests_jitter,
+                                   backlog=args.backlog,
+                                   graceful_timeout=args.graceful_timeout)
+    server.serve_forever()
+
+
+def serve_asgi(args):
+    """Runs the ASGI server with uvicorn, with the debugger disabled"""
+    if uvicorn is None:
+        sys.exit("The ASGI server needs uvicorn: pip install uvicorn")
+    forum_server.debug = False
+    client_web.debug = False
+    if args.database:
+        use_database(args.database)
+    uvicorn.run(asgi.AsgiApp(CLIENT, read_threads=args.threads), host=args.host,
+                port=args.port, lifespan='on')
+
+
+def rebuild_search(args):
+    """Creates or rebuilds the full-text index of the messages"""
+    engine = database_engine.Engine(args.database or database_engine.DEFAULT_DB_PATH)
+    print("%d messages indexed in %s" % (engine.rebuild_search_index(), engine.db_path))
+
+
+def check_threads(args):
+    """Recomputes the aggregates of the threads and reports the wrong ones"""
+    engine = database_engine.Engine(args.database or database_engine.DEFAULT_DB_PATH)
+    wrong = engine.check_thread_stats(repair=args.repair)
+    if not wrong:
+        print("The aggregates of the threads in %s are consistent" % engine.db_path)
+        return
+    print("%d threads with wrong aggregates in %s: %s" % (
+        len(wrong), engine.db_path, ", ".join("msg-%d" % root for root in wrong)))
+    if args.repair:
+        print("The aggregates have been computed again")
+    else:
+        sys.exit(1)
+
+
+def rebuild_message_counts(args):
+    """Counts again the messages of the users and fixes the wrong numbers"""
+    engine = database_engine.Engine(args.database or database_engine.DEFAULT_DB_PATH)
+    print("%d users with a wrong number of messages fixed in %s" % (
+        engine.rebuild_message_counts(), engine.db_path))
+
+
+def parse_args(argv=None):
+    """Parses the command line. Without a command, the development server is run."""
+    parser = argparse.ArgumentParser(description="Medical forum server")
+    commands = parser.add_subparsers(dest="command")
+
+    run_parser = commands.add_parser("run", help="development server")
+    run_parser.add_argument("--no-reload", dest="reload", action="store_false",
+                            help="do not restart when the code changes")
+    run_parser.set_defaults(func=run)
+
+    serve_parser = commands.add_parser("serve", help="production server")
+    serve_parser.add_argument("--workers", type=int, default=prefork.DEFAULT_WORKERS,
+                              help="number of worker processes")
+    serve_parser.add_argument("--max-requests", type=int, default=0,
+                              help="recycle a worker after this number of requests "
+                                   "(0: never)")
+    serve_parser.add_argument("--max-requests-jitter", type=int, default=0,
+                              help="random number of requests added to the limit of "
+                                   "each worker")
+    serve_parser.add_argument("--backlog", type=int, default=prefork.DEFAULT_BACKLOG,
+                              help="size of the queue of pending connections")
+    serve_parser.add_argument("--graceful-timeout", type=int,
+                              default=prefork.DEFAULT_GRACEFUL_TIMEOUT,
+                              help="seconds given to the workers to finish their requests "
+                                   "when stopping")
+    serve_parser.set_defaults(func=serve)
+
+    asgi_parser = commands.add_parser("serve-asgi", help="ASGI server (uvicorn)")
+    asgi_parser.add_argument("--threads", type=int, default=asgi.DEFAULT_READ_THREADS,
+                             help="number of threads serving the read requests")
+    asgi_parser.set_defaults(func=serve_asgi)
+
+    rebuild_parser = commands.add_parser("rebuild-search",
+                                         help="create or rebuild the full-text index of "
+                                              "the messages")
+    rebuild_parser.set_defaults(func=rebuild_search)
+
+    check_parser = commands.add_parser("check-threads",
+                                       help="check the aggregates of the threads of "
+                                            "messages against the messages")
+    check_parser.add_argument("--repair", action="store_true",
+                              help="compute the aggregates again if they are wrong")
+    check_parser.set_defaults(func=check_threads)
+
+    counts_parser = commands.add_parser("rebuild-message-counts",
+                                        help="count again the messages of the users")
+    counts_parser.set_defaults(func=rebuild_message_counts)
+
+    for command in (run_parser, serve_parser, asgi_parser):
+        command.add_argument("--host", default="localhost")
+        command.add_argument("--port", type=int, default=5000)
+    for command in (run_parser, serve_parser, asgi_parser, rebuild_parser, check_parser,
+                    counts_parser):
+        command.add_argument("--database", help="path of the database file")
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        args = parser.parse_args(["run"])
+    return args
+
 
 if __name__ == '__main__':
-    run_simple('localhost', 5000, CLIENT,
-               use_reloader=True, use_debugger=True, use_evalex=True)
+    ARGS = parse_args()
+    ARGS.func(ARGS)
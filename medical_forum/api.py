@@ -1,22 +1,52 @@
 """
 Create API and APP objects
 """
-from flask import Flask, g
+import sqlite3
+
+from flask import Flask, g, make_response, request
 from flask_restful import Api
 from medical_forum import database_engine
-from medical_forum.utils import RegexConverter
+from medical_forum import hypermedia_formats as hyper_const
+from medical_forum import serializer
+from medical_forum.database_connection import TUNED_PROFILE
+from medical_forum.utils import RegexConverter, MessageIdConverter, DiagnosisIdConverter
 
 APP = Flask(__name__, static_folder="static", static_url_path="/.")
 APP.debug = True
-APP.config.update({"Engine": database_engine.Engine()})
+APP.config.update({"Engine": database_engine.Engine(profile=TUNED_PROFILE)})
 API = Api(APP)
 
 
+@API.representation(hyper_const.JSON)
+@API.representation(hyper_const.MASON)
+def output_json(data, code, headers=None):
+    """
+    Serializes the bodies that Flask-RESTful builds itself (the aborts and
+    its 404 and 405 errors) with :py:func:`medical_forum.serializer.dumps`,
+    like the responses built by the resources.
+    """
+    response = make_response(serializer.dumps(data), code)
+    response.headers.extend(headers or {})
+    return response
+
+# HTTP methods served with a read-only database connection
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Endpoints served with a read-only database connection whatever the method
+READ_ENDPOINTS = ('batch',)
+# WSGI environ key of a read-only connection lent by the server for the whole
+# request (see medical_forum.asgi). It is used instead of one borrowed from
+# the Engine, and is not given back to the Engine after the request.
+READER_ENVIRON_KEY = 'medical_forum.reader'
+
+
 def add_regex_support_to_routes():
     """
-    Add the Regex Converter so we can use regex expressions when we define the routes
+    Add the Regex Converter so we can use regex expressions when we define the routes,
+    and the converters of the message and diagnosis ids
     """
     APP.url_map.converters["regex"] = RegexConverter
+    APP.url_map.converters["message_id"] = MessageIdConverter
+    APP.url_map.converters["diagnosis_id"] = DiagnosisIdConverter
 
 
 add_regex_support_to_routes()
@@ -25,23 +55,32 @@ add_regex_support_to_routes()
 @APP.before_request
 def connect_db():
     """
-    Creates a database connection before the request is proccessed.
+    Borrows a database connection from the Engine before the request is
+    proccessed: a read-only connection for the methods and endpoints that do
+    not modify the forum (see READ_METHODS and READ_ENDPOINTS) and the single
+    writer connection otherwise.
 
     The connection is stored in the application context variable flask.g .
     Hence it is accessible from the request object.
-    """
 
-    g.con = APP.config["Engine"].connect()
+    A read-only connection lent by the server (see READER_ENVIRON_KEY) is
+    used instead of borrowing one, if there is one.
+    """
+    if request.method in READ_METHODS or request.endpoint in READ_ENDPOINTS:
+        g.con = request.environ.get(READER_ENVIRON_KEY) or APP.config["Engine"].acquire_reader()
+    else:
+        g.con = APP.config["Engine"].acquire_writer()
 
 
 @APP.teardown_request
 def close_connection(exception):
     """
-    Closes the database connection
+    Gives the database connection back to the Engine pool.
     Check if the connection is created. It migth be exception appear before
     the connection is created.
     """
     if exception is not None:
         print("Got execption on close connection: " + str(exception))
-    if hasattr(g, "con"):
-        g.con.close()
+    if hasattr(g, "con") and g.con is not request.environ.get(READER_ENVIRON_KEY):
+        # A connection that raised is health checked before it is reused
+        APP.config["Engine"].release(g.con, failed=isinstance(exception, sqlite3.Error))
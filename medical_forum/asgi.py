@@ -0,0 +1,237 @@
+"""
+ASGI variant of the API server.
+
+:py:class:`AsgiApp` serves the WSGI application of the forum to an ASGI
+server (uvicorn, hypercorn...) so that many requests in flight share one
+event loop. The event loop only receives the request bodies and sends the
+responses; the views, and so every call to the database, run on bounded
+thread pools:
+
+* The read requests (see :py:data:`medical_forum.api.READ_METHODS` and
+  :py:data:`medical_forum.api.READ_ENDPOINTS`) run on ``read_threads``
+  threads. Each thread keeps its own read-only connection from the Engine
+  for as long as it lives, and lends it to the requests it serves
+  (:py:data:`medical_forum.api.READER_ENVIRON_KEY`), so they never wait for
+  the reader pool. The connection is replaced if the Engine of the
+  application or its database file changes.
+* The other requests run on a single thread, since they all wait for the
+  single writer connection of the Engine anyway.
+
+The response body is produced in full on the thread serving the request,
+streamed collections included, and then sent by the event loop: a slow
+client keeps no thread and no connection busy.
+
+The views are unchanged and still use the Flask request context, which is
+local to the thread running them.
+
+Usage, with the web client mounted as in ``main.py``::
+
+    uvicorn main:ASGI_CLIENT
+    # or: python main.py serve-asgi --threads 4
+"""
+
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+
+from .api import APP, READ_ENDPOINTS, READ_METHODS, READER_ENVIRON_KEY
+from .database_pool import _file_identity
+
+DEFAULT_READ_THREADS = 4
+
+
+class AsgiApp(object):
+    """
+    ASGI 3 application running a WSGI application on thread pools.
+
+    :param app: the WSGI application, for instance
+        :py:data:`medical_forum.resources.APP` or the dispatcher of
+        ``main.py`` that mounts the web client too.
+    :param int read_threads: number of threads serving the read requests.
+        The reader pool of the Engine must be at least this big, since every
+        thread keeps one of its connections.
+    """
+
+    def __init__(self, app, read_threads=DEFAULT_READ_THREADS):
+        super(AsgiApp, self).__init__()
+        if read_threads < 1:
+            raise ValueError("At least one read thread is needed")
+        self.app = app
+        self.read_threads = read_threads
+        self._readers = None
+        self._writer = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (engine, connection) kept by the read threads
+        self._pinned = []
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        else:
+            raise ValueError("Unsupported ASGI scope %r" % scope['type'])
+
+    async def _lifespan(self, receive, send):
+        """Handles the startup and shutdown of the server"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._executors()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _executors(self):
+        """The executors of the read and write requests, created on first use"""
+        with self._lock:
+            if self._readers is None:
+                self._readers = ThreadPoolExecutor(self.read_threads,
+                                                   thread_name_prefix='forum-reader')
+                self._writer = ThreadPoolExecutor(1, thread_name_prefix='forum-writer')
+            return self._readers, self._writer
+
+    def close(self):
+        """
+        Waits for the requests in progress, stops the threads and gives their
+        connections back to the Engine.
+        """
+        with self._lock:
+            executors, self._readers, self._writer = (self._readers, self._writer), None, None
+            pinned, self._pinned = self._pinned, []
+            self._local = threading.local()
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=True)
+        for engine, connection in pinned:
+            engine.release(connection)
+
+    async def _http(self, scope, receive, send):
+        """Serves an HTTP request"""
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        environ = build_environ(scope, b''.join(chunks))
+        readers, writer = self._executors()
+        read = is_read_request(environ)
+        loop = asyncio.get_running_loop()
+        status, headers, body = await loop.run_in_executor(
+            readers if read else writer, self._run, environ, read)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _run(self, environ, read):
+        """
+        Runs the WSGI application on the current thread.
+
+        :return: the status code, the headers and the whole body.
+        """
+        if read:
+            environ[READER_ENVIRON_KEY] = self._reader()
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [int(status.split(' ', 1)[0]),
+                           [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                            for name, value in headers]]
+            return lambda data: None
+
+        result = self.app(environ, start_response)
+        try:
+            body = b''.join(result)
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                close()
+        return response[0], response[1], body
+
+    def _reader(self):
+        """The read-only connection kept by the current thread"""
+        engine = APP.config["Engine"]
+        pinned = getattr(self._local, 'pinned', None)
+        if pinned is not None:
+            if pinned[0] is engine and pinned[2] == _file_identity(engine.db_path) \
+                    and not pinned[1].isclosed():
+                return pinned[1]
+            # The database was replaced: the pool closes the connection
+            pinned[0].release(pinned[1])
+            with self._lock:
+                self._pinned.remove(pinned[:2])
+        connection = engine.acquire_reader()
+        self._local.pinned = (engine, connection, _file_identity(engine.db_path))
+        with self._lock:
+            self._pinned.append((engine, connection))
+        return connection
+
+
+def is_read_request(environ):
+    """
+    Tells if a request is served with a read-only connection, like
+    :py:func:`medical_forum.api.connect_db` does: by its method, or by the
+    endpoint of its url for the POST requests of the batch resource.
+
+    :param dict environ: the WSGI environ of the request.
+    :rtype: bool
+    """
+    if environ['REQUEST_METHOD'] in READ_METHODS:
+        return True
+    try:
+        endpoint, _ = APP.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return False
+    return endpoint in READ_ENDPOINTS
+
+
+def build_environ(scope, body):
+    """
+    Builds the WSGI environ of an ASGI HTTP request.
+
+    :param dict scope: the ASGI scope of the request.
+    :param bytes body: the whole request body.
+    :rtype: dict
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI strings hold the bytes of the url as latin-1
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = 'HTTP_' + name
+            if key in environ:
+                value = environ[key] + ('; ' if name == 'COOKIE' else ',') + value
+            environ[key] = value
+    return environ
@@ -0,0 +1,122 @@
+"""
+Autocompletion resources API implementation
+
+The forms of the client complete the disease of a new diagnosis and the
+username of a doctor while they are typed. Every keystroke is a GET with the
+text typed so far in the prefix query parameter, answered from the in-memory
+indexes of :py:mod:`medical_forum.prefix_index`.
+"""
+
+from flask import request, Response, g
+from flask_restful import Resource
+
+from .resources import API, hyper_const
+from .error_handlers import create_error_response
+
+from . import conditional
+from . import forum_object as forum_obj
+from . import pagination
+from . import prefix_index
+from . import serializer
+from . import url_templates
+from . import user_resources as user_res
+
+# Number of values returned by default, and at most
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+
+
+class DiseaseAutocomplete(Resource):
+    """
+    Resource DiseaseAutocomplete implementation
+    """
+
+    def get(self):
+        """
+        Get the diseases of the diagnoses starting with a prefix.
+
+        INPUT parameters:
+         * prefix: the beginning of the disease, the case is ignored. All
+           the diseases are candidates if it is empty or not given.
+         * limit: maximum number of diseases returned (capped by the server)
+
+        RESPONSE ENTITY BODY:
+        * Media type: Mason
+          https://github.com/JornWildt/Mason
+         * Items: {"disease": ...}, in alphabetical order
+
+        RESPONSE STATUS CODE:
+         * Returns 200 with the diseases found, maybe none.
+         * Returns 400 if the limit is not valid.
+        """
+
+        return _autocomplete(DiseaseAutocomplete, prefix_index.DISEASES,
+                             conditional.DIAGNOSES_VERSION,
+                             lambda disease: {"disease": disease})
+
+
+class UsernameAutocomplete(Resource):
+    """
+    Resource UsernameAutocomplete implementation
+    """
+
+    def get(self):
+        """
+        Get the usernames starting with a prefix.
+
+        INPUT parameters:
+         * prefix: the beginning of the username, the case is ignored. All
+           the usernames are candidates if it is empty or not given.
+         * limit: maximum number of usernames returned (capped by the server)
+
+        RESPONSE ENTITY BODY:
+        * Media type: Mason
+          https://github.com/JornWildt/Mason
+         * Items: {"username": ...} with a self control linking the user,
+           in alphabetical order
+
+        RESPONSE STATUS CODE:
+         * Returns 200 with the usernames found, maybe none.
+         * Returns 400 if the limit is not valid.
+        """
+
+        template = url_templates.url_template(user_res.User, "username")
+
+        def item(username):
+            found = forum_obj.ForumObject(username=username)
+            found.add_control("self", href=template.expand(username))
+            return found
+        return _autocomplete(UsernameAutocomplete, prefix_index.USERNAMES,
+                             conditional.USERNAMES_VERSION, item)
+
+
+def _autocomplete(resource, name, version, create_item):
+    """
+    Builds the response of an autocompletion resource.
+
+    : param resource: the resource class.
+    : param str name: the name of the prefix index.
+    : param str version: the version counter of the values of the index.
+    : param create_item: function creating the item of a value.
+    : return: the response, a Mason document whose items are the values
+        found.
+    """
+
+    prefix = request.args.get("prefix", "")
+    try:
+        limit = pagination.parse_limit(request.args.get("limit"), DEFAULT_SUGGESTIONS)
+    except ValueError:
+        return create_error_response(400, "Wrong query parameters", "Check the limit")
+    limit = min(limit, MAX_SUGGESTIONS)
+
+    etag = conditional.entity_tag(version)
+    response = conditional.not_modified(etag)
+    if response is not None:
+        return response
+
+    envelope = forum_obj.ForumObject()
+    envelope.add_control("self", href=API.url_for(resource, prefix=prefix))
+    envelope["items"] = [create_item(value) for value in
+                         prefix_index.complete(g.con, name, prefix, limit)]
+    return conditional.set_etag(Response(serializer.dumps(envelope), 200,
+                                         mimetype=hyper_const.MASON), etag)
@@ -0,0 +1,142 @@
+"""
+Batch resource API implementation
+
+A client that needs several resources at once, for instance a message with
+its author, its diagnoses and the message it replies to, POSTs the list of
+their urls to the batch resource instead of sending one GET per resource.
+Every url is dispatched through the resources of the API as a GET, one after
+the other, with the database connection of the batch request.
+"""
+
+from urllib.parse import urlsplit
+
+from flask import request, Response, g
+from flask_restful import Resource
+from werkzeug.test import EnvironBuilder
+
+from .api import APP, READER_ENVIRON_KEY
+from .resources import hyper_const
+from .error_handlers import create_error_response
+from . import serializer
+
+# Maximum number of urls in one batch
+MAX_BATCH_SIZE = 20
+# Media types whose bodies are embedded as JSON in the results. Other bodies
+# are embedded as strings.
+JSON_MIMETYPES = (hyper_const.MASON, hyper_const.JSON)
+
+
+class Batch(Resource):
+    """
+    Resource Batch implementation
+    """
+
+    def post(self):
+        """
+        GETs several resources of the API in one request.
+
+        REQUEST ENTITY BODY:
+         * Media type: JSON
+         * An array of the urls of the resources (at most MAX_BATCH_SIZE),
+           as they appear in the controls: absolute paths, with their query
+           string, or absolute urls of this server.
+
+        RESPONSE ENTITY BODY:
+         * Media type: JSON
+         * An array with the result of every url, in the same order: an
+           object with the keys url, status (the status code of the GET) and
+           body (the JSON document of the response, a string if the response
+           is not JSON, or null if it has no body).
+
+        RESPONSE STATUS CODE:
+         * Returns 200 if the urls were requested, whatever their own status.
+         * Returns 400 if the body is not an array of urls of this server,
+           or has too many urls.
+         * Returns 415 if the format of the request is not json
+        """
+
+        if hyper_const.JSON != request.headers.get("Content-Type", ""):
+            return create_error_response(415, "UnsupportedMediaType",
+                                         "Use a JSON compatible format")
+        request_body = request.get_json(force=True)
+        if not isinstance(request_body, list) or not request_body:
+            return create_error_response(400, "Wrong request format",
+                                         "The body must be an array of urls")
+        if len(request_body) > MAX_BATCH_SIZE:
+            return create_error_response(400, "Wrong request format",
+                                         "At most %d urls can be requested at once"
+                                         % MAX_BATCH_SIZE)
+        targets = []
+        for url in request_body:
+            target = _split_url(url)
+            if target is None:
+                return create_error_response(400, "Wrong request format",
+                                             "%r is not a url of this server" % (url,))
+            targets.append(target)
+
+        results = [_result(url, *_get(path, query))
+                   for url, (path, query) in zip(request_body, targets)]
+        return Response(b'[' + b','.join(results) + b']', 200, mimetype=hyper_const.JSON)
+
+
+def _split_url(url):
+    """
+    Extracts the path, relative to the root of the application, and the
+    query string of a url of the batch.
+
+    : param url: the url, an absolute path or an absolute url of this server.
+    : return: (path, query string), or None if the url is not one of this
+        server.
+    """
+
+    if not isinstance(url, str):
+        return None
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc:
+        if parts.scheme != request.scheme or parts.netloc != request.host:
+            return None
+    if not parts.path.startswith("/"):
+        return None
+    path = parts.path
+    script_root = request.script_root
+    if script_root:
+        if not path.startswith(script_root + "/"):
+            return None
+        path = path[len(script_root):]
+    return path, parts.query
+
+
+def _get(path, query):
+    """
+    Dispatches a GET through the resources of the API, in a request context
+    of its own that shares the database connection of the batch request.
+
+    : return: the status code, the media type and the body of the response.
+    """
+
+    builder = EnvironBuilder(path=path, query_string=query, method="GET",
+                             base_url=request.url_root,
+                             environ_overrides={"REMOTE_ADDR": request.remote_addr})
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    environ[READER_ENVIRON_KEY] = g.con
+    with APP.request_context(environ):
+        try:
+            response = APP.full_dispatch_request()
+        except Exception as excp:
+            response = APP.handle_exception(excp)
+        # Streamed bodies are written now, while the connection is lent
+        return response.status_code, response.mimetype, response.get_data()
+
+
+def _result(url, status, mimetype, body):
+    """The JSON document of the result of a url of the batch"""
+
+    if not body:
+        body = b"null"
+    elif mimetype not in JSON_MIMETYPES:
+        body = serializer.dumps(body.decode("utf-8", "replace"))
+    return (b'{"url":' + serializer.dumps(url) + b',"status":' + str(status).encode("ascii") +
+            b',"body":' + body + b'}')
@@ -0,0 +1,194 @@
+"""
+Compression of the response bodies, negotiated with ``Accept-Encoding``.
+
+The bodies of the JSON and Mason responses are compressed with gzip or
+deflate when the client accepts one of them (gzip is preferred at equal
+quality). The settings are read from the configuration of the application:
+
+* ``COMPRESS_MIN_SIZE``: bodies smaller than this, in bytes, are sent as
+  they are. The size of a streamed body is not known in advance, so the
+  streamed collections are always compressed, chunk by chunk.
+* ``COMPRESS_LEVEL``: the zlib compression level, from 1 (fastest) to 9.
+
+A compressed response has a weak version of the entity tag of its
+representation (``W/"..."``), since its bytes differ from the identity
+version. :py:func:`medical_forum.conditional.not_modified` compares entity
+tags weakly, so a client revalidating a compressed response still gets
+``304 Not Modified``.
+
+The compressed bodies of the responses kept in the response cache are cached
+with them (see :py:func:`medical_forum.response_cache.cached_encoding`), so
+a hot response is compressed once per encoding.
+
+:py:func:`stats` returns, for each endpoint, the bytes before and after the
+compression and the CPU time spent compressing.
+"""
+
+import threading
+import time
+import zlib
+
+from flask import request
+
+from .api import APP
+from . import response_cache
+
+# Default settings
+MIN_SIZE = 500
+LEVEL = 6
+APP.config.setdefault("COMPRESS_MIN_SIZE", MIN_SIZE)
+APP.config.setdefault("COMPRESS_LEVEL", LEVEL)
+
+# Supported content codings, in order of preference, and their zlib formats
+ENCODINGS = ('gzip', 'deflate')
+_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+# Media types of the bodies that are compressed
+MIMETYPES = ('application/vnd.mason+json', 'application/json')
+
+_LOCK = threading.Lock()
+# endpoint -> counters, see stats()
+_COUNTERS = {}
+
+
+def compress(data, encoding, level=LEVEL):
+    """
+    Compresses a body.
+
+    :param bytes data: the body.
+    :param str encoding: ``gzip`` or ``deflate``.
+    :param int level: the zlib compression level.
+    :rtype: bytes
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+def _negotiate():
+    """The content coding to use for the current request, or None"""
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None or request.accept_encodings[encoding] == 0:
+        return None
+    return encoding
+
+
+@APP.after_request
+def compress_response(response):
+    """
+    Compresses the body of the response if the client accepts it and the
+    body is large enough.
+    """
+    if response.mimetype not in MIMETYPES or response.status_code < 200 \
+            or response.status_code in (204, 304) or response.direct_passthrough \
+            or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _negotiate()
+    if encoding is None:
+        return response
+    level = APP.config["COMPRESS_LEVEL"]
+    etag, weak = response.get_etag()
+    endpoint = request.endpoint
+
+    if response.is_streamed:
+        key = response_cache.request_key() if etag is not None and request.method == 'GET' \
+            else None
+        response.response = _compress_stream(response.response, encoding, level, endpoint,
+                                             key, etag)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < APP.config["COMPRESS_MIN_SIZE"]:
+            return response
+        compressed = None
+        if etag is not None and request.method == 'GET':
+            compressed = response_cache.cached_encoding(etag, encoding)
+        if compressed is None:
+            start = time.thread_time()
+            compressed = compress(data, encoding, level)
+            _count(endpoint, len(data), len(compressed), time.thread_time() - start)
+            if etag is not None and request.method == 'GET':
+                response_cache.cache_encoding(etag, encoding, compressed)
+        else:
+            _count(endpoint, len(data), len(compressed), 0.0, cached=True)
+        response.set_data(compressed)
+
+    response.headers['Content-Encoding'] = encoding
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def _compress_stream(chunks, encoding, level, endpoint, key, etag):
+    """
+    Generator compressing the chunks of a streamed body. The compressed body
+    is stored in the response cache under the given key once complete, if
+    the body itself was cached. The request context is gone by then, so the
+    key is computed beforehand.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+    compressed = []
+    size = 0
+    elapsed = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            size += len(chunk)
+            start = time.thread_time()
+            data = compressor.compress(chunk)
+            elapsed += time.thread_time() - start
+            if data:
+                compressed.append(data)
+                yield data
+        start = time.thread_time()
+        data = compressor.flush()
+        elapsed += time.thread_time() - start
+        compressed.append(data)
+        yield data
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+    _count(endpoint, size, sum(len(data) for data in compressed), elapsed)
+    if key is not None:
+        response_cache.CACHE.put_encoded(key, etag, encoding, b''.join(compressed))
+
+
+def _count(endpoint, size, compressed_size, elapsed, cached=False):
+    """Adds a compressed response to the counters of its endpoint"""
+    with _LOCK:
+        counters = _COUNTERS.get(endpoint)
+        if counters is None:
+            counters = _COUNTERS[endpoint] = {'responses': 0, 'cached': 0, 'bytes_in': 0,
+                                              'bytes_out': 0, 'seconds': 0.0}
+        counters['responses'] += 1
+        counters['cached'] += cached
+        counters['bytes_in'] += size
+        counters['bytes_out'] += compressed_size
+        counters['seconds'] += elapsed
+
+
+def stats():
+    """
+    Returns a snapshot of the compression counters of each endpoint.
+
+    :return: a dictionary of endpoint names to dictionaries with the keys
+        ``responses`` (compressed responses), ``cached`` (responses whose
+        compressed body came from the response cache), ``bytes_in`` and
+        ``bytes_out`` (sizes of the bodies before and after compression),
+        ``saved`` (ratio of bytes saved) and ``seconds`` (CPU time spent
+        compressing).
+    :rtype: dict
+    """
+    with _LOCK:
+        snapshot = {endpoint: dict(counters) for endpoint, counters in _COUNTERS.items()}
+    for counters in snapshot.values():
+        bytes_in = counters['bytes_in']
+        counters['saved'] = 1.0 - counters['bytes_out'] / bytes_in if bytes_in else 0.0
+    return snapshot
+
+
+def reset_stats():
+    """Drops the counters returned by :py:func:`stats`."""
+    with _LOCK:
+        _COUNTERS.clear()
@@ -0,0 +1,137 @@
+"""
+Conditional GET requests (``ETag`` and ``If-None-Match``) for the resources.
+
+The entity tag of a representation is computed from the version counters of
+the tables and rows it is built from (see
+:py:meth:`medical_forum.database_connection.Connection.get_versions`) and
+from the path and query of the request. Reading the counters is a single
+lookup in the ``versions`` table, so a request whose ``If-None-Match``
+matches is answered with ``304 Not Modified`` before the row data is read
+and before the Mason body is serialized.
+
+Usage in a resource::
+
+    etag = conditional.entity_tag(conditional.message_version(message_id))
+    response = conditional.not_modified(etag)
+    if response is not None:
+        return response
+    ...
+    return conditional.set_etag(Response(...), etag)
+"""
+
+import hashlib
+import threading
+
+from flask import Response, g, request
+
+from . import resource_ids
+
+# Version counters of the tables behind the collections
+MESSAGES_VERSION = 'messages'
+USERS_VERSION = 'users'
+DIAGNOSES_VERSION = 'diagnosis'
+# Version counter of the usernames alone, not bumped by the other changes of
+# the users
+USERNAMES_VERSION = 'usernames'
+
+_LOCK = threading.Lock()
+_COUNTERS = {'requests': 0, 'conditional': 0, 'not_modified': 0}
+
+
+def message_version(message_id):
+    """
+    :param str message_id: id of the message, with the format msg-N.
+    :return: the name of the version counter of the message.
+    """
+    return 'messages/%d' % resource_ids.parse_message_id(message_id)
+
+
+def diagnosis_version(diagnosis_id):
+    """
+    :param str diagnosis_id: id of the diagnosis, with the format dgs-N.
+    :return: the name of the version counter of the diagnosis.
+    """
+    return 'diagnosis/%d' % resource_ids.parse_diagnosis_id(diagnosis_id)
+
+
+def user_version(username):
+    """
+    :param str username: username of the user.
+    :return: the name of the version counter of the user and its profile.
+    """
+    return 'users/' + username
+
+
+def entity_tag(*names):
+    """
+    Computes the entity tag of the representation requested.
+
+    :param str names: names of the version counters the representation is
+        built from.
+    :return: the (unquoted) strong entity tag, or None if the database has no
+        version counters.
+    :rtype: str
+    """
+    versions = g.con.get_versions(*names)
+    if versions is None:
+        return None
+    digest = hashlib.sha1(('%s %r' % (request.full_path, versions)).encode('utf-8'))
+    return digest.hexdigest()[:24]
+
+
+def not_modified(etag):
+    """
+    Evaluates the ``If-None-Match`` header of the request.
+
+    :param str etag: entity tag of the current representation, as returned
+        by :py:func:`entity_tag`.
+    :return: a ``304 Not Modified`` response if the client already has the
+        current representation, None otherwise.
+    :rtype: flask.Response
+    """
+    conditional = bool(request.if_none_match)
+    match = etag is not None and conditional and request.if_none_match.contains_weak(etag)
+    with _LOCK:
+        _COUNTERS['requests'] += 1
+        _COUNTERS['conditional'] += conditional
+        _COUNTERS['not_modified'] += match
+    if not match:
+        return None
+    return set_etag(Response(status=304), etag)
+
+
+def set_etag(response, etag):
+    """
+    Adds the ``ETag`` header to a response.
+
+    :param flask.Response response: the response of a GET request.
+    :param str etag: entity tag of the representation, or None.
+    :return: the same response.
+    """
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+
+def stats():
+    """
+    Returns a snapshot of the counters of the conditional GET requests.
+
+    :return: a dictionary with the keys ``requests`` (GET requests of the
+        resources with entity tags), ``conditional`` (requests with an
+        ``If-None-Match`` header), ``not_modified`` (requests answered with
+        304) and ``not_modified_ratio`` (``not_modified`` / ``requests``).
+    :rtype: dict
+    """
+    with _LOCK:
+        counters = dict(_COUNTERS)
+    requests = counters['requests']
+    counters['not_modified_ratio'] = counters['not_modified'] / requests if requests else 0.0
+    return counters
+
+
+def reset_stats():
+    """Sets the counters returned by :py:func:`stats` back to zero."""
+    with _LOCK:
+        for name in _COUNTERS:
+            _COUNTERS[name] = 0
@@ -0,0 +1,316 @@
+"""
+Registry of the constant parts of the Mason controls.
+
+The schemas of the forms (add a message, add a diagnosis, the query of the
+messages history...) and the controls pointing to the collections do not
+depend on the request, so they are built once per process instead of once
+per envelope. The registry is built on the first lookup, which must happen
+inside a request context since the urls are resolved with ``url_for``.
+
+The controls and schemas of the registry are shared by all the envelopes,
+so they are read-only: any attempt to modify them raises TypeError. A
+:py:class:`medical_forum.forum_object.ForumObject` that needs a different
+control builds a new dictionary instead.
+"""
+
+import threading
+
+from flask import has_request_context, request
+
+from .resources import API
+from . import hypermedia_formats as hyper_const
+from . import user_resources as user_res
+from . import message_resources as message_res
+from . import diagnosis_resources as diagnosis_res
+
+
+class FrozenDict(dict):
+    """
+    A dictionary that can not be modified once created. It is still a dict,
+    so the JSON encoders serialize it as any other dictionary.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("The controls of the registry are read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+def freeze(value):
+    """
+    Returns a read-only copy of a JSON value: dictionaries become
+    :py:class:`FrozenDict` and lists become tuples.
+    """
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def message_schema():
+    """
+    Creates a schema dictionary for messages.
+
+    This schema can also be accessed from the urls /medical_forum/schema/edit-msg/ and
+    /medical_forum/schema/add-msg/.
+
+    : rtype:: dict
+    """
+
+    user_field = "author"
+
+    schema = {
+        "type": "object",
+        "properties": {},
+        "required": ["headline", "articleBody"]
+    }
+
+    props = schema["properties"]
+    props["headline"] = {
+        "title": "Headline",
+        "description": "Message headline",
+        "type": "string"
+    }
+    props["articleBody"] = {
+        "title": "Contents",
+        "description": "Message contents",
+        "type": "string"
+    }
+    props[user_field] = {
+        "title": user_field.capitalize(),
+        "description": "Name of the message {}".format(user_field),
+        "type": "string"
+    }
+    return schema
+
+
+def diagnosis_schema():
+    """
+    Creates a schema dictionary for diagnoses.
+
+    This schema can also be accessed from the urls /medical_forum/schema/edit-dgs/ and
+    /medical_forum/schema/add-dgs/.
+
+    : rtype:: dict
+    """
+
+    user_id = "user_id"
+
+    schema = {
+        "type": "object",
+        "properties": {},
+        "required": ["disease", "diagnosis_description"]
+    }
+
+    props = schema["properties"]
+
+    props["disease"] = {
+        "title": "disease",
+        "description": "diagnosis disease",
+        "type": "string"
+    }
+    props["diagnosis_description"] = {
+        "title": "diagnosis description",
+        "description": "diagnosis description",
+        "type": "string"
+    }
+
+    props[user_id] = {
+        "title": user_id,
+        "description": "user_ide {}".format(user_id),
+        "type": "Integer"
+    }
+    return schema
+
+
+def public_profile_schema():
+    """
+    Creates a schema dictionary for editing public profiles of users.
+
+    :rtype:: dict
+    """
+
+    schema = {
+        "type": "object",
+        "properties": {},
+        "required": ["lastname", "picture"]
+    }
+
+    props = schema["properties"]
+
+    props["picture"] = {
+        "description": "image file location",
+        "title": "picture",
+        "type": "string"
+    }
+
+    return schema
+
+
+def history_schema():
+    """
+    Creates a schema dicionary for the messages history query parameters.
+
+    This schema can also be accessed from /forum/schema/history-query/
+
+    :rtype:: dict
+    """
+
+    schema = {
+        "type": "object",
+        "properties": {},
+        "required": []
+    }
+
+    props = schema["properties"]
+    props["limit"] = {
+        "description": "Maximum number of messages returned in one page",
+        "type": "integer"
+    }
+    props["before"] = {
+        "description": "Find messages before (timestamp as seconds)",
+        "type": "integer"
+    }
+    props["after"] = {
+        "description": "Find messages after (timestamp as seconds)",
+        "type": "integer"
+    }
+
+    return schema
+
+
+def search_schema():
+    """
+    Creates a schema dicionary for the query parameters of the search of
+    messages.
+
+    :rtype:: dict
+    """
+
+    schema = {
+        "type": "object",
+        "properties": {},
+        "required": ["q"]
+    }
+
+    props = schema["properties"]
+    props["q"] = {
+        "description": "Words searched in the headline and the body of the messages",
+        "type": "string"
+    }
+    props["limit"] = {
+        "description": "Maximum number of messages returned in one page",
+        "type": "integer"
+    }
+
+    return schema
+
+
+class ControlRegistry(object):
+    """
+    The read-only schemas, urls and controls shared by all the envelopes.
+
+    :ivar schemas: schemas of the forms, by name (``message``, ``diagnosis``,
+        ``public-profile``, ``history`` and ``search``).
+    :ivar urls: urls of the collections, by name (``messages``, ``users``,
+        ``diagnoses`` and ``search``, the search of messages).
+    :ivar controls: complete controls, by link relation.
+    """
+
+    def __init__(self):
+        super(ControlRegistry, self).__init__()
+        self.schemas = FrozenDict(
+            message=freeze(message_schema()),
+            diagnosis=freeze(diagnosis_schema()),
+            history=freeze(history_schema()),
+            search=freeze(search_schema()),
+            **{"public-profile": freeze(public_profile_schema())})
+        self.urls = FrozenDict(
+            messages=API.url_for(message_res.Messages),
+            users=API.url_for(user_res.Users),
+            diagnoses=API.url_for(diagnosis_res.Diagnoses),
+            search=API.url_for(message_res.MessageSearch))
+        self.controls = freeze({
+            "medical_forum:messages-all": {
+                "href": self.urls["messages"],
+                "title": "All messages"
+            },
+            "medical_forum:users-all": {
+                "href": self.urls["users"],
+                "title": "List users"
+            },
+            "medical_forum:diagnoses-all": {
+                "href": self.urls["diagnoses"],
+                "title": "All diagnoses"
+            },
+            "medical_forum:search-messages": {
+                "href": self.urls["search"] + "{?q,limit}",
+                "title": "Search messages",
+                "isHrefTemplate": True,
+                "schema": self.schemas["search"]
+            },
+            "medical_forum:add-message": {
+                "href": self.urls["messages"],
+                "title": "Create message",
+                "encoding": "json",
+                "method": "POST",
+                "schema": self.schemas["message"]
+            },
+            "medical_forum:add-user": {
+                "href": self.urls["users"],
+                "title": "Create user",
+                "encoding": "json",
+                "method": "POST",
+                "schemaUrl": hyper_const.USER_SCHEMA_URL
+            },
+            "medical_forum:add-diagnosis": {
+                "href": self.urls["diagnoses"],
+                "title": "Create diagnosis",
+                "encoding": "json",
+                "method": "POST",
+                "schema": self.schemas["diagnosis"]
+            }
+        })
+
+
+# Registries kept at most; the Host header comes from the client
+MAX_REGISTRIES = 16
+
+_LOCK = threading.Lock()
+# root url of the requests -> ControlRegistry
+_REGISTRIES = {}
+
+
+def registry():
+    """
+    Returns the registry of the application, building it on the first call.
+
+    The urls of the registry are resolved for the scheme, the host and the
+    script root of the current request, as ``url_for`` does, so an
+    application served under several hosts or prefixes gets a registry for
+    each of them. Past :py:data:`MAX_REGISTRIES` hosts and prefixes, the
+    registry of a new one is built for every lookup.
+
+    :rtype: ControlRegistry
+    :raises RuntimeError: if called outside of a request context.
+    """
+    if not has_request_context():
+        raise RuntimeError("The control registry is built inside a request context")
+    key = request.root_url
+    found = _REGISTRIES.get(key)
+    if found is None:
+        with _LOCK:
+            found = _REGISTRIES.get(key)
+            if found is None:
+                found = ControlRegistry()
+                if len(_REGISTRIES) < MAX_REGISTRIES:
+                    _REGISTRIES[key] = found
+    return found
+
+
+def reset():
+    """Drops the registries, so that they are built again on the next lookup."""
+    with _LOCK:
+        _REGISTRIES.clear()
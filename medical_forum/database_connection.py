@@ -11,17 +11,151 @@ Provides the database API to access the forum persistent data.
 @author: Issam
 """
 
+from contextlib import contextmanager
 from datetime import datetime
 import time
 import sqlite3
-import re
+from urllib.request import pathname2url
 from .utils import execute_query
+from . import resource_ids
+from .database_query import Select, projection
+from . import prefix_index
 
 DEFAULT_DB_PATH = 'db/medical_forum_data.db'
 DEFAULT_SCHEMA = "db/medical_forum_data_schema.sql"
 DEFAULT_DATA_DUMP = "db/medical_forum_data_dump.sql"
 DOCTOR = 1
 PATIENT = 0
+# Number of rows fetched from a cursor at a time by the iter_* methods
+FETCH_CHUNK_SIZE = 256
+# Number of values bound in one ``IN (...)`` list, below the 999 variables
+# allowed by the oldest SQLite versions
+IN_CHUNK_SIZE = 500
+
+# Columns of the tables, in the order of the schema. The methods that accept
+# the names of the columns to read select the other ones as NULL (see
+# medical_forum.database_query.projection)
+MESSAGE_COLUMNS = ('message_id', 'user_id', 'username', 'reply_to', 'title', 'body', 'views',
+                   'timestamp')
+DIAGNOSIS_COLUMNS = ('diagnosis_id', 'user_id', 'message_id', 'disease',
+                     'diagnosis_description')
+# users joined with users_profile
+USER_COLUMNS = ('users.user_id', 'users.username', 'users.pass_hash', 'users.reg_date',
+                'users.last_login', 'users.msg_count', 'users_profile.user_type',
+                'users_profile.firstname', 'users_profile.lastname',
+                'users_profile.work_address', 'users_profile.gender', 'users_profile.age',
+                'users_profile.email', 'users_profile.picture', 'users_profile.phone',
+                'users_profile.diagnosis_id', 'users_profile.height', 'users_profile.weight',
+                'users_profile.speciality')
+# Orders of get_users and the columns of their sort keys
+USER_SORTS = {'user_id': ('user_id',), 'msg_count': ('msg_count', 'user_id')}
+
+# Column list of the messages found by search_messages. The snippet of a
+# message has at most 16 words of its title or body, the matched ones between
+# <b> and </b>
+SEARCH_COLUMNS = ("rowid, title, rank, "
+                  "snippet(messages_fts, -1, '<b>', '</b>', '...', 16) AS snippet")
+
+# Column list of the threads listed by get_threads
+THREAD_COLUMNS = ('messages.message_id, messages.title, messages.username, '
+                  'messages.timestamp, thread_stats.reply_count, '
+                  'thread_stats.last_timestamp, thread_stats.participants')
+
+# Statements of the threads of messages (see Connection.iter_thread). The
+# path of a message is the ids of the messages from the first one of the
+# thread down to it, each one written with the 19 digits of the largest id,
+# so sorting by path lists a message before its replies and the replies of a
+# message in the order they were created. The recursive step follows the
+# reply_to index, and its ORDER BY makes SQLite walk the thread in path
+# order, so that its LIMIT stops the walk once the page is full. The
+# messages whose replies all come before the :path of the page cursor are
+# not walked.
+THREAD_QUERY = (
+    "WITH RECURSIVE thread(message_id, depth, path) AS ("
+    " SELECT message_id, 0, printf('%019d', message_id) FROM messages"
+    " WHERE message_id = :root"
+    " UNION ALL"
+    " SELECT messages.message_id, thread.depth + 1,"
+    " thread.path || printf('%019d', messages.message_id)"
+    " FROM thread JOIN messages ON messages.reply_to = thread.message_id"
+    " WHERE thread.depth < :depth"
+    " AND thread.path || printf('%019d', messages.message_id)"
+    " >= substr(:path, 1, length(thread.path) + 19)"
+    " ORDER BY 3 LIMIT :walk)"
+    " SELECT messages.*, thread.depth FROM thread"
+    " JOIN messages ON messages.message_id = thread.message_id"
+    " WHERE thread.path > :path ORDER BY thread.path LIMIT :limit")
+# The messages of a thread coming before the :path of a page cursor, the
+# closest first. The closest ones are the last of the walk, so all the
+# messages before the cursor are walked
+THREAD_BEFORE_QUERY = (
+    "WITH RECURSIVE thread(message_id, depth, path) AS ("
+    " SELECT message_id, 0, printf('%019d', message_id) FROM messages"
+    " WHERE message_id = :root AND printf('%019d', message_id) < :path"
+    " UNION ALL"
+    " SELECT messages.message_id, thread.depth + 1,"
+    " thread.path || printf('%019d', messages.message_id)"
+    " FROM thread JOIN messages ON messages.reply_to = thread.message_id"
+    " WHERE thread.depth < :depth"
+    " AND thread.path || printf('%019d', messages.message_id) < :path)"
+    " SELECT messages.*, thread.depth FROM thread"
+    " JOIN messages ON messages.message_id = thread.message_id"
+    " ORDER BY thread.path DESC LIMIT :limit")
+# Path of the message :message_id in the thread of :root, found by walking
+# its reply_to links up to :root
+THREAD_PATH_QUERY = (
+    "WITH RECURSIVE ancestors(message_id, reply_to, path) AS ("
+    " SELECT message_id, reply_to, printf('%019d', message_id) FROM messages"
+    " WHERE message_id = :message_id"
+    " UNION ALL"
+    " SELECT messages.message_id, messages.reply_to,"
+    " printf('%019d', messages.message_id) || ancestors.path"
+    " FROM ancestors JOIN messages ON messages.message_id = ancestors.reply_to"
+    " WHERE ancestors.message_id != :root)"
+    " SELECT path FROM ancestors WHERE message_id = :root")
+# Number of characters of each id in the path of a message
+THREAD_PATH_DIGITS = 19
+
+# Tuning profiles. A profile maps PRAGMA names to the value they are set to,
+# in order, once when a connection is opened.
+DEFAULT_PROFILE = {'foreign_keys': 'ON'}
+TUNED_PROFILE = {
+    'foreign_keys': 'ON',
+    # Readers do not block the writer (and the other way around)
+    'journal_mode': 'WAL',
+    # Safe with WAL, only the checkpoints wait for fsync
+    'synchronous': 'NORMAL',
+    # Read the database file through a 256MB memory map
+    'mmap_size': 268435456,
+    # Negative values are KiB, so this is a 64MB page cache per connection
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+    # Milliseconds to wait on a locked database before failing
+    'busy_timeout': 5000
+}
+
+
+def search_expression(text):
+    """
+    Turns the words searched by a user into an FTS5 query. Every word is
+    quoted, so the FTS5 operators and punctuation are searched as plain
+    text, and the query matches the rows containing all of them. A word
+    ending with ``*`` matches the words starting with it.
+
+    :param str text: the words, separated by spaces.
+    :rtype: str
+    :raises ValueError: if ``text`` has no word.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if word:
+            terms.append('"%s"%s' % (word.replace('"', '""'), '*' if prefix else ''))
+    if not terms:
+        raise ValueError("There is no word to search")
+    return ' '.join(terms)
+
 
 # Copied Class from Exercise 1
 # We state if a method is copied, modified or written from scratch before it
@@ -43,13 +177,66 @@ class Connection(object):
 
     :param db_path: Location of the database file.
     :type dbpath: str
+    :param check_same_thread: default True. If False the connection can be
+        used by a thread different from the one that opened it. This is
+        needed by pooled connections, which are only used by one thread at a
+        time but not always by the same thread.
+    :type check_same_thread: bool
+    :param profile: default None. Dictionary of PRAGMA names and values (see
+        :py:data:`TUNED_PROFILE`) applied once when the connection is opened.
+        If None, :py:data:`DEFAULT_PROFILE` is used.
+    :type profile: dict
+    :param read_only: default False. If True the database file is opened
+        with a ``mode=ro`` URI, so every statement that writes fails with
+        :py:exc:`sqlite3.OperationalError`. The ``journal_mode`` of the
+        profile is skipped since only a writer can change it.
+    :type read_only: bool
 
     """
 
-    def __init__(self, db_path):
+    def __init__(self, db_path, check_same_thread=True, profile=None, read_only=False):
         super(Connection, self).__init__()
-        self.con = sqlite3.connect(db_path)
+        self.db_path = db_path
+        self.read_only = read_only
+        if read_only:
+            self.con = sqlite3.connect('file:%s?mode=ro' % pathname2url(db_path), uri=True,
+                                       check_same_thread=check_same_thread)
+        else:
+            self.con = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+        self.con.row_factory = sqlite3.Row
         self._isclosed = False
+        profile = DEFAULT_PROFILE if profile is None else profile
+        if read_only:
+            profile = dict((pragma, value) for pragma, value in profile.items()
+                           if pragma != 'journal_mode')
+        self.apply_profile(profile)
+
+    def apply_profile(self, profile):
+        """
+        Set the PRAGMAs of a tuning profile on this connection. Since they
+        stay set for the whole life of the connection, the methods of this
+        class do not need to set them again before each statement.
+
+        :param dict profile: PRAGMA names and the values they are set to.
+        :raises sqlite3.Error: when a PRAGMA cannot be set. In this case the
+            connection is closed.
+        """
+        cursor = self.con.cursor()
+        try:
+            for pragma, value in profile.items():
+                cursor.execute('PRAGMA %s = %s' % (pragma, value))
+        except sqlite3.Error as excp:
+            print("Error %s:" % excp.args[0])
+            self.close()
+            raise excp
+
+    def get_pragma(self, pragma):
+        """
+        :param str pragma: name of the PRAGMA
+        :return: the current value of the PRAGMA on this connection.
+        """
+        row = self.con.execute('PRAGMA %s' % pragma).fetchone()
+        return row[0] if row is not None else None
 
     def isclosed(self):
         """
@@ -67,6 +254,107 @@ class Connection(object):
             self.con.close()
             self._isclosed = True
 
+    # Written from scratch
+    def _iter_rows(self, cursor, create_object, reverse=False):
+        """
+        Generator of the objects created from the rows of an executed cursor.
+
+        The rows are fetched :py:data:`FETCH_CHUNK_SIZE` at a time, so only
+        one chunk of rows is held in memory whatever the size of the result.
+
+        :param cursor: a cursor on which a SELECT statement has been executed.
+        :type cursor: sqlite3.Cursor
+        :param create_object: function turning a row into a dictionary, for
+            instance :py:meth:`_create_message_list_object`.
+        :param bool reverse: default False. If True the rows are yielded in
+            reverse order. All of them are fetched first, so it should only
+            be used on statements with a LIMIT.
+        """
+        if reverse:
+            rows = cursor.fetchall()
+            rows.reverse()
+            for row in rows:
+                yield create_object(row)
+            return
+        while True:
+            rows = cursor.fetchmany(FETCH_CHUNK_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield create_object(row)
+
+    # Written from scratch
+    def _select_in(self, query, values):
+        """
+        Executes a SELECT statement with an ``IN`` list of values, binding at
+        most :py:data:`IN_CHUNK_SIZE` values in each statement.
+
+        :param str query: the statement, with ``%s`` in place of the list of
+            ``?`` of the ``IN`` operator.
+        :param values: the values of the ``IN`` list.
+        :return: all the rows returned by the statements.
+        :rtype: list
+        """
+        values = list(values)
+        rows = []
+        for start in range(0, len(values), IN_CHUNK_SIZE):
+            chunk = values[start:start + IN_CHUNK_SIZE]
+            cursor = self.con.execute(query % ','.join('?' * len(chunk)), chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+
+    @staticmethod
+    def _projection(all_columns, columns, keys=()):
+        """
+        Column list of a statement reading the given columns only.
+
+        :param tuple all_columns: the columns of the tables, for instance
+            :py:data:`MESSAGE_COLUMNS`.
+        :param columns: names of the columns to read, or None to read all
+            of them.
+        :param tuple keys: columns that are always read, like the sort key.
+        :return: the column list, or None if all the columns are read.
+        """
+        if columns is None:
+            return None
+        return projection(all_columns, frozenset(columns).union(keys))
+
+    # Written from scratch
+    @contextmanager
+    def _write_transaction(self):
+        """
+        Context manager running its block in one transaction, commited at
+        the end of the block or rolled back if the block raises.
+
+        The transaction is started with ``BEGIN IMMEDIATE``, so the write lock
+        is held from the start and the ids returned by :py:meth:`_next_ids`
+        cannot be taken by another connection.
+        """
+        if self.con.in_transaction:
+            self.con.commit()
+        self.con.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except Exception:
+            self.con.rollback()
+            raise
+        self.con.commit()
+
+    # Written from scratch
+    def _next_ids(self, table, column, number):
+        """
+        Returns the ids of the next rows of a table, following its greatest
+        id. Only to be used inside :py:meth:`_write_transaction`.
+
+        :param str table: name of the table.
+        :param str column: name of the INTEGER PRIMARY KEY column of the table.
+        :param int number: number of ids to return.
+        :rtype: list
+        """
+        cursor = self.con.execute('SELECT IFNULL(MAX(%s), 0) FROM %s' % (column, table))
+        first_id = cursor.fetchone()[0] + 1
+        return list(range(first_id, first_id + number))
+
     def check_foreign_keys_status(self):
         """
         Check if the foreign keys has been activated.
@@ -79,7 +367,7 @@ class Connection(object):
             cursor = self.con.cursor()
             cursor.execute('PRAGMA foreign_keys')
             data = cursor.fetchone()
-            is_activated = data == (1,)
+            is_activated = tuple(data) == (1,)
             print("Foreign Keys status: %s" % 'ON' if is_activated else 'OFF')
         except sqlite3.Error as excp:
             print("Error %s:" % excp.args[0])
@@ -139,8 +427,8 @@ class Connection(object):
             Note that all values in the returned dictionary are string unless
             otherwise stated.
         """
-        message_id = 'msg-' + str(row['message_id'])
-        message_reply_to = 'msg-' + str(row['reply_to']) \
+        message_id = resource_ids.format_message_id(row['message_id'])
+        message_reply_to = resource_ids.format_message_id(row['reply_to']) \
             if row['reply_to'] is not None else None
         message_sender = row['username']
         message_title = row['title']
@@ -162,7 +450,7 @@ class Connection(object):
         :return: a dictionary with the keys ``message_id``, ``title``,
             ``timestamp`` and ``sender``.
         """
-        message_id = 'msg-' + str(row['message_id'])
+        message_id = resource_ids.format_message_id(row['message_id'])
         message_sender = row['username']
         message_title = row['title']
         message_timestamp = row['timestamp']
@@ -170,6 +458,55 @@ class Connection(object):
                    'timestamp': message_timestamp, 'sender': message_sender}
         return message
 
+    def _create_thread_message_object(self, row):
+        """
+        Same as :py:meth:`_create_message_object`, plus the key ``depth``
+        (int) of a message read by :py:meth:`get_thread`.
+        """
+        message = self._create_message_object(row)
+        message['depth'] = row['depth']
+        return message
+
+    def _create_thread_list_object(self, row):
+        """
+        Same as :py:meth:`_create_message_list_object`, for the first
+        message of a thread read by :py:meth:`get_threads`.
+
+        :param row: The row obtained from the database.
+        :type row: sqlite3.Row
+        :return: a dictionary with the keys ``message_id``, ``title``,
+            ``timestamp``, ``sender`` and the aggregates of the thread:
+            ``replies`` (number of messages of the thread but the first one),
+            ``last_activity`` (timestamp of its last message) and
+            ``participants`` (number of authors of its messages).
+        """
+        message = self._create_message_list_object(row)
+        message['replies'] = row['reply_count']
+        message['last_activity'] = row['last_timestamp']
+        message['participants'] = row['participants']
+        return message
+
+    def _create_search_result_object(self, row):
+        """
+        It takes a database Row of the full-text index of the messages and
+        transform it into a python dictionary.
+
+        :param row: The row obtained from the database.
+        :type row: sqlite3.Row
+        :return: a dictionary with the keys:
+
+            * ``message_id``: id of the message (string)
+            * ``title``: message's title
+            * ``snippet``: the words of the title or body around the matched
+              terms (see :py:data:`SEARCH_COLUMNS`)
+            * ``rank``: relevance of the message, the lower the better (float)
+
+            Note that all values in the returned dictionary are string unless
+            otherwise stated.
+        """
+        return {'message_id': resource_ids.format_message_id(row['rowid']),
+                'title': row['title'], 'snippet': row['snippet'], 'rank': row['rank']}
+
     def _create_diagnoses_list_object(self, row):
         """
         Same as :py:meth:`_create_message_object`. However, the resulting
@@ -180,7 +517,7 @@ class Connection(object):
         :return: a dictionary with the keys ``message_id``, ``title``,
             ``timestamp`` and ``sender``.
         """
-        diagnosis_id = 'dgs-' + str(row['diagnosis_id'])
+        diagnosis_id = resource_ids.format_diagnosis_id(row['diagnosis_id'])
         user_id = row['user_id']
         message_id = row['message_id']
         disease = row['disease']
@@ -203,7 +540,8 @@ class Connection(object):
             .. code-block:: javascript
 
                 {'public_profile':{'reg_date':,'username':'',
-                                   'speciality':'','user_type':''},
+                                   'speciality':'','user_type':'',
+                                   'msg_count':},
                 'restricted_profile':{'firstname':'','lastname':'',
                                       'work_address':'','gender':'',
                                       'picture':'', age':'', email':''}
@@ -216,6 +554,7 @@ class Connection(object):
             * ``user_type``: either a patient or a doctor
             * ``username``: username of the user
             * ``speciality``: text chosen by the user for speciality
+            * ``msg_count``: number of messages sent by the user (int)
             * ``age``: name of the image file used as age
             * ``firstname``: given name of the user
             * ``lastname``: family name of the user
@@ -233,7 +572,8 @@ class Connection(object):
                                    'picture': row['picture'],
                                    'user_id': row['user_id'],
                                    'user_type': row['user_type'],
-                                   'speciality': row['speciality']},
+                                   'speciality': row['speciality'],
+                                   'msg_count': row['msg_count']},
                 'restricted_profile': {'user_id': row['user_id'], 'firstname': row['firstname'],
                                        'lastname': row['lastname'],
                                        'work_address': row['work_address'],
@@ -253,12 +593,13 @@ class Connection(object):
 
         :param row: The row obtained from the database.
         :type row: sqlite3.Row
-        :return: a dictionary with the keys ``reg_date`` and
-            ``username``
+        :return: a dictionary with the keys ``user_id``, ``reg_date``,
+            ``username``, ``user_type``, ``speciality``, ``picture`` and
+            ``msg_count``
         """
         return {'user_id': row['user_id'], 'reg_date': row['reg_date'], 'username': row['username'],
                 'user_type': row['user_type'], 'speciality': row['speciality'],
-                'picture': row['picture']}
+                'picture': row['picture'], 'msg_count': row['msg_count']}
 
     # Helpers for diagnosis
     # Written from scratch
@@ -280,7 +621,7 @@ class Connection(object):
             otherwise stated.
         """
         user_id = row['user_id']
-        message_id = 'msg-' + str(row['message_id'])
+        message_id = resource_ids.format_message_id(row['message_id'])
         disease = row['disease']
         diagnosis_description = row['diagnosis_description']
 
@@ -291,24 +632,23 @@ class Connection(object):
 
     # API ITSELF
     # Diagnosis Table API.
-    def get_diagnosis(self, diagnosis_id):
+    def get_diagnosis(self, diagnosis_id, columns=None):
         """
         Extracts a diagnosis from the database.
 
         :param diagnosis_id: The id of the diagnosis. Note that diagnosis_id is a
-            string with format ``dgs-\d{1,3}``.
+            string with format ``dgs-\d+``.
+        :param columns: default None. Names of the columns to read (see
+            :py:data:`DIAGNOSIS_COLUMNS`); the values of the other ones are
+            None. If None, all the columns are read.
         :return: A dictionary with the format provided in
             :py:meth:`_create_diagnosis_object` or None if the diagnosis with target
             id does not exist.
         :raises ValueError: when ``diagnosis_id`` is not well formed
         """
-        diagnosis_id_int = re.match(r'dgs-(\d{1,3})', diagnosis_id)
-        if diagnosis_id_int is None:
-            raise ValueError("The diagnosis is malformed")
-        diagnosis_id = int(diagnosis_id_int.group(1))
-        self.set_foreign_keys_support()
-        query = 'SELECT * FROM diagnosis WHERE diagnosis_id = ?'
-        self.con.row_factory = sqlite3.Row
+        diagnosis_id = resource_ids.parse_diagnosis_id(diagnosis_id)
+        query = 'SELECT %s FROM diagnosis WHERE diagnosis_id = ?' % (
+            self._projection(DIAGNOSIS_COLUMNS, columns) or '*')
         cursor = self.con.cursor()
         pvalue = (diagnosis_id,)
         cursor.execute(query, pvalue)
@@ -321,7 +661,8 @@ class Connection(object):
     # TODO get_diagnoses --Extra
     # Return a list of all the diagnoses in the database
     # Modified from get_messages
-    def get_diagnoses(self, message_id=None, user_id=None, number_of_diagnoses=-1):
+    def get_diagnoses(self, message_id=None, user_id=None, number_of_diagnoses=-1,
+                      start_after=None, end_before=None, columns=None):
         """
         Return a list of all the messages in the database filtered by the
         conditions provided in the parameters.
@@ -339,11 +680,21 @@ class Connection(object):
         :param after: All timestamps < ``after`` (UNIX timestamp) are removed.
             If set to -1, this condition is not applied.
         :type after: long
+        :param start_after: default None. Sort key ``(diagnosis_id,)`` of a
+            diagnosis (as an integer). Only the diagnoses coming after it are
+            returned (keyset pagination).
+        :type start_after: tuple
+        :param end_before: default None. Same as ``start_after`` but only the
+            diagnoses coming before the given one are returned.
+        :type end_before: tuple
+        :param columns: default None. Names of the columns to read (see
+            :py:data:`DIAGNOSIS_COLUMNS`); the values of the other ones are
+            None. If None, all the columns are read. The id is always read.
 
         :return: A list of messages. Each message is a dictionary containing
             the following keys:
 
-            * ``user_id``: string with the format msg-\d{1,3}.Id of the
+            * ``user_id``: string with the format msg-\d+.Id of the
                 message.
             * ``sender``: username of the message's author.
             * ``title``: string containing the title of the message.
@@ -356,33 +707,37 @@ class Connection(object):
         :raises ValueError: if ``before`` or ``after`` are not valid UNIX
             timestamps
         """
-        select_all_dgs_query = 'SELECT * FROM diagnosis'
-        if user_id is not None:
-            select_all_dgs_query += " WHERE user_id = '%s'" % user_id
-        if message_id is not None:
-            message_id_int = re.match(r'msg-(\d{1,3})', message_id)
-            if message_id_int is None:
-                raise ValueError("The message id is malformed")
-            message_id_n = int(message_id_int.group(1))
-            select_all_dgs_query += " WHERE message_id = '%s'" % message_id_n
-
-        select_all_dgs_query += ' ORDER BY diagnosis_id ASC'
-        if number_of_diagnoses > -1:
-            select_all_dgs_query += ' LIMIT ' + str(number_of_diagnoses)
-        self.set_foreign_keys_support()
-        self.con.row_factory = sqlite3.Row
-        cursor = self.con.cursor()
-        cursor.execute(select_all_dgs_query)
+        return list(self.iter_diagnoses(message_id, user_id, number_of_diagnoses,
+                                        start_after, end_before, columns))
 
-        rows = cursor.fetchall()
-        if rows is None:
-            return None
+    def iter_diagnoses(self, message_id=None, user_id=None, number_of_diagnoses=-1,
+                       start_after=None, end_before=None, columns=None):
+        """
+        Same as :py:meth:`get_diagnoses` but the diagnoses are returned by a
+        generator that fetches the rows from the cursor in chunks.
 
-        diagnoses = []
-        for row in rows:
-            diagnosis = self._create_diagnoses_list_object(row)
-            diagnoses.append(diagnosis)
-        return diagnoses
+        :raises ValueError: if the message id is malformed. It is raised when
+            this method is called, not when the generator is consumed.
+        """
+        query = Select(self._projection(DIAGNOSIS_COLUMNS, columns, ('diagnosis_id',)) or '*',
+                       'diagnosis')
+        if user_id is not None:
+            query.where('user_id = ?', user_id)
+        if message_id is not None:
+            query.where('message_id = ?', resource_ids.parse_message_id(message_id))
+        if start_after is not None:
+            query.where('diagnosis_id > ?', *start_after)
+        elif end_before is not None:
+            query.where('diagnosis_id < ?', *end_before)
+
+        if end_before is not None:
+            query.order_by('diagnosis_id DESC')
+        else:
+            query.order_by('diagnosis_id ASC')
+        query.limit(number_of_diagnoses)
+        cursor = query.execute(self.con)
+        return self._iter_rows(cursor, self._create_diagnoses_list_object,
+                               reverse=end_before is not None)
 
     # Written from scratch
     def create_diagnosis(self, diagnosis):
@@ -392,7 +747,7 @@ class Connection(object):
         :param diagnosis : the diagnosis object
 
         :return: the id of the created message or None if the message was not
-            found. Note that the returned value is a string with the format msg-\d{1,3}.
+            found. Note that the returned value is a string with the format msg-\d+.
 
         :raises ForumDatabaseError: if the database could not be modified.
         """
@@ -401,8 +756,6 @@ class Connection(object):
         insert_data_query = ('INSERT INTO diagnosis(disease, diagnosis_description, message_id, '
                              'user_id) VALUES(?,?,?,?)')
 
-        self.set_foreign_keys_support()
-        self.con.row_factory = sqlite3.Row
         cursor = self.con.cursor()
 
         user_id = diagnosis['user_id']
@@ -416,10 +769,7 @@ class Connection(object):
         if row['user_type'] != DOCTOR:
             raise ValueError("the user is not a doctor")
 
-        message_id_int = re.match(r'msg-(\d{1,3})', diagnosis['message_id'])
-        if message_id_int is None:
-            raise ValueError("The message_id is malformed")
-        message_id = int(message_id_int.group(1))
+        message_id = resource_ids.parse_message_id(diagnosis['message_id'])
         cursor.execute(query_msg, (message_id,))
         row = cursor.fetchone()
         if row is None:
@@ -428,11 +778,68 @@ class Connection(object):
         disease = diagnosis['disease']
         diagnosis_description = diagnosis['diagnosis_description']
         pvalue = (disease, diagnosis_description, message_id, user_id)
-        cursor.execute(insert_data_query, pvalue)
-        self.con.commit()
+        with self._write_transaction():
+            before = self.get_versions('diagnosis')
+            cursor.execute(insert_data_query, pvalue)
+            last_id = cursor.lastrowid
+            after = self.get_versions('diagnosis')
+        prefix_index.update(self, prefix_index.DISEASES, before, after, added=(disease,))
+
+        return resource_ids.format_diagnosis_id(last_id) if last_id is not None else None
+
+    # Written from scratch
+    def create_diagnoses_bulk(self, diagnoses):
+        """
+        Create several diagnoses in a single transaction. Same as calling
+        :py:meth:`create_diagnosis` for each of them, but the users and the
+        messages are looked up with one query for all the diagnoses and the
+        rows are inserted with one ``executemany``.
+
+        :param list diagnoses: the diagnosis objects, with the same keys as
+            the one of :py:meth:`create_diagnosis`.
+        :return: the ids of the created diagnoses, in the same order, with the
+            format dgs-\d+. None if a user or a message does not exist, in
+            which case no diagnosis is created.
+        :raises ValueError: if a user is not valid or is not a doctor, or if a
+            message_id is malformed.
+        """
+        if not diagnoses:
+            return []
+        user_ids = []
+        message_ids = []
+        for diagnosis in diagnoses:
+            if diagnosis['user_id'] is None:
+                raise ValueError("User is not valid")
+            user_ids.append(int(diagnosis['user_id']))
+            message_ids.append(resource_ids.parse_message_id(diagnosis['message_id']))
+
+        user_types = dict(
+            (row['user_id'], row['user_type']) for row in self._select_in(
+                'SELECT user_id, user_type FROM users_profile WHERE user_id IN (%s)',
+                set(user_ids)))
+        if len(user_types) < len(set(user_ids)):
+            return None
+        if any(user_type != DOCTOR for user_type in user_types.values()):
+            raise ValueError("the user is not a doctor")
+        found = self._select_in('SELECT message_id FROM messages WHERE message_id IN (%s)',
+                                set(message_ids))
+        if len(found) < len(set(message_ids)):
+            return None
 
-        last_id = cursor.lastrowid
-        return 'dgs-' + str(last_id) if last_id is not None else None
+        insert_data_query = ('INSERT INTO diagnosis(diagnosis_id, disease, diagnosis_description, '
+                             'message_id, user_id) VALUES(?,?,?,?,?)')
+        with self._write_transaction():
+            before = self.get_versions('diagnosis')
+            ids = self._next_ids('diagnosis', 'diagnosis_id', len(diagnoses))
+            self.con.executemany(insert_data_query, (
+                (new_id, diagnosis['disease'], diagnosis['diagnosis_description'],
+                 message_id, user_id)
+                for new_id, diagnosis, message_id, user_id
+                in zip(ids, diagnoses, message_ids, user_ids)))
+            after = self.get_versions('diagnosis')
+        prefix_index.update(self, prefix_index.DISEASES, before, after,
+                            added=[diagnosis['disease'] for diagnosis in diagnoses])
+        return [resource_ids.format_diagnosis_id(new_id) for new_id in ids]
 
     # TODO def delete_diagnosis(self, diagnosis_id) --Extra
 
@@ -447,24 +854,23 @@ class Connection(object):
 
     # Message Table API
     # Modified from get_message
-    def get_message(self, message_id):
+    def get_message(self, message_id, columns=None):
         """
         Extracts a message from the database.
 
         :param message_id: The id of the message. Note that message_id is a
-            string with format ``msg-\d{1,3}``.
+            string with format ``msg-\d+``.
+        :param columns: default None. Names of the columns to read (see
+            :py:data:`MESSAGE_COLUMNS`); the values of the other ones are
+            None. If None, all the columns are read.
         :return: A dictionary with the format provided in
             :py:meth:`_create_message_object` or None if the message with target
             id does not exist.
         :raises ValueError: when ``message_id`` is not well formed
         """
-        message_id_int = re.match(r'msg-(\d{1,3})', message_id)
-        if message_id_int is None:
-            raise ValueError("The message_id is malformed")
-        message_id = int(message_id_int.group(1))
-        self.set_foreign_keys_support()
-        query = 'SELECT * FROM messages WHERE message_id = ?'
-        self.con.row_factory = sqlite3.Row
+        message_id = resource_ids.parse_message_id(message_id)
+        query = 'SELECT %s FROM messages WHERE message_id = ?' % (
+            self._projection(MESSAGE_COLUMNS, columns) or '*')
         cur = self.con.cursor()
         cur.execute(query, (message_id,))
         row = cur.fetchone()
@@ -475,7 +881,7 @@ class Connection(object):
 
     # Modified from get_messages
     def get_messages(self, username=None, number_of_messages=-1,
-                     before=-1, after=-1):
+                     before=-1, after=-1, start_after=None, end_before=None, columns=None):
         """
         Return a list of all the messages in the database filtered by the
         conditions provided in the parameters.
@@ -493,11 +899,24 @@ class Connection(object):
         :param after: All timestamps < ``after`` (UNIX timestamp) are removed.
             If set to -1, this condition is not applied.
         :type after: long
-
-        :return: A list of messages. Each message is a dictionary containing
+        :param start_after: default None. Sort key ``(timestamp, message_id)``
+            of a message (``message_id`` as an integer). Only the messages
+            coming after it in the list are returned (keyset pagination).
+        :type start_after: tuple
+        :param end_before: default None. Same as ``start_after`` but only the
+            messages coming before the given one are returned. In this case
+            ``number_of_messages`` limits the messages closest to it.
+        :type end_before: tuple
+        :param columns: default None. Names of the columns to read (see
+            :py:data:`MESSAGE_COLUMNS`); the values of the other ones are
+            None. If None, all the columns are read. The columns of the sort
+            key are always read.
+
+        :return: A list of messages, the most recent first (ties are broken
+            by the id of the message). Each message is a dictionary containing
             the following keys:
 
-            * ``message_id``: string with the format msg-\d{1,3}.Id of the
+            * ``message_id``: string with the format msg-\d+.Id of the
                 message.
             * ``sender``: username of the message's author.
             * ``title``: string containing the title of the message.
@@ -510,39 +929,211 @@ class Connection(object):
         :raises ValueError: if ``before`` or ``after`` are not valid UNIX
             timestamps
         """
-        select_all_msg_query = 'SELECT * FROM messages'
-        if username is not None or before != -1 or after != -1:
-            select_all_msg_query += ' WHERE'
-        if username is not None:
-            select_all_msg_query += " username = '%s'" % username
+        return list(self.iter_messages(username, number_of_messages, before, after,
+                                       start_after, end_before, columns))
 
+    def iter_messages(self, username=None, number_of_messages=-1,
+                      before=-1, after=-1, start_after=None, end_before=None, columns=None):
+        """
+        Same as :py:meth:`get_messages` but the messages are returned by a
+        generator that fetches the rows from the cursor in chunks, so that
+        large collections can be processed without holding them in memory.
+        """
+        query = Select(self._projection(MESSAGE_COLUMNS, columns,
+                                        ('message_id', 'timestamp')) or '*', 'messages')
+        if username is not None:
+            query.where('username = ?', username)
         if before != -1:
-            if username is not None:
-                select_all_msg_query += ' AND'
-            select_all_msg_query += " timestamp < %s" % str(before)
-
+            query.where('timestamp < ?', before)
         if after != -1:
-            if username is not None or before != -1:
-                select_all_msg_query += ' AND'
-            select_all_msg_query += " timestamp > %s" % str(after)
-
-        select_all_msg_query += ' ORDER BY timestamp DESC'
-        if number_of_messages > -1:
-            select_all_msg_query += ' LIMIT ' + str(number_of_messages)
-        self.set_foreign_keys_support()
-        self.con.row_factory = sqlite3.Row
-        cursor = self.con.cursor()
-        cursor.execute(select_all_msg_query)
+            query.where('timestamp > ?', after)
+        if start_after is not None:
+            query.where('(timestamp, message_id) < (?, ?)', *start_after)
+        elif end_before is not None:
+            query.where('(timestamp, message_id) > (?, ?)', *end_before)
+
+        if end_before is not None:
+            # Walk backwards from the key, the rows are reversed below
+            query.order_by('timestamp ASC, message_id ASC')
+        else:
+            query.order_by('timestamp DESC, message_id DESC')
+        query.limit(number_of_messages)
+        cursor = query.execute(self.con)
+        return self._iter_rows(cursor, self._create_message_list_object,
+                               reverse=end_before is not None)
 
-        rows = cursor.fetchall()
-        if rows is None:
-            return None
+    # Written from scratch
+    def search_messages(self, text, number_of_messages=-1, start_after=None,
+                        end_before=None):
+        """
+        Full-text search of the titles and bodies of the messages, with the
+        index created by
+        :py:meth:`medical_forum.database_engine.Engine.create_search_index`.
 
-        messages = []
-        for row in rows:
-            message = self._create_message_list_object(row)
-            messages.append(message)
-        return messages
+        :param str text: the words to search, separated by spaces (see
+            :py:func:`search_expression`). A message matches if it contains
+            all of them, in its title or its body.
+        :param number_of_messages: default -1. Sets the maximum number of
+            messages returning in the list. If set to -1, there is no limit.
+        :type number_of_messages: int
+        :param start_after: default None. Sort key ``(rank, message_id)``
+            of a message (``message_id`` as an integer). Only the messages
+            coming after it in the list are returned (keyset pagination).
+        :type start_after: tuple
+        :param end_before: default None. Same as ``start_after`` but only the
+            messages coming before the given one are returned. In this case
+            ``number_of_messages`` limits the messages closest to it.
+        :type end_before: tuple
+
+        :return: A list of messages, the best match first. Each message is a
+            dictionary with the format provided in
+            :py:meth:`_create_search_result_object`.
+
+        :raises ValueError: if ``text`` has no word to search.
+        """
+        return list(self.iter_search_messages(text, number_of_messages, start_after,
+                                              end_before))
+
+    def iter_search_messages(self, text, number_of_messages=-1, start_after=None,
+                             end_before=None):
+        """
+        Same as :py:meth:`search_messages` but the messages are returned by
+        a generator that fetches the rows from the cursor in chunks.
+        """
+        query = Select(SEARCH_COLUMNS, 'messages_fts')
+        query.where('messages_fts MATCH ?', search_expression(text))
+        if start_after is not None:
+            query.where('(rank, rowid) > (?, ?)', *start_after)
+        elif end_before is not None:
+            query.where('(rank, rowid) < (?, ?)', *end_before)
+
+        if end_before is not None:
+            # Walk backwards from the key, the rows are reversed below
+            query.order_by('rank DESC, rowid DESC')
+        else:
+            query.order_by('rank ASC, rowid ASC')
+        query.limit(number_of_messages)
+        cursor = query.execute(self.con)
+        return self._iter_rows(cursor, self._create_search_result_object,
+                               reverse=end_before is not None)
+
+    # Written from scratch
+    def get_threads(self, number_of_threads=-1, start_after=None, end_before=None):
+        """
+        Return the first messages of the threads, the most recently active
+        thread first, with the aggregates kept by the triggers of
+        :py:meth:`medical_forum.database_engine.Engine.create_thread_stats`.
+
+        :param number_of_threads: default -1. Sets the maximum number of
+            threads returning in the list. If set to -1, there is no limit.
+        :type number_of_threads: int
+        :param start_after: default None. Sort key ``(last_activity,
+            message_id)`` of a thread (``message_id`` of its first message,
+            as an integer). Only the threads coming after it in the list are
+            returned (keyset pagination).
+        :type start_after: tuple
+        :param end_before: default None. Same as ``start_after`` but only the
+            threads coming before the given one are returned. In this case
+            ``number_of_threads`` limits the threads closest to it.
+        :type end_before: tuple
+
+        :return: A list of messages, each one a dictionary with the format
+            provided in :py:meth:`_create_thread_list_object`.
+        """
+        return list(self.iter_threads(number_of_threads, start_after, end_before))
+
+    def iter_threads(self, number_of_threads=-1, start_after=None, end_before=None):
+        """
+        Same as :py:meth:`get_threads` but the messages are returned by a
+        generator that fetches the rows from the cursor in chunks.
+        """
+        query = Select(THREAD_COLUMNS, 'thread_stats JOIN messages '
+                                       'ON messages.message_id = thread_stats.root_id')
+        if start_after is not None:
+            query.where('(thread_stats.last_timestamp, thread_stats.root_id) < (?, ?)',
+                        *start_after)
+        elif end_before is not None:
+            query.where('(thread_stats.last_timestamp, thread_stats.root_id) > (?, ?)',
+                        *end_before)
+
+        if end_before is not None:
+            # Walk backwards from the key, the rows are reversed below
+            query.order_by('thread_stats.last_timestamp ASC, thread_stats.root_id ASC')
+        else:
+            query.order_by('thread_stats.last_timestamp DESC, thread_stats.root_id DESC')
+        query.limit(number_of_threads)
+        cursor = query.execute(self.con)
+        return self._iter_rows(cursor, self._create_thread_list_object,
+                               reverse=end_before is not None)
+
+    # Written from scratch
+    def get_thread(self, message_id, max_depth=-1, number_of_messages=-1,
+                   start_after=None, end_before=None):
+        """
+        Return a message and all its replies, the replies of its replies and
+        so on, read with a single recursive query.
+
+        :param message_id: The id of the first message of the thread. Note
+            that message_id is a string with format ``msg-\d+``.
+        :param max_depth: default -1. Replies deeper than this are not
+            returned: 0 returns the message alone, 1 the message and its
+            direct replies. If set to -1, there is no limit.
+        :type max_depth: int
+        :param number_of_messages: default -1. Sets the maximum number of
+            messages returning in the list. If set to -1, there is no limit.
+        :type number_of_messages: int
+        :param start_after: default None. Sort key ``(message_id,)`` of a
+            message of the thread (``message_id`` as an integer). Only the
+            messages coming after it in the list are returned (keyset
+            pagination).
+        :type start_after: tuple
+        :param end_before: default None. Same as ``start_after`` but only the
+            messages coming before the given one are returned. In this case
+            ``number_of_messages`` limits the messages closest to it.
+        :type end_before: tuple
+
+        :return: A list of messages in depth-first order: each message comes
+            before its replies, and the replies of a message are ordered by
+            id. The list is empty if the message does not exist. Each message
+            is a dictionary with the format provided in
+            :py:meth:`_create_message_object` plus the key ``depth``: the
+            number of reply_to links from the message to the first message
+            of the thread (0 for the first message).
+
+        :raises ValueError: if ``message_id`` is not well formed, or if the
+            message of ``start_after`` or ``end_before`` is not in the thread.
+        """
+        return list(self.iter_thread(message_id, max_depth, number_of_messages,
+                                     start_after, end_before))
+
+    def iter_thread(self, message_id, max_depth=-1, number_of_messages=-1,
+                    start_after=None, end_before=None):
+        """
+        Same as :py:meth:`get_thread` but the messages are returned by a
+        generator that fetches the rows from the cursor in chunks.
+        """
+        root = resource_ids.parse_message_id(message_id)
+        cursor_key = start_after if start_after is not None else end_before
+        path = ''
+        if cursor_key is not None:
+            row = self.con.execute(THREAD_PATH_QUERY, {'message_id': cursor_key[0],
+                                                       'root': root}).fetchone()
+            if row is None:
+                raise ValueError("The message %r is not in the thread" % (cursor_key[0],))
+            path = row[0]
+        params = {'root': root, 'path': path, 'limit': number_of_messages,
+                  # No message is deeper than the number of messages
+                  'depth': max_depth if max_depth != -1 else resource_ids.MAX_ID}
+        if end_before is not None:
+            cursor = self.con.execute(THREAD_BEFORE_QUERY, params)
+        else:
+            # The walk also goes through the cursor and the messages it
+            # replies to, one per level of the path
+            params['walk'] = number_of_messages + len(path) // THREAD_PATH_DIGITS \
+                if number_of_messages != -1 else -1
+            cursor = self.con.execute(THREAD_QUERY, params)
+        return self._iter_rows(cursor, self._create_thread_message_object,
+                               reverse=end_before is not None)
 
     # Modified from delete_message
     def delete_message(self, message_id):
@@ -550,19 +1141,14 @@ class Connection(object):
         Delete the message with id given as parameter.
 
         :param str message_id: id of the message to remove.Note that message_id
-            is a string with format ``msg-\d{1,3}``
+            is a string with format ``msg-\d+``
         :return: True if the message has been deleted, False otherwise
         :raises ValueError: if the message_id has a wrong format.
         """
-        message_id_int = re.match(r'msg-(\d{1,3})', message_id)
-        if message_id_int is None:
-            raise ValueError("The message_id is malformed")
-        message_id = int(message_id_int.group(1))
+        message_id = resource_ids.parse_message_id(message_id)
 
         delete_diagnosis_query = 'DELETE FROM diagnosis WHERE message_id = ?'
         delete_message_query = 'DELETE FROM messages WHERE message_id = ?'
-        self.set_foreign_keys_support()
-        self.con.row_factory = sqlite3.Row
         cursor = self.con.cursor()
         try:
             cursor.execute(delete_diagnosis_query, (message_id,))
@@ -582,23 +1168,18 @@ class Connection(object):
         ``message_id``
 
         :param str message_id: The id of the message to remove. Note that
-            message_id is a string with format msg-\d{1,3}
+            message_id is a string with format msg-\d+
         :param str title: the message's title
         :param str body: the message's content
         :return: the id of the edited message or None if the message was
-              not found. The id of the message has the format ``msg-\d{1,3}``,
-              where \d{1,3} is the id of the message in the database.
+              not found. The id of the message has the format ``msg-\d+``,
+              where \d+ is the id of the message in the database.
         :raises ValueError: if the message_id has a wrong format.
         """
-        message_id_int = re.match(r'msg-(\d{1,3})', message_id)
-        if message_id_int is None:
-            raise ValueError("The message_id is malformed")
-        message_id = int(message_id_int.group(1))
+        message_id = resource_ids.parse_message_id(message_id)
 
         update_message_query = ('UPDATE messages SET title=:title , '
                                 'body=:body WHERE message_id =:msg_id')
-        self.set_foreign_keys_support()
-        self.con.row_factory = sqlite3.Row
         cursor = self.con.cursor()
         pvalue = {"msg_id": message_id,
                   "title": title,
@@ -611,7 +1192,7 @@ class Connection(object):
         else:
             if cursor.rowcount < 1:
                 return None
-        return 'msg-%s' % message_id
+        return resource_ids.format_message_id(message_id)
 
     # Modified from create_message
     def create_message(self, title, body, sender, reply_to=None):
@@ -623,10 +1204,10 @@ class Connection(object):
         :param str sender: the username of the person who is editing this message.
         :param str reply_to: Only provided if this message is an answer to a
             previous message (parent). Otherwise, Null will be stored in the
-            database. The id of the message has the format msg-\d{1,3}
+            database. The id of the message has the format msg-\d+
 
         :return: the id of the created message or None if the message was not
-            found. Note that the returned value is a string with the format msg-\d{1,3}.
+            found. Note that the returned value is a string with the format msg-\d+.
 
         :raises ForumDatabaseError: if the database could not be modified.
         :raises ValueError: if the reply_to has a wrong format.
@@ -634,10 +1215,7 @@ class Connection(object):
         """
         # Extracts the int which is the id for a message in the database
         if reply_to is not None:
-            match = re.match('msg-(\d{1,3})', reply_to)
-            if match is None:
-                raise ValueError("The reply_to is malformed")
-            reply_to = int(match.group(1))
+            reply_to = resource_ids.parse_message_id(reply_to)
 
         # Create the SQL statement
         # SQL to test that the message which I am answering does exist
@@ -664,7 +1242,7 @@ class Connection(object):
 
         pvalue = (title, body, timestamp, 0, reply_to, sender, user_id)
         last_id = execute_query(self.con, stmnt, pvalue, 'lastid')
-        return 'msg-' + str(last_id) if last_id is not None else None
+        return resource_ids.format_message_id(last_id) if last_id is not None else None
 
     # Modified from append_answer
     def append_answer(self, reply_to, title, body, sender):
@@ -674,7 +1252,7 @@ class Connection(object):
 
         :param str reply_to: Only provided if this message is an answer to a
             previous message (parent). Otherwise, Null will be stored in the
-            database. The id of the message has the format msg-\d{1,3}
+            database. The id of the message has the format msg-\d+
         :param str title: the message's title
         :param str body: the message's content
         :param str sender: the username of the person who is editing this
@@ -682,7 +1260,7 @@ class Connection(object):
 
         :return: the id of the created message or None if the message was not
             found. Note that
-            the returned value is a string with the format msg-\d{1,3}.
+            the returned value is a string with the format msg-\d+.
 
         :raises ForumDatabaseError: if the database could not be modified.
         :raises ValueError: if the reply_to has a wrong format.
@@ -690,6 +1268,81 @@ class Connection(object):
         """
         return self.create_message(title, body, sender, reply_to)
 
+    # Written from scratch
+    def create_messages_bulk(self, messages):
+        """
+        Create several messages in a single transaction. Same as calling
+        :py:meth:`create_message` for each of them, but the senders and the
+        parent messages are looked up with one query for all the messages and
+        the rows are inserted with one ``executemany``.
+
+        :param list messages: the messages to create. Each message is a
+            dictionary with the keys ``title``, ``body``, ``sender`` and,
+            optionally, ``reply_to``: the arguments of :py:meth:`create_message`.
+        :return: the ids of the created messages, in the same order, with the
+            format msg-\d+. None if a ``reply_to`` message does not exist, in
+            which case no message is created.
+
+        :raises KeyError: if a sender is not a user of the forum.
+        :raises ValueError: if a reply_to has a wrong format.
+        """
+        if not messages:
+            return []
+        replies_to = []
+        for message in messages:
+            reply_to = message.get('reply_to')
+            if reply_to is not None:
+                reply_to = resource_ids.parse_message_id(reply_to)
+            replies_to.append(reply_to)
+
+        parents = set(reply_to for reply_to in replies_to if reply_to is not None)
+        found = self._select_in('SELECT message_id FROM messages WHERE message_id IN (%s)',
+                                parents)
+        if len(found) < len(parents):
+            return None
+        senders = set(message['sender'] for message in messages)
+        user_ids = dict(
+            (row['username'], row['user_id']) for row in self._select_in(
+                'SELECT username, user_id FROM users WHERE username IN (%s)', senders))
+        if len(user_ids) < len(senders):
+            raise KeyError("User is not valid")
+
+        stmnt = ('INSERT INTO messages(message_id, title, body, timestamp, views, '
+                 'reply_to, username, user_id) VALUES(?,?,?,?,?,?,?,?)')
+        timestamp = time.mktime(datetime.now().timetuple())
+        with self._write_transaction():
+            ids = self._next_ids('messages', 'message_id', len(messages))
+            self.con.executemany(stmnt, (
+                (new_id, message['title'], message['body'], timestamp, 0, reply_to,
+                 message['sender'], user_ids[message['sender']])
+                for new_id, message, reply_to in zip(ids, messages, replies_to)))
+        return [resource_ids.format_message_id(new_id) for new_id in ids]
+
+    # VERSIONS
+    # Written from scratch
+    def get_versions(self, *names):
+        """
+        Reads version counters of the table ``versions``, maintained by the
+        triggers created with
+        :py:meth:`medical_forum.database_engine.Engine.create_triggers`.
+
+        :param str names: names of the counters, either a table
+            (``messages``) or a row of it (``messages/15``).
+        :return: a tuple with the epoch of the database followed by the
+            version of each name, 0 for a name that has never been modified.
+            None if the database has no ``versions`` table.
+        :rtype: tuple
+        """
+        keys = ('epoch',) + names
+        try:
+            cursor = self.con.execute(
+                'SELECT name, version FROM versions WHERE name IN (%s)'
+                % ','.join('?' * len(keys)), keys)
+        except sqlite3.OperationalError:
+            return None
+        versions = dict(cursor.fetchall())
+        return tuple(versions.get(name, 0) for name in keys)
+
     # MESSAGE UTILS
     # Copied from contains_message
     def contains_message(self, message_id):
@@ -697,7 +1350,7 @@ class Connection(object):
         Checks if a message is in the database.
 
         :param str message_id: Id of the message to search. Note that message_id
-            is a string with the format msg-\d{1,3}.
+            is a string with the format msg-\d+.
         :return: True if the message is in the database. False otherwise.
 
         """
@@ -705,76 +1358,139 @@ class Connection(object):
 
     # ACCESSING THE USER and USER_PROFILE tables
     # Modified from get_users
-    def get_users(self):
+    def get_users(self, number_of_users=-1, start_after=None, end_before=None, columns=None,
+                  sort='user_id'):
         '''
-        Extracts all users in the database.
-
+        Extracts all users in the database, ordered by user id, or by number
+        of messages.
+
+        :param int number_of_users: default -1. Sets the maximum number of
+            users returning in the list. If set to -1, there is no limit.
+        :param tuple start_after: default None. Sort key ``(user_id,)`` of a
+            user, or ``(msg_count, user_id)`` if sorted by number of
+            messages. Only the users coming after it are returned (keyset
+            pagination).
+        :param tuple end_before: default None. Same as ``start_after`` but
+            only the users coming before the given one are returned. In this
+            case ``number_of_users`` limits the users closest to it.
+        :param columns: default None. Names of the columns to read (see
+            :py:data:`USER_COLUMNS`); the values of the other ones are None.
+            If None, all the columns are read. The columns of the sort key
+            are always read.
+        :param str sort: default 'user_id'. 'user_id' returns the users by
+            ascending user id, 'msg_count' the users with the most messages
+            first (by descending user id when they have as many messages).
         :return: list of Users of the database. Each user is a dictionary
             that contains tswo keys: ``username``(str) and ``reg_date``
             (long representing UNIX timestamp). None is returned if the database
             has no users.
 
         '''
-        # Create the SQL Statements
-        # SQL Statement for retrieving the users
-        query = 'SELECT users.*, users_profile.* FROM users, users_profile \
-                 WHERE users.user_id = users_profile.user_id'
-        # Activate foreign key support
-        self.set_foreign_keys_support()
-        # Create the cursor
-        self.con.row_factory = sqlite3.Row
-        cur = self.con.cursor()
+        return list(self.iter_users(number_of_users, start_after, end_before, columns, sort))
+
+    def iter_users(self, number_of_users=-1, start_after=None, end_before=None, columns=None,
+                   sort='user_id'):
+        """
+        Same as :py:meth:`get_users` but the users are returned by a
+        generator that fetches the rows from the cursor in chunks.
+        """
+        if sort not in USER_SORTS:
+            raise ValueError("Unknown sort %r" % sort)
+        # Create the SQL Statement for retrieving the users
+        query = Select(self._projection(USER_COLUMNS, columns, USER_SORTS[sort])
+                       or 'users.*, users_profile.*', 'users, users_profile')
+        query.where('users.user_id = users_profile.user_id')
+        if sort == 'msg_count':
+            # Read from the end of the index idx_users_msg_count
+            if start_after is not None:
+                query.where('(users.msg_count, users.user_id) < (?, ?)', *start_after)
+            elif end_before is not None:
+                query.where('(users.msg_count, users.user_id) > (?, ?)', *end_before)
+            if end_before is not None:
+                # Walk backwards from the key, the rows are reversed below
+                query.order_by('users.msg_count ASC, users.user_id ASC')
+            else:
+                query.order_by('users.msg_count DESC, users.user_id DESC')
+        else:
+            if start_after is not None:
+                query.where('users.user_id > ?', *start_after)
+            elif end_before is not None:
+                query.where('users.user_id < ?', *end_before)
+            query.order_by('users.user_id %s' % ('DESC' if end_before is not None else 'ASC'))
+        query.limit(number_of_users)
         # Execute main SQL Statement
-        cur.execute(query)
-        # Process the results
-        rows = cur.fetchall()
-        if rows is None:
-            return None
-        # Process the response.
-        users = []
-        for row in rows:
-            users.append(self._create_user_list_object(row))
-        return users
+        cur = query.execute(self.con)
+        # Process the results one chunk of rows at a time
+        return self._iter_rows(cur, self._create_user_list_object,
+                               reverse=end_before is not None)
 
     # Modified from get_users
-    def get_user(self, username):
+    def get_user(self, username, columns=None):
         '''
         Extracts all the information of a user.
 
         :param str username: The username of the user to search for.
+        :param columns: default None. Names of the columns to read (see
+            :py:data:`USER_COLUMNS`); the values of the other ones are None.
+            If None, all the columns are read.
         :return: dictionary with the format provided in the method:
             :py:meth:`_create_user_object
         '''
-        # Create the SQL Statements
-        # SQL Statement for retrieving the user given a username
-        query1 = 'SELECT user_id from users WHERE username = ?'
-        # SQL Statement for retrieving the user information
-        query2 = ('SELECT users.*, users_profile.* FROM users, users_profile '
-                  'WHERE users.user_id = ? AND users_profile.user_id = users.user_id')
-        # Variable to be used in the second query.
-        user_id = None
-        # Activate foreign key support
-        self.set_foreign_keys_support()
-        # Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        # SQL Statement for retrieving the user information. The username is
+        # UNIQUE, so its index finds the user and the profile is joined by
+        # its primary key in the same statement.
+        query = ('SELECT %s FROM users '
+                 'JOIN users_profile ON users_profile.user_id = users.user_id '
+                 'WHERE users.username = ?'
+                 % (self._projection(USER_COLUMNS, columns) or 'users.*, users_profile.*'))
+        # Cursor initialization
         cur = self.con.cursor()
-        # Execute SQL Statement to retrieve the id given a username
-        pvalue = (username,)
-        cur.execute(query1, pvalue)
-        # Extract the user id
+        # Execute the SQL Statement to retrieve the user information.
+        cur.execute(query, (username,))
+        # Process the response. Only one posible row is expected.
         row = cur.fetchone()
         if row is None:
             return None
-        user_id = row["user_id"]
-        # Execute the SQL Statement to retrieve the user invformation.
-        # Create first the valuse
-        pvalue = (user_id,)
-        # execute the statement
-        cur.execute(query2, pvalue)
-        # Process the response. Only one posible row is expected.
-        row = cur.fetchone()
         return self._create_user_object(row)
 
+    # Written from scratch
+    def get_users_by_usernames(self, usernames):
+        """
+        Extracts all the information of several users at once, for instance
+        the senders of a list of messages.
+
+        :param usernames: iterable of usernames. Repeated usernames are
+            fetched once.
+        :return: dictionary whose keys are the usernames found in the
+            database and whose values have the format provided in the method
+            :py:meth:`_create_user_object`. The usernames that do not exist
+            are left out.
+        :rtype: dict
+        """
+        rows = self._select_in(
+            'SELECT users.*, users_profile.* FROM users '
+            'JOIN users_profile ON users_profile.user_id = users.user_id '
+            'WHERE users.username IN (%s)', set(usernames))
+        return dict((row['username'], self._create_user_object(row)) for row in rows)
+
+    # Written from scratch
+    def get_users_by_ids(self, user_ids):
+        """
+        Same as :py:meth:`get_users_by_usernames` but the users are
+        searched by their ``user_id``.
+
+        :param user_ids: iterable of user ids (int).
+        :return: dictionary whose keys are the user ids found in the
+            database and whose values have the format provided in the method
+            :py:meth:`_create_user_object`.
+        :rtype: dict
+        """
+        rows = self._select_in(
+            'SELECT users.*, users_profile.* FROM users '
+            'JOIN users_profile ON users_profile.user_id = users.user_id '
+            'WHERE users.user_id IN (%s)', set(user_ids))
+        return dict((row['user_id'], self._create_user_object(row)) for row in rows)
+
     # Modified from delete_user
     def delete_user(self, username):
         '''
@@ -790,10 +1506,7 @@ class Connection(object):
         # get the user_id for username
         query = 'SELECT user_id FROM users WHERE username = ?'
         # execute the statement
-        # Activate foreign key support
-        self.set_foreign_keys_support()
-        # Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        # Cursor initialization
         cur = self.con.cursor()
         cur.execute(query, (username, ))
         # Process the response. Only one possible row is expected.
@@ -810,14 +1523,19 @@ class Connection(object):
         query_u = 'DELETE FROM users WHERE username = ?'
 
         # Execute the statement to delete
-        cur.execute(query_d, (user_id,))
-        cur.execute(query_m, (user_id,))
-        cur.execute(query_p, (user_id,))
-        cur.execute(query_u, (username,))
-        self.con.commit()
+        with self._write_transaction():
+            before = self.get_versions('usernames')
+            cur.execute(query_d, (user_id,))
+            cur.execute(query_m, (user_id,))
+            cur.execute(query_p, (user_id,))
+            cur.execute(query_u, (username,))
+            deleted = cur.rowcount
+            after = self.get_versions('usernames')
         # Check that it has been deleted
-        if cur.rowcount < 1:
+        if deleted < 1:
             return False
+        # The index of the diseases is built again if diagnoses were deleted
+        prefix_index.update(self, prefix_index.USERNAMES, before, after, removed=(username,))
         return True
 
     # Modified from modify_user
@@ -881,10 +1599,7 @@ class Connection(object):
         _picture = None if not r_profile else r_profile.get('picture', None)
         _email = None if not r_profile else r_profile.get('email', None)
 
-        # Activate foreign key support
-        self.set_foreign_keys_support()
-        # Cursor and row initialization
-        self.con.row_factory = sqlite3.Row
+        # Cursor initialization
         cur = self.con.cursor()
         # Execute the statement to extract the id associated to a username
         pvalue = (username,)
@@ -948,7 +1663,8 @@ class Connection(object):
 
         '''
         select_user_query = 'SELECT user_id FROM users WHERE username = ?'
-        insert_user_query = 'INSERT INTO users(username,reg_date,last_login, pass_hash) VALUES(?,?,?,?)'
+        insert_user_query = ('INSERT INTO users(username,reg_date,last_login, pass_hash, msg_count) '
+                             'VALUES(?,?,?,?,0)')
         insert_user_profile_query = (
             'INSERT INTO users_profile (user_id, firstname,lastname, speciality, picture, '
             'age, work_address, gender, email, user_type, phone, weight, height) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)')
@@ -958,36 +1674,92 @@ class Connection(object):
         # TODO pass_hash = user['pass_hash']
         pass_hash = 'pass_hash'
         # temporal variables for user profiles
-        p_profile = user['public_profile']
-        r_profile = user['restricted_profile']
-        _firstname = r_profile.get('firstname', None)
-        _lastname = r_profile.get('lastname', None)
-        _speciality = p_profile.get('speciality', None)
-        _picture = r_profile.get('picture', None)
-        _age = r_profile.get('age', None)
-        _work_address = r_profile.get('work_address', None)
-        _gender = r_profile.get('gender', None)
-        _email = r_profile.get('email', None)
-        _user_type = p_profile.get('user_type', None)
-        _phone = r_profile.get('phone', None)
-        _weight = r_profile.get('weight', None)
-        _height = r_profile.get('height', None)
+        profile = self._user_profile_values(user)
 
         row = execute_query(self.con, select_user_query, (username, ), 'one')
         # If there is no user add rows in user and user profile
         if row is None:
             pvalue = (username, timestamp, timestamp, pass_hash)
-            lid = execute_query(self.con, insert_user_query, pvalue, 'lastid')
-            pvalue = (
-                lid, _firstname, _lastname, _speciality, _picture, _age,
-                _work_address, _gender, _email, _user_type, _phone, _weight, _height)
-
-            execute_query(self.con, insert_user_profile_query,
-                          pvalue, 'commit')
+            with self._write_transaction():
+                before = self.get_versions('usernames')
+                lid = self.con.execute(insert_user_query, pvalue).lastrowid
+                pvalue = (lid,) + profile
+                self.con.execute(insert_user_profile_query, pvalue)
+                after = self.get_versions('usernames')
+            prefix_index.update(self, prefix_index.USERNAMES, before, after,
+                                added=(username,))
             return username
 
         return None
 
+    # Written from scratch
+    def append_users_bulk(self, users):
+        """
+        Create several users in a single transaction. Same as calling
+        :py:meth:`append_user` for each of them, but the usernames are
+        checked with one query for all the users and the rows of each table
+        are inserted with one ``executemany``.
+
+        :param list users: ``(username, user)`` tuples, with the arguments of
+            :py:meth:`append_user`.
+        :return: the usernames of the created users, in the same order. None
+            if a username is already in the database or is repeated, in which
+            case no user is created.
+        :raise ValueError: if a user argument is not well formed.
+        """
+        if not users:
+            return []
+        usernames = [username for username, _ in users]
+        if len(set(usernames)) < len(usernames):
+            return None
+        if self._select_in('SELECT user_id FROM users WHERE username IN (%s)', usernames):
+            return None
+        profiles = [self._user_profile_values(user) for _, user in users]
+
+        insert_user_query = ('INSERT INTO users(user_id, username, reg_date, last_login, '
+                             'pass_hash, msg_count) VALUES(?,?,?,?,?,0)')
+        insert_user_profile_query = (
+            'INSERT INTO users_profile (user_id, firstname,lastname, speciality, picture, '
+            'age, work_address, gender, email, user_type, phone, weight, height) '
+            'VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)')
+        timestamp = time.mktime(datetime.now().timetuple())
+        # TODO pass_hash = user['pass_hash']
+        pass_hash = 'pass_hash'
+        with self._write_transaction():
+            before = self.get_versions('usernames')
+            ids = self._next_ids('users', 'user_id', len(users))
+            self.con.executemany(insert_user_query, (
+                (user_id, username, timestamp, timestamp, pass_hash)
+                for user_id, username in zip(ids, usernames)))
+            self.con.executemany(insert_user_profile_query, (
+                (user_id,) + profile for user_id, profile in zip(ids, profiles)))
+            after = self.get_versions('usernames')
+        prefix_index.update(self, prefix_index.USERNAMES, before, after, added=usernames)
+        return usernames
+
+    # Written from scratch
+    def _user_profile_values(self, user):
+        """
+        Returns the values of the users_profile row of a user, in the order
+        of the columns firstname, lastname, speciality, picture, age,
+        work_address, gender, email, user_type, phone, weight and height.
+
+        :param dict user: the user, with the format of :py:meth:`append_user`.
+        :rtype: tuple
+        :raise ValueError: if the user argument is not well formed.
+        """
+        try:
+            p_profile = user['public_profile']
+            r_profile = user['restricted_profile']
+        except (KeyError, TypeError):
+            raise ValueError("The user is malformed")
+        return (r_profile.get('firstname', None), r_profile.get('lastname', None),
+                p_profile.get('speciality', None), r_profile.get('picture', None),
+                r_profile.get('age', None), r_profile.get('work_address', None),
+                r_profile.get('gender', None), r_profile.get('email', None),
+                p_profile.get('user_type', None), r_profile.get('phone', None),
+                r_profile.get('weight', None), r_profile.get('height', None))
+
     # UTILS
     # Modified from get_user_id
     def get_user_id(self, username):
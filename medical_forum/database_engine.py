@@ -13,12 +13,192 @@ Provides the database API to access the forum persistent data.
 
 import sqlite3
 import os
-from .database_connection import Connection
+from .database_connection import Connection, DEFAULT_PROFILE
+from .database_pool import ConnectionPool, DEFAULT_POOL_SIZE, DEFAULT_MAX_IDLE, drain_pools
 
 DEFAULT_DB_PATH = 'db/medical_forum_data.db'
 DEFAULT_SCHEMA = "db/medical_forum_data_schema.sql"
 DEFAULT_DATA_DUMP = "db/medical_forum_data_dump.sql"
 
+# Secondary indexes managed by the Engine as (name, table, columns). They back
+# the lookups of the Connection methods that would otherwise scan a table:
+# history of a user and listings ordered by timestamp, the deletion of the
+# messages and diagnoses of a user or message, the reply_to cascade and the
+# search of doctors by speciality and the users sorted by number of messages.
+INDEXES = (
+    ('idx_messages_username_timestamp', 'messages', ('username', 'timestamp')),
+    ('idx_messages_timestamp', 'messages', ('timestamp',)),
+    ('idx_messages_user_id', 'messages', ('user_id',)),
+    ('idx_messages_reply_to', 'messages', ('reply_to',)),
+    ('idx_diagnosis_user_id', 'diagnosis', ('user_id',)),
+    ('idx_diagnosis_message_id', 'diagnosis', ('message_id',)),
+    ('idx_users_profile_type_speciality', 'users_profile', ('user_type', 'speciality')),
+    ('idx_users_msg_count', 'users', ('msg_count',)),
+)
+
+# Version counters of the tables and of their rows, kept in the table
+# ``versions`` by the triggers below. A row of ``versions`` is named after a
+# table (``messages``) or a row of it (``messages/15``, ``users/PoorGuy``) and
+# its version grows by one on every INSERT, UPDATE or DELETE of the table or
+# row. The ``epoch`` row holds a random number drawn when the table is
+# created, so that two databases never share the same versions.
+VERSIONS_TABLE = ('CREATE TABLE IF NOT EXISTS versions(name TEXT PRIMARY KEY, '
+                  'version INTEGER NOT NULL) WITHOUT ROWID')
+VERSIONS_EPOCH = "INSERT OR IGNORE INTO versions(name, version) VALUES('epoch', abs(random()))"
+BUMP_VERSIONS = ('INSERT INTO versions(name, version) %s '
+                 'ON CONFLICT(name) DO UPDATE SET version = version + 1')
+# (table, versions bumped as the rows of an INSERT ... SELECT with the changed
+# row as NEW or OLD)
+VERSIONED_TABLES = (
+    ('messages', "VALUES('messages', 1), ('messages/' || {row}.message_id, 1)"),
+    ('diagnosis', "VALUES('diagnosis', 1), ('diagnosis/' || {row}.diagnosis_id, 1)"),
+    ('users', "VALUES('users', 1), ('users/' || {row}.username, 1)"),
+    # The profile is part of the representation of its user. The SELECT may
+    # return no row if the user has already been deleted.
+    ('users_profile', "SELECT 'users', 1 UNION ALL SELECT 'users/' || username, 1 "
+                      "FROM users WHERE user_id = {row}.user_id"),
+)
+# Version counter of the usernames alone, for the index of
+# :py:mod:`medical_forum.prefix_index`: it is not bumped when only the other
+# columns of a user change, like ``msg_count`` on every message.
+# (name, event, condition)
+USERNAMES_TRIGGERS = (
+    ('trg_users_insert_usernames', 'INSERT', 'TRUE'),
+    ('trg_users_update_usernames', 'UPDATE OF username', 'OLD.username IS NOT NEW.username'),
+    ('trg_users_delete_usernames', 'DELETE', 'TRUE'),
+)
+
+# Full-text index of the titles and bodies of the messages: an FTS5 table
+# whose content is read from ``messages`` (external content), so the text is
+# not stored twice. The triggers below keep the index in step with every
+# INSERT, UPDATE and DELETE of ``messages``, the rows deleted by a cascade
+# included.
+SEARCH_TABLE = ("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(title, body, "
+                "content='messages', content_rowid='message_id')")
+# The rank of a match: bm25, a match in the title weighing twice as much as
+# one in the body. FTS5 stores it with the index.
+SEARCH_RANK = "INSERT INTO messages_fts(messages_fts, rank) VALUES('rank', 'bm25(2.0, 1.0)')"
+SEARCH_REBUILD = "INSERT INTO messages_fts(messages_fts) VALUES('rebuild')"
+SEARCH_INSERT = ('INSERT INTO messages_fts(rowid, title, body) '
+                 'VALUES(NEW.message_id, NEW.title, NEW.body)')
+# An external content index removes a row given the values it indexed
+SEARCH_DELETE = ("INSERT INTO messages_fts(messages_fts, rowid, title, body) "
+                 "VALUES('delete', OLD.message_id, OLD.title, OLD.body)")
+# (name, event, statements)
+SEARCH_TRIGGERS = (
+    ('trg_messages_insert_search', 'INSERT', (SEARCH_INSERT,)),
+    ('trg_messages_update_search', 'UPDATE OF message_id, title, body',
+     (SEARCH_DELETE, SEARCH_INSERT)),
+    ('trg_messages_delete_search', 'DELETE', (SEARCH_DELETE,)),
+)
+
+# Aggregates of the threads of messages. A thread is a message that replies
+# to no other (its root) with all its replies, their replies and so on.
+# ``thread_messages`` maps each message to the root of its thread and
+# ``thread_participants`` counts the messages of each author in a thread, so
+# the triggers below can keep ``thread_stats`` up to date on every INSERT
+# and DELETE of ``messages`` (the replies deleted by a cascade included)
+# without reading the whole thread. Only the deletion of the most recent
+# message of a thread reads the timestamps of the others. The messages are
+# never moved to another thread or author, an UPDATE of those columns is
+# not followed (see Engine.check_thread_stats).
+THREAD_TABLES = (
+    'CREATE TABLE IF NOT EXISTS thread_messages(message_id INTEGER PRIMARY KEY, '
+    'root_id INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS idx_thread_messages_root_id ON thread_messages(root_id)',
+    'CREATE TABLE IF NOT EXISTS thread_participants(root_id INTEGER, username TEXT, '
+    'messages INTEGER NOT NULL, PRIMARY KEY(root_id, username)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS thread_stats(root_id INTEGER PRIMARY KEY, '
+    'reply_count INTEGER NOT NULL, last_timestamp INTEGER, participants INTEGER NOT NULL)',
+    # The threads ordered by last activity
+    'CREATE INDEX IF NOT EXISTS idx_thread_stats_last_timestamp '
+    'ON thread_stats(last_timestamp)',
+)
+# The root of each message, walked from the messages that reply to no
+# existing message
+THREAD_TREE = ('WITH RECURSIVE tree(message_id, root_id) AS ('
+               'SELECT message_id, message_id FROM messages '
+               'WHERE reply_to IS NULL OR reply_to NOT IN (SELECT message_id FROM messages) '
+               'UNION ALL SELECT messages.message_id, tree.root_id '
+               'FROM tree JOIN messages ON messages.reply_to = tree.message_id) ')
+# The aggregates of the threads of the table {tree}, mapping the messages to
+# their root
+THREAD_AGGREGATES = ('SELECT root_id, COUNT(*) - 1, MAX(timestamp), COUNT(DISTINCT username) '
+                     'FROM {tree} JOIN messages USING(message_id) GROUP BY root_id')
+# Statements filling the empty tables of the threads
+THREAD_REBUILD = (
+    'INSERT INTO thread_messages(message_id, root_id) ' + THREAD_TREE +
+    'SELECT message_id, root_id FROM tree',
+    'INSERT INTO thread_participants(root_id, username, messages) '
+    'SELECT root_id, username, COUNT(*) FROM thread_messages JOIN messages USING(message_id) '
+    'WHERE username IS NOT NULL GROUP BY root_id, username',
+    'INSERT INTO thread_stats(root_id, reply_count, last_timestamp, participants) ' +
+    THREAD_AGGREGATES.format(tree='thread_messages'),
+)
+THREAD_ROOT = '(SELECT root_id FROM thread_messages WHERE message_id = {row}.message_id)'
+THREAD_COUNT_PARTICIPANTS = ('participants = (SELECT COUNT(*) FROM thread_participants '
+                             'WHERE thread_participants.root_id = thread_stats.root_id)')
+THREAD_INSERT = (
+    # A reply joins the thread of its parent, other messages start a thread
+    'INSERT OR REPLACE INTO thread_messages(message_id, root_id) VALUES(NEW.message_id, '
+    'IFNULL(' + THREAD_ROOT.format(row='NEW').replace('NEW.message_id', 'NEW.reply_to') +
+    ', NEW.message_id))',
+    'INSERT INTO thread_stats(root_id, reply_count, last_timestamp, participants) '
+    'SELECT root_id, 0, NEW.timestamp, 0 FROM thread_messages '
+    'WHERE message_id = NEW.message_id ON CONFLICT(root_id) DO UPDATE SET '
+    'reply_count = reply_count + 1, last_timestamp = CASE '
+    'WHEN last_timestamp >= excluded.last_timestamp THEN last_timestamp '
+    'ELSE IFNULL(excluded.last_timestamp, last_timestamp) END',
+    'INSERT INTO thread_participants(root_id, username, messages) '
+    'SELECT root_id, NEW.username, 1 FROM thread_messages '
+    'WHERE message_id = NEW.message_id AND NEW.username IS NOT NULL '
+    'ON CONFLICT(root_id, username) DO UPDATE SET messages = messages + 1',
+    'UPDATE thread_stats SET ' + THREAD_COUNT_PARTICIPANTS +
+    ' WHERE root_id = ' + THREAD_ROOT.format(row='NEW'),
+)
+THREAD_DELETE = (
+    'UPDATE thread_participants SET messages = messages - 1 '
+    'WHERE root_id = ' + THREAD_ROOT.format(row='OLD') + ' AND username = OLD.username',
+    'DELETE FROM thread_participants WHERE root_id = ' + THREAD_ROOT.format(row='OLD') +
+    ' AND username = OLD.username AND messages <= 0',
+    # The last activity is only read again if the message was the last one
+    'UPDATE thread_stats SET reply_count = reply_count - 1, ' + THREAD_COUNT_PARTICIPANTS +
+    ', last_timestamp = CASE WHEN OLD.timestamp < last_timestamp THEN last_timestamp '
+    'ELSE (SELECT MAX(messages.timestamp) FROM thread_messages JOIN messages '
+    'USING(message_id) WHERE thread_messages.root_id = thread_stats.root_id) END '
+    'WHERE root_id = ' + THREAD_ROOT.format(row='OLD'),
+    # The deletion of the root ends the thread. Its replies are deleted by
+    # the cascade, before or after it.
+    'DELETE FROM thread_stats WHERE root_id = OLD.message_id',
+    'DELETE FROM thread_participants WHERE root_id = OLD.message_id',
+    'DELETE FROM thread_messages WHERE message_id = OLD.message_id',
+)
+# (name, event, statements)
+THREAD_TRIGGERS = (
+    ('trg_messages_insert_threads', 'INSERT', THREAD_INSERT),
+    ('trg_messages_delete_threads', 'DELETE', THREAD_DELETE),
+)
+
+# Number of messages of each user (``users.msg_count``), kept by the triggers
+# below on every INSERT and DELETE of ``messages``, the messages deleted by a
+# cascade included.
+MESSAGE_COUNT_INCREMENT = ('UPDATE users SET msg_count = IFNULL(msg_count, 0) + 1 '
+                           'WHERE user_id = NEW.user_id')
+MESSAGE_COUNT_DECREMENT = ('UPDATE users SET msg_count = msg_count - 1 '
+                           'WHERE user_id = OLD.user_id')
+MESSAGE_COUNT_REBUILD = ('UPDATE users SET msg_count = (SELECT COUNT(*) FROM messages '
+                         'WHERE messages.user_id = users.user_id) '
+                         'WHERE msg_count IS NOT (SELECT COUNT(*) FROM messages '
+                         'WHERE messages.user_id = users.user_id)')
+# (name, event, statements)
+MESSAGE_COUNT_TRIGGERS = (
+    ('trg_messages_insert_msg_count', 'INSERT', (MESSAGE_COUNT_INCREMENT,)),
+    ('trg_messages_delete_msg_count', 'DELETE', (MESSAGE_COUNT_DECREMENT,)),
+    ('trg_messages_update_msg_count', 'UPDATE OF user_id',
+     (MESSAGE_COUNT_DECREMENT + ' AND OLD.user_id IS NOT NEW.user_id',
+      MESSAGE_COUNT_INCREMENT + ' AND OLD.user_id IS NOT NEW.user_id')),
+)
+
 # Copied Class from Exercise 1
 # We state if a method is copied, modified or written from scratch before it
 
@@ -37,13 +217,35 @@ class Engine(object):
     >>> engine = Engine()
     >>> con = engine.connect()
 
+    The Engine also owns a bounded pool of connections. Short lived users,
+    such as HTTP requests, should borrow a connection with :py:meth:`acquire`
+    and give it back with :py:meth:`release` instead of opening a new one.
+
+    >>> con = engine.acquire()
+    >>> engine.release(con)
+
+    Requests that only read (GET and HEAD) borrow instead a read-only
+    connection with :py:meth:`acquire_reader`, and requests that write borrow
+    the single writer connection with :py:meth:`acquire_writer`. The writer
+    is handed out to one request at a time, the others wait in the queue of
+    its pool, so writes never fail with ``database is locked``. The database is
+    switched to WAL by the writer, so readers never wait for it.
+
     :param db_path: The path of the database file (always with respect to the
         calling script. If not specified, the Engine will use the file located
         at *db/forum.db*
+    :param pool_size: maximum number of pooled connections open at once.
+    :param max_idle: maximum number of idle pooled connections kept open.
+    :param profile: tuning profile (PRAGMA names and values) applied once to
+        every connection when it is opened. If not specified
+        :py:data:`medical_forum.database_connection.DEFAULT_PROFILE` is used.
+        :py:data:`medical_forum.database_connection.TUNED_PROFILE` is the one
+        recommended for the API server.
 
     """
 
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, pool_size=DEFAULT_POOL_SIZE, max_idle=DEFAULT_MAX_IDLE,
+                 profile=None):
         """
         """
 
@@ -52,6 +254,14 @@ class Engine(object):
             self.db_path = db_path
         else:
             self.db_path = DEFAULT_DB_PATH
+        self.profile = profile
+        self.pool = ConnectionPool(self.db_path, self._pooled_connection,
+                                   max_size=pool_size, max_idle=max_idle)
+        self.reader_pool = ConnectionPool(self.db_path, self._reader_connection,
+                                          max_size=pool_size, max_idle=max_idle)
+        self.writer_pool = ConnectionPool(self.db_path, self._writer_connection,
+                                          max_size=1, max_idle=1)
+        self._wal_enabled = False
 
     def connect(self):
         """
@@ -61,14 +271,105 @@ class Engine(object):
         :rtype: Connection
 
         """
-        return Connection(self.db_path)
+        return Connection(self.db_path, profile=self.profile)
+
+    def acquire(self):
+        """
+        Borrows a connection from the pool. It must be given back with
+        :py:meth:`release` once it is not needed anymore.
+
+        :return: A Connection instance
+        :rtype: Connection
+        :raises sqlite3.OperationalError: if the pool is exhausted for too long.
+        """
+        return self.pool.acquire()
+
+    def acquire_reader(self):
+        """
+        Borrows a read-only connection. It must be given back with
+        :py:meth:`release` once it is not needed anymore.
+
+        :return: A Connection instance opened in ``mode=ro``.
+        :rtype: Connection
+        :raises sqlite3.OperationalError: if the pool is exhausted for too long.
+        """
+        return self.reader_pool.acquire()
+
+    def acquire_writer(self):
+        """
+        Borrows the writer connection, waiting in a queue while another
+        thread holds it. It must be given back with :py:meth:`release` as
+        soon as possible since it blocks the other writers.
+
+        :return: A Connection instance
+        :rtype: Connection
+        :raises sqlite3.OperationalError: if the writer is not released
+            within the wait timeout of the pool.
+        """
+        return self.writer_pool.acquire()
+
+    def release(self, connection, failed=False):
+        """
+        Gives back a connection obtained with :py:meth:`acquire`,
+        :py:meth:`acquire_reader` or :py:meth:`acquire_writer`, commiting all
+        changes.
+
+        :param connection: the Connection to give back.
+        :param bool failed: default False. True if a statement run with the
+            connection failed (see :py:meth:`ConnectionPool.release`).
+        """
+        for pool in (self.reader_pool, self.writer_pool):
+            if pool.owns(connection):
+                pool.release(connection, failed)
+                return
+        self.pool.release(connection, failed)
+
+    def pool_stats(self, pool='shared'):
+        """
+        Returns the usage counters of a connection pool (hit rate, wait
+        time...) as documented in
+        :py:meth:`medical_forum.database_pool.ConnectionPool.stats`.
+
+        :param str pool: default 'shared'. The pool of :py:meth:`acquire`
+            ('shared'), of :py:meth:`acquire_reader` ('reader') or of
+            :py:meth:`acquire_writer` ('writer').
+        :rtype: dict
+        """
+        return {'shared': self.pool, 'reader': self.reader_pool,
+                'writer': self.writer_pool}[pool].stats()
+
+    def _pooled_connection(self):
+        """Opens a connection meant to live in the pool."""
+        return Connection(self.db_path, check_same_thread=False, profile=self.profile)
+
+    def _reader_connection(self):
+        """Opens a read-only connection meant to live in the reader pool."""
+        if not self._wal_enabled:
+            # A read-only connection cannot switch the database to WAL, so
+            # the writer is opened first.
+            self.release(self.acquire_writer())
+        return Connection(self.db_path, check_same_thread=False, profile=self.profile,
+                          read_only=True)
+
+    def _writer_connection(self):
+        """Opens the writer connection, switching the database to WAL."""
+        profile = dict(DEFAULT_PROFILE if self.profile is None else self.profile)
+        profile['journal_mode'] = 'WAL'
+        connection = Connection(self.db_path, check_same_thread=False, profile=profile)
+        self._wal_enabled = True
+        return connection
 
     def remove_database(self):
         """
-        Removes the database file from the filesystem.
+        Removes the database file from the filesystem, together with its WAL
+        journal files if any. Pooled connections to the removed file are
+        closed, the ones of the other Engines of the process included.
         """
-        if os.path.exists(self.db_path):
-            os.remove(self.db_path)
+        drain_pools(self.db_path)
+        self._wal_enabled = False
+        for path in (self.db_path, self.db_path + '-wal', self.db_path + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
 
     def clear(self):
         """
@@ -89,7 +390,12 @@ class Engine(object):
 
     def create_tables(self, schema=None):
         """
-        Create programmatically the tables from a schema file.
+        Create programmatically the tables from a schema file, followed by
+        the secondary indexes (see :py:meth:`create_indexes`), the version
+        counters (see :py:meth:`create_triggers`), the full-text index of
+        the messages (see :py:meth:`create_search_index`), the aggregates
+        of the threads (see :py:meth:`create_thread_stats`) and the number
+        of messages of the users (see :py:meth:`create_message_counts`).
 
         :param schema: path to the .sql schema file. If this parmeter is
             None, then *db/forum_schema_dump.sql* is utilized.
@@ -104,10 +410,276 @@ class Engine(object):
                 cur.executescript(sql)
         finally:
             con.close()
+        self.create_indexes()
+        self.create_triggers()
+        self.create_search_index()
+        self.create_thread_stats()
+        self.create_message_counts()
+
+    def create_indexes(self):
+        """
+        Create the secondary indexes listed in :py:data:`INDEXES` that do not
+        exist yet. It is safe to call it on an existing (and populated)
+        database as many times as needed.
+
+        :return: the names of the indexes that have been created.
+        :rtype: list
+        """
+        con = sqlite3.connect(self.db_path)
+        try:
+            with con:
+                cursor = con.cursor()
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+                existing = set(row[0] for row in cursor.fetchall())
+                created = []
+                for name, table, columns in INDEXES:
+                    if name in existing:
+                        continue
+                    cursor.execute('CREATE INDEX IF NOT EXISTS %s ON %s(%s)'
+                                   % (name, table, ', '.join(columns)))
+                    created.append(name)
+        finally:
+            con.close()
+        return created
+
+    def create_triggers(self):
+        """
+        Create the table ``versions`` and the triggers that keep its version
+        counters (see :py:data:`VERSIONED_TABLES` and
+        :py:data:`USERNAMES_TRIGGERS`) up to date, if they do not exist yet.
+        Like :py:meth:`create_indexes` it is safe to call it on an existing
+        database as many times as needed.
+
+        :return: the names of the triggers that have been created.
+        :rtype: list
+        """
+        con = sqlite3.connect(self.db_path)
+        try:
+            with con:
+                cursor = con.cursor()
+                cursor.execute(VERSIONS_TABLE)
+                cursor.execute(VERSIONS_EPOCH)
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+                existing = set(row[0] for row in cursor.fetchall())
+                created = []
+                for table, versions in VERSIONED_TABLES:
+                    for operation, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'),
+                                           ('DELETE', 'OLD')):
+                        name = 'trg_%s_%s_versions' % (table, operation.lower())
+                        if name in existing:
+                            continue
+                        cursor.execute('CREATE TRIGGER IF NOT EXISTS %s AFTER %s ON %s BEGIN '
+                                       '%s; END' % (name, operation, table,
+                                                    BUMP_VERSIONS % versions.format(row=row)))
+                        created.append(name)
+                for name, event, condition in USERNAMES_TRIGGERS:
+                    if name in existing:
+                        continue
+                    cursor.execute('CREATE TRIGGER IF NOT EXISTS %s AFTER %s ON users WHEN %s '
+                                   'BEGIN %s; END' % (name, event, condition,
+                                                      BUMP_VERSIONS % "VALUES('usernames', 1)"))
+                    created.append(name)
+        finally:
+            con.close()
+        return created
+
+    def create_search_index(self):
+        """
+        Create the full-text index of the messages (``messages_fts``, see
+        :py:data:`SEARCH_TABLE`) and the triggers that keep it up to date, if
+        they do not exist yet. A new index is filled with the messages
+        already in the database, so, like :py:meth:`create_indexes`, it is
+        safe to call it on an existing database as many times as needed.
+
+        :return: the names of the table and triggers that have been created.
+        :rtype: list
+        """
+        con = sqlite3.connect(self.db_path)
+        try:
+            with con:
+                cursor = con.cursor()
+                cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+                existing = set(row[0] for row in cursor.fetchall())
+                created = []
+                if 'messages_fts' not in existing:
+                    cursor.execute(SEARCH_TABLE)
+                    cursor.execute(SEARCH_RANK)
+                    cursor.execute(SEARCH_REBUILD)
+                    created.append('messages_fts')
+                for name, event, statements in SEARCH_TRIGGERS:
+                    if name in existing:
+                        continue
+                    cursor.execute('CREATE TRIGGER IF NOT EXISTS %s AFTER %s ON messages BEGIN '
+                                   '%s; END' % (name, event, '; '.join(statements)))
+                    created.append(name)
+        finally:
+            con.close()
+        return created
+
+    def rebuild_search_index(self):
+        """
+        Rebuild the full-text index of the messages from the ``messages``
+        table. Needed when the messages have been modified without the
+        triggers of :py:meth:`create_search_index`, for instance by an older
+        version of the forum. The index is created first if it does not
+        exist.
+
+        :return: the number of messages indexed.
+        :rtype: int
+        """
+        # A new index is filled when it is created
+        rebuild = 'messages_fts' not in self.create_search_index()
+        con = sqlite3.connect(self.db_path)
+        try:
+            with con:
+                cursor = con.cursor()
+                if rebuild:
+                    cursor.execute(SEARCH_REBUILD)
+                cursor.execute('SELECT COUNT(*) FROM messages')
+                return cursor.fetchone()[0]
+        finally:
+            con.close()
+
+    def create_thread_stats(self):
+        """
+        Create the aggregates of the threads of messages (``thread_stats``,
+        see :py:data:`THREAD_TABLES`) and the triggers that keep them up to
+        date, if they do not exist yet. New tables are filled from the
+        messages already in the database, so, like :py:meth:`create_indexes`,
+        it is safe to call it on an existing database as many times as
+        needed.
+
+        :return: the names of the table and triggers that have been created.
+        :rtype: list
+        """
+        con = sqlite3.connect(self.db_path)
+        try:
+            with con:
+                cursor = con.cursor()
+                cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+                existing = set(row[0] for row in cursor.fetchall())
+                created = []
+                if 'thread_stats' not in existing:
+                    for statement in THREAD_TABLES:
+                        cursor.execute(statement)
+                    self._fill_thread_stats(cursor)
+                    created.append('thread_stats')
+                for name, event, statements in THREAD_TRIGGERS:
+                    if name in existing:
+                        continue
+                    cursor.execute('CREATE TRIGGER IF NOT EXISTS %s AFTER %s ON messages BEGIN '
+                                   '%s; END' % (name, event, '; '.join(statements)))
+                    created.append(name)
+        finally:
+            con.close()
+        return created
+
+    def check_thread_stats(self, repair=False):
+        """
+        Compute the aggregates of the threads from scratch and compare them
+        with the ones kept by the triggers of :py:meth:`create_thread_stats`.
+        They differ if the messages have been modified without the triggers,
+        for instance by an older version of the forum or with the foreign
+        keys disabled, or if a message was moved to another thread. The
+        tables are created first if they do not exist.
+
+        :param bool repair: default False. If True, and if any thread
+            differs, all the aggregates are computed again.
+        :return: the ids of the first messages of the threads whose
+            aggregates differ (or whose messages are mapped to another
+            thread), sorted.
+        :rtype: list
+        """
+        self.create_thread_stats()
+        con = sqlite3.connect(self.db_path)
+        try:
+            with con:
+                cursor = con.cursor()
+                cursor.execute(THREAD_TREE + THREAD_AGGREGATES.format(tree='tree'))
+                expected = dict((row[0], row[1:]) for row in cursor.fetchall())
+                cursor.execute('SELECT root_id, reply_count, last_timestamp, participants '
+                               'FROM thread_stats')
+                stored = dict((row[0], row[1:]) for row in cursor.fetchall())
+                wrong = set(root for root in set(expected).union(stored)
+                            if expected.get(root) != stored.get(root))
+                cursor.execute(THREAD_TREE + 'SELECT tree.root_id, thread_messages.root_id '
+                               'FROM tree LEFT JOIN thread_messages USING(message_id) '
+                               'WHERE thread_messages.root_id IS NOT tree.root_id')
+                for row in cursor.fetchall():
+                    wrong.update(root for root in row if root is not None)
+                cursor.execute('SELECT root_id FROM thread_messages WHERE message_id NOT IN '
+                               '(SELECT message_id FROM messages)')
+                wrong.update(row[0] for row in cursor.fetchall())
+                if repair and wrong:
+                    for table in ('thread_messages', 'thread_participants', 'thread_stats'):
+                        cursor.execute('DELETE FROM %s' % table)
+                    self._fill_thread_stats(cursor)
+        finally:
+            con.close()
+        return sorted(wrong)
+
+    @staticmethod
+    def _fill_thread_stats(cursor):
+        """Fills the empty tables of the aggregates of the threads"""
+        for statement in THREAD_REBUILD:
+            cursor.execute(statement)
+
+    def create_message_counts(self):
+        """
+        Create the triggers that keep the number of messages of each user
+        (``users.msg_count``, see :py:data:`MESSAGE_COUNT_TRIGGERS`) up to
+        date, if they do not exist yet. When they are created the numbers
+        are counted again from the messages already in the database, so,
+        like :py:meth:`create_indexes`, it is safe to call it on an existing
+        database as many times as needed.
+
+        :return: the names of the triggers that have been created.
+        :rtype: list
+        """
+        con = sqlite3.connect(self.db_path)
+        try:
+            with con:
+                cursor = con.cursor()
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+                existing = set(row[0] for row in cursor.fetchall())
+                created = []
+                for name, event, statements in MESSAGE_COUNT_TRIGGERS:
+                    if name in existing:
+                        continue
+                    cursor.execute('CREATE TRIGGER IF NOT EXISTS %s AFTER %s ON messages BEGIN '
+                                   '%s; END' % (name, event, '; '.join(statements)))
+                    created.append(name)
+                if created:
+                    cursor.execute(MESSAGE_COUNT_REBUILD)
+        finally:
+            con.close()
+        return created
+
+    def rebuild_message_counts(self):
+        """
+        Count again the messages of every user from the ``messages`` table
+        and fix ``users.msg_count`` where it differs. Needed when the
+        messages or the users have been modified without the triggers of
+        :py:meth:`create_message_counts`, for instance by an older version of
+        the forum or by a dump. The triggers are created first if they do not
+        exist.
+
+        :return: the number of users whose count has been fixed.
+        :rtype: int
+        """
+        self.create_message_counts()
+        con = sqlite3.connect(self.db_path)
+        try:
+            with con:
+                return con.execute(MESSAGE_COUNT_REBUILD).rowcount
+        finally:
+            con.close()
 
     def populate_tables(self, dump=None):
         """
-        Populate programmatically the tables from a dump file.
+        Populate programmatically the tables from a dump file. The numbers
+        of messages of the users in the dump are replaced by the ones counted
+        from its messages.
 
         :param dump:  path to the .sql dump file. If this parmeter is
             None, then *db/forum_data_dump.sql* is utilized.
@@ -123,6 +695,8 @@ class Engine(object):
                 sql = schema_file.read()
                 cursor = con.cursor()
                 cursor.executescript(sql)
+            with con:
+                cursor.execute(MESSAGE_COUNT_REBUILD)
         finally:
             con.close()
 
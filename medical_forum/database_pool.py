@@ -0,0 +1,326 @@
+"""
+Provides a bounded pool of reusable database connections so that the API
+does not open and close a sqlite3 connection on every HTTP request.
+"""
+
+import collections
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_MAX_IDLE = 4
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_WAIT_TIMEOUT = 10
+DEFAULT_CHECK_AFTER = 1
+
+# Every pool of the process, so that the pools of a database file removed
+# by any Engine can be drained (see drain_pools)
+_POOLS = weakref.WeakSet()
+_POOLS_LOCK = threading.Lock()
+
+
+def _file_identity(db_path):
+    """
+    Returns a tuple identifying the database file on disk, or None when the
+    file does not exist (or the database lives in memory).
+
+    Two different identities for the same path mean that the file has been
+    removed or replaced since the connection was opened.
+    """
+    try:
+        stat = os.stat(db_path)
+    except (OSError, TypeError):
+        return None
+    return (stat.st_dev, stat.st_ino)
+
+
+def drain_pools(db_path):
+    """
+    Drains every pool of the process opened on a database file. Called when
+    the file is removed: the idle connections released less than
+    ``check_after`` seconds ago are handed out without looking at the file,
+    so they would keep reading the removed one.
+
+    :param str db_path: Location of the database file.
+    """
+    db_path = os.path.abspath(db_path)
+    with _POOLS_LOCK:
+        pools = [pool for pool in _POOLS if os.path.abspath(pool.db_path) == db_path]
+    for pool in pools:
+        pool.drain()
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of :py:class:`medical_forum.database_connection.Connection`
+    instances.
+
+    A connection is checked out by one thread with :py:meth:`acquire` and
+    handed back with :py:meth:`release`. At most ``max_size`` connections are
+    open at the same time; when all of them are checked out :py:meth:`acquire`
+    waits up to ``wait_timeout`` seconds for one to be released. Released
+    connections are kept idle (up to ``max_idle`` of them). The ones that
+    have been idle for more than ``check_after`` seconds, or whose last user
+    got a database error, are health checked before being handed out again.
+
+    The threads waiting in :py:meth:`acquire` queue up: a released connection
+    (or a free slot) goes to the thread that has been waiting the longest,
+    and a thread arriving meanwhile waits behind it. A pool of size one
+    therefore serializes its users in arrival order, as the writer connection
+    of the Engine does.
+
+    An instance of this class should not be instantiated directly. The pool is
+    owned by :py:class:`medical_forum.database_engine.Engine`.
+
+    :param str db_path: Location of the database file.
+    :param factory: callable without arguments returning a new
+        :py:class:`Connection`.
+    :param int max_size: maximum number of open connections.
+    :param int max_idle: maximum number of idle connections kept open.
+    :param float idle_timeout: idle connections older than this (in seconds)
+        are closed instead of being reused.
+    :param float wait_timeout: maximum time (in seconds) :py:meth:`acquire`
+        waits for a free connection.
+    :param float check_after: idle connections younger than this (in
+        seconds) are handed out without the health check.
+    """
+
+    def __init__(self, db_path, factory, max_size=DEFAULT_POOL_SIZE,
+                 max_idle=DEFAULT_MAX_IDLE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 wait_timeout=DEFAULT_WAIT_TIMEOUT, check_after=DEFAULT_CHECK_AFTER):
+        super(ConnectionPool, self).__init__()
+        if max_size < 1:
+            raise ValueError("The pool needs room for at least one connection")
+        self.db_path = db_path
+        self.max_size = max_size
+        self.max_idle = min(max_idle, max_size)
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.check_after = check_after
+        self._factory = factory
+        self._lock = threading.Lock()
+        # Idle connections as (connection, file identity, generation, released at,
+        # suspect), suspect being True if the last user got a database error
+        self._idle = []
+        # Checked out connections: id(connection) -> (file identity, generation, thread)
+        self._in_use = {}
+        self._size = 0
+        # Threads waiting in acquire for a connection to be released, in
+        # arrival order. Each one waits on its own condition.
+        self._waiters = collections.deque()
+        self._generation = 0
+        self._counters = {'checkouts': 0, 'hits': 0, 'misses': 0,
+                          'discarded': 0, 'timeouts': 0,
+                          'wait_total': 0.0, 'wait_max': 0.0}
+        with _POOLS_LOCK:
+            _POOLS.add(self)
+
+    def acquire(self):
+        """
+        Checks out a connection for the calling thread.
+
+        An idle connection is reused if it passes the health check, otherwise a
+        new one is opened.
+
+        :return: A Connection instance
+        :rtype: Connection
+        :raises sqlite3.OperationalError: if no connection is released within
+            ``wait_timeout`` seconds.
+        """
+        start = time.perf_counter()
+        deadline = start + self.wait_timeout
+        while True:
+            candidate = None
+            with self._lock:
+                if self._waiters or not self._available():
+                    self._wait_turn(deadline)
+                if self._idle:
+                    candidate = self._idle.pop()
+                else:
+                    self._size += 1
+                    generation = self._generation
+
+            if candidate is None:
+                connection = self._open()
+                identity = _file_identity(self.db_path)
+                hit = False
+                break
+            connection, identity, generation, released_at, suspect = candidate
+            if self._is_healthy(connection, identity, generation, released_at, suspect):
+                hit = True
+                break
+            self._discard(connection)
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._in_use[id(connection)] = (identity, generation, threading.get_ident())
+            counters = self._counters
+            counters['checkouts'] += 1
+            counters['hits' if hit else 'misses'] += 1
+            counters['wait_total'] += waited
+            counters['wait_max'] = max(counters['wait_max'], waited)
+        return connection
+
+    def release(self, connection, failed=False):
+        """
+        Hands a connection back to the pool, commiting any pending change.
+
+        The connection is closed instead of kept idle if it is broken, if the
+        pool already holds ``max_idle`` idle connections or if the pool was
+        drained while the connection was checked out.
+
+        :param connection: a Connection obtained from :py:meth:`acquire`.
+        :param bool failed: default False. True if a statement run with the
+            connection failed, so that it is health checked before being
+            handed out again.
+        """
+        with self._lock:
+            checkout = self._in_use.pop(id(connection), None)
+        if checkout is None:
+            # Not ours, just close it as a plain connection would be.
+            connection.close()
+            return
+        identity, generation = checkout[0], checkout[1]
+
+        if not connection.isclosed():
+            try:
+                connection.con.commit()
+            except sqlite3.Error as excp:
+                print("Error %s:" % excp.args[0])
+                connection.close()
+
+        with self._lock:
+            keep = (not connection.isclosed() and
+                    generation == self._generation and
+                    len(self._idle) < self.max_idle)
+            if keep:
+                self._idle.append((connection, identity, generation, time.monotonic(),
+                                   failed))
+                self._notify_waiter()
+                return
+        self._discard(connection)
+
+    def drain(self):
+        """
+        Closes every idle connection. Connections currently checked out are
+        closed when they are released instead of being kept idle.
+        """
+        with self._lock:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+        for connection, _, _, _, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool usage counters.
+
+        :return: a dictionary with the keys ``size`` (open connections),
+            ``idle``, ``in_use``, ``checkouts``, ``hits`` (checkouts served by
+            an idle connection), ``misses`` (checkouts that opened a new
+            connection), ``hit_rate``, ``discarded``, ``timeouts``,
+            ``wait_total``, ``wait_avg`` and ``wait_max`` (seconds spent
+            waiting inside :py:meth:`acquire`) and ``waiting`` (threads
+            waiting inside :py:meth:`acquire` right now).
+        :rtype: dict
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = len(self._in_use)
+            stats['waiting'] = len(self._waiters)
+        checkouts = stats['checkouts']
+        stats['hit_rate'] = stats['hits'] / checkouts if checkouts else 0.0
+        stats['wait_avg'] = stats['wait_total'] / checkouts if checkouts else 0.0
+        return stats
+
+    def owns(self, connection):
+        """
+        :return: ``True`` if the connection was checked out from this pool and
+            has not been released yet.
+        """
+        with self._lock:
+            return id(connection) in self._in_use
+
+    def _available(self):
+        """True if there is an idle connection or room for a new one."""
+        return bool(self._idle) or self._size < self.max_size
+
+    def _wait_turn(self, deadline):
+        """
+        Queues the calling thread behind the threads already waiting, until
+        it is the first one and a connection is available. Called with the
+        lock of the pool held.
+
+        :raises sqlite3.OperationalError: if the deadline passes first.
+        """
+        waiter = threading.Condition(self._lock)
+        self._waiters.append(waiter)
+        try:
+            while self._waiters[0] is not waiter or not self._available():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise sqlite3.OperationalError(
+                        "Timed out waiting for a database connection")
+                waiter.wait(remaining)
+        finally:
+            self._waiters.remove(waiter)
+            # The next thread in the queue may be served as well
+            self._notify_waiter()
+
+    def _notify_waiter(self):
+        """Wakes up the first waiting thread, if any. Called with the lock held."""
+        if self._waiters and self._available():
+            self._waiters[0].notify()
+
+    def _open(self):
+        """Open a new connection, giving back the reserved slot on failure."""
+        try:
+            return self._factory()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._notify_waiter()
+            raise
+
+    def _discard(self, connection):
+        """Close a connection and free its slot in the pool."""
+        try:
+            connection.close()
+        except sqlite3.Error as excp:
+            print("Error %s:" % excp.args[0])
+        with self._lock:
+            self._size -= 1
+            self._counters['discarded'] += 1
+            self._notify_waiter()
+
+    def _is_healthy(self, connection, identity, generation, released_at, suspect):
+        """
+        Health check run on an idle connection before handing it out.
+
+        :return: ``False`` if the connection is closed, has been idle for too
+            long or belongs to a drained generation. If it has been idle for
+            more than ``check_after`` seconds or is suspect, also ``False`` if
+            it points to a database file that was removed or replaced, or
+            cannot run a trivial query.
+        """
+        if connection.isclosed() or generation != self._generation:
+            return False
+        idle = time.monotonic() - released_at
+        if idle > self.idle_timeout:
+            return False
+        if idle <= self.check_after and not suspect:
+            # Released a moment ago by a user that got no error
+            return True
+        if identity != _file_identity(self.db_path):
+            return False
+        try:
+            connection.con.execute('SELECT 1').fetchone()
+        except sqlite3.Error:
+            return False
+        return True
@@ -0,0 +1,131 @@
+"""
+Builder of the parameterized SELECT statements of the Connection.
+
+Every value of a statement (filters, keyset and LIMIT) is bound as a
+parameter, never written into the SQL text. The text of a statement only
+depends on which filters are used, so each method emits a small fixed set
+of statement shapes, and sqlite3 reuses the prepared statement of a shape
+from its statement cache instead of compiling the SQL on every call.
+"""
+
+import functools
+
+
+class Select(object):
+    """
+    A SELECT statement whose WHERE conditions are joined with AND.
+
+    Example::
+
+        query = Select('*', 'messages')
+        if username is not None:
+            query.where('username = ?', username)
+        query.order_by('timestamp DESC').limit(10)
+        cursor = query.execute(con)
+
+    :param str columns: the column list of the statement.
+    :param str tables: the FROM clause of the statement.
+    """
+
+    def __init__(self, columns, tables):
+        super(Select, self).__init__()
+        self.columns = columns
+        self.tables = tables
+        self.conditions = []
+        self.params = []
+        self.ordering = None
+        self.max_rows = None
+
+    def where(self, condition, *params):
+        """
+        Adds a condition to the statement.
+
+        :param str condition: SQL condition with one ``?`` per parameter.
+        :param params: values bound to the ``?`` of the condition.
+        :return: the statement itself, so calls can be chained.
+        """
+        self.conditions.append(condition)
+        self.params.extend(params)
+        return self
+
+    def order_by(self, ordering):
+        """
+        Sets the ORDER BY clause of the statement.
+
+        :param str ordering: the terms of the clause.
+        :return: the statement itself, so calls can be chained.
+        """
+        self.ordering = ordering
+        return self
+
+    def limit(self, number):
+        """
+        Sets the maximum number of rows returned by the statement.
+
+        :param int number: number of rows. -1 means no limit, and it is also
+            bound as a parameter so that limited and unlimited calls share
+            the same statement.
+        :return: the statement itself, so calls can be chained.
+        """
+        self.max_rows = number
+        return self
+
+    def sql(self):
+        """
+        :return: the SQL text of the statement.
+        """
+        query = 'SELECT %s FROM %s' % (self.columns, self.tables)
+        if self.conditions:
+            query += ' WHERE ' + ' AND '.join(self.conditions)
+        if self.ordering is not None:
+            query += ' ORDER BY ' + self.ordering
+        if self.max_rows is not None:
+            query += ' LIMIT ?'
+        return query
+
+    def parameters(self):
+        """
+        :return: the values bound to the statement, in order.
+        """
+        if self.max_rows is not None:
+            return tuple(self.params) + (self.max_rows,)
+        return tuple(self.params)
+
+    def execute(self, con):
+        """
+        Executes the statement.
+
+        :param con: the sqlite3 connection.
+        :type con: sqlite3.Connection
+        :return: the cursor of the executed statement.
+        :rtype: sqlite3.Cursor
+        """
+        cursor = con.cursor()
+        cursor.execute(self.sql(), self.parameters())
+        return cursor
+
+
+@functools.lru_cache(maxsize=256)
+def projection(columns, wanted=None):
+    """
+    Creates the column list of a statement that only reads some of the
+    columns of its tables. The other columns are selected as NULL under
+    their own name, so the rows keep all their keys and the helpers building
+    dictionaries from them work unchanged.
+
+    Example::
+
+        projection(('message_id', 'title', 'body'), frozenset(['title']))
+        # 'NULL AS message_id, title, NULL AS body'
+
+    :param tuple columns: all the columns of the tables, qualified by their
+        table if needed (``users.user_id``).
+    :param frozenset wanted: names of the columns to read, without table. If
+        None, all the columns are read.
+    :rtype: str
+    """
+    terms = []
+    for column in columns:
+        name = column.rsplit('.', 1)[-1]
+        terms.append(column if wanted is None or name in wanted else 'NULL AS ' + name)
+    return ', '.join(terms)
@@ -2,14 +2,30 @@
 Diagnosis and Diagnoses resource API implementation
 """
 
-import json
 from flask import request, Response, g
-from flask_restful import Resource, abort
+from flask_restful import Resource
 from .resources import API, hyper_const
+from . import conditional
+from . import fields
 from . import forum_object as forum_obj
+from . import pagination
+from . import resource_ids
+from . import response_cache
+from . import serializer
+from . import streaming
+from . import url_templates
 from .error_handlers import create_error_response
 from . import user_resources as user_res
 
+# Attributes that can be selected with the fields query parameter, and the
+# columns of the diagnosis table they are read from
+DIAGNOSIS_ITEM_FIELDS = fields.Fieldset({"disease": ("disease",)}, identifiers=("id",),
+                                        required=("diagnosis_id",))
+DIAGNOSIS_FIELDS = fields.Fieldset(
+    {"disease": ("disease",), "diagnosis_description": ("diagnosis_description",),
+     "user_id": ("user_id",), "message_id": ("message_id",)},
+    required=("user_id", "message_id"))
+
 
 class Diagnoses(Resource):
     """
@@ -18,10 +34,14 @@ class Diagnoses(Resource):
 
     def get(self):
         """
-        Get all diagnoses.
+        Get one page of diagnoses.
 
         INPUT parameters:
-          None
+         * limit: maximum number of diagnoses in the page (capped by the server)
+         * after: cursor of the next page, taken from the "next" control
+         * before: cursor of the previous page, taken from the "prev" control
+         * fields: attributes of the items to send, separated by commas
+           (disease). The id and the controls are always sent.
 
         RESPONSE ENTITY BODY:
         * Media type: Mason
@@ -36,7 +56,26 @@ class Diagnoses(Resource):
          * The attribute user_id is obtained from the column diagnoses.user_id
         """
 
-        diagnoses_db = g.con.get_diagnoses()
+        try:
+            page_args = pagination.parse_page_args(request.args, 1)
+            selection = DIAGNOSIS_ITEM_FIELDS.parse(request.args)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters",
+                                         "Check the limit, the page cursor and the fields")
+
+        etag = conditional.entity_tag(conditional.DIAGNOSES_VERSION)
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+        response = response_cache.cached_response(etag)
+        if response is not None:
+            return response
+
+        diagnoses_db = g.con.iter_diagnoses(number_of_diagnoses=page_args.limit + 1,
+                                            start_after=page_args.after,
+                                            end_before=page_args.before,
+                                            columns=DIAGNOSIS_ITEM_FIELDS.columns(selection))
+        page = pagination.Page(diagnoses_db, page_args, pagination.diagnosis_key)
 
         envelope = forum_obj.ForumObject()
         envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
@@ -44,19 +83,13 @@ class Diagnoses(Resource):
         envelope.add_control("self", href=API.url_for(Diagnoses))
         envelope.add_control_users_all()
         envelope.add_control_add_diagnosis()
-        items = envelope["items"] = []
-
-        for dgs in diagnoses_db:
-            item = forum_obj.ForumObject(
-                id=dgs["diagnosis_id"], disease=dgs["disease"])
-            item.add_control("self", href=API.url_for(
-                Diagnosis, diagnosis_id=dgs["diagnosis_id"]))
-            item.add_control(
-                "profile", href=hyper_const.FORUM_DIAGNOSIS_PROFILE)
-            items.append(item)
+        envelope.add_control_page(Diagnoses, page, fields=request.args.get("fields"))
+        # The items are created while the response body is written
+        items = _diagnosis_items(page.items, selection)
 
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
-                        hyper_const.FORUM_DIAGNOSIS_PROFILE)
+        return response_cache.cache_response(conditional.set_etag(streaming.streamed_response(
+            envelope, items, hyper_const.MASON + ";" + hyper_const.FORUM_DIAGNOSIS_PROFILE), etag),
+                                             etag)
 
     def post(self):
         """
@@ -84,6 +117,12 @@ class Diagnoses(Resource):
          * Returns 415 if the format of the response is not json
          * Returns 500 if the diagnosis could not be added to database.
 
+        BATCH:
+        The body can also be an array of new diagnoses. They are all added in
+        a single transaction, or none of them is. The response is 201 and its
+        body is a Mason document whose items link the new diagnoses, in the
+        same order as the array.
+
         """
 
         # Extract the request body. In general would be request.data
@@ -97,6 +136,8 @@ class Diagnoses(Resource):
             return create_error_response(
                 415, "UnsupportedMediaType", "Use a JSON compatible format")
         request_body = request.get_json(force=True)
+        if isinstance(request_body, list):
+            return _post_diagnoses_batch(request_body)
 
         try:
             disease = request_body["disease"]
@@ -110,7 +151,7 @@ class Diagnoses(Resource):
                 "Be sure you include diagnosis and disease and a valid user_id")
 
         user_id = int(user_id)
-        message_id = 'msg-' + message_id
+        message_id = resource_ids.format_message_id(message_id)
         diagnosis = {'user_id': user_id,
                      'message_id': message_id,
                      'disease': disease,
@@ -124,6 +165,7 @@ class Diagnoses(Resource):
         if not new_diagnosis_id:
             return create_error_response(
                 500, "Problem with the database", "Cannot access the database")
+        response_cache.invalidate(API.url_for(Diagnoses))
 
         url = API.url_for(Diagnosis, diagnosis_id=new_diagnosis_id)
         return Response(status=201, headers={"Location": url})
@@ -136,10 +178,14 @@ class DiagnosesHistory(Resource):
 
     def get(self, user_id=None):
         """
-        Get all diagnoses.
+        Get one page of diagnoses.
 
         INPUT parameters:
-          None
+         * limit: maximum number of diagnoses in the page (capped by the server)
+         * after: cursor of the next page, taken from the "next" control
+         * before: cursor of the previous page, taken from the "prev" control
+         * fields: attributes of the items to send, separated by commas
+           (disease). The id and the controls are always sent.
 
         RESPONSE ENTITY BODY:
         * Media type: Mason
@@ -154,26 +200,37 @@ class DiagnosesHistory(Resource):
          * The attribute user_id is obtained from the column diagnoses.user_id
         """
 
-        diagnoses_db = g.con.get_diagnoses(user_id=user_id)
+        try:
+            page_args = pagination.parse_page_args(request.args, 1)
+            selection = DIAGNOSIS_ITEM_FIELDS.parse(request.args)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters",
+                                         "Check the limit, the page cursor and the fields")
+
+        etag = conditional.entity_tag(conditional.DIAGNOSES_VERSION)
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+
+        diagnoses_db = g.con.iter_diagnoses(user_id=user_id,
+                                            number_of_diagnoses=page_args.limit + 1,
+                                            start_after=page_args.after,
+                                            end_before=page_args.before,
+                                            columns=DIAGNOSIS_ITEM_FIELDS.columns(selection))
+        page = pagination.Page(diagnoses_db, page_args, pagination.diagnosis_key)
         envelope = forum_obj.ForumObject()
         envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
 
         envelope.add_control("self", href=API.url_for(Diagnoses))
         envelope.add_control_users_all()
         envelope.add_control_add_diagnosis()
-        items = envelope["items"] = []
-
-        for dgs in diagnoses_db:
-            item = forum_obj.ForumObject(
-                id=dgs["diagnosis_id"], disease=dgs["disease"])
-            item.add_control("self", href=API.url_for(
-                Diagnosis, diagnosis_id=dgs["diagnosis_id"]))
-            item.add_control(
-                "profile", href=hyper_const.FORUM_DIAGNOSIS_PROFILE)
-            items.append(item)
+        envelope.add_control_page(DiagnosesHistory, page, user_id=user_id,
+                                  fields=request.args.get("fields"))
+        # The items are created while the response body is written
+        items = _diagnosis_items(page.items, selection)
 
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
-                        hyper_const.FORUM_DIAGNOSIS_PROFILE)
+        return conditional.set_etag(streaming.streamed_response(
+            envelope, items, hyper_const.MASON + ";" + hyper_const.FORUM_DIAGNOSIS_PROFILE), etag)
 
 
 class DiagnosesHistoryMessage(Resource):
@@ -183,10 +240,14 @@ class DiagnosesHistoryMessage(Resource):
 
     def get(self, message_id=None):
         """
-        Get all diagnoses.
+        Get one page of diagnoses.
 
         INPUT parameters:
-          None
+         * limit: maximum number of diagnoses in the page (capped by the server)
+         * after: cursor of the next page, taken from the "next" control
+         * before: cursor of the previous page, taken from the "prev" control
+         * fields: attributes of the items to send, separated by commas
+           (disease). The id and the controls are always sent.
 
         RESPONSE ENTITY BODY:
         * Media type: Mason
@@ -201,26 +262,37 @@ class DiagnosesHistoryMessage(Resource):
          * The attribute user_id is obtained from the column diagnoses.user_id
         """
 
-        diagnoses_db = g.con.get_diagnoses(message_id=message_id)
+        try:
+            page_args = pagination.parse_page_args(request.args, 1)
+            selection = DIAGNOSIS_ITEM_FIELDS.parse(request.args)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters",
+                                         "Check the limit, the page cursor and the fields")
+
+        etag = conditional.entity_tag(conditional.DIAGNOSES_VERSION)
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+
+        diagnoses_db = g.con.iter_diagnoses(message_id=message_id,
+                                            number_of_diagnoses=page_args.limit + 1,
+                                            start_after=page_args.after,
+                                            end_before=page_args.before,
+                                            columns=DIAGNOSIS_ITEM_FIELDS.columns(selection))
+        page = pagination.Page(diagnoses_db, page_args, pagination.diagnosis_key)
         envelope = forum_obj.ForumObject()
         envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
 
         envelope.add_control("self", href=API.url_for(Diagnoses))
         envelope.add_control_users_all()
         envelope.add_control_add_diagnosis()
-        items = envelope["items"] = []
+        envelope.add_control_page(DiagnosesHistoryMessage, page, message_id=message_id,
+                                  fields=request.args.get("fields"))
+        # The items are created while the response body is written
+        items = _diagnosis_items(page.items, selection)
 
-        for dgs in diagnoses_db:
-            item = forum_obj.ForumObject(
-                id=dgs["diagnosis_id"], disease=dgs["disease"])
-            item.add_control("self", href=API.url_for(
-                Diagnosis, diagnosis_id=dgs["diagnosis_id"]))
-            item.add_control(
-                "profile", href=hyper_const.FORUM_DIAGNOSIS_PROFILE)
-            items.append(item)
-
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
-                        hyper_const.FORUM_DIAGNOSIS_PROFILE)
+        return conditional.set_etag(streaming.streamed_response(
+            envelope, items, hyper_const.MASON + ";" + hyper_const.FORUM_DIAGNOSIS_PROFILE), etag)
 
 
 class Diagnosis(Resource):
@@ -250,8 +322,14 @@ class Diagnosis(Resource):
             Semantic descriptors used: diagnosis, disease
             return None.
 
+        INPUT parameters:
+         * fields: attributes to send, separated by commas (disease,
+           diagnosis_description, user_id, message_id). The controls are
+           always sent.
+
         RESPONSE STATUS CODE
          * Return status code 200 if everything OK.
+         * Return status code 400 if the fields are not valid.
          * Return status code 404 if the diagnosis was not found in the database.
 
         NOTE:
@@ -261,12 +339,21 @@ class Diagnosis(Resource):
          * The attribute user_id is obtained from the column diagnoses.user_id
         """
 
-        diagnosis_db = g.con.get_diagnosis(diagnosis_id)
+        try:
+            selection = DIAGNOSIS_FIELDS.parse(request.args)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters", "Check the fields")
+
+        etag = conditional.entity_tag(conditional.diagnosis_version(diagnosis_id))
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+
+        diagnosis_db = g.con.get_diagnosis(diagnosis_id,
+                                           columns=DIAGNOSIS_FIELDS.columns(selection))
         if not diagnosis_db:
-            abort(404, diagnosis="There is no a diagnosis with id %s" % diagnosis_id,
-                  resource_type="Diagnosis",
-                  resource_url=request.path,
-                  resource_id=diagnosis_id)
+            return create_error_response(404, "Diagnosis not found",
+                                         "There is no a diagnosis with id %s" % diagnosis_id)
 
         user_id = diagnosis_db.get("user_id")
         message_id = diagnosis_db.get("message_id")
@@ -277,6 +364,7 @@ class Diagnosis(Resource):
             user_id=user_id,
             message_id=message_id
         )
+        DIAGNOSIS_FIELDS.trim(envelope, selection)
 
         envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
         envelope.add_namespace("atom-thread", hyper_const.ATOM_THREAD_PROFILE)
@@ -291,8 +379,9 @@ class Diagnosis(Resource):
             "user_id", href=API.url_for(user_res.User, username=user_id))
 
         envelope.add_control("atom-thread:in-reply-to", href=None)
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
-                        hyper_const.FORUM_DIAGNOSIS_PROFILE)
+        return conditional.set_etag(
+            Response(serializer.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
+                     hyper_const.FORUM_DIAGNOSIS_PROFILE), etag)
 
     def put(self, diagnosis_id):
         """
@@ -321,3 +410,65 @@ class Diagnosis(Resource):
                     500, "Internal error", "Diagnosis information for %s cannot be updated"
                     % diagnosis_id)
             return "", 204
+
+
+def _post_diagnoses_batch(request_body):
+    """
+    Adds the diagnoses of a batch POST to Diagnoses in a single transaction.
+
+    : param list request_body: the new diagnoses, each one with the format of
+        a single POST.
+    : return: a 201 response whose items link the new diagnoses, in order.
+    """
+
+    try:
+        diagnoses = [{'user_id': int(diagnosis["user_id"]),
+                      'message_id': resource_ids.format_message_id(diagnosis["message_id"]),
+                      'disease': diagnosis["disease"],
+                      'diagnosis_description': diagnosis["diagnosis_description"]}
+                     for diagnosis in request_body]
+    except (KeyError, TypeError, ValueError):
+        return create_error_response(
+            400, "Wrong request format",
+            "Be sure you include diagnosis and disease and a valid user_id in every diagnosis")
+    if not diagnoses:
+        return create_error_response(400, "Wrong request format",
+                                     "The array of diagnoses is empty")
+    try:
+        new_diagnosis_ids = g.con.create_diagnoses_bulk(diagnoses)
+    except ValueError:
+        return create_error_response(
+            400, "Request by non-doctor user", "Only doctors can add a diagnosis")
+    if new_diagnosis_ids is None:
+        return create_error_response(
+            400, "Wrong request format", "Be sure every user and message exists")
+    response_cache.invalidate(API.url_for(Diagnoses))
+
+    envelope = forum_obj.ForumObject()
+    envelope["items"] = []
+    template = url_templates.url_template(Diagnosis, "diagnosis_id")
+    for diagnosis_id in new_diagnosis_ids:
+        item = forum_obj.ForumObject(id=diagnosis_id)
+        item.add_control("self", href=template.expand(diagnosis_id))
+        envelope["items"].append(item)
+    return Response(serializer.dumps(envelope), 201, mimetype=hyper_const.MASON + ";" +
+                    hyper_const.FORUM_DIAGNOSIS_PROFILE)
+
+
+def _diagnosis_items(diagnoses, selection=None):
+    """
+    Generator of the items of a collection of diagnoses.
+
+    :param diagnoses: iterable of diagnoses, as returned by
+        :py:meth:`Connection.get_diagnoses`.
+    :param frozenset selection: attributes selected with the fields query
+        parameter (see :py:data:`DIAGNOSIS_ITEM_FIELDS`), or None for all.
+    """
+    template = url_templates.url_template(Diagnosis, "diagnosis_id")
+    for dgs in diagnoses:
+        item = forum_obj.ForumObject(
+            id=dgs["diagnosis_id"], disease=dgs["disease"])
+        item.add_control("self", href=template.expand(dgs["diagnosis_id"]))
+        item.add_control(
+            "profile", href=hyper_const.FORUM_DIAGNOSIS_PROFILE)
+        yield DIAGNOSIS_ITEM_FIELDS.trim(item, selection)
@@ -2,10 +2,10 @@
 Error handling methods for the medical forum request
 """
 
-import json
 from flask import request, Response, _request_ctx_stack
 from .mason_object import MasonObject
 from . import hypermedia_formats as hyper_const
+from . import serializer
 from .api import APP
 
 
@@ -28,7 +28,7 @@ def create_error_response(status_code, title, message=None):
     envelope = MasonObject(resource_url=resource_url)
     envelope.add_error(title, message)
 
-    return Response(json.dumps(envelope), status_code, mimetype=hyper_const.MASON + ";" +
+    return Response(serializer.dumps(envelope), status_code, mimetype=hyper_const.MASON + ";" +
                     hyper_const.ERROR_PROFILE)
 
 
@@ -0,0 +1,98 @@
+"""
+Sparse fieldsets: the ``?fields=`` query parameter of the resources.
+
+A client that only needs some attributes of a representation lists them,
+separated by commas, for instance ``?fields=headline`` on the messages
+collection. The attributes that can be selected are the ones of the
+whitelist of the resource, a :py:class:`Fieldset`, which also knows the
+database columns each attribute is read from. The resource reads only the
+columns of the selected attributes (see the ``columns`` argument of the
+``Connection`` methods), so a large column like ``messages.body`` is not read
+from the database file when it is not requested, and the attributes that
+were not selected are removed from the representation.
+
+The identifier of the representation, its ``@controls`` and its
+``@namespaces`` are always sent.
+
+Usage in a resource::
+
+    try:
+        selection = MESSAGE_FIELDS.parse(request.args)
+    except ValueError:
+        return create_error_response(400, ...)
+    message = g.con.get_message(message_id, columns=MESSAGE_FIELDS.columns(selection))
+    ...
+    MESSAGE_FIELDS.trim(envelope, selection)
+"""
+
+# Keys of the Mason objects that are never removed
+MASON_KEYS = ('@controls', '@namespaces')
+
+
+class Fieldset(object):
+    """
+    The whitelist of the attributes of a representation.
+
+    :param dict fields: attributes that can be selected, mapped to the
+        tuple of the columns they are read from.
+    :param tuple identifiers: attributes that are always sent.
+    :param tuple required: columns always read, for instance those needed
+        to build the controls.
+    """
+
+    def __init__(self, fields, identifiers=(), required=()):
+        super(Fieldset, self).__init__()
+        self.fields = dict(fields)
+        self.identifiers = frozenset(identifiers)
+        self.required = frozenset(required)
+        self._all_columns = frozenset(column for columns in self.fields.values()
+                                      for column in columns).union(self.required)
+
+    def parse(self, args):
+        """
+        Extracts the attributes selected by the ``fields`` query parameter.
+
+        :param args: the query parameters (``request.args``).
+        :return: the names of the selected attributes, or None if the
+            parameter is not given (all the attributes are sent).
+        :rtype: frozenset
+        :raises ValueError: if an attribute is not in the whitelist.
+        """
+        value = args.get('fields')
+        if value is None:
+            return None
+        selection = frozenset(name.strip() for name in value.split(',') if name.strip())
+        unknown = selection.difference(self.fields, self.identifiers)
+        if unknown:
+            raise ValueError("Unknown fields: %s" % ', '.join(sorted(unknown)))
+        return selection
+
+    def columns(self, selection):
+        """
+        :param frozenset selection: the selected attributes, as returned by
+            :py:meth:`parse`, or None for all of them.
+        :return: the names of the columns to read.
+        :rtype: frozenset
+        """
+        if selection is None:
+            return self._all_columns
+        columns = set(self.required)
+        for name in selection:
+            columns.update(self.fields.get(name, ()))
+        return frozenset(columns)
+
+    def trim(self, representation, selection):
+        """
+        Removes the attributes that were not selected from a representation.
+
+        :param dict representation: the Mason object of the representation.
+        :param frozenset selection: the selected attributes, as returned by
+            :py:meth:`parse`, or None for all of them.
+        :return: the same representation.
+        """
+        if selection is not None:
+            for name in list(representation):
+                if name not in selection and name not in self.identifiers \
+                        and name not in MASON_KEYS:
+                    del representation[name]
+        return representation
@@ -9,6 +9,7 @@ from . import user_resources as user_res
 from . import profile_resources as profile_res
 from . import message_resources as message_res
 from . import diagnosis_resources as diagnosis_res
+from . import controls
 
 
 class ForumObject(MasonObject):
@@ -22,6 +23,10 @@ class ForumObject(MasonObject):
 
     In the medical_forum code this object should always be used for root document as
     well as any items in a collection type resource.
+
+    The controls and schemas that do not depend on the request are taken from
+    the :py:mod:`medical_forum.controls` registry and shared between the
+    objects, so they must not be modified.
     """
 
     def __init__(self, **kwargs):
@@ -39,10 +44,17 @@ class ForumObject(MasonObject):
         Adds the message-all link to an object. Intended for the document object.
         """
 
-        self["@controls"]["medical_forum:messages-all"] = {
-            "href": API.url_for(message_res.Messages),
-            "title": "All messages"
-        }
+        self["@controls"]["medical_forum:messages-all"] = controls.registry().controls[
+            "medical_forum:messages-all"]
+
+    def add_control_search_messages(self):
+        """
+        Adds the search-messages control to an object, a href template with
+        the words to search. Intended for the document object.
+        """
+
+        self["@controls"]["medical_forum:search-messages"] = controls.registry().controls[
+            "medical_forum:search-messages"]
 
     # Copied from add_control_users_all
     def add_control_users_all(self):
@@ -50,20 +62,39 @@ class ForumObject(MasonObject):
         This adds the users-all link to an object. Intended for the document object.
         """
 
-        self["@controls"]["medical_forum:users-all"] = {
-            "href": API.url_for(user_res.Users),
-            "title": "List users"
-        }
+        self["@controls"]["medical_forum:users-all"] = controls.registry().controls[
+            "medical_forum:users-all"]
 
     def add_control_diagnoses_all(self):
         """
         Adds the diagnosis-all link to an object. Intended for the document object.
         """
 
-        self["@controls"]["medical_forum:diagnoses-all"] = {
-            "href": API.url_for(diagnosis_res.Diagnoses),
-            "title": "All diagnoses"
-        }
+        self["@controls"]["medical_forum:diagnoses-all"] = controls.registry().controls[
+            "medical_forum:diagnoses-all"]
+
+    def add_control_page(self, resource, page, **values):
+        """
+        Adds the next and prev controls of a page of a collection. They are
+        only added if there is a following (or preceding) page.
+
+        : param resource: the collection resource class
+        : param page: the :py:class:`medical_forum.pagination.Page` rendered
+        : param values: any other value needed to build the url of the resource
+        """
+
+        if page.next_cursor is not None:
+            self["@controls"]["next"] = {
+                "href": API.url_for(resource, after=page.next_cursor,
+                                    limit=page.limit, **values),
+                "title": "Next page"
+            }
+        if page.prev_cursor is not None:
+            self["@controls"]["prev"] = {
+                "href": API.url_for(resource, before=page.prev_cursor,
+                                    limit=page.limit, **values),
+                "title": "Previous page"
+            }
 
     def add_control_diagnoses_history(self, user_id):
         """
@@ -95,13 +126,8 @@ class ForumObject(MasonObject):
         achieve the correctly formed JSON document representation.
         """
 
-        self["@controls"]["medical_forum:add-message"] = {
-            "href": API.url_for(message_res.Messages),
-            "title": "Create message",
-            "encoding": "json",
-            "method": "POST",
-            "schema": self._msg_schema()
-        }
+        self["@controls"]["medical_forum:add-message"] = controls.registry().controls[
+            "medical_forum:add-message"]
 
     # copied from def add_control_add_user(self)
     def add_control_add_user(self):
@@ -112,13 +138,8 @@ class ForumObject(MasonObject):
         2) the user schema is relatively large.
         """
 
-        self["@controls"]["medical_forum:add-user"] = {
-            "href": API.url_for(user_res.Users),
-            "title": "Create user",
-            "encoding": "json",
-            "method": "POST",
-            "schemaUrl": hyper_const.USER_SCHEMA_URL
-        }
+        self["@controls"]["medical_forum:add-user"] = controls.registry().controls[
+            "medical_forum:add-user"]
 
     def add_control_messages_history(self, username):
         """
@@ -131,7 +152,7 @@ class ForumObject(MasonObject):
 
         self["@controls"]["medical_forum:messages-history"] = {
             "href": API.url_for(message_res.History,
-                                username=username).rstrip("/") + "{?length,before,after}",
+                                username=username).rstrip("/") + "{?limit,before,after}",
             "title": "Message history",
             "isHrefTemplate": True,
             "schema": self._history_schema()
@@ -146,7 +167,7 @@ class ForumObject(MasonObject):
         """
 
         self["@controls"]["medical_forum:add-diagnosis-with-user"] = {
-            "href": API.url_for(diagnosis_res.Diagnoses),
+            "href": controls.registry().urls["diagnoses"],
             "title": "Create diagnosis",
             "encoding": "json",
             "method": "POST",
@@ -163,7 +184,7 @@ class ForumObject(MasonObject):
         """
 
         self["@controls"]["medical_forum:get-diagnosis-with-message"] = {
-            "href": API.url_for(diagnosis_res.Diagnoses),
+            "href": controls.registry().urls["diagnoses"],
             "title": "Create diagnosis",
             "encoding": "json",
             "method": "GET",
@@ -179,20 +200,16 @@ class ForumObject(MasonObject):
         achieve the correctly formed JSON document representation.
         """
 
-        self["@controls"]["medical_forum:add-diagnosis"] = {
-            "href": API.url_for(diagnosis_res.Diagnoses),
-            "title": "Create diagnosis",
-            "encoding": "json",
-            "method": "POST",
-            "schema": self._dgs_schema()
-        }
+        self["@controls"]["medical_forum:add-diagnosis"] = controls.registry().controls[
+            "medical_forum:add-diagnosis"]
 
     def add_control_delete_message(self, message_id):
         """
         Adds the delete control to an object. This is intended for any
         object that represents a message.
 
-        : param str message_id: message id in the msg-N form
+        : param str message_id: message id in the msg-N form, or its
+            database key (int)
         """
 
         self["@controls"]["medical_forum:delete"] = {
@@ -221,7 +238,8 @@ class ForumObject(MasonObject):
         Adds a the edit control to a message object. For the schema we need
         the one that's intended for editing
 
-        : param str msgid: message id in the msg-N form
+        : param str msgid: message id in the msg-N form, or its
+            database key (int)
         """
 
         self["@controls"]["edit"] = {
@@ -271,7 +289,8 @@ class ForumObject(MasonObject):
         """
         Adds a reply-to control to a message.
 
-        : param str msgid: message id in the msg-N form
+        : param str msgid: message id in the msg-N form, or its
+            database key (int)
         """
 
         self["@controls"]["medical_forum:reply"] = {
@@ -287,7 +306,8 @@ class ForumObject(MasonObject):
         """
         Adds a reply-to control to a diagnosis.
 
-        : param str dgsid: diagnosis id in the dgs-N form
+        : param str dgsid: diagnosis id in the dgs-N form, or its
+            database key (int)
         """
 
         self["@controls"]["medical_forum:reply"] = {
@@ -301,7 +321,7 @@ class ForumObject(MasonObject):
     # Schema
     def _msg_schema(self, edit=False):
         """
-        Creates a schema dictionary for messages.
+        Returns the schema dictionary for messages, shared by all the objects.
 
         This schema can also be accessed from the urls /medical_forum/schema/edit-msg/ and
         /medical_forum/schema/add-msg/.
@@ -310,35 +330,11 @@ class ForumObject(MasonObject):
         : rtype:: dict
         """
 
-        user_field = "author"
-
-        schema = {
-            "type": "object",
-            "properties": {},
-            "required": ["headline", "articleBody"]
-        }
-
-        props = schema["properties"]
-        props["headline"] = {
-            "title": "Headline",
-            "description": "Message headline",
-            "type": "string"
-        }
-        props["articleBody"] = {
-            "title": "Contents",
-            "description": "Message contents",
-            "type": "string"
-        }
-        props[user_field] = {
-            "title": user_field.capitalize(),
-            "description": "Name of the message {}".format(user_field),
-            "type": "string"
-        }
-        return schema
+        return controls.registry().schemas["message"]
 
     def _dgs_schema(self, edit=False):
         """
-        Creates a schema dictionary for diagnoses.
+        Returns the schema dictionary for diagnoses, shared by all the objects.
 
         This schema can also be accessed from the urls /medical_forum/schema/edit-dgs/ and
         /medical_forum/schema/add-dgs/.
@@ -347,85 +343,26 @@ class ForumObject(MasonObject):
         : rtype:: dict
         """
 
-        user_id = "user_id"
-        message_id = "message_id"
-
-        schema = {
-            "type": "object",
-            "properties": {},
-            "required": ["disease", "diagnosis_description"]
-        }
-
-        props = schema["properties"]
-
-        props["disease"] = {
-            "title": "disease",
-            "description": "diagnosis disease",
-            "type": "string"
-        }
-        props["diagnosis_description"] = {
-            "title": "diagnosis description",
-            "description": "diagnosis description",
-            "type": "string"
-        }
-
-        props[user_id] = {
-            "title": user_id,
-            "description": "user_ide {}".format(user_id),
-            "type": "Integer"
-        }
-        return schema
+        return controls.registry().schemas["diagnosis"]
 
     def _public_profile_schema(self):
         """
-        Creates a schema dictionary for editing public profiles of users.
+        Returns the schema dictionary for editing public profiles of users,
+        shared by all the objects.
 
         :rtype:: dict
         """
 
-        schema = {
-            "type": "object",
-            "properties": {},
-            "required": ["lastname", "picture"]
-        }
-
-        props = schema["properties"]
-
-        props["picture"] = {
-            "description": "image file location",
-            "title": "picture",
-            "type": "string"
-        }
-
-        return schema
+        return controls.registry().schemas["public-profile"]
 
     def _history_schema(self):
         """
-        Creates a schema dicionary for the messages history query parameters.
+        Returns the schema dicionary for the messages history query parameters,
+        shared by all the objects.
 
         This schema can also be accessed from /forum/schema/history-query/
 
         :rtype:: dict
         """
 
-        schema = {
-            "type": "object",
-            "properties": {},
-            "required": []
-        }
-
-        props = schema["properties"]
-        props["length"] = {
-            "description": "Maximum number of messages returned",
-            "type": "integer"
-        }
-        props["before"] = {
-            "description": "Find messages before (timestamp as seconds)",
-            "type": "integer"
-        }
-        props["after"] = {
-            "description": "Find messages after (timestamp as seconds)",
-            "type": "integer"
-        }
-
-        return schema
+        return controls.registry().schemas["history"]
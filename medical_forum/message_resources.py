@@ -2,17 +2,40 @@
 Messages and Message resource API implementation
 """
 
-import json
 from flask import request, Response, g
-from flask_restful import Resource, abort
+from flask_restful import Resource
 
 from .resources import API, hyper_const
 from .error_handlers import create_error_response
+from .database_connection import search_expression
 
+from . import conditional
+from . import fields
 from . import forum_object as forum_obj
+from . import pagination
+from . import response_cache
+from . import serializer
+from . import streaming
+from . import url_templates
 from . import user_resources as user_res
 from . import diagnosis_resources as diagnosis_res
 
+# Attributes that can be selected with the fields query parameter, and the
+# columns of the messages table they are read from
+MESSAGE_ITEM_FIELDS = fields.Fieldset({"headline": ("title",)}, identifiers=("id",),
+                                      required=("message_id", "timestamp"))
+MESSAGE_FIELDS = fields.Fieldset(
+    {"headline": ("title",), "articleBody": ("body",), "author": ("username",),
+     "reply_to": ("reply_to",)},
+    identifiers=("message_id",),
+    required=("message_id", "user_id", "username", "reply_to"))
+# Same for the threads listed by Messages with sort=activity
+THREAD_ITEM_FIELDS = fields.Fieldset({"headline": ("title",), "replies": (),
+                                     "last_activity": (), "participants": ()},
+                                    identifiers=("id",))
+# Values of the sort query parameter of the messages collection
+MESSAGE_SORTS = ("timestamp", "activity")
+
 
 class Messages(Resource):
     """
@@ -21,10 +44,20 @@ class Messages(Resource):
 
     def get(self):
         """
-        Get all messages.
+        Get one page of messages, the most recent first.
 
         INPUT parameters:
-          None
+         * limit: maximum number of messages in the page (capped by the server)
+         * after: cursor of the next page, taken from the "next" control
+         * before: cursor of the previous page, taken from the "prev" control
+         * fields: attributes of the items to send, separated by commas
+           (headline). The id and the controls are always sent.
+         * sort: timestamp (default) or activity. With activity the items are
+           the first messages of the threads, the thread with the most
+           recent message first, and they also have the attributes replies
+           (number of replies in the thread), last_activity (timestamp of
+           the last message of the thread) and participants (number of
+           authors in the thread), which can be selected with fields.
 
         RESPONSE ENTITY BODY:
         * Media type: Mason
@@ -38,8 +71,38 @@ class Messages(Resource):
          * The attribute author is obtained from the column messages.sender
         """
 
-        # Extract messages from database
-        messages_db = g.con.get_messages()
+        sort = request.args.get("sort", "timestamp")
+        try:
+            if sort not in MESSAGE_SORTS:
+                raise ValueError("Unknown sort %r" % sort)
+            page_args = pagination.parse_page_args(request.args, 2)
+            selection = (THREAD_ITEM_FIELDS if sort == "activity" else
+                         MESSAGE_ITEM_FIELDS).parse(request.args)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters",
+                                         "Check the limit, the page cursor, the fields and"
+                                         " the sort")
+
+        etag = conditional.entity_tag(conditional.MESSAGES_VERSION)
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+        response = response_cache.cached_response(etag)
+        if response is not None:
+            return response
+
+        # Extract one page of messages from database
+        if sort == "activity":
+            messages_db = g.con.iter_threads(page_args.limit + 1,
+                                             start_after=page_args.after,
+                                             end_before=page_args.before)
+            page = pagination.Page(messages_db, page_args, pagination.activity_key)
+        else:
+            messages_db = g.con.iter_messages(number_of_messages=page_args.limit + 1,
+                                             start_after=page_args.after,
+                                             end_before=page_args.before,
+                                             columns=MESSAGE_ITEM_FIELDS.columns(selection))
+            page = pagination.Page(messages_db, page_args, pagination.message_key)
 
         envelope = forum_obj.ForumObject()
         envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
@@ -47,19 +110,19 @@ class Messages(Resource):
         envelope.add_control("self", href=API.url_for(Messages))
         envelope.add_control_users_all()
         envelope.add_control_add_message()
+        envelope.add_control_search_messages()
+        envelope.add_control_page(Messages, page, fields=request.args.get("fields"),
+                                  sort=request.args.get("sort"))
 
-        items = envelope["items"] = []
-
-        for msg in messages_db:
-            item = forum_obj.ForumObject(
-                id=msg["message_id"], headline=msg["title"])
-            item.add_control("self", href=API.url_for(
-                Message, message_id=msg["message_id"]))
-            item.add_control("profile", href=hyper_const.FORUM_MESSAGE_PROFILE)
-            items.append(item)
+        # The items are created while the response body is written
+        if sort == "activity":
+            items = _thread_list_items(page.items, selection)
+        else:
+            items = _message_items(page.items, selection)
 
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
-                        hyper_const.FORUM_MESSAGE_PROFILE)
+        return response_cache.cache_response(conditional.set_etag(streaming.streamed_response(
+            envelope, items, hyper_const.MASON + ";" + hyper_const.FORUM_MESSAGE_PROFILE), etag),
+                                             etag)
 
     def post(self):
         """
@@ -85,6 +148,12 @@ class Messages(Resource):
          * Returns 415 if the format of the response is not json
          * Returns 500 if the message could not be added to database.
 
+        BATCH:
+        The body can also be an array of new messages. They are all added in
+        a single transaction, or none of them is. The response is 201 and its
+        body is a Mason document whose items link the new messages, in the
+        same order as the array.
+
         """
 
         # Extract the request body. In general would be request.data
@@ -100,6 +169,8 @@ class Messages(Resource):
         request_body = request.get_json(force=True)
         # It throws a BadRequest exception, and hence a 400 code if the JSON is
         # not well-formed
+        if isinstance(request_body, list):
+            return _post_messages_batch(request_body)
         try:
             title = request_body["headline"]
             body = request_body["articleBody"]
@@ -120,6 +191,7 @@ class Messages(Resource):
         except KeyError:
             return create_error_response(400, "Wrong request format",
                                          "Be sure to have the right request values or user_id")
+        response_cache.invalidate(API.url_for(Messages))
 
         # Create the Location header with the id of the message created
         url = API.url_for(Message, message_id=new_message_id)
@@ -156,8 +228,14 @@ class Message(Resource):
             Semantic descriptors used: articleBody, headline
             return None.
 
+        INPUT parameters:
+         * fields: attributes to send, separated by commas (headline,
+           articleBody, author, reply_to). The message_id and the controls
+           are always sent.
+
         RESPONSE STATUS CODE
          * Return status code 200 if everything OK.
+         * Return status code 400 if the fields are not valid.
          * Return status code 404 if the message was not found in the database.
 
         NOTE:
@@ -167,13 +245,25 @@ class Message(Resource):
         """
 
         # PEFORM OPERATIONS INITIAL CHECKS
+        try:
+            selection = MESSAGE_FIELDS.parse(request.args)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters", "Check the fields")
+
+        # Answer 304 if the client has the current version of the message
+        etag = conditional.entity_tag(conditional.message_version(message_id))
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+        response = response_cache.cached_response(etag)
+        if response is not None:
+            return response
+
         # Get the message from db
-        message_db = g.con.get_message(message_id)
+        message_db = g.con.get_message(message_id, columns=MESSAGE_FIELDS.columns(selection))
         if not message_db:
-            abort(404, message="There is no a message with id %s" % message_id,
-                  resource_type="Message",
-                  resource_url=request.path,
-                  resource_id=message_id)
+            return create_error_response(404, "Message not found",
+                                         "There is no a message with id %s" % message_id)
 
         sender = message_db.get("sender")
         parent = message_db.get("reply_to", None)
@@ -188,6 +278,8 @@ class Message(Resource):
             message_id=message_db["message_id"]
         )
 
+        MESSAGE_FIELDS.trim(envelope, selection)
+
         envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
         envelope.add_namespace("atom-thread", hyper_const.ATOM_THREAD_PROFILE)
 
@@ -208,6 +300,9 @@ class Message(Resource):
         envelope.add_control("author", href=API.url_for(
             user_res.User, username=sender))
 
+        envelope.add_control("atom-thread:replies", href=API.url_for(
+            MessageThread, message_id=message_id))
+
         if parent:
             envelope.add_control("atom-thread:in-reply-to",
                                  href=API.url_for(Message, message_id=parent))
@@ -215,8 +310,9 @@ class Message(Resource):
             envelope.add_control("atom-thread:in-reply-to", href=None)
 
         # RENDER
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
-                        hyper_const.FORUM_MESSAGE_PROFILE)
+        return response_cache.cache_response(conditional.set_etag(
+            Response(serializer.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
+                     hyper_const.FORUM_MESSAGE_PROFILE), etag), etag)
 
     def delete(self, message_id):
         """
@@ -232,6 +328,10 @@ class Message(Resource):
 
         # PERFORM DELETE OPERATIONS
         if g.con.delete_message(message_id):
+            # The diagnoses of the message are deleted with it
+            response_cache.invalidate(API.url_for(Message, message_id=message_id),
+                                      API.url_for(Messages),
+                                      API.url_for(diagnosis_res.Diagnoses))
             return "", 204
         else:
             # Send error message
@@ -299,6 +399,8 @@ class Message(Resource):
                 return create_error_response(
                     500, "Internal error", "Message information for %s cannot be updated"
                     % message_id)
+            response_cache.invalidate(API.url_for(Message, message_id=message_id),
+                                      API.url_for(Messages))
             return "", 204
 
     def post(self, message_id):
@@ -359,7 +461,9 @@ class Message(Resource):
         # Create the new message and build the response code"
         new_message_id = g.con.append_answer(message_id, title, body, sender)
         if not new_message_id:
-            abort(500)
+            return create_error_response(500, "Problem with the database",
+                                         "Cannot access the database")
+        response_cache.invalidate(API.url_for(Messages))
 
         # Create the Location header with the id of the message created
         url = API.url_for(Message, message_id=new_message_id)
@@ -382,12 +486,18 @@ class History(Resource):
 
             INPUT:
             The query parameters are:
-             * length: the number of messages to return
+             * limit (or length): the number of messages to return in one page
              * after: the messages returned must have been modified after
                       the time provided in this parameter.
                       Time is UNIX timestamp
              * before: the messages returned must have been modified before the
                        time provided in this parameter. Time is UNIX timestamp
+             * fields: attributes of the items to send, separated by commas
+                       (headline). The id and the controls are always sent.
+
+            Non numeric values of after and before are page cursors, taken
+            from the "next" and "prev" controls. They keep the time
+            restrictions of the first page.
 
             RESPONSE STATUS CODE:
              * Returns 200 if the list can be generated and it is not empty
@@ -407,13 +517,27 @@ class History(Resource):
             Semantic descriptors used in queries: after, before, length
         """
 
-        parameters = request.args
-        length = int(parameters.get('length', -1))
-        before = int(parameters.get('before', -1))
-        after = int(parameters.get('after', -1))
-
-        messages_db = g.con.get_messages(username, length, before, after)
-        if messages_db is None or not messages_db:
+        try:
+            page_args, before, after = _parse_history_args(request.args)
+            selection = MESSAGE_ITEM_FIELDS.parse(request.args)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters",
+                                         "Check the timestamps, the limit, the page cursor"
+                                         " and the fields")
+
+        etag = conditional.entity_tag(conditional.MESSAGES_VERSION)
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+
+        messages_db = g.con.iter_messages(username, page_args.limit + 1, before, after,
+                                          start_after=page_args.after,
+                                          end_before=page_args.before,
+                                          columns=MESSAGE_ITEM_FIELDS.columns(selection))
+        page = pagination.Page(
+            messages_db, page_args,
+            lambda msg: pagination.message_key(msg) + (before, after))
+        if not page.items:
             return create_error_response(404, "Empty list",
                                          "Cannot find any message with the"
                                          " provided restrictions")
@@ -425,16 +549,334 @@ class History(Resource):
             "author", href=API.url_for(user_res.User, username=username))
         envelope.add_control_messages_all()
         envelope.add_control_users_all()
+        envelope.add_control_page(History, page, username=username,
+                                  fields=request.args.get("fields"))
+
+        # The items are created while the response body is written
+        items = _message_items(page.items, selection)
+
+        return conditional.set_etag(streaming.streamed_response(
+            envelope, items, hyper_const.MASON + ";" + hyper_const.FORUM_MESSAGE_PROFILE), etag)
+
+
+class MessageSearch(Resource):
+    """
+    Resource for the full-text search of the messages
+    """
+
+    def get(self):
+        """
+        Get one page of the messages whose headline or body contain some
+        words, the best match first.
+
+        INPUT parameters:
+         * q: the words to search, separated by spaces. A message must
+           contain all of them. A word ending with * matches the words
+           starting with it.
+         * limit: maximum number of messages in the page (capped by the server)
+         * after: cursor of the next page, taken from the "next" control
+         * before: cursor of the previous page, taken from the "prev" control
+
+        RESPONSE ENTITY BODY:
+        * Media type: Mason
+          https://github.com/JornWildt/Mason
+         * Profile: Forum_Message
+          /profiles/message_profile
+
+        Semantic descriptors used in items: headline, snippet (the words of
+        the headline or body around the matched ones, which are between
+        <b> and </b>)
+
+        RESPONSE STATUS CODE:
+         * Returns 200 with the page of messages found, maybe empty.
+         * Returns 400 if there is no word to search or if the limit or the
+           page cursor are not valid.
+        """
+
+        text = request.args.get("q", "")
+        try:
+            search_expression(text)
+            page_args = pagination.parse_page_args(request.args, 2)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters",
+                                         "Check the words to search, the limit and the"
+                                         " page cursor")
+
+        etag = conditional.entity_tag(conditional.MESSAGES_VERSION)
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+        response = response_cache.cached_response(etag)
+        if response is not None:
+            return response
+
+        # Extract one page of the messages found from database
+        messages_db = g.con.iter_search_messages(text, page_args.limit + 1,
+                                                 start_after=page_args.after,
+                                                 end_before=page_args.before)
+        page = pagination.Page(messages_db, page_args, pagination.search_key)
+
+        envelope = forum_obj.ForumObject()
+        envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
+
+        envelope.add_control("self", href=API.url_for(MessageSearch, q=text))
+        envelope.add_control_messages_all()
+        envelope.add_control_search_messages()
+        envelope.add_control_page(MessageSearch, page, q=text)
+
+        # The items are created while the response body is written
+        items = _search_items(page.items)
+
+        return response_cache.cache_response(conditional.set_etag(streaming.streamed_response(
+            envelope, items, hyper_const.MASON + ";" + hyper_const.FORUM_MESSAGE_PROFILE), etag),
+                                             etag)
+
+
+class MessageThread(Resource):
+    """
+    Resource for the thread of a message: the message and all its replies
+    """
+
+    def get(self, message_id):
+        """
+        Get one page of the thread of a message: the message, its replies,
+        their replies and so on, read from the database with a single query.
+
+        INPUT PARAMETER
+       : param str message_id: The id of the first message of the thread
+
+        INPUT parameters:
+         * depth: replies deeper than this are not sent (0 sends the message
+           alone, 1 the message and its direct replies). No limit by default.
+         * limit: maximum number of messages in the page (capped by the server)
+         * after: cursor of the next page, taken from the "next" control
+         * before: cursor of the previous page, taken from the "prev" control
 
-        items = envelope["items"] = []
+        RESPONSE ENTITY BODY:
+        * Media type: Mason
+          https://github.com/JornWildt/Mason
+         * Profile: Forum_Message
+          /profiles/message_profile
+
+        The items are flattened in depth-first order: each message comes
+        before its replies, and the replies of a message are in the order
+        they were sent. The tree is rebuilt from their reply_to.
+
+        Semantic descriptors used in items: headline, articleBody, author,
+        reply_to, depth (number of replies between the message and the first
+        one of the thread)
+
+        RESPONSE STATUS CODE:
+         * Returns 200 with the page of the thread.
+         * Returns 400 if the depth, the limit or the page cursor are not
+           valid.
+         * Returns 404 if the message was not found in the database.
+        """
+
+        try:
+            page_args = pagination.parse_page_args(request.args, 1)
+            depth = _parse_depth(request.args.get("depth"))
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters",
+                                         "Check the depth, the limit and the page cursor")
+
+        etag = conditional.entity_tag(conditional.MESSAGES_VERSION)
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+        response = response_cache.cached_response(etag)
+        if response is not None:
+            return response
+
+        if not g.con.contains_message(message_id):
+            return create_error_response(404, "Message not found",
+                                         "There is no a message with id %s" % message_id)
+        # Extract one page of the thread from database
+        try:
+            messages_db = g.con.iter_thread(message_id, depth, page_args.limit + 1,
+                                            start_after=page_args.after,
+                                            end_before=page_args.before)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters",
+                                         "The page cursor is not in the thread")
+        page = pagination.Page(messages_db, page_args, pagination.thread_key)
+
+        envelope = forum_obj.ForumObject()
+        envelope.add_namespace("medical_forum", hyper_const.LINK_RELATIONS_URL)
+
+        envelope.add_control("self", href=API.url_for(MessageThread, message_id=message_id))
+        envelope.add_control("up", href=API.url_for(Message, message_id=message_id))
+        envelope.add_control_messages_all()
+        envelope.add_control_page(MessageThread, page, message_id=message_id,
+                                  depth=request.args.get("depth"))
+
+        # The items are created while the response body is written
+        items = _thread_items(page.items)
+
+        return response_cache.cache_response(conditional.set_etag(streaming.streamed_response(
+            envelope, items, hyper_const.MASON + ";" + hyper_const.FORUM_MESSAGE_PROFILE), etag),
+                                             etag)
+
+
+def _parse_depth(value):
+    """
+    Returns the maximum depth of the replies requested by the client.
+
+    : param str value: value of the depth query parameter, or None
+    : return: the depth, or -1 if it is not restricted
+    : raises ValueError: if the value is not a non negative integer
+    """
 
-        for msg in messages_db:
-            item = forum_obj.ForumObject(
-                id=msg["message_id"], headline=msg["title"])
-            item.add_control("self", href=API.url_for(
-                Message, message_id=msg["message_id"]))
-            item.add_control("profile", href=hyper_const.FORUM_MESSAGE_PROFILE)
-            items.append(item)
+    if value is None:
+        return -1
+    depth = int(value)
+    if depth < 0:
+        raise ValueError("The depth must be a non negative integer")
+    return depth
 
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON+";" +
-                        hyper_const.FORUM_MESSAGE_PROFILE)
+
+def _parse_history_args(parameters):
+    """
+    Extracts the query parameters of the messages history.
+
+    Numeric values of before and after are timestamps. Other values are page
+    cursors whose key is (timestamp, message id, before, after), so that the
+    timestamps given for the first page also restrict the following ones.
+
+    : param parameters: the query parameters of the request
+    : return: the pagination parameters, the before and the after timestamps
+        (-1 if not restricted)
+    : raises ValueError: if any parameter is malformed
+    """
+
+    limit = pagination.parse_limit(parameters.get("limit", parameters.get("length")))
+    timestamps = {"before": -1, "after": -1}
+    cursors = {"before": None, "after": None}
+    for name in ("before", "after"):
+        value = parameters.get(name)
+        if value is None:
+            continue
+        if value.lstrip("-").isdigit():
+            timestamps[name] = int(value)
+        else:
+            cursors[name] = pagination.decode_cursor(value, 4)
+    if cursors["before"] is not None and cursors["after"] is not None:
+        raise ValueError("Only one of after and before can be a cursor")
+    cursor = cursors["before"] or cursors["after"]
+    if cursor is not None:
+        # The cursor carries the time restrictions of the first page
+        timestamps = {"before": cursor[2], "after": cursor[3]}
+    page_args = pagination.PageArgs(
+        limit,
+        cursors["after"][:2] if cursors["after"] is not None else None,
+        cursors["before"][:2] if cursors["before"] is not None else None)
+    return page_args, timestamps["before"], timestamps["after"]
+
+
+def _post_messages_batch(request_body):
+    """
+    Adds the messages of a batch POST to Messages in a single transaction.
+
+    : param list request_body: the new messages, each one with the format of
+        a single POST.
+    : return: a 201 response whose items link the new messages, in order.
+    """
+
+    try:
+        messages = [{"title": message["headline"], "body": message["articleBody"],
+                     "sender": message.get("author")} for message in request_body]
+    except (KeyError, TypeError, AttributeError):
+        return create_error_response(400, "Wrong request format",
+                                     "Be sure you include title and body in every message")
+    if not messages:
+        return create_error_response(400, "Wrong request format",
+                                     "The array of messages is empty")
+    try:
+        new_message_ids = g.con.create_messages_bulk(messages)
+    except KeyError:
+        return create_error_response(400, "Wrong request format",
+                                     "Be sure to have the right request values or user_id")
+    if not new_message_ids:
+        return create_error_response(500, "Problem with the database",
+                                     "Cannot access the database")
+    response_cache.invalidate(API.url_for(Messages))
+
+    envelope = forum_obj.ForumObject()
+    envelope["items"] = []
+    template = url_templates.url_template(Message, "message_id")
+    for message_id in new_message_ids:
+        item = forum_obj.ForumObject(id=message_id)
+        item.add_control("self", href=template.expand(message_id))
+        envelope["items"].append(item)
+    return Response(serializer.dumps(envelope), 201, mimetype=hyper_const.MASON + ";" +
+                    hyper_const.FORUM_MESSAGE_PROFILE)
+
+
+def _message_items(messages, selection=None):
+    """
+    Generator of the items of a collection of messages.
+
+    :param messages: iterable of messages, as returned by
+        :py:meth:`Connection.get_messages`.
+    :param frozenset selection: attributes selected with the fields query
+        parameter (see :py:data:`MESSAGE_ITEM_FIELDS`), or None for all.
+    """
+    template = url_templates.url_template(Message, "message_id")
+    for msg in messages:
+        item = forum_obj.ForumObject(
+            id=msg["message_id"], headline=msg["title"])
+        item.add_control("self", href=template.expand(msg["message_id"]))
+        item.add_control("profile", href=hyper_const.FORUM_MESSAGE_PROFILE)
+        yield MESSAGE_ITEM_FIELDS.trim(item, selection)
+
+
+def _thread_list_items(messages, selection=None):
+    """
+    Generator of the items of the messages collection sorted by activity.
+
+    :param messages: iterable of messages, as returned by
+        :py:meth:`Connection.get_threads`.
+    :param frozenset selection: attributes selected with the fields query
+        parameter (see :py:data:`THREAD_ITEM_FIELDS`), or None for all.
+    """
+    template = url_templates.url_template(Message, "message_id")
+    for msg in messages:
+        item = forum_obj.ForumObject(
+            id=msg["message_id"], headline=msg["title"], replies=msg["replies"],
+            last_activity=msg["last_activity"], participants=msg["participants"])
+        item.add_control("self", href=template.expand(msg["message_id"]))
+        item.add_control("profile", href=hyper_const.FORUM_MESSAGE_PROFILE)
+        yield THREAD_ITEM_FIELDS.trim(item, selection)
+
+
+def _search_items(messages):
+    """
+    Generator of the items of a page of the search of messages.
+
+    :param messages: iterable of messages, as returned by
+        :py:meth:`Connection.search_messages`.
+    """
+    template = url_templates.url_template(Message, "message_id")
+    for msg in messages:
+        item = forum_obj.ForumObject(
+            id=msg["message_id"], headline=msg["title"], snippet=msg["snippet"])
+        item.add_control("self", href=template.expand(msg["message_id"]))
+        item.add_control("profile", href=hyper_const.FORUM_MESSAGE_PROFILE)
+        yield item
+
+
+def _thread_items(messages):
+    """
+    Generator of the items of a page of the thread of a message.
+
+    :param messages: iterable of messages, as returned by
+        :py:meth:`Connection.get_thread`.
+    """
+    template = url_templates.url_template(Message, "message_id")
+    for msg in messages:
+        item = forum_obj.ForumObject(
+            id=msg["message_id"], headline=msg["title"], articleBody=msg["body"],
+            author=msg["sender"], reply_to=msg["reply_to"], depth=msg["depth"])
+        item.add_control("self", href=template.expand(msg["message_id"]))
+        item.add_control("profile", href=hyper_const.FORUM_MESSAGE_PROFILE)
+        yield item
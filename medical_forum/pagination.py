@@ -0,0 +1,162 @@
+"""
+Keyset (cursor) pagination for the collection resources.
+
+A page is requested with ``?limit=N`` plus either ``?after=<token>`` (the
+page following a given item) or ``?before=<token>`` (the page preceding it).
+Tokens are opaque to the clients: they are the sort key of the item, JSON
+encoded and then base64url encoded, and are only produced by the server in
+the ``next`` and ``prev`` controls of a page.
+"""
+
+import base64
+import itertools
+import json
+from collections import namedtuple
+
+from . import resource_ids
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# limit: page size. after / before: decoded key of the cursor, or None.
+PageArgs = namedtuple('PageArgs', ['limit', 'after', 'before'])
+
+
+def encode_cursor(key):
+    """
+    Creates the opaque token of a sort key.
+
+    :param tuple key: the sort key of an item (numbers only).
+    :rtype: str
+    """
+    data = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """
+    Returns the sort key of an opaque token.
+
+    :param str token: a token created by :py:func:`encode_cursor`
+    :param int size: number of values expected in the key.
+    :rtype: tuple
+    :raises ValueError: if the token is malformed.
+    """
+    try:
+        data = base64.urlsafe_b64decode((token + '=' * (-len(token) % 4)).encode('ascii'))
+        key = json.loads(data.decode('utf-8'))
+    except (ValueError, TypeError):
+        raise ValueError("The cursor is malformed")
+    if not isinstance(key, list) or len(key) != size or \
+            not all(isinstance(value, (int, float)) and not isinstance(value, bool)
+                    for value in key):
+        raise ValueError("The cursor is malformed")
+    return tuple(key)
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    """
+    Returns the page size requested by the client, capped to
+    :py:data:`MAX_PAGE_SIZE`.
+
+    :param str value: value of the ``limit`` query parameter, or None.
+    :rtype: int
+    :raises ValueError: if the value is not a positive integer.
+    """
+    if value is None:
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("The limit must be a positive integer")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_page_args(args, key_size):
+    """
+    Extracts the pagination query parameters of a request.
+
+    :param args: the query parameters (``request.args``).
+    :param int key_size: number of values in the sort key of the collection.
+    :rtype: PageArgs
+    :raises ValueError: if a parameter is malformed or if both ``after`` and
+        ``before`` are given.
+    """
+    after = args.get('after')
+    before = args.get('before')
+    if after is not None and before is not None:
+        raise ValueError("Only one of after and before can be used")
+    return PageArgs(parse_limit(args.get('limit')),
+                    decode_cursor(after, key_size) if after is not None else None,
+                    decode_cursor(before, key_size) if before is not None else None)
+
+
+class Page(object):
+    """
+    One page of a collection.
+
+    The rows are fetched with one extra row (``limit + 1``) so that the
+    existence of a following page (or preceding one, when paging backwards)
+    is known without a second query. At most ``limit + 1`` rows are read, so
+    ``rows`` can also be one of the generators of the ``Connection.iter_*``
+    methods.
+
+    :param rows: the rows fetched for the page, in display order.
+    :param PageArgs page_args: the pagination parameters of the request.
+    :param key: function returning the sort key of a row.
+    """
+
+    def __init__(self, rows, page_args, key):
+        super(Page, self).__init__()
+        limit = self.limit = page_args.limit
+        rows = list(itertools.islice(rows, limit + 1))
+        more = len(rows) > limit
+        self.next_cursor = self.prev_cursor = None
+        if page_args.before is not None:
+            # The extra row is the first one: it belongs to the previous page
+            self.items = rows[len(rows) - limit:] if more else rows
+            if self.items:
+                self.next_cursor = encode_cursor(key(self.items[-1]))
+                if more:
+                    self.prev_cursor = encode_cursor(key(self.items[0]))
+        else:
+            self.items = rows[:limit]
+            if self.items:
+                if more:
+                    self.next_cursor = encode_cursor(key(self.items[-1]))
+                if page_args.after is not None:
+                    self.prev_cursor = encode_cursor(key(self.items[0]))
+
+
+def message_key(message):
+    """Sort key of a message of :py:meth:`Connection.get_messages`"""
+    return (message['timestamp'], resource_ids.parse_message_id(message['message_id']))
+
+
+def activity_key(message):
+    """Sort key of a message of :py:meth:`Connection.get_threads`"""
+    return (message['last_activity'], resource_ids.parse_message_id(message['message_id']))
+
+
+def user_key(user):
+    """Sort key of a user of :py:meth:`Connection.get_users`"""
+    return (user['user_id'],)
+
+
+def msg_count_key(user):
+    """Sort key of a user of :py:meth:`Connection.get_users` by number of messages"""
+    return (user['msg_count'], user['user_id'])
+
+
+def diagnosis_key(diagnosis):
+    """Sort key of a diagnosis of :py:meth:`Connection.get_diagnoses`"""
+    return (resource_ids.parse_diagnosis_id(diagnosis['diagnosis_id']),)
+
+
+def search_key(message):
+    """Sort key of a message of :py:meth:`Connection.search_messages`"""
+    return (message['rank'], resource_ids.parse_message_id(message['message_id']))
+
+
+def thread_key(message):
+    """Sort key of a message of :py:meth:`Connection.get_thread`"""
+    return (resource_ids.parse_message_id(message['message_id']),)
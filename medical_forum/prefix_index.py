@@ -0,0 +1,178 @@
+"""
+In-memory prefix indexes of the disease names of the diagnoses and of the
+usernames, for the autocompletion resources.
+
+A :py:class:`PrefixIndex` keeps the distinct values of a column in a sorted
+list, so the values starting with a prefix are found with one binary search
+(``bisect``) and read in order from there, without touching the database.
+
+Each process keeps one index per database file and column, built on the
+first lookup. An index is tagged with the version counter of its values (see
+:py:meth:`medical_forum.database_connection.Connection.get_versions`) and is
+only used while that version is the current one, so the changes made by
+another process or connection are never missed: the index is built again.
+The Connection methods that add or remove values (``create_diagnosis``,
+``append_user``, ``delete_user``...) update the index in place instead. They
+read the version before and after their change inside their write
+transaction, so the index takes the new version only if it was up to date
+before the change and no other write came in between.
+
+Usage::
+
+    usernames = prefix_index.complete(con, prefix_index.USERNAMES, 'ali', 10)
+"""
+
+import bisect
+import threading
+
+# Names of the indexes
+DISEASES = 'diseases'
+USERNAMES = 'usernames'
+
+# name -> (version counter, query of the values and the number of rows
+# holding each one). The usernames have a counter of their own, so the index
+# is not built again every time a user posts a message (``users.msg_count``).
+SOURCES = {
+    DISEASES: ('diagnosis', 'SELECT disease, COUNT(*) FROM diagnosis '
+                            'WHERE disease IS NOT NULL GROUP BY disease'),
+    USERNAMES: ('usernames', 'SELECT username, 1 FROM users'),
+}
+
+_LOCK = threading.Lock()
+# (database path, name) -> PrefixIndex
+_INDEXES = {}
+
+
+class PrefixIndex(object):
+    """
+    Sorted array of distinct strings, searched by prefix ignoring the case.
+
+    Each value counts the rows holding it, and is removed when its last row
+    is. The index is safe to use from several threads.
+
+    :param values: iterable of ``(value, number of rows)``.
+    :param version: the version of the table the values were read at.
+    """
+
+    def __init__(self, values=(), version=None):
+        super(PrefixIndex, self).__init__()
+        self.version = version
+        self._lock = threading.Lock()
+        self._counts = {}
+        for value, count in values:
+            self._counts[value] = self._counts.get(value, 0) + count
+        # (casefolded value, value), sorted
+        self._keys = sorted((value.casefold(), value) for value in self._counts)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, value, count=1):
+        """
+        Adds rows holding a value.
+
+        :param str value: the value.
+        :param int count: default 1. Number of rows added.
+        """
+        with self._lock:
+            if value not in self._counts:
+                self._counts[value] = 0
+                bisect.insort(self._keys, (value.casefold(), value))
+            self._counts[value] += count
+
+    def discard(self, value, count=1):
+        """
+        Removes rows holding a value, and the value once no row holds it.
+        Unknown values are ignored.
+
+        :param str value: the value.
+        :param int count: default 1. Number of rows removed.
+        """
+        with self._lock:
+            if value not in self._counts:
+                return
+            self._counts[value] -= count
+            if self._counts[value] <= 0:
+                del self._counts[value]
+                key = (value.casefold(), value)
+                del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def complete(self, prefix, limit):
+        """
+        Returns the values starting with a prefix, ignoring the case.
+
+        :param str prefix: the prefix. All the values start with ''.
+        :param int limit: maximum number of values returned.
+        :return: the values in alphabetical order (ignoring the case).
+        :rtype: list
+        """
+        prefix = prefix.casefold()
+        found = []
+        with self._lock:
+            position = bisect.bisect_left(self._keys, (prefix,))
+            for key, value in self._keys[position:position + limit]:
+                if not key.startswith(prefix):
+                    break
+                found.append(value)
+        return found
+
+
+def complete(connection, name, prefix, limit):
+    """
+    Returns the values of an index starting with a prefix, building the
+    index first if it does not exist or is out of date.
+
+    The version is read again after the values, and a new index is only
+    kept if it did not change: a write in between would be in the values
+    but not in their version, and counted twice by :py:func:`update`.
+
+    :param connection: the Connection to the database.
+    :type connection: medical_forum.database_connection.Connection
+    :param str name: :py:data:`DISEASES` or :py:data:`USERNAMES`.
+    :param str prefix: the prefix, the case is ignored.
+    :param int limit: maximum number of values returned.
+    :rtype: list
+    """
+    counter, query = SOURCES[name]
+    version = connection.get_versions(counter)
+    key = (connection.db_path, name)
+    index = _INDEXES.get(key)
+    if index is None or version is None or index.version != version:
+        index = PrefixIndex(connection.con.execute(query).fetchall(), version)
+        if connection.get_versions(counter) == version:
+            with _LOCK:
+                _INDEXES[key] = index
+    return index.complete(prefix, limit)
+
+
+def update(connection, name, before, after, added=(), removed=()):
+    """
+    Applies the values added and removed by a write to the index, if it is
+    in memory.
+
+    :param connection: the Connection that made the write.
+    :type connection: medical_forum.database_connection.Connection
+    :param str name: :py:data:`DISEASES` or :py:data:`USERNAMES`.
+    :param tuple before: version of the values (see :py:data:`SOURCES`) read
+        in the write transaction before the change.
+    :param tuple after: version read in the same transaction after it.
+    :param added: values of the rows added, one per row.
+    :param removed: values of the rows removed, one per row.
+    """
+    index = _INDEXES.get((connection.db_path, name))
+    if index is None or before is None or index.version != before:
+        # Out of date anyway, built again on the next lookup
+        return
+    for value in added:
+        if value is not None:
+            index.add(value)
+    for value in removed:
+        if value is not None:
+            index.discard(value)
+    index.version = after
+
+
+def clear():
+    """Drops the indexes, so that they are built again on the next lookup."""
+    with _LOCK:
+        _INDEXES.clear()
@@ -0,0 +1,237 @@
+"""
+Pre-forking HTTP server for production.
+
+The master process binds the listening socket and then forks a fixed number
+of worker processes that share it. The WSGI application is imported by the
+master before forking (it is the ``app`` argument), so every worker starts
+with the modules, routes and constant controls already loaded, and the
+memory pages are shared between them until written.
+
+Each worker serves one request at a time with the server of werkzeug. A
+worker is recycled after ``max_requests`` requests: it finishes the request
+in progress, exits and the master forks a new one. ``max_requests_jitter``
+adds a random number of requests to each worker's limit, so that the
+workers are not all recycled at once.
+
+Signals handled by the master:
+
+* ``SIGTERM`` and ``SIGINT``: graceful stop. Every worker finishes its
+  current request and exits; the ones still running after
+  ``graceful_timeout`` seconds are killed.
+* ``SIGHUP``: graceful recycling of all the workers.
+
+Only available where :py:func:`os.fork` is (Unix).
+
+:Example:
+
+>>> server = PreforkServer(app, '0.0.0.0', 8000, workers=4, max_requests=1000)
+>>> server.serve_forever()
+"""
+
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+DEFAULT_WORKERS = 2
+DEFAULT_BACKLOG = 128
+DEFAULT_GRACEFUL_TIMEOUT = 30
+# Seconds between two checks of the stop flags, in the master and workers
+POLL_INTERVAL = 0.5
+
+
+class PreforkServer(object):
+    """
+    Master process of the pre-forking server.
+
+    :param app: the WSGI application, already imported.
+    :param str host: the address to listen on.
+    :param int port: the port to listen on. If 0, a free port is chosen
+        (see :py:attr:`port` after :py:meth:`bind`).
+    :param int workers: number of worker processes.
+    :param int max_requests: number of requests after which a worker is
+        recycled. If 0, workers are never recycled.
+    :param int max_requests_jitter: maximum random number of requests added
+        to ``max_requests`` for each worker.
+    :param int backlog: size of the queue of pending connections.
+    :param int graceful_timeout: seconds the workers are given to finish
+        their requests when the server stops.
+    :param post_fork: function called in every new worker, with the number
+        of the worker, before it serves requests. For instance to drop
+        resources that must not be shared between processes.
+    """
+
+    def __init__(self, app, host='127.0.0.1', port=5000, workers=DEFAULT_WORKERS,
+                 max_requests=0, max_requests_jitter=0, backlog=DEFAULT_BACKLOG,
+                 graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT, post_fork=None):
+        super(PreforkServer, self).__init__()
+        if workers < 1:
+            raise ValueError("At least one worker is needed")
+        if max_requests < 0 or max_requests_jitter < 0:
+            raise ValueError("The number of requests cannot be negative")
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+        self.post_fork = post_fork
+        self.socket = None
+        # pid -> number of the worker
+        self._children = {}
+        self._stopping = False
+        self._recycle = False
+        # Number of workers forked since the start, including the recycled ones
+        self.spawned = 0
+
+    def bind(self):
+        """
+        Creates the listening socket. Called by :py:meth:`serve_forever` if
+        it has not been called before.
+        """
+        if self.socket is None:
+            self.socket = socket.create_server((self.host, self.port), backlog=self.backlog)
+            self.port = self.socket.getsockname()[1]
+        return self.socket
+
+    def serve_forever(self):
+        """
+        Forks the workers and keeps their number until the server is stopped
+        by a signal. Returns once all the workers have exited.
+        """
+        self.bind()
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_recycle)
+        print("Listening on http://%s:%d with %d workers (pid %d)"
+              % (self.host, self.port, self.workers, os.getpid()), file=sys.stderr)
+        try:
+            while not self._stopping:
+                if self._recycle:
+                    self._recycle = False
+                    self._signal_workers(signal.SIGTERM)
+                self._reap()
+                while len(self._children) < self.workers and not self._stopping:
+                    self._spawn(self._free_number())
+                time.sleep(POLL_INTERVAL)
+        finally:
+            self._stop_workers()
+            self.socket.close()
+
+    def _handle_stop(self, signum, frame):
+        """Signal handler of SIGTERM and SIGINT in the master"""
+        self._stopping = True
+
+    def _handle_recycle(self, signum, frame):
+        """Signal handler of SIGHUP in the master"""
+        self._recycle = True
+
+    def _free_number(self):
+        """The lowest worker number not in use"""
+        numbers = set(self._children.values())
+        number = 0
+        while number in numbers:
+            number += 1
+        return number
+
+    def _spawn(self, number):
+        """Forks a worker"""
+        pid = os.fork()
+        if pid:
+            self._children[pid] = number
+            self.spawned += 1
+            return
+        # In the worker. It never returns to the loop of the master.
+        status = 1
+        try:
+            status = self._run_worker(number)
+        except BaseException as excp:
+            print("Worker %d failed: %r" % (number, excp), file=sys.stderr)
+        finally:
+            sys.stderr.flush()
+            os._exit(status)
+
+    def _reap(self):
+        """Forgets the workers that have exited"""
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._children.clear()
+                return
+            if pid == 0:
+                return
+            number = self._children.pop(pid, None)
+            if number is not None and os.waitstatus_to_exitcode(status) != 0 \
+                    and not self._stopping:
+                print("Worker %d (pid %d) exited with status %d"
+                      % (number, pid, os.waitstatus_to_exitcode(status)), file=sys.stderr)
+
+    def _signal_workers(self, signum):
+        """Sends a signal to every worker"""
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _stop_workers(self):
+        """Stops the workers gracefully, killing the ones that do not exit in time"""
+        self._signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            self._reap()
+            if self._children:
+                time.sleep(0.05)
+        self._signal_workers(signal.SIGKILL)
+        while self._children:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self._children.pop(pid, None)
+        self._children.clear()
+
+    def _run_worker(self, number):
+        """
+        Serves requests in a worker until it is stopped or has served its
+        maximum number of requests.
+
+        :return: the exit status of the worker.
+        """
+        self._children = {}
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        # The master handles Ctrl+C for the whole process group
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        if self.post_fork is not None:
+            self.post_fork(number)
+
+        limit = self.max_requests
+        if limit and self.max_requests_jitter:
+            limit += random.randint(0, self.max_requests_jitter)
+        handled = [0]
+        app = self.app
+
+        def counted_app(environ, start_response):
+            handled[0] += 1
+            return app(environ, start_response)
+
+        server = make_server(self.host, self.port, counted_app, fd=self.socket.fileno())
+        # All the workers wake up on a new connection and only one accepts
+        # it. The others must not block in accept.
+        server.socket.setblocking(False)
+        server.timeout = POLL_INTERVAL
+        try:
+            while not stopping and (not limit or handled[0] < limit):
+                server.handle_request()
+        finally:
+            server.socket.close()
+        return 0
@@ -2,7 +2,6 @@
 Public and restricted profiles resource API implementation
 """
 
-import json
 from werkzeug.exceptions import NotFound
 
 from flask import request, Response, g
@@ -11,7 +10,10 @@ from flask_restful import Resource
 from .resources import API, hyper_const
 from .error_handlers import create_error_response
 
+from . import conditional
 from . import forum_object as forum_obj
+from . import response_cache
+from . import serializer
 from . import user_resources as user_res
 
 
@@ -29,6 +31,11 @@ class UserPublic(Resource):
          * Profile: Forum_User_Profile
         """
 
+        etag = conditional.entity_tag(conditional.user_version(username))
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+
         user_db = g.con.get_user(username)
         if not user_db:
             return create_error_response(404, "Unknown user",
@@ -53,8 +60,9 @@ class UserPublic(Resource):
             "medical_forum:private-data", href=API.url_for(UserRestricted, username=username))
         envelope.add_control_edit_public_profile(username)
 
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
-                        hyper_const.FORUM_USER_PROFILE)
+        return conditional.set_etag(
+            Response(serializer.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
+                     hyper_const.FORUM_USER_PROFILE), etag)
 
     def put(self, username):
         """
@@ -89,6 +97,8 @@ class UserPublic(Resource):
         if not g.con.modify_user(username, user_public, None):
             return create_error_response(404, "Unknown user",
                                          "There is no user with username {}".format(username))
+        response_cache.invalidate(API.url_for(user_res.User, username=username),
+                                  API.url_for(user_res.Users))
 
         return "", 204
 
@@ -106,6 +116,11 @@ class UserRestricted(Resource):
          * Profile: Forum_User_Profile
         """
 
+        etag = conditional.entity_tag(conditional.user_version(username))
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+
         user_db = g.con.get_user(username)
         if not user_db:
             return create_error_response(404, "Unknown user",
@@ -142,8 +157,9 @@ class UserRestricted(Resource):
                              href=API.url_for(UserPublic, username=username))
         envelope.add_control_edit_private_profile(username)
 
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
-                        hyper_const.FORUM_USER_PROFILE)
+        return conditional.set_etag(
+            Response(serializer.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
+                     hyper_const.FORUM_USER_PROFILE), etag)
 
     def put(self, username):
         """
@@ -180,4 +196,6 @@ class UserRestricted(Resource):
 
         if not g.con.modify_user(username, None, priv_profile):
             return NotFound()
+        response_cache.invalidate(API.url_for(user_res.User, username=username),
+                                  API.url_for(user_res.Users))
         return "", 204
@@ -0,0 +1,87 @@
+"""
+Codec of the public ids of the messages and the diagnoses.
+
+A message with the key 15 in the database has the id ``msg-15`` in the API,
+and a diagnosis the id ``dgs-15``. The key is an SQLite INTEGER PRIMARY KEY,
+so any integer from 0 up to :py:data:`MAX_ID` (the largest signed 64 bit
+integer) is a valid id. Ids are parsed by slicing off the prefix, without
+regular expressions.
+"""
+
+MESSAGE_PREFIX = 'msg-'
+DIAGNOSIS_PREFIX = 'dgs-'
+
+MAX_ID = 2 ** 63 - 1
+# Number of digits of MAX_ID
+MAX_DIGITS = len(str(MAX_ID))
+
+# Patterns of the ids in the routes of the API
+MESSAGE_ID_PATTERN = r'msg-\d{1,%d}' % MAX_DIGITS
+DIAGNOSIS_ID_PATTERN = r'dgs-\d{1,%d}' % MAX_DIGITS
+
+
+def parse_id(resource_id, prefix):
+    """
+    Returns the database key of an id.
+
+    :param str resource_id: the id, for instance ``msg-15``.
+    :param str prefix: the expected prefix, for instance :py:data:`MESSAGE_PREFIX`.
+    :rtype: int
+    :raises ValueError: if the id does not have the format ``<prefix>N``, or
+        if N is not a 64 bit integer.
+    """
+    return _PARSERS[prefix](resource_id) if prefix in _PARSERS \
+        else _create_parser(prefix)(resource_id)
+
+
+def format_id(key, prefix):
+    """
+    Returns the id of a database key.
+
+    :param key: the database key. A digit string is accepted as well.
+    :type key: int or str
+    :param str prefix: the prefix of the id, for instance :py:data:`MESSAGE_PREFIX`.
+    :rtype: str
+    """
+    return prefix + str(key)
+
+
+def _create_parser(prefix):
+    """
+    Creates the parser of the ids with the given prefix, with the length of
+    the prefix computed once.
+    """
+    size = len(prefix)
+
+    def parse(resource_id):
+        """Database key of an id with the format <prefix>N"""
+        if resource_id.__class__ is not str or resource_id[:size] != prefix:
+            raise ValueError("The id %r is malformed" % (resource_id,))
+        digits = resource_id[size:]
+        # isdigit() alone accepts other unicode digits, like superscripts
+        if not digits.isdigit() or not digits.isascii() or len(digits) > MAX_DIGITS:
+            raise ValueError("The id %r is malformed" % (resource_id,))
+        key = int(digits)
+        if key > MAX_ID:
+            raise ValueError("The id %r is out of range" % (resource_id,))
+        return key
+    return parse
+
+
+_PARSERS = {MESSAGE_PREFIX: _create_parser(MESSAGE_PREFIX),
+            DIAGNOSIS_PREFIX: _create_parser(DIAGNOSIS_PREFIX)}
+
+# Database key of a message id with the format msg-N
+parse_message_id = _PARSERS[MESSAGE_PREFIX]
+# Database key of a diagnosis id with the format dgs-N
+parse_diagnosis_id = _PARSERS[DIAGNOSIS_PREFIX]
+
+
+def format_message_id(key):
+    """Message id with the format msg-N of a database key"""
+    return MESSAGE_PREFIX + str(key)
+
+
+def format_diagnosis_id(key):
+    """Diagnosis id with the format dgs-N of a database key"""
+    return DIAGNOSIS_PREFIX + str(key)
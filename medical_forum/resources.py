@@ -11,10 +11,14 @@ Modified on 26.03.2018
 from flask import redirect, send_from_directory
 from . import hypermedia_formats as hyper_const
 from .api import API, APP
+# Imported for its after_request hook, which compresses the responses
+from . import compression  # noqa: F401
 from .user_resources import User, Users
 from .profile_resources import UserPublic, UserRestricted
-from .message_resources import Message, Messages, History
+from .message_resources import Message, Messages, MessageSearch, MessageThread, History
 from .diagnosis_resources import Diagnoses, Diagnosis, DiagnosesHistory, DiagnosesHistoryMessage
+from .batch_resources import Batch
+from .autocomplete_resources import DiseaseAutocomplete, UsernameAutocomplete
 
 
 def add_resources_routes():
@@ -23,8 +27,12 @@ def add_resources_routes():
     """
     API.add_resource(Messages, "/medical_forum/api/messages/",
                      endpoint="messages")
-    API.add_resource(Message, "/medical_forum/api/messages/<regex('msg-\d+'):message_id>/",
+    API.add_resource(MessageSearch, "/medical_forum/api/messages/search/",
+                     endpoint="messages_search")
+    API.add_resource(Message, "/medical_forum/api/messages/<message_id:message_id>/",
                      endpoint="message")
+    API.add_resource(MessageThread, "/medical_forum/api/messages/<message_id:message_id>/thread/",
+                     endpoint="message_thread")
     API.add_resource(UserPublic, "/medical_forum/api/users/<username>/public_profile/",
                      endpoint="public_profile")
     API.add_resource(UserRestricted, "/medical_forum/api/users/<username>/restricted_profile/",
@@ -35,14 +43,20 @@ def add_resources_routes():
                      endpoint="users")
     API.add_resource(Diagnoses, "/medical_forum/api/diagnoses/",
                      endpoint="diagnoses")
-    API.add_resource(Diagnosis, "/medical_forum/api/diagnoses/<regex('dgs-\d+'):diagnosis_id>/",
+    API.add_resource(Diagnosis, "/medical_forum/api/diagnoses/<diagnosis_id:diagnosis_id>/",
                      endpoint="diagnosis")
-    API.add_resource(DiagnosesHistoryMessage, "/medical_forum/api/diagnoses/<regex('msg-\d+'):message_id>/",
+    API.add_resource(DiagnosesHistoryMessage, "/medical_forum/api/diagnoses/<message_id:message_id>/",
                      endpoint="diagnoses_message")
     API.add_resource(DiagnosesHistory, "/medical_forum/api/diagnoses/<user_id>/",
                      endpoint="diagnoses_user")
     API.add_resource(History, "/medical_forum/api/messages/<username>/history/",
                      endpoint="history")
+    API.add_resource(Batch, "/medical_forum/api/batch/",
+                     endpoint="batch")
+    API.add_resource(DiseaseAutocomplete, "/medical_forum/api/autocomplete/diseases/",
+                     endpoint="autocomplete_diseases")
+    API.add_resource(UsernameAutocomplete, "/medical_forum/api/autocomplete/usernames/",
+                     endpoint="autocomplete_usernames")
 
 
 add_resources_routes()
@@ -0,0 +1,327 @@
+"""
+In-process LRU cache of the serialized bodies of the GET responses.
+
+An entry is the body (bytes) of a 200 response, stored under the path and
+query of the request together with the entity tag of the representation
+(see :py:mod:`medical_forum.conditional`). An entry is only served while
+its entity tag is still the current one, so the cache never returns a body
+older than the database, even when the database was modified by another
+process. On top of that, the resources that modify the forum drop the
+entries of the paths they affect with :py:func:`invalidate`, so that
+outdated bodies do not take room in the cache.
+
+The cache is bounded by number of entries and by total size of the bodies,
+and the entries expire after a time to live. Bodies larger than
+:py:data:`MAX_ENTRY_BYTES` are not cached.
+
+An entry also keeps the compressed versions of its body (see
+:py:mod:`medical_forum.compression`), which count in the size of the cache
+and are dropped with the entry.
+
+Usage in a resource::
+
+    response = response_cache.cached_response(etag)
+    if response is not None:
+        return response
+    ...
+    return response_cache.cache_response(Response(...), etag)
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+from flask import Response, request
+
+from . import conditional
+
+MAX_ENTRIES = 1024
+MAX_BYTES = 64 * 1024 * 1024
+MAX_ENTRY_BYTES = 1024 * 1024
+# Seconds an entry is served after being stored
+TTL = 300
+
+
+class ResponseCache(object):
+    """
+    Bounded LRU mapping of request keys to response bodies.
+
+    :param int max_entries: maximum number of entries.
+    :param int max_bytes: maximum total size of the bodies, in bytes.
+    :param int max_entry_bytes: bodies larger than this are not stored.
+    :param float ttl: seconds an entry is served after being stored.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES,
+                 max_entry_bytes=MAX_ENTRY_BYTES, ttl=TTL):
+        super(ResponseCache, self).__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # (path, query) -> (etag, body, content type, stored at, compressed
+        # bodies by encoding), least recently used first
+        self._entries = OrderedDict()
+        # path -> set of the keys of its entries, for the invalidations
+        self._paths = {}
+        self._bytes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'stale': 0, 'expired': 0,
+                          'evictions': 0, 'invalidations': 0, 'encoded_hits': 0}
+
+    def get(self, key, etag):
+        """
+        :param tuple key: the path and the query of the request.
+        :param str etag: the current entity tag of the representation.
+        :return: the body and the content type of the entry, or None if
+            there is no valid entry for the key.
+        :rtype: tuple
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            if entry[0] != etag:
+                self._counters['stale'] += 1
+                self._counters['misses'] += 1
+                self._remove(key)
+                return None
+            if time.monotonic() - entry[3] > self.ttl:
+                self._counters['expired'] += 1
+                self._counters['misses'] += 1
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry[1], entry[2]
+
+    def put(self, key, etag, body, content_type):
+        """
+        Stores a body, evicting the least recently used entries if the cache
+        is full.
+
+        :param tuple key: the path and the query of the request.
+        :param str etag: the entity tag of the representation.
+        :param bytes body: the body of the response.
+        :param str content_type: the Content-Type of the response.
+        """
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (etag, body, content_type, time.monotonic(), {})
+            self._paths.setdefault(key[0], set()).add(key)
+            self._bytes += len(body)
+            self._evict()
+
+    def get_encoded(self, key, etag, encoding):
+        """
+        :param tuple key: the path and the query of the request.
+        :param str etag: the current entity tag of the representation.
+        :param str encoding: the content coding, for instance ``gzip``.
+        :return: the compressed body of the entry, or None if the entry is
+            not valid or was not compressed with the encoding yet.
+        :rtype: bytes
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag or encoding not in entry[4]:
+                return None
+            self._counters['encoded_hits'] += 1
+            return entry[4][encoding]
+
+    def put_encoded(self, key, etag, encoding, data):
+        """
+        Stores a compressed body along with the entry it was compressed
+        from. Nothing is stored if there is no such entry.
+
+        :param tuple key: the path and the query of the request.
+        :param str etag: the entity tag of the representation.
+        :param str encoding: the content coding, for instance ``gzip``.
+        :param bytes data: the compressed body.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag or encoding in entry[4]:
+                return
+            entry[4][encoding] = data
+            self._bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        """
+        Drop the least recently used entries until the cache is within its
+        limits. Must be called with the lock held.
+        """
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._counters['evictions'] += 1
+
+    def invalidate(self, *paths):
+        """
+        Drops the entries of the given paths, whatever their query.
+
+        :param str paths: paths of the resources, as returned by ``url_for``.
+        """
+        with self._lock:
+            for path in paths:
+                for key in list(self._paths.get(path, ())):
+                    self._remove(key)
+                    self._counters['invalidations'] += 1
+
+    def clear(self):
+        """Drops all the entries and sets the counters back to zero."""
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+            self._bytes = 0
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def stats(self):
+        """
+        Returns a snapshot of the cache counters.
+
+        :return: a dictionary with the keys ``entries``, ``bytes``, ``hits``,
+            ``misses``, ``hit_rate``, ``stale`` (misses because the
+            representation changed), ``expired`` (misses because the entry
+            was too old), ``evictions`` (entries dropped to make room) and
+            ``invalidations`` (entries dropped by :py:meth:`invalidate`) and
+            ``encoded_hits`` (compressed bodies served).
+        :rtype: dict
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _remove(self, key):
+        """Drop an entry. Must be called with the lock held."""
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry[1]) + sum(len(data) for data in entry[4].values())
+        keys = self._paths[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._paths[key[0]]
+
+
+# Cache of the API responses
+CACHE = ResponseCache()
+
+
+def request_key():
+    """The cache key of the current request"""
+    return (request.path, request.query_string)
+
+
+def cached_response(etag):
+    """
+    Looks up the body of the current GET request in :py:data:`CACHE`.
+
+    :param str etag: the current entity tag of the representation, as
+        returned by :py:func:`medical_forum.conditional.entity_tag`.
+    :return: a 200 response with the cached body, or None on a miss.
+    :rtype: flask.Response
+    """
+    if etag is None:
+        return None
+    entry = CACHE.get(request_key(), etag)
+    if entry is None:
+        return None
+    body, content_type = entry
+    return conditional.set_etag(Response(body, 200, content_type=content_type), etag)
+
+
+def cache_response(response, etag):
+    """
+    Stores the body of a 200 response to the current GET request in
+    :py:data:`CACHE`.
+
+    A streamed body is stored once it has been completely written, if it is
+    not larger than the size limit of the entries.
+
+    :param flask.Response response: the response, with its ETag.
+    :param str etag: the entity tag of the representation.
+    :return: the same response.
+    """
+    if etag is None or response.status_code != 200:
+        return response
+    key = request_key()
+    if response.is_streamed:
+        response.response = _collect(response.response, key, etag, response.content_type)
+    else:
+        CACHE.put(key, etag, response.get_data(), response.content_type)
+    return response
+
+
+def cached_encoding(etag, encoding):
+    """
+    Looks up the compressed body of the current GET request in
+    :py:data:`CACHE`.
+
+    :param str etag: the entity tag of the representation.
+    :param str encoding: the content coding, for instance ``gzip``.
+    :return: the compressed body, or None on a miss.
+    :rtype: bytes
+    """
+    return CACHE.get_encoded(request_key(), etag, encoding)
+
+
+def cache_encoding(etag, encoding, data):
+    """
+    Stores the compressed body of the current GET request in
+    :py:data:`CACHE`, along with its uncompressed body.
+
+    :param str etag: the entity tag of the representation.
+    :param str encoding: the content coding, for instance ``gzip``.
+    :param bytes data: the compressed body.
+    """
+    CACHE.put_encoded(request_key(), etag, encoding, data)
+
+
+def _collect(chunks, key, etag, content_type):
+    """
+    Generator yielding the chunks of a streamed body, which is stored in the
+    cache after the last one.
+    """
+    body = []
+    size = 0
+    try:
+        for chunk in chunks:
+            yield chunk
+            if body is not None:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                body.append(chunk)
+                size += len(chunk)
+                if size > CACHE.max_entry_bytes:
+                    body = None
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+    if body is not None:
+        CACHE.put(key, etag, b''.join(body), content_type)
+
+
+def invalidate(*paths):
+    """
+    Drops the cached bodies of the given paths from :py:data:`CACHE`.
+
+    :param str paths: paths of the resources modified by a request.
+    """
+    CACHE.invalidate(*paths)
+
+
+def stats():
+    """
+    :return: the counters of :py:data:`CACHE`, see
+        :py:meth:`ResponseCache.stats`.
+    :rtype: dict
+    """
+    return CACHE.stats()
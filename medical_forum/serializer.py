@@ -0,0 +1,79 @@
+"""
+Serialization of the bodies of the API responses.
+
+All the Mason and JSON documents of the API are serialized with
+:py:func:`dumps`, into compact UTF-8 JSON (no spaces after the separators,
+non-ASCII characters written as is). The encoder is the fastest one
+installed among orjson, ujson and the json module of the standard library.
+They produce the same bytes, except for the exponent of very large or very
+small floats (``1e+16`` or ``1e16``), which are the same number in JSON.
+Another encoder can be selected with :py:func:`use`, for instance to
+compare them.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _orjson_dumps(value):
+    """Serializes with orjson, which returns bytes"""
+    return orjson.dumps(value)
+
+
+def _ujson_dumps(value):
+    """Serializes with ujson, which escapes the slashes unless told not to"""
+    return ujson.dumps(value, ensure_ascii=False,
+                       escape_forward_slashes=False).encode('utf-8')
+
+
+def _json_dumps(value):
+    """Serializes with the json module of the standard library"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# Encoders by name, fastest first
+ENCODERS = {}
+if orjson is not None:
+    ENCODERS['orjson'] = _orjson_dumps
+if ujson is not None:
+    ENCODERS['ujson'] = _ujson_dumps
+ENCODERS['json'] = _json_dumps
+
+# Name of the encoder in use
+ENCODER = next(iter(ENCODERS))
+_dumps = ENCODERS[ENCODER]
+
+
+def use(name):
+    """
+    Selects the encoder used by :py:func:`dumps`.
+
+    :param str name: ``orjson``, ``ujson`` or ``json``.
+    :raises ValueError: if the encoder is not installed.
+    """
+    global ENCODER, _dumps
+    if name not in ENCODERS:
+        raise ValueError("The JSON encoder %r is not installed" % (name,))
+    ENCODER = name
+    _dumps = ENCODERS[name]
+
+
+def dumps(value):
+    """
+    Serializes a Mason or JSON document.
+
+    :param value: the document: dictionaries (str keys), lists, tuples,
+        strings, numbers, booleans and None.
+    :return: the compact JSON, encoded in UTF-8.
+    :rtype: bytes
+    """
+    return _dumps(value)
@@ -0,0 +1,62 @@
+"""
+Streamed Mason responses for the collection resources.
+
+Instead of building the list of items of a collection and serializing the
+whole envelope with one :py:func:`medical_forum.serializer.dumps` call, the
+envelope is written in three parts: the head (namespaces and controls), the
+items, serialized a few at a time as they are produced, and the tail closing
+the document. The body is byte for byte the one ``serializer.dumps`` would
+produce for the envelope with the items stored last under the ``items`` key.
+"""
+
+from flask import Response, stream_with_context
+
+from . import serializer
+
+# Number of items serialized into one chunk of the response body
+ITEMS_PER_CHUNK = 64
+
+
+def stream_envelope(envelope, items, chunk_size=ITEMS_PER_CHUNK):
+    """
+    Generator of the chunks of the JSON document of a collection.
+
+    :param dict envelope: the envelope of the collection, without items.
+    :param items: iterable of the items of the collection. It is only
+        consumed while the body is written, so it can be a generator.
+    :param int chunk_size: number of items serialized into one chunk.
+    """
+    head = serializer.dumps(envelope)
+    if head == b'{}':
+        yield b'{"items":['
+    else:
+        yield head[:-1] + b',"items":['
+    separator = b''
+    batch = []
+    for item in items:
+        batch.append(serializer.dumps(item))
+        if len(batch) == chunk_size:
+            yield separator + b','.join(batch)
+            separator = b','
+            batch = []
+    if batch:
+        yield separator + b','.join(batch)
+    yield b']}'
+
+
+def streamed_response(envelope, items, mimetype, status=200):
+    """
+    Creates a response that streams the JSON document of a collection.
+
+    The request context stays available until the body has been written, so
+    the items can be created lazily from rows of ``g.con`` and use
+    ``url_for``.
+
+    :param dict envelope: the envelope of the collection, without items.
+    :param items: iterable of the items of the collection.
+    :param str mimetype: media type of the response.
+    :param int status: default 200. Status code of the response.
+    :rtype: flask.Response
+    """
+    return Response(stream_with_context(stream_envelope(envelope, items)),
+                    status, mimetype=mimetype)
@@ -0,0 +1,107 @@
+"""
+Precompiled url templates of the item resources.
+
+The collections link every item with a ``self`` control. Instead of building
+each of these urls with ``url_for``, which matches the endpoint against the
+url map and runs the converters of the route, the url of the endpoint is
+built once with a placeholder and the items are linked by replacing the
+placeholder with their id.
+
+A value is substituted as is only if the converters of the route would not
+modify it: a string made of the characters that werkzeug does not quote.
+Any other value (quoted characters, a database key given as int...) is
+passed to ``url_for``, so the urls are always the ones ``url_for`` builds.
+
+Usage in a resource::
+
+    template = url_templates.url_template(Message, "message_id")
+    for msg in messages:
+        item.add_control("self", href=template.expand(msg["message_id"]))
+"""
+
+import re
+import threading
+
+from flask import has_request_context, request
+
+from .api import API
+
+# The characters werkzeug does not quote in a path segment
+_SAFE_VALUE = re.compile(r"[A-Za-z0-9!$'()*+,.;_~-]+")
+PLACEHOLDER = "__url_template_value__"
+
+# Templates kept at most; the Host header comes from the client
+MAX_TEMPLATES = 256
+
+
+class UrlTemplate(object):
+    """
+    The url of an endpoint with one variable part.
+
+    :param resource: the resource class of the endpoint.
+    :param str argument: the name of the variable of the route, or None if
+        the route has none.
+    """
+
+    def __init__(self, resource, argument=None):
+        super(UrlTemplate, self).__init__()
+        self.resource = resource
+        self.argument = argument
+        if argument is None:
+            self.prefix, self.suffix = API.url_for(resource), None
+            return
+        url = API.url_for(resource, **{argument: PLACEHOLDER})
+        if url.count(PLACEHOLDER) == 1:
+            self.prefix, self.suffix = url.split(PLACEHOLDER)
+        else:
+            # Substitution would be ambiguous: every url is built by url_for
+            self.prefix = self.suffix = None
+
+    def expand(self, value=None):
+        """
+        Returns the url of the endpoint for a value of the variable.
+
+        :param value: the value of the variable, as given to ``url_for``.
+        :rtype: str
+        """
+        if self.argument is None:
+            return self.prefix
+        if self.prefix is not None and value.__class__ is str and _SAFE_VALUE.fullmatch(value):
+            return self.prefix + value + self.suffix
+        return API.url_for(self.resource, **{self.argument: value})
+
+
+_LOCK = threading.Lock()
+# (root url of the requests, endpoint, argument) -> UrlTemplate
+_TEMPLATES = {}
+
+
+def url_template(resource, argument=None):
+    """
+    Returns the template of an endpoint, creating it on the first call.
+
+    The url is resolved for the scheme, the host and the script root of the
+    current request, as ``url_for`` does. Past :py:data:`MAX_TEMPLATES`
+    templates, a new template is created for every call.
+
+    :param resource: the resource class of the endpoint.
+    :param str argument: the name of the variable of the route, or None.
+    :rtype: UrlTemplate
+    :raises RuntimeError: if called outside of a request context.
+    """
+    if not has_request_context():
+        raise RuntimeError("The url templates are created inside a request context")
+    key = (request.root_url, resource.endpoint, argument)
+    found = _TEMPLATES.get(key)
+    if found is None:
+        found = UrlTemplate(resource, argument)
+        with _LOCK:
+            if len(_TEMPLATES) < MAX_TEMPLATES:
+                found = _TEMPLATES.setdefault(key, found)
+    return found
+
+
+def reset():
+    """Drops the templates, so that they are created again on the next call."""
+    with _LOCK:
+        _TEMPLATES.clear()
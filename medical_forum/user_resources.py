@@ -2,15 +2,32 @@
 Users and User resource API implementation
 """
 
-import json
 from flask import request, Response, g
-from flask_restful import Resource, abort
+from flask_restful import Resource
 from .resources import API, hyper_const
 from .error_handlers import create_error_response
 
+from . import conditional
+from . import fields
 from . import forum_object as forum_obj
+from . import pagination
+from . import response_cache
+from . import serializer
+from . import streaming
+from . import url_templates
 from . import profile_resources as profile_res
 from . import diagnosis_resources as diagnosis_res
+from . import message_resources as message_res
+
+# Attributes that can be selected with the fields query parameter, and the
+# columns of the users and users_profile tables they are read from
+USER_FIELDS = fields.Fieldset(
+    {"reg_date": ("reg_date",), "user_id": ("user_id",), "user_type": ("user_type",),
+     "speciality": ("speciality",), "msg_count": ("msg_count",)},
+    identifiers=("username",), required=("user_id", "username"))
+# Values of the sort query parameter of the users collection, and the sort
+# keys of their pages
+USER_SORTS = {"user_id": pagination.user_key, "msg_count": pagination.msg_count_key}
 
 
 class Users(Resource):
@@ -18,9 +35,19 @@ class Users(Resource):
 
     def get(self):
         """
-        Gets a list of all the users in the database.
+        Gets one page of the list of the users in the database.
+
+        INPUT parameters:
+         * limit: maximum number of users in the page (capped by the server)
+         * after: cursor of the next page, taken from the "next" control
+         * before: cursor of the previous page, taken from the "prev" control
+         * fields: attributes of the items to send, separated by commas
+           (reg_date, user_id, user_type, speciality, msg_count). The
+           username and the controls are always sent.
+         * sort: user_id (default) or msg_count. With msg_count the users
+           who sent the most messages come first.
 
-        It returns always status code 200.
+        It returns status code 200, or 400 if the query parameters are wrong.
 
         RESPONSE ENTITY BODY:
 
@@ -42,9 +69,34 @@ class Users(Resource):
         NOTE:
          * Attributes match one-to-one with column names in the database.
         """
+        sort = request.args.get("sort", "user_id")
+        try:
+            if sort not in USER_SORTS:
+                raise ValueError("Unknown sort %r" % sort)
+            key = USER_SORTS[sort]
+            page_args = pagination.parse_page_args(request.args, 2 if sort == "msg_count" else 1)
+            selection = USER_FIELDS.parse(request.args)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters",
+                                         "Check the limit, the page cursor, the fields and"
+                                         " the sort")
+
+        etag = conditional.entity_tag(conditional.USERS_VERSION)
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+        response = response_cache.cached_response(etag)
+        if response is not None:
+            return response
+
         # PERFORM OPERATIONS
-        # Create the messages list
-        users_db = g.con.get_users()
+        # Create the users list
+        users_db = g.con.iter_users(number_of_users=page_args.limit + 1,
+                                    start_after=page_args.after,
+                                    end_before=page_args.before,
+                                    columns=USER_FIELDS.columns(selection),
+                                    sort=sort)
+        page = pagination.Page(users_db, page_args, key)
 
         # FILTER AND GENERATE THE RESPONSE
         # Create the envelope
@@ -56,25 +108,16 @@ class Users(Resource):
         envelope.add_control_messages_all()
         envelope.add_control_diagnoses_all()
         envelope.add_control("self", href=API.url_for(Users))
+        envelope.add_control_page(Users, page, fields=request.args.get("fields"),
+                                  sort=request.args.get("sort"))
 
-        items = envelope["items"] = []
-
-        for user in users_db:
-            item = forum_obj.ForumObject(
-                username=user["username"],
-                reg_date=user["reg_date"],
-                user_id=user["user_id"],
-                user_type=user["user_type"],
-                speciality=user["speciality"]
-            )
-            item.add_control("self", href=API.url_for(
-                User, username=user["username"]))
-            item.add_control("profile", href=hyper_const.FORUM_USER_PROFILE)
-            items.append(item)
+        # The items are created while the response body is written
+        items = _user_items(page.items, selection)
 
         # RENDER
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
-                        hyper_const.FORUM_USER_PROFILE)
+        return response_cache.cache_response(conditional.set_etag(streaming.streamed_response(
+            envelope, items, hyper_const.MASON + ";" + hyper_const.FORUM_USER_PROFILE), etag),
+                                             etag)
 
     def post(self):
         """
@@ -93,6 +136,12 @@ class Users(Resource):
          * Return 400 if the body is not well formed
          * Return 415 if it receives a media type != application/json
 
+        BATCH:
+        The body can also be an array of new users. They are all added in a
+        single transaction, or none of them is (409 if any username is taken
+        or repeated). The response is 201 and its body is a Mason document
+        whose items link the new users, in the same order as the array.
+
         NOTE:
          * The attributes match one-to-one with column names in the database.
 
@@ -109,9 +158,12 @@ class Users(Resource):
         """
 
         if hyper_const.JSON != request.headers.get("Content-Type", ""):
-            abort(415)
+            return create_error_response(415, "UnsupportedMediaType",
+                                         "Use a JSON compatible format")
         # PARSE THE REQUEST:
         request_body = request.get_json(force=True)
+        if isinstance(request_body, list):
+            return _post_users_batch(request_body)
         if not request_body:
             return create_error_response(
                 415, "Unsupported Media Type", "Use a JSON compatible format", )
@@ -133,41 +185,20 @@ class Users(Resource):
                 409, "Username already exist", "There is already a user with same username:%s."
                 % username)
 
-        # pick up rest of the mandatory fields
+        # pick up rest of the mandatory and optional fields
         try:
-            speciality = request_body["speciality"]
-            user_type = request_body["user_type"]
-            firstname = request_body["firstname"]
-            lastname = request_body["lastname"]
-            work_address = request_body["work_address"]
-
+            user = _user_from_body(request_body)
         except KeyError:
             return create_error_response(400, "Wrong request format",
                                          "Be sure to include all mandatory properties")
 
-        # pick up rest of the optional fields
-        picture = request_body.get("picture", "")
-        gender = request_body.get("gender", "")
-        age = request_body.get("age", "")
-        email = request_body.get("email", "")
-        weight = request_body.get("weight", "")
-        height = request_body.get("height", "")
-        phone = request_body.get("phone", "")
-        print(phone + " " + height + " " + weight)
-
-        user = {'public_profile': {'username': username,
-                                   'speciality': speciality, 'user_type': user_type},
-
-                'restricted_profile': {'firstname': firstname, 'lastname': lastname,
-                                       'work_address': work_address, 'gender': gender,
-                                       'picture': picture, 'age': age, 'email': email,
-                                       'phone': phone, 'weight': weight, 'height': height}}
         try:
             username = g.con.append_user(username, user)
         except ValueError:
             return create_error_response(400, "Wrong request format",
                                          "Be sure you include all"
                                          " mandatory properties")
+        response_cache.invalidate(API.url_for(Users))
 
         # CREATE RESPONSE AND RENDER
         return Response(status=201,
@@ -186,8 +217,14 @@ class User(Resource):
         INPUT PARAMETER:
        : param str username: username of the required user.
 
+        INPUT parameters:
+         * fields: attributes to send, separated by commas (reg_date,
+           user_id, user_type, speciality, msg_count). The username and the
+           controls are always sent.
+
         OUTPUT:
          * Return 200 if the username exists.
+         * Return 400 if the fields are not valid.
          * Return 404 if the username is not stored in the system.
 
         RESPONSE ENTITY BODY:
@@ -198,21 +235,36 @@ class User(Resource):
         Link relations used: self, collection, public-data, private-data,
         messages.
 
-        Semantic descriptors used: username and reg_date
+        Semantic descriptors used: username, reg_date and msg_count (number
+        of messages sent by the user)
 
         NOTE:
         The: py: method:`Connection.get_user()` returns a dictionary with the
         the following format.
 
                {'public_profile':{'reg_date':,'username':'',
-                                   'speciality':'','user_type':''},
+                                   'speciality':'','user_type':'',
+                                   'msg_count':},
                 'restricted_profile':{'firstname':'','lastname':'',
                                       'work_address':'','gender':'',
                                       'picture':'', age':'', email':''}
                 }
         """
 
-        user_db = g.con.get_user(username)
+        try:
+            selection = USER_FIELDS.parse(request.args)
+        except ValueError:
+            return create_error_response(400, "Wrong query parameters", "Check the fields")
+
+        etag = conditional.entity_tag(conditional.user_version(username))
+        response = conditional.not_modified(etag)
+        if response is not None:
+            return response
+        response = response_cache.cached_response(etag)
+        if response is not None:
+            return response
+
+        user_db = g.con.get_user(username, columns=USER_FIELDS.columns(selection))
         if not user_db:
             return create_error_response(
                 404, "Unknown user", "There is no user with username %s" % username)
@@ -222,8 +274,10 @@ class User(Resource):
             reg_date=user_db["public_profile"]["reg_date"],
             user_id=user_db["restricted_profile"]["user_id"],
             user_type=user_db["public_profile"]["user_type"],
-            speciality=user_db["public_profile"]["speciality"]
+            speciality=user_db["public_profile"]["speciality"],
+            msg_count=user_db["public_profile"]["msg_count"]
         )
+        USER_FIELDS.trim(envelope, selection)
 
         envelope.add_namespace("forum", hyper_const.LINK_RELATIONS_URL)
         envelope.add_control("self", href=API.url_for(User, username=username))
@@ -241,8 +295,9 @@ class User(Resource):
         envelope.add_control("collection", href=API.url_for(Users))
         envelope.add_control_delete_user(username)
 
-        return Response(json.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
-                        hyper_const.FORUM_USER_PROFILE)
+        return response_cache.cache_response(conditional.set_etag(
+            Response(serializer.dumps(envelope), 200, mimetype=hyper_const.MASON + ";" +
+                     hyper_const.FORUM_USER_PROFILE), etag), etag)
 
     def delete(self, username):
         """
@@ -261,9 +316,102 @@ class User(Resource):
         # Try to  delete the user. If it could not be deleted, the database
         # returns None.
         if g.con.delete_user(username):
+            # The messages and diagnoses of the user are deleted with it
+            response_cache.invalidate(API.url_for(User, username=username),
+                                      API.url_for(Users),
+                                      API.url_for(message_res.Messages),
+                                      API.url_for(diagnosis_res.Diagnoses))
             # RENDER RESPONSE
             return '', 204
         else:
             # GENERATE ERROR RESPONSE
             return create_error_response(
                 404, "Unknown user", "There is no user with username %s" % username)
+
+
+def _user_from_body(request_body):
+    """
+    Creates the user argument of :py:meth:`Connection.append_user` from the
+    body of a POST to Users.
+
+    : param dict request_body: the new user.
+    : return: the user dictionary.
+    : raises KeyError: if a mandatory property is missing.
+    """
+
+    return {'public_profile': {'username': request_body["username"],
+                               'speciality': request_body["speciality"],
+                               'user_type': request_body["user_type"]},
+
+            'restricted_profile': {'firstname': request_body["firstname"],
+                                   'lastname': request_body["lastname"],
+                                   'work_address': request_body["work_address"],
+                                   'gender': request_body.get("gender", ""),
+                                   'picture': request_body.get("picture", ""),
+                                   'age': request_body.get("age", ""),
+                                   'email': request_body.get("email", ""),
+                                   'phone': request_body.get("phone", ""),
+                                   'weight': request_body.get("weight", ""),
+                                   'height': request_body.get("height", "")}}
+
+
+def _post_users_batch(request_body):
+    """
+    Adds the users of a batch POST to Users in a single transaction.
+
+    : param list request_body: the new users, each one with the format of a
+        single POST.
+    : return: a 201 response whose items link the new users, in order.
+    """
+
+    try:
+        users = [(user["username"], _user_from_body(user)) for user in request_body]
+    except (KeyError, TypeError):
+        return create_error_response(400, "Wrong request format",
+                                     "Be sure to include all mandatory properties in every user")
+    if not users:
+        return create_error_response(400, "Wrong request format",
+                                     "The array of users is empty")
+    try:
+        usernames = g.con.append_users_bulk(users)
+    except ValueError:
+        return create_error_response(400, "Wrong request format",
+                                     "Be sure you include all mandatory properties")
+    if usernames is None:
+        return create_error_response(
+            409, "Username already exist",
+            "A username is already taken or repeated in the array")
+
+    envelope = forum_obj.ForumObject()
+    envelope["items"] = []
+    template = url_templates.url_template(User, "username")
+    for username in usernames:
+        item = forum_obj.ForumObject(username=username)
+        item.add_control("self", href=template.expand(username))
+        envelope["items"].append(item)
+    return Response(serializer.dumps(envelope), 201, mimetype=hyper_const.MASON + ";" +
+                    hyper_const.FORUM_USER_PROFILE)
+
+
+def _user_items(users, selection=None):
+    """
+    Generator of the items of a collection of users.
+
+    :param users: iterable of users, as returned by
+        :py:meth:`Connection.get_users`.
+    :param frozenset selection: attributes selected with the fields query
+        parameter (see :py:data:`USER_FIELDS`), or None for all.
+    """
+    template = url_templates.url_template(User, "username")
+    for user in users:
+        item = forum_obj.ForumObject(
+            username=user["username"],
+            reg_date=user["reg_date"],
+            user_id=user["user_id"],
+            user_type=user["user_type"],
+            speciality=user["speciality"],
+            msg_count=user["msg_count"]
+        )
+        item.add_control("self", href=template.expand(user["username"]))
+        item.add_control("profile", href=hyper_const.FORUM_USER_PROFILE)
+        yield USER_FIELDS.trim(item, selection)
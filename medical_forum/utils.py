@@ -6,10 +6,9 @@ Modified on 26.03.2018
 @author: ivan
 '''
 
-import sqlite3
-from werkzeug.routing import BaseConverter
+from werkzeug.routing import BaseConverter, ValidationError
 
-FOREIGN_KEYS_ON = 'PRAGMA foreign_keys = ON'
+from . import resource_ids
 
 
 class RegexConverter(BaseConverter):
@@ -22,11 +21,56 @@ class RegexConverter(BaseConverter):
         self.regex = items[0]
 
 
+class ResourceIdConverter(BaseConverter):
+    '''
+    Converter of the ids of the messages and the diagnoses in the url, with
+    the format <prefix>N (see :py:mod:`medical_forum.resource_ids`). Ids out
+    of the 64 bit range do not match the route.
+
+    The value passed to the resource is the id string. When building a url
+    either the id string or the database key (int) can be given.
+    '''
+
+    prefix = None
+
+    def to_python(self, value):
+        try:
+            resource_ids.parse_id(value, self.prefix)
+        except ValueError:
+            raise ValidationError()
+        return value
+
+    def to_url(self, value):
+        if isinstance(value, int):
+            value = resource_ids.format_id(value, self.prefix)
+        return super(ResourceIdConverter, self).to_url(value)
+
+
+class MessageIdConverter(ResourceIdConverter):
+    '''
+    Converter of message ids with the format msg-N
+    '''
+
+    prefix = resource_ids.MESSAGE_PREFIX
+    regex = resource_ids.MESSAGE_ID_PATTERN
+
+
+class DiagnosisIdConverter(ResourceIdConverter):
+    '''
+    Converter of diagnosis ids with the format dgs-N
+    '''
+
+    prefix = resource_ids.DIAGNOSIS_PREFIX
+    regex = resource_ids.DIAGNOSIS_ID_PATTERN
+
+
 def execute_query(connection, query, pvalue, fetch_type=''):
     """
     This is a helper method to facilitate and be used by many methods.
     This method is used to handle the execution of queries and return the result of that query.
-    :param self: to pass the context of the parent method.
+    The connection is expected to be configured already (row factory and
+    foreign keys), as done by :py:class:`medical_forum.database_connection.Connection`.
+    :param connection: the sqlite3 connection to use.
     :param query: the query to execute.
     :param fetch_type: whether to return one or all results from the cursor instance
             after query execution.
@@ -34,11 +78,7 @@ def execute_query(connection, query, pvalue, fetch_type=''):
     """
 
     with connection:
-        # Cursor and row initialization
-        connection.row_factory = sqlite3.Row
         cursor = connection.cursor()
-        # Provide support for foreign keys
-        cursor.execute(FOREIGN_KEYS_ON)
         # Execute main SQL Statement
         cursor.execute(query, pvalue)
         if fetch_type == 'one':
@@ -0,0 +1,105 @@
+"""
+Testing unit for the autocompletion resources of the diseases and usernames.
+"""
+import unittest
+import json
+
+import medical_forum.resources as resources
+import medical_forum.database_engine as database
+from medical_forum import prefix_index
+
+DEFAULT_DB_PATH = 'db/medical_forum_data_test.db'
+
+ENGINE = database.Engine(DEFAULT_DB_PATH)
+
+JSON = "application/json"
+MASONJSON = "application/vnd.mason+json"
+
+resources.APP.config["TESTING"] = True
+resources.APP.config["SERVER_NAME"] = "localhost:5000"
+resources.APP.config.update({"Engine": ENGINE})
+
+
+class AutocompleteTestCase(unittest.TestCase):
+    """Autocompletion resources API tests"""
+    diseases_url = "/medical_forum/api/autocomplete/diseases/"
+    usernames_url = "/medical_forum/api/autocomplete/usernames/"
+
+    @classmethod
+    def setUpClass(cls):
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        print("Testing ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        print("Testing started for: ", self.id())
+        ENGINE.populate_tables()
+        prefix_index.clear()
+        self.app_context = resources.APP.app_context()
+        self.app_context.push()
+        self.client = resources.APP.test_client()
+
+    def tearDown(self):
+        ENGINE.clear()
+        prefix_index.clear()
+        self.app_context.pop()
+
+    def _get(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, MASONJSON)
+        return json.loads(resp.data.decode("utf-8"))
+
+    def test_autocomplete(self):
+        """
+        Checks that the diseases and usernames starting with the prefix are
+        returned in order, up to the limit
+        """
+        print("(" + self.test_autocomplete.__name__ + ")", self.test_autocomplete.__doc__)
+        data = self._get(self.diseases_url + "?prefix=D")
+        self.assertEqual(data["items"], [{"disease": "dead"}, {"disease": "diabets"}])
+        data = self._get(self.usernames_url + "?prefix=al")
+        self.assertEqual([item["username"] for item in data["items"]], ["Alex77", "Allyson"])
+        self.assertEqual(data["items"][0]["@controls"]["self"]["href"],
+                         "/medical_forum/api/users/Alex77/")
+        data = self._get(self.usernames_url + "?limit=3")
+        self.assertEqual(len(data["items"]), 3)
+        self.assertEqual(self._get(self.usernames_url + "?prefix=zz")["items"], [])
+        resp = self.client.get(self.usernames_url + "?limit=0")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_autocomplete_after_post(self):
+        """
+        Checks that a user added through the API is completed, and that the
+        ETag of the completions changes
+        """
+        print("(" + self.test_autocomplete_after_post.__name__ + ")",
+              self.test_autocomplete_after_post.__doc__)
+        url = self.usernames_url + "?prefix=al"
+        resp = self.client.get(url)
+        etag = resp.headers["ETag"]
+        resp = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+
+        resp = self.client.post("/medical_forum/api/users/", headers={"Content-Type": JSON},
+                                data=json.dumps({
+                                    "username": "Alicia", "firstname": "Alicia",
+                                    "lastname": "Smith", "work_address": "Street 1",
+                                    "gender": "female", "age": 30,
+                                    "email": "alicia@example.com", "user_type": 0,
+                                    "speciality": ""}))
+        self.assertEqual(resp.status_code, 201)
+        resp = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([item["username"] for item in json.loads(resp.data)["items"]],
+                         ["Alex77", "Alicia", "Allyson"])
+
+
+if __name__ == "__main__":
+    print("Start running tests")
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Testing unit for the batch resource, which GETs several resources of the
+API in one request.
+"""
+import unittest
+import json
+
+import medical_forum.resources as resources
+import medical_forum.database_engine as database
+import medical_forum.batch_resources as batch_res
+
+DEFAULT_DB_PATH = 'db/medical_forum_data_test.db'
+
+ENGINE = database.Engine(DEFAULT_DB_PATH)
+
+JSON = "application/json"
+
+resources.APP.config["TESTING"] = True
+resources.APP.config["SERVER_NAME"] = "localhost:5000"
+resources.APP.config.update({"Engine": ENGINE})
+
+
+class BatchTestCase(unittest.TestCase):
+    """Batch resource API tests"""
+    url = "/medical_forum/api/batch/"
+
+    @classmethod
+    def setUpClass(cls):
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        print("Testing ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        print("Testing started for: ", self.id())
+        ENGINE.populate_tables()
+        self.app_context = resources.APP.app_context()
+        self.app_context.push()
+        self.client = resources.APP.test_client()
+
+    def tearDown(self):
+        ENGINE.clear()
+        self.app_context.pop()
+
+    def _post(self, urls):
+        return self.client.post(self.url, headers={"Content-Type": JSON},
+                                data=json.dumps(urls))
+
+    def test_batch(self):
+        """
+        Checks that every url of the batch gets the response of its own GET,
+        in order, and that they are all read with one connection
+        """
+        print("(" + self.test_batch.__name__ + ")", self.test_batch.__doc__)
+        message = json.loads(self.client.get(
+            "/medical_forum/api/messages/msg-8/").data.decode("utf-8"))
+        controls = message["@controls"]
+        urls = [controls["self"]["href"], controls["author"]["href"],
+                controls["medical_forum:diagnoses-history-message"]["href"],
+                controls["atom-thread:in-reply-to"]["href"],
+                "/medical_forum/api/messages/?limit=3&fields=headline",
+                "/medical_forum/api/messages/msg-290/"]
+        engine = resources.APP.config["Engine"]
+        checkouts = engine.pool_stats("reader")["checkouts"]
+        resp = self._post(urls)
+        self.assertEqual(engine.pool_stats("reader")["checkouts"] - checkouts, 1)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, JSON)
+        results = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual([result["url"] for result in results], urls)
+        for url, result in zip(urls, results):
+            expected = self.client.get(url)
+            self.assertEqual(result["status"], expected.status_code)
+            self.assertEqual(result["body"], json.loads(expected.data.decode("utf-8")))
+        self.assertEqual(results[-1]["status"], 404)
+
+    def test_wrong_batch(self):
+        """
+        Checks that a body that is not an array of urls of this server returns
+        400, and a body that is not JSON 415
+        """
+        print("(" + self.test_wrong_batch.__name__ + ")", self.test_wrong_batch.__doc__)
+        for urls in ({"url": "/medical_forum/api/messages/"}, [], [7],
+                     ["medical_forum/api/messages/"],
+                     ["http://example.com/medical_forum/api/messages/"],
+                     ["/medical_forum/api/messages/"] * (batch_res.MAX_BATCH_SIZE + 1)):
+            self.assertEqual(self._post(urls).status_code, 400)
+        resp = self.client.post(self.url, data=json.dumps(["/medical_forum/api/messages/"]))
+        self.assertEqual(resp.status_code, 415)
+
+        # Only GET is dispatched
+        results = json.loads(self._post([self.url]).data.decode("utf-8"))
+        self.assertEqual(results[0]["status"], 405)
+
+
+if __name__ == "__main__":
+    print("Start running tests")
+    unittest.main()
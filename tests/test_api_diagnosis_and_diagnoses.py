@@ -148,6 +148,28 @@ class DiagnosesTestCase(ResourcesAPITestCase):
         resp = self.client.get(url)
         self.assertTrue(resp.status_code == 200)
 
+    def test_add_diagnoses_batch(self):
+        """
+        Test adding an array of diagnoses in one request, and none by a non doctor
+        """
+        print("(" + self.test_add_diagnoses_batch.__name__ + ")",
+              self.test_add_diagnoses_batch.__doc__)
+        resp = self.client.post(resources.API.url_for(resources.Diagnoses),
+                                headers={"Content-Type": JSON},
+                                data=json.dumps([self.diagnosis_by_doctor,
+                                                 self.diagnosis_by_patient]))
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.client.post(resources.API.url_for(resources.Diagnoses),
+                                headers={"Content-Type": JSON},
+                                data=json.dumps([self.diagnosis_by_doctor] * 2))
+        self.assertEqual(resp.status_code, 201)
+        items = json.loads(resp.data.decode("utf-8"))["items"]
+        self.assertEqual(len(items), 2)
+        for item in items:
+            resp = self.client.get(item["@controls"]["self"]["href"])
+            self.assertEqual(resp.status_code, 200)
+
     def test_add_diagnosis_nondoctor(self):
         """
         Test adding diagnoses to the database by a non doctor
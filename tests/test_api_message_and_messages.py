@@ -5,12 +5,18 @@ Modified on 26.03.2017
 @author: mika oja
 @author: yazan barhoush
 """
+import gzip
 import unittest
 import json
+import zlib
 import flask
 
 import medical_forum.resources as resources
 import medical_forum.database_engine as database
+import medical_forum.compression as compression
+import medical_forum.conditional as conditional
+import medical_forum.response_cache as response_cache
+import medical_forum.serializer as serializer
 
 # Default paths for .db and .sql files to create and populate the database.
 DEFAULT_DB_PATH = 'db/medical_forum_data_test.db'
@@ -220,6 +226,33 @@ class MessagesTestCase(ResourcesAPITestCase):
         # resp = self.client.get(url)
         # self.assertTrue(resp.status_code == 200)
 
+    def test_add_messages_batch(self):
+        """
+        Test adding an array of messages in one request, and none if one is wrong
+        """
+        print("(" + self.test_add_messages_batch.__name__ + ")",
+              self.test_add_messages_batch.__doc__)
+        resp = self.client.post(resources.API.url_for(resources.Messages),
+                                headers={"Content-Type": JSON},
+                                data=json.dumps([self.existing_user_request,
+                                                 self.non_existing_user_request]))
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post(resources.API.url_for(resources.Messages),
+                                headers={"Content-Type": JSON}, data=json.dumps([]))
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.client.post(resources.API.url_for(resources.Messages),
+                                headers={"Content-Type": JSON},
+                                data=json.dumps([self.existing_user_request] * 3))
+        self.assertEqual(resp.status_code, 201)
+        items = json.loads(resp.data.decode("utf-8"))["items"]
+        self.assertEqual(len(items), 3)
+        for item in items:
+            resp = self.client.get(item["@controls"]["self"]["href"])
+            self.assertEqual(resp.status_code, 200)
+        data = json.loads(self.client.get(self.url + "?limit=100").data.decode("utf-8"))
+        self.assertEqual(len(data["items"]), INITIAL_MESSAGES + 3)
+
     def test_add_message_nonexisting_user(self):
         """Test adding a message with non existing user"""
         print("(" + self.test_add_message_nonexisting_user.__name__ + ")",
@@ -319,6 +352,21 @@ class MessageTestCase(ResourcesAPITestCase):
         resp = self.client.get(self.url_wrong)
         self.assertEqual(resp.status_code, 404)
 
+    def test_wrong_url_error_body(self):
+        """
+        Checks that GET Message of a wrong message returns a Mason error
+        serialized with serializer.dumps, like the other error responses
+        """
+        print("(" + self.test_wrong_url_error_body.__name__ + ")",
+              self.test_wrong_url_error_body.__doc__)
+        resp = self.client.get(self.url_wrong)
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.headers.get("Content-Type", None),
+                         "{};{}".format(MASONJSON, "/profiles/error-profile"))
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["@error"]["@message"], "Message not found")
+        self.assertEqual(resp.data, serializer.dumps(data))
+
     # Modified from test_get_message(self):
     def test_get_message(self):
         """
@@ -340,6 +388,7 @@ class MessageTestCase(ResourcesAPITestCase):
             self.assertIn("medical_forum:delete", controls)
             self.assertIn("medical_forum:reply", controls)
             self.assertIn("atom-thread:in-reply-to", controls)
+            self.assertEqual(controls["atom-thread:replies"]["href"], self.url + "thread/")
 
             edit_ctrl = controls["edit"]
             self.assertIn("title", edit_ctrl)
@@ -544,6 +593,64 @@ class MessageTestCase(ResourcesAPITestCase):
                                headers={"Content-Type": JSON})
         self.assertEqual(resp.status_code, 400)
 
+    def test_conditional_get_message(self):
+        """
+        Checks that a GET with the ETag of the message is answered with 304
+        until the message is modified
+        """
+        print("(" + self.test_conditional_get_message.__name__ + ")",
+              self.test_conditional_get_message.__doc__)
+        conditional.reset_stats()
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp.headers["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        resp = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.data, b"")
+        self.assertEqual(resp.headers["ETag"], etag)
+        # Another message has another tag
+        resp = self.client.get(self.url.replace("msg-1", "msg-2"),
+                               headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+
+        resp = self.client.put(self.url, data=json.dumps(self.message_modify_req_1),
+                               headers={"Content-Type": JSON})
+        self.assertEqual(resp.status_code, 204)
+        resp = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+
+        stats = conditional.stats()
+        self.assertEqual(stats["requests"], 4)
+        self.assertEqual(stats["conditional"], 3)
+        self.assertEqual(stats["not_modified"], 1)
+        self.assertEqual(stats["not_modified_ratio"], 0.25)
+
+    def test_cached_message(self):
+        """
+        Checks that the body of a message is served from the cache until the
+        message is modified
+        """
+        print("(" + self.test_cached_message.__name__ + ")",
+              self.test_cached_message.__doc__)
+        response_cache.CACHE.clear()
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers["Content-Type"], first.headers["Content-Type"])
+        self.assertEqual(second.headers["ETag"], first.headers["ETag"])
+        stats = response_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+
+        resp = self.client.put(self.url, data=json.dumps(self.message_modify_req_1),
+                               headers={"Content-Type": JSON})
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(response_cache.stats()["invalidations"], 1)
+        data = json.loads(self.client.get(self.url).data.decode("utf-8"))
+        self.assertEqual(data["headline"], self.message_modify_req_1["headline"])
+
     # Modified from def test_delete_message(self):
     def test_delete_message(self):
         """
@@ -566,6 +673,419 @@ class MessageTestCase(ResourcesAPITestCase):
         resp = self.client.delete(self.url_wrong)
         self.assertEqual(resp.status_code, 404)
 
+    def test_compressed_message(self):
+        """
+        Checks that a message is sent compressed with the accepted encoding,
+        that the compressed body is cached and that it can be revalidated
+        """
+        print("(" + self.test_compressed_message.__name__ + ")",
+              self.test_compressed_message.__doc__)
+        response_cache.CACHE.clear()
+        compression.reset_stats()
+        min_size = resources.APP.config["COMPRESS_MIN_SIZE"]
+        resources.APP.config["COMPRESS_MIN_SIZE"] = 100
+        try:
+            identity = self.client.get(self.url)
+            self.assertNotIn("Content-Encoding", identity.headers)
+            self.assertIn("Accept-Encoding", identity.headers["Vary"])
+            for _ in range(2):
+                resp = self.client.get(self.url, headers={"Accept-Encoding": "gzip, deflate"})
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+                self.assertEqual(gzip.decompress(resp.data), identity.data)
+                self.assertEqual(resp.headers["ETag"], "W/" + identity.headers["ETag"])
+            resp = self.client.get(self.url, headers={"Accept-Encoding": "deflate;q=1, gzip;q=0.5"})
+            self.assertEqual(resp.headers["Content-Encoding"], "deflate")
+            self.assertEqual(zlib.decompress(resp.data), identity.data)
+
+            stats = compression.stats()["message"]
+            self.assertEqual((stats["responses"], stats["cached"]), (3, 1))
+            self.assertLess(stats["bytes_out"], stats["bytes_in"])
+
+            resp = self.client.get(self.url, headers={"Accept-Encoding": "gzip",
+                                                      "If-None-Match": resp.headers["ETag"]})
+            self.assertEqual(resp.status_code, 304)
+
+            resources.APP.config["COMPRESS_MIN_SIZE"] = len(identity.data) + 1
+            resp = self.client.get(self.url, headers={"Accept-Encoding": "gzip"})
+            self.assertNotIn("Content-Encoding", resp.headers)
+            self.assertEqual(resp.data, identity.data)
+        finally:
+            resources.APP.config["COMPRESS_MIN_SIZE"] = min_size
+
+    def test_sparse_message(self):
+        """
+        Checks that only the attributes selected with fields are sent, with
+        the id and the controls, and that unknown fields return 400
+        """
+        print("(" + self.test_sparse_message.__name__ + ")",
+              self.test_sparse_message.__doc__)
+        full = json.loads(self.client.get(self.url).data.decode("utf-8"))
+        resp = self.client.get(self.url + "?fields=headline,%20author")
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(set(data), {"headline", "author", "message_id", "@controls",
+                                     "@namespaces"})
+        self.assertEqual(data["headline"], full["headline"])
+        self.assertEqual(data["author"], full["author"])
+        self.assertEqual(data["@controls"], full["@controls"])
+
+        for query in ("?fields=headline,views", "?fields=body"):
+            resp = self.client.get(self.url + query)
+            self.assertEqual(resp.status_code, 400)
+
+
+class MessagesPaginationTestCase(ResourcesAPITestCase):
+    """Messages and History collections pagination tests"""
+    url = "/medical_forum/api/messages/"
+    history_url = "/medical_forum/api/messages/Dizzy/history/"
+
+    def _get(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return json.loads(resp.data.decode("utf-8"))
+
+    def test_walk_messages_pages(self):
+        """
+        Checks that following the next controls returns every message once,
+        the most recent first, and that prev goes back to the previous page
+        """
+        print("(" + self.test_walk_messages_pages.__name__ + ")",
+              self.test_walk_messages_pages.__doc__)
+        data = self._get(self.url + "?limit=5")
+        self.assertNotIn("prev", data["@controls"])
+        first_page = [item["id"] for item in data["items"]]
+        self.assertEqual(first_page[0], "msg-1")
+
+        seen = list(first_page)
+        pages = 1
+        second_page_url = data["@controls"]["next"]["href"]
+        while "next" in data["@controls"]:
+            data = self._get(data["@controls"]["next"]["href"])
+            self.assertLessEqual(len(data["items"]), 5)
+            seen.extend(item["id"] for item in data["items"])
+            pages += 1
+        self.assertEqual(pages, 4)
+        self.assertEqual(len(seen), INITIAL_MESSAGES)
+        self.assertEqual(len(set(seen)), INITIAL_MESSAGES)
+
+        data = self._get(second_page_url)
+        data = self._get(data["@controls"]["prev"]["href"])
+        self.assertEqual([item["id"] for item in data["items"]], first_page)
+        self.assertNotIn("prev", data["@controls"])
+        self.assertIn("next", data["@controls"])
+
+    def test_walk_messages_by_activity(self):
+        """
+        Checks that sort=activity lists the threads, the last active first,
+        with their aggregates, and that the next controls keep the order
+        """
+        print("(" + self.test_walk_messages_by_activity.__name__ + ")",
+              self.test_walk_messages_by_activity.__doc__)
+        data = self._get(self.url + "?sort=activity&limit=2")
+        item = data["items"][0]
+        self.assertEqual((item["id"], item["replies"], item["last_activity"],
+                          item["participants"]), ("msg-1", 2, 1519474612, 3))
+        self.assertIn("sort=activity", data["@controls"]["next"]["href"])
+        seen = [item["id"] for item in data["items"]]
+        while "next" in data["@controls"]:
+            data = self._get(data["@controls"]["next"]["href"])
+            seen.extend(item["id"] for item in data["items"])
+        self.assertEqual(seen, ["msg-1", "msg-3", "msg-2", "msg-7", "msg-4"])
+
+        # A new reply makes its thread the last active
+        resp = self.client.post("/medical_forum/api/messages/msg-4/",
+                                headers={"Content-Type": JSON},
+                                data=json.dumps({"headline": "Reply", "articleBody": "Body",
+                                                 "author": "Dizzy"}))
+        self.assertEqual(resp.status_code, 201)
+        data = self._get(self.url + "?sort=activity&fields=replies")
+        self.assertEqual(data["items"][0]["id"], "msg-4")
+        self.assertEqual(data["items"][0]["replies"], 3)
+        self.assertNotIn("headline", data["items"][0])
+
+    def test_wrong_page_parameters(self):
+        """
+        Checks that malformed cursors and limits return 400
+        """
+        print("(" + self.test_wrong_page_parameters.__name__ + ")",
+              self.test_wrong_page_parameters.__doc__)
+        for query in ("?after=notacursor", "?limit=0", "?limit=many",
+                      "?after=WzEsMl0&before=WzEsMl0", "?sort=views",
+                      "?sort=timestamp&fields=replies"):
+            resp = self.client.get(self.url + query)
+            self.assertEqual(resp.status_code, 400)
+
+    def test_max_page_size(self):
+        """
+        Checks that the page size is capped by the server
+        """
+        print("(" + self.test_max_page_size.__name__ + ")",
+              self.test_max_page_size.__doc__)
+        data = self._get(self.url + "?limit=1000000")
+        self.assertEqual(len(data["items"]), INITIAL_MESSAGES)
+        self.assertNotIn("next", data["@controls"])
+
+    def test_history_pages_keep_timestamps(self):
+        """
+        Checks that the history pages keep the timestamp restrictions of the
+        first page
+        """
+        print("(" + self.test_history_pages_keep_timestamps.__name__ + ")",
+              self.test_history_pages_keep_timestamps.__doc__)
+        data = self._get(self.history_url + "?after=1000&length=1")
+        self.assertEqual([item["id"] for item in data["items"]], ["msg-8"])
+        data = self._get(data["@controls"]["next"]["href"])
+        self.assertEqual([item["id"] for item in data["items"]], ["msg-15"])
+        # msg-9 is older than the after timestamp
+        self.assertNotIn("next", data["@controls"])
+
+    def test_conditional_get_messages(self):
+        """
+        Checks that the pages of the collection keep their ETag until a
+        message is added, and that each page has its own
+        """
+        print("(" + self.test_conditional_get_messages.__name__ + ")",
+              self.test_conditional_get_messages.__doc__)
+        # The streamed bodies are read so that the connections are released
+        resp = self.client.get(self.url + "?limit=5")
+        etag = resp.headers["ETag"]
+        self.assertTrue(resp.data)
+        resp = self.client.get(self.url + "?limit=5", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        resp = self.client.get(self.url + "?limit=6", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.data)
+
+        resp = self.client.post(self.url, headers={"Content-Type": JSON},
+                                data=json.dumps({"headline": "Title", "articleBody": "Body",
+                                                 "author": "PoorGuy"}))
+        self.assertEqual(resp.status_code, 201)
+        resp = self.client.get(self.url + "?limit=5", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+        self.assertTrue(resp.data)
+
+    def test_cached_messages(self):
+        """
+        Checks that a streamed page is cached once it has been written, and
+        that the cached body is the streamed one
+        """
+        print("(" + self.test_cached_messages.__name__ + ")",
+              self.test_cached_messages.__doc__)
+        response_cache.CACHE.clear()
+        body = self.client.get(self.url + "?limit=4").data
+        self.assertEqual(response_cache.stats()["entries"], 1)
+        self.assertEqual(self.client.get(self.url + "?limit=4").data, body)
+        self.assertEqual(response_cache.stats()["hits"], 1)
+        # Another page is another entry
+        self.assertNotEqual(self.client.get(self.url + "?limit=3").data, body)
+        self.assertEqual(response_cache.stats()["entries"], 2)
+
+        # A write by another connection is not seen by the cache, but changes the ETag
+        connection = ENGINE.connect()
+        connection.create_message("Title", "Body", "PoorGuy")
+        connection.close()
+        data = json.loads(self.client.get(self.url + "?limit=4").data.decode("utf-8"))
+        self.assertEqual(data["items"][0]["headline"], "Title")
+        self.assertEqual(response_cache.stats()["stale"], 1)
+
+    def test_streamed_messages(self):
+        """
+        Checks that the collection is streamed with the same body serializer.dumps
+        would produce, and that the connection is kept until it is written
+        """
+        print("(" + self.test_streamed_messages.__name__ + ")",
+              self.test_streamed_messages.__doc__)
+        engine = resources.APP.config["Engine"]
+        resp = self.client.get(self.url + "?limit=7", buffered=False)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.is_streamed)
+        self.assertEqual(engine.pool_stats("reader")["in_use"], 1)
+        body = b"".join(resp.response).decode("utf-8")
+        resp.close()
+        self.assertEqual(engine.pool_stats("reader")["in_use"], 0)
+
+        data = json.loads(body)
+        self.assertEqual(len(data["items"]), 7)
+        self.assertEqual(list(data)[-1], "items")
+        self.assertEqual(body, serializer.dumps(data).decode("utf-8"))
+
+    def test_compressed_messages(self):
+        """
+        Checks that a streamed collection is compressed chunk by chunk into
+        the same body
+        """
+        print("(" + self.test_compressed_messages.__name__ + ")",
+              self.test_compressed_messages.__doc__)
+        response_cache.CACHE.clear()
+        resp = self.client.get(self.url + "?limit=7", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", resp.headers)
+        body = gzip.decompress(resp.data)
+        self.assertEqual(body, self.client.get(self.url + "?limit=7").data)
+        # The body and its compressed version were cached by the first request
+        resp = self.client.get(self.url + "?limit=7", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(gzip.decompress(resp.data), body)
+        self.assertEqual(response_cache.stats()["encoded_hits"], 1)
+
+    def test_sparse_messages(self):
+        """
+        Checks that the items only have the attributes selected with fields,
+        on every page, and that unknown fields return 400
+        """
+        print("(" + self.test_sparse_messages.__name__ + ")",
+              self.test_sparse_messages.__doc__)
+        full = self._get(self.url + "?limit=5")
+        data = self._get(self.url + "?limit=5&fields=id")
+        self.assertEqual([set(item) for item in data["items"]], [{"id", "@controls"}] * 5)
+        self.assertEqual([item["id"] for item in data["items"]],
+                         [item["id"] for item in full["items"]])
+        self.assertIn("fields=id", data["@controls"]["next"]["href"])
+        data = self._get(data["@controls"]["next"]["href"])
+        self.assertEqual(set(data["items"][0]), {"id", "@controls"})
+
+        data = self._get(self.history_url + "?fields=headline")
+        self.assertTrue(all("headline" in item for item in data["items"]))
+
+        for url in (self.url + "?fields=articleBody", self.history_url + "?fields=x"):
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 400)
+
+
+class MessageSearchTestCase(ResourcesAPITestCase):
+    """MessageSearch resource API tests"""
+    url = "/medical_forum/api/messages/search/"
+
+    def _get(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return json.loads(resp.data.decode("utf-8"))
+
+    def test_search_messages(self):
+        """
+        Checks that the messages found are returned with their snippet, the
+        best match first, and that the control is in the messages collection
+        """
+        print("(" + self.test_search_messages.__name__ + ")",
+              self.test_search_messages.__doc__)
+        data = self._get(self.url + "?q=throat")
+        self.assertEqual(len(data["items"]), 1)
+        item = data["items"][0]
+        self.assertEqual(item["id"], "msg-1")
+        self.assertEqual(item["headline"], "Soreness in the throat")
+        self.assertIn("<b>throat</b>", item["snippet"])
+        self.assertEqual(item["@controls"]["self"]["href"], "/medical_forum/api/messages/msg-1/")
+        self.assertEqual(data["@controls"]["self"]["href"], self.url + "?q=throat")
+        self.assertEqual(self._get(self.url + "?q=throat+dizzy")["items"], [])
+
+        control = self._get("/medical_forum/api/messages/")["@controls"][
+            "medical_forum:search-messages"]
+        self.assertEqual(control["href"], self.url + "{?q,limit}")
+        self.assertTrue(control["isHrefTemplate"])
+
+    def test_walk_search_pages(self):
+        """
+        Checks that following the next controls returns every message found
+        once, and that prev goes back to the previous page
+        """
+        print("(" + self.test_walk_search_pages.__name__ + ")",
+              self.test_walk_search_pages.__doc__)
+        found = [item["id"] for item in self._get(self.url + "?q=tony+car")["items"]]
+        self.assertGreater(len(found), 4)
+        data = self._get(self.url + "?q=tony+car&limit=2")
+        seen = [item["id"] for item in data["items"]]
+        second_page_url = data["@controls"]["next"]["href"]
+        self.assertIn("q=tony+car", second_page_url)
+        while "next" in data["@controls"]:
+            data = self._get(data["@controls"]["next"]["href"])
+            seen.extend(item["id"] for item in data["items"])
+        self.assertEqual(seen, found)
+
+        data = self._get(self._get(second_page_url)["@controls"]["prev"]["href"])
+        self.assertEqual([item["id"] for item in data["items"]], found[:2])
+
+    def test_wrong_search(self):
+        """
+        Checks that a search without words or with a malformed page returns 400
+        """
+        print("(" + self.test_wrong_search.__name__ + ")", self.test_wrong_search.__doc__)
+        for query in ("", "?q=", "?q=+*+", "?q=throat&limit=0", "?q=throat&after=x"):
+            resp = self.client.get(self.url + query)
+            self.assertEqual(resp.status_code, 400)
+
+
+
+class MessageThreadTestCase(ResourcesAPITestCase):
+    """MessageThread resource API tests"""
+    url = "/medical_forum/api/messages/msg-2/thread/"
+
+    def _get(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return json.loads(resp.data.decode("utf-8"))
+
+    def test_get_thread(self):
+        """
+        Checks that the message and all its replies are returned depth first,
+        with their depth, and that the depth parameter cuts the tree
+        """
+        print("(" + self.test_get_thread.__name__ + ")", self.test_get_thread.__doc__)
+        data = self._get(self.url)
+        self.assertEqual([(item["id"], item["depth"], item["reply_to"])
+                          for item in data["items"]],
+                         [("msg-2", 0, None), ("msg-5", 1, "msg-2"), ("msg-13", 2, "msg-5"),
+                          ("msg-11", 1, "msg-2"), ("msg-19", 1, "msg-2")])
+        item = data["items"][2]
+        self.assertEqual(item["headline"], "dat")
+        self.assertEqual(item["author"], "Neal")
+        self.assertEqual(item["@controls"]["self"]["href"], "/medical_forum/api/messages/msg-13/")
+        self.assertEqual(data["@controls"]["up"]["href"], "/medical_forum/api/messages/msg-2/")
+        self.assertNotIn("next", data["@controls"])
+
+        data = self._get(self.url + "?depth=1")
+        self.assertEqual([item["id"] for item in data["items"]],
+                         ["msg-2", "msg-5", "msg-11", "msg-19"])
+        data = self._get("/medical_forum/api/messages/msg-13/thread/")
+        self.assertEqual([(item["id"], item["depth"]) for item in data["items"]],
+                         [("msg-13", 0)])
+
+    def test_walk_thread_pages(self):
+        """
+        Checks that following the next controls returns every message of the
+        thread once, keeping the depth, and that prev goes back
+        """
+        print("(" + self.test_walk_thread_pages.__name__ + ")",
+              self.test_walk_thread_pages.__doc__)
+        data = self._get(self.url + "?limit=2&depth=1")
+        seen = [item["id"] for item in data["items"]]
+        second_page_url = data["@controls"]["next"]["href"]
+        self.assertIn("depth=1", second_page_url)
+        while "next" in data["@controls"]:
+            data = self._get(data["@controls"]["next"]["href"])
+            seen.extend(item["id"] for item in data["items"])
+        self.assertEqual(seen, ["msg-2", "msg-5", "msg-11", "msg-19"])
+
+        data = self._get(self._get(second_page_url)["@controls"]["prev"]["href"])
+        self.assertEqual([item["id"] for item in data["items"]], ["msg-2", "msg-5"])
+
+    def test_wrong_thread(self):
+        """
+        Checks that a thread of a message that does not exist returns 404, and
+        a wrong depth or page returns 400
+        """
+        print("(" + self.test_wrong_thread.__name__ + ")", self.test_wrong_thread.__doc__)
+        resp = self.client.get("/medical_forum/api/messages/msg-290/thread/")
+        self.assertEqual(resp.status_code, 404)
+        # A cursor of a message of another thread
+        other = self._get("/medical_forum/api/messages/msg-1/thread/?limit=1")
+        cursor = other["@controls"]["next"]["href"].split("after=")[1].split("&")[0]
+        for query in ("?depth=-1", "?depth=x", "?limit=0", "?after=x",
+                      "?after=" + cursor):
+            resp = self.client.get(self.url + query)
+            self.assertEqual(resp.status_code, 400)
+
+
 
 if __name__ == "__main__":
     print("Start running tests")
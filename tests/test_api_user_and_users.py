@@ -225,6 +225,58 @@ class UsersTestCase(ResourcesAPITestCase):
             self.assertEqual(item["@controls"]["profile"]
                              ["href"], FORUM_USER_PROFILE)
 
+    def test_get_users_pages(self):
+        """
+        Checks that the users can be listed page by page
+        """
+        print("(" + self.test_get_users_pages.__name__ + ")",
+              self.test_get_users_pages.__doc__)
+        usernames = []
+        url = self.url + "?limit=10"
+        while url is not None:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            data = json.loads(resp.data.decode("utf-8"))
+            self.assertLessEqual(len(data["items"]), 10)
+            usernames.extend(item["username"] for item in data["items"])
+            url = data["@controls"].get("next", {}).get("href")
+        self.assertEqual(len(usernames), INITIAL_USERS)
+        self.assertEqual(usernames[0], self.PATIENT_USERNAME)
+
+        resp = self.client.get(self.url + "?before=bad")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_get_users_by_msg_count(self):
+        """
+        Checks that the users can be listed page by page, the users with the
+        most messages first
+        """
+        print("(" + self.test_get_users_by_msg_count.__name__ + ")",
+              self.test_get_users_by_msg_count.__doc__)
+        items = []
+        url = self.url + "?limit=10&sort=msg_count"
+        while url is not None:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            data = json.loads(resp.data.decode("utf-8"))
+            items.extend(data["items"])
+            url = data["@controls"].get("next", {}).get("href")
+            if url is not None:
+                self.assertIn("sort=msg_count", url)
+        self.assertEqual(len(items), INITIAL_USERS)
+        self.assertEqual([(item["username"], item["msg_count"]) for item in items[:2]],
+                         [("Dizzy", 3), ("Brendan", 2)])
+        counts = [item["msg_count"] for item in items]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+
+        resp = self.client.get(self.url + "?sort=msg_count&fields=msg_count&limit=1")
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(set(data["items"][0]), {"username", "msg_count", "@controls"})
+        resp = self.client.get(self.url + "?sort=views")
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(self.url + "?sort=msg_count&after=1")
+        self.assertEqual(resp.status_code, 400)
+
     def test_get_users_mimetype(self):
         """
         Checks that GET Messages return correct status code and data format
@@ -265,6 +317,32 @@ class UsersTestCase(ResourcesAPITestCase):
         resp2 = self.client.get(url)
         self.assertEqual(resp2.status_code, 200)
 
+    def test_add_users_batch(self):
+        """
+        Checks that an array of users is added in one request, and none on conflict
+        """
+        print("(" + self.test_add_users_batch.__name__ + ")",
+              self.test_add_users_batch.__doc__)
+        batch = [self.user_1, self.user_mandatory_params_only]
+        resp = self.client.post(resources.API.url_for(resources.Users),
+                                headers={"Content-Type": JSON},
+                                data=json.dumps(batch + [self.user_existing_username]))
+        self.assertEqual(resp.status_code, 409)
+        resp = self.client.get(resources.API.url_for(
+            resources.User, username=self.NEW_PATIENT_USERNAME))
+        self.assertEqual(resp.status_code, 404)
+
+        resp = self.client.post(resources.API.url_for(resources.Users),
+                                headers={"Content-Type": JSON},
+                                data=json.dumps(batch))
+        self.assertEqual(resp.status_code, 201)
+        items = json.loads(resp.data.decode("utf-8"))["items"]
+        self.assertEqual([item["username"] for item in items],
+                         [self.NEW_PATIENT_USERNAME, "anotheruser"])
+        for item in items:
+            resp = self.client.get(item["@controls"]["self"]["href"])
+            self.assertEqual(resp.status_code, 200)
+
     def test_add_user_missing_mandatory(self):
         """
         Test that it returns error when is missing a mandatory data
@@ -367,6 +445,47 @@ class UserTestCase(ResourcesAPITestCase):
         resp2 = self.client.get(self.wrong_user_url)
         self.assertEqual(resp2.status_code, 404)
 
+    def test_conditional_get_user(self):
+        """
+        Checks that the ETag of a user changes when its profile is modified or
+        the user is deleted
+        """
+        print("(" + self.test_conditional_get_user.__name__ + ")",
+              self.test_conditional_get_user.__doc__)
+        etag = self.client.get(self.user1_url).headers["ETag"]
+        resp = self.client.get(self.user1_url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+
+        connection = ENGINE.connect()
+        connection.con.execute("UPDATE users_profile SET speciality = 'Nose' WHERE user_id = 1")
+        connection.close()
+        resp = self.client.get(self.user1_url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.data.decode("utf-8"))["speciality"], "Nose")
+        etag = resp.headers["ETag"]
+
+        self.assertEqual(self.client.delete(self.user1_url).status_code, 204)
+        resp = self.client.get(self.user1_url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_get_user_msg_count(self):
+        """
+        Checks that the number of messages of a user is sent and follows the
+        new messages of the user
+        """
+        print("(" + self.test_get_user_msg_count.__name__ + ")",
+              self.test_get_user_msg_count.__doc__)
+        resp = self.client.get(self.user1_url)
+        self.assertEqual(json.loads(resp.data.decode("utf-8"))["msg_count"], 1)
+        etag = resp.headers["ETag"]
+
+        connection = ENGINE.connect()
+        connection.create_message("Fever", "Since yesterday", "PoorGuy")
+        connection.close()
+        resp = self.client.get(self.user1_url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.data.decode("utf-8"))["msg_count"], 2)
+
     def test_get_user_mimetype(self):
         """
         Checks that GET Messages return correct status code and data format
@@ -379,6 +498,24 @@ class UserTestCase(ResourcesAPITestCase):
         self.assertEqual(resp.headers.get("Content-Type", None),
                          "{};{}".format(MASONJSON, FORUM_USER_PROFILE))
 
+    def test_sparse_user(self):
+        """
+        Checks that only the attributes selected with fields are sent with the
+        username, and that the controls are unchanged
+        """
+        print("(" + self.test_sparse_user.__name__ + ")",
+              self.test_sparse_user.__doc__)
+        full = json.loads(self.client.get(self.user1_url).data.decode("utf-8"))
+        resp = self.client.get(self.user1_url + "?fields=speciality")
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(set(data), {"username", "speciality", "@controls", "@namespaces"})
+        self.assertEqual(data["speciality"], full["speciality"])
+        self.assertEqual(data["@controls"], full["@controls"])
+
+        resp = self.client.get(self.user1_url + "?fields=email")
+        self.assertEqual(resp.status_code, 400)
+
 
 if __name__ == "__main__":
     print("Start running tests")
@@ -0,0 +1,181 @@
+"""
+Testing unit for the ASGI variant of the API server.
+"""
+
+import asyncio
+import json
+import threading
+import unittest
+
+import medical_forum.resources as resources
+import medical_forum.database_engine as database
+import medical_forum.asgi as asgi
+
+DEFAULT_DB_PATH = 'db/medical_forum_data_test.db'
+ENGINE = database.Engine(DEFAULT_DB_PATH)
+
+resources.APP.config["TESTING"] = True
+resources.APP.config["SERVER_NAME"] = "localhost:5000"
+resources.APP.config.update({"Engine": ENGINE})
+
+JSON = "application/json"
+
+
+async def call(app, method, path, query=b'', headers=(), body=b''):
+    """
+    Sends a request to an ASGI application.
+
+    :return: the status code, the headers (a dictionary) and the body.
+    """
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+             'method': method, 'scheme': 'http', 'path': path, 'root_path': '',
+             'query_string': query, 'server': ('localhost', 5000),
+             'client': ('127.0.0.1', 40000),
+             'headers': [(b'host', b'localhost:5000')] + list(headers)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    headers = {name.decode('latin-1'): value.decode('latin-1')
+               for name, value in sent[0]['headers']}
+    return sent[0]['status'], headers, b''.join(message.get('body', b'')
+                                                 for message in sent[1:])
+
+
+class AsgiTestCase(unittest.TestCase):
+    """
+    Test cases for the requests served through the ASGI application
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        print("Testing ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        print("Testing started for: ", self.id())
+        ENGINE.populate_tables()
+        self.app = asgi.AsgiApp(resources.APP, read_threads=2)
+        self.client = resources.APP.test_client()
+
+    def tearDown(self):
+        self.app.close()
+        ENGINE.clear()
+
+    def test_same_responses(self):
+        """
+        Checks that the ASGI responses are the ones of the WSGI application
+        """
+        print('(' + self.test_same_responses.__name__ + ')',
+              self.test_same_responses.__doc__)
+        for path, query in (('/medical_forum/api/messages/msg-1/', b''),
+                            ('/medical_forum/api/messages/', b'limit=3'),
+                            ('/medical_forum/api/users/PoorGuy/', b''),
+                            ('/medical_forum/api/messages/msg-290/', b'')):
+            expected = self.client.get(path, query_string=query)
+            status, headers, body = asyncio.run(call(self.app, 'GET', path, query))
+            self.assertEqual(status, expected.status_code)
+            self.assertEqual(headers['content-type'], expected.headers['Content-Type'])
+            self.assertEqual(body, expected.data)
+
+    def test_concurrent_reads(self):
+        """
+        Checks that concurrent reads are served by the read threads, each one
+        keeping its own connection
+        """
+        print('(' + self.test_concurrent_reads.__name__ + ')',
+              self.test_concurrent_reads.__doc__)
+        engine = resources.APP.config["Engine"]
+        checkouts = engine.pool_stats('reader')['checkouts']
+
+        async def requests():
+            return await asyncio.gather(*[
+                call(self.app, 'GET', '/medical_forum/api/messages/msg-%d/' % (number % 5 + 1))
+                for number in range(30)])
+        responses = asyncio.run(requests())
+        self.assertEqual([status for status, _, _ in responses], [200] * 30)
+        headlines = {json.loads(body.decode('utf-8'))['headline'] for _, _, body in responses}
+        self.assertEqual(len(headlines), 5)
+        self.assertLessEqual(engine.pool_stats('reader')['checkouts'] - checkouts, 2)
+
+    def test_write_then_read(self):
+        """
+        Checks that a message added through the writer thread is read by the
+        read threads
+        """
+        print('(' + self.test_write_then_read.__name__ + ')',
+              self.test_write_then_read.__doc__)
+        path = '/medical_forum/api/messages/'
+        _, _, before = asyncio.run(call(self.app, 'GET', path, b'limit=1'))
+        status, headers, _ = asyncio.run(call(
+            self.app, 'POST', path, headers=[(b'content-type', JSON.encode('ascii'))],
+            body=json.dumps({"headline": "Title", "articleBody": "Body",
+                             "author": "PoorGuy"}).encode('utf-8')))
+        self.assertEqual(status, 201)
+        message_id = headers['location'].rstrip('/').rsplit('/', 1)[-1]
+        _, _, after = asyncio.run(call(self.app, 'GET', path, b'limit=1'))
+        self.assertNotEqual(after, before)
+        self.assertEqual(json.loads(after.decode('utf-8'))['items'][0]['id'], message_id)
+
+    def test_batch_on_read_threads(self):
+        """
+        Checks that a batch of GET requests is served by the read threads
+        although it is a POST, and the other POST requests by the writer thread
+        """
+        print('(' + self.test_batch_on_read_threads.__name__ + ')',
+              self.test_batch_on_read_threads.__doc__)
+        threads = []
+
+        def forum(environ, start_response):
+            threads.append(threading.current_thread().name)
+            return resources.APP(environ, start_response)
+
+        app = asgi.AsgiApp(forum, read_threads=2)
+        try:
+            status, _, _ = asyncio.run(call(
+                app, 'POST', '/medical_forum/api/batch/',
+                headers=[(b'content-type', JSON.encode('ascii'))],
+                body=json.dumps(['/medical_forum/api/messages/msg-1/']).encode('utf-8')))
+            self.assertEqual(status, 200)
+            status, _, _ = asyncio.run(call(
+                app, 'POST', '/medical_forum/api/messages/',
+                headers=[(b'content-type', JSON.encode('ascii'))],
+                body=json.dumps({"headline": "Title", "articleBody": "Body",
+                                 "author": "PoorGuy"}).encode('utf-8')))
+            self.assertEqual(status, 201)
+        finally:
+            app.close()
+        self.assertTrue(threads[0].startswith('forum-reader'))
+        self.assertTrue(threads[1].startswith('forum-writer'))
+
+    def test_database_replaced(self):
+        """
+        Checks that the read threads open a new connection when the database
+        file is replaced
+        """
+        print('(' + self.test_database_replaced.__name__ + ')',
+              self.test_database_replaced.__doc__)
+        path = '/medical_forum/api/messages/msg-1/'
+        self.assertEqual(asyncio.run(call(self.app, 'GET', path))[0], 200)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+        self.assertEqual(asyncio.run(call(self.app, 'GET', path))[0], 404)
+        ENGINE.populate_tables()
+        self.assertEqual(asyncio.run(call(self.app, 'GET', path))[0], 200)
+
+
+if __name__ == '__main__':
+    print('Running ASGI tests')
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Testing unit for the registry of the Mason controls in
+medical_forum/controls.py.
+"""
+
+import json
+import unittest
+
+from medical_forum import controls, resources
+from medical_forum.forum_object import ForumObject
+
+
+class ControlRegistryTestCase(unittest.TestCase):
+    """
+    Test cases for the controls shared by the envelopes
+    """
+
+    def setUp(self):
+        print("Testing started for: ", self.id())
+        controls.reset()
+
+    def test_registry_built_once(self):
+        """
+        Check that the registry is built on the first lookup and then reused
+        """
+        print('(' + self.test_registry_built_once.__name__ + ')',
+              self.test_registry_built_once.__doc__)
+        with self.assertRaises(RuntimeError):
+            controls.registry()
+        with resources.APP.test_request_context():
+            registry = controls.registry()
+            self.assertIs(controls.registry(), registry)
+            self.assertEqual(registry.urls["messages"], "/medical_forum/api/messages/")
+        with resources.APP.test_request_context(base_url="http://localhost:5000/forum"):
+            self.assertEqual(controls.registry().urls["messages"],
+                             "/forum/medical_forum/api/messages/")
+
+    def test_read_only(self):
+        """
+        Check that the shared controls and schemas can not be modified
+        """
+        print('(' + self.test_read_only.__name__ + ')', self.test_read_only.__doc__)
+        with resources.APP.test_request_context():
+            envelope = ForumObject()
+            envelope.add_control_add_message()
+        control = envelope["@controls"]["medical_forum:add-message"]
+        with self.assertRaises(TypeError):
+            control["href"] = "/"
+        with self.assertRaises(TypeError):
+            control["schema"]["properties"].pop("headline")
+        with self.assertRaises(TypeError):
+            control["schema"]["required"][0] = "author"
+        # The envelope itself can still be modified
+        envelope["@controls"]["medical_forum:add-message"] = {}
+
+    def test_envelope_unchanged(self):
+        """
+        Check that the controls from the registry serialize as the ones built per call
+        """
+        print('(' + self.test_envelope_unchanged.__name__ + ')',
+              self.test_envelope_unchanged.__doc__)
+        with resources.APP.test_request_context():
+            envelope = ForumObject()
+            envelope.add_control_messages_all()
+            envelope.add_control_users_all()
+            envelope.add_control_diagnoses_all()
+            envelope.add_control_add_message()
+            envelope.add_control_add_user()
+            envelope.add_control_add_diagnosis()
+            envelope.add_control_messages_history("PoorGuy")
+            envelope.add_control_edit_public_profile("PoorGuy")
+        expected = {"@controls": {
+            "medical_forum:messages-all": {
+                "href": "/medical_forum/api/messages/", "title": "All messages"},
+            "medical_forum:users-all": {
+                "href": "/medical_forum/api/users/", "title": "List users"},
+            "medical_forum:diagnoses-all": {
+                "href": "/medical_forum/api/diagnoses/", "title": "All diagnoses"},
+            "medical_forum:add-message": {
+                "href": "/medical_forum/api/messages/", "title": "Create message",
+                "encoding": "json", "method": "POST",
+                "schema": controls.message_schema()},
+            "medical_forum:add-user": {
+                "href": "/medical_forum/api/users/", "title": "Create user",
+                "encoding": "json", "method": "POST",
+                "schemaUrl": "/medical_forum/schema/user/"},
+            "medical_forum:add-diagnosis": {
+                "href": "/medical_forum/api/diagnoses/", "title": "Create diagnosis",
+                "encoding": "json", "method": "POST",
+                "schema": controls.diagnosis_schema()},
+            "medical_forum:messages-history": {
+                "href": "/medical_forum/api/messages/PoorGuy/history{?limit,before,after}",
+                "title": "Message history", "isHrefTemplate": True,
+                "schema": controls.history_schema()},
+            "edit": {
+                "href": "/medical_forum/api/users/PoorGuy/public_profile/",
+                "title": "Edit this public profile", "encoding": "json", "method": "PUT",
+                "schema": controls.public_profile_schema()}
+        }}
+        self.assertEqual(json.dumps(envelope), json.dumps(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
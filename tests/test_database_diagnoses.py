@@ -124,6 +124,23 @@ class DatabaseDiagnosesTestCase(unittest.TestCase):
         self.assertIsNone(
             self.connection.get_diagnosis(NON_EXIST_DIAGNOSIS_ID))
 
+    def test_get_diagnoses_filters(self):
+        """
+        Test get_diagnoses filtered by user, by message and by both of them
+        """
+        print('(' + self.test_get_diagnoses_filters.__name__+')',
+              self.test_get_diagnoses_filters.__doc__)
+        diagnoses = self.connection.get_diagnoses(user_id=9)
+        self.assertEqual([dgs['diagnosis_id'] for dgs in diagnoses], ['dgs-13', 'dgs-18'])
+        diagnoses = self.connection.get_diagnoses(message_id='msg-7')
+        self.assertEqual([dgs['diagnosis_id'] for dgs in diagnoses], ['dgs-1', 'dgs-16'])
+        diagnoses = self.connection.get_diagnoses(message_id='msg-9', user_id='9')
+        self.assertEqual([dgs['diagnosis_id'] for dgs in diagnoses], ['dgs-18'])
+        self.assertEqual(self.connection.get_diagnoses(message_id='msg-7', user_id=9), [])
+        diagnoses = self.connection.get_diagnoses(user_id=9, number_of_diagnoses=1,
+                                                  start_after=(13,))
+        self.assertEqual([dgs['diagnosis_id'] for dgs in diagnoses], ['dgs-18'])
+
     def test_append_diagnosis(self):
         """
         Test that a new diagnosis can be added and check its data after adding
@@ -137,6 +154,27 @@ class DatabaseDiagnosesTestCase(unittest.TestCase):
         get_new_diagnosis = self.connection.get_diagnosis(new_diagnosis_id)
         self.assertDictContainsSubset(NEW_DIAGNOSIS, get_new_diagnosis)
 
+    def test_create_diagnoses_bulk(self):
+        """
+        Test that several diagnoses are created in one call, and none if one is not valid
+        """
+        print('(' + self.test_create_diagnoses_bulk.__name__+')',
+              self.test_create_diagnoses_bulk.__doc__)
+        diagnosis = dict(NEW_DIAGNOSIS, user_id=DOCTOR_ID)
+        other = dict(diagnosis, message_id='msg-9', disease='cold')
+        with self.assertRaises(ValueError):
+            self.connection.create_diagnoses_bulk(
+                [diagnosis, dict(diagnosis, user_id=NOT_DOCTOR_ID)])
+        self.assertIsNone(self.connection.create_diagnoses_bulk(
+            [diagnosis, dict(diagnosis, message_id='msg-200')]))
+        self.assertEqual(len(self.connection.get_diagnoses()), INITIAL_DIAGNOSIS_COUNT)
+
+        ids = self.connection.create_diagnoses_bulk([diagnosis, other])
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(self.connection.get_diagnosis(ids[0])['message_id'], 'msg-3')
+        self.assertEqual(self.connection.get_diagnosis(ids[1])['disease'], 'cold')
+        self.assertEqual(len(self.connection.get_diagnoses()), INITIAL_DIAGNOSIS_COUNT + 2)
+
     def test_append_diagnosis_nondoctor(self):
         """
         Test that a new diagnosis cannot be added by a non-doctor user
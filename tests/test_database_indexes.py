@@ -0,0 +1,217 @@
+"""
+Database API testing unit for the secondary indexes managed by the Engine.
+
+Each hot query of the Connection is checked with EXPLAIN QUERY PLAN to make
+sure that SQLite searches an index instead of scanning the whole table.
+"""
+
+import sqlite3
+import unittest
+
+from medical_forum.database_engine import INDEXES
+from medical_forum.database_connection import THREAD_QUERY
+from .utils import ENGINE, DB_PATH
+
+# (description, query, parameters, expected index)
+HOT_QUERIES = (
+    ('history of a user',
+     'SELECT * FROM messages WHERE username = ? ORDER BY timestamp DESC',
+     ('Dizzy',), 'idx_messages_username_timestamp'),
+    ('messages ordered by timestamp',
+     'SELECT * FROM messages ORDER BY timestamp DESC',
+     (), 'idx_messages_timestamp'),
+    ('messages of a user id',
+     'DELETE FROM messages WHERE user_id = ?',
+     (1,), 'idx_messages_user_id'),
+    ('replies of a message (reply_to cascade)',
+     'SELECT message_id FROM messages WHERE reply_to = ?',
+     (1,), 'idx_messages_reply_to'),
+    ('replies walked by the thread of a message',
+     THREAD_QUERY, {'root': 2, 'depth': 10, 'path': '', 'walk': -1, 'limit': -1},
+     'idx_messages_reply_to'),
+    ('threads by last activity',
+     'SELECT * FROM thread_stats JOIN messages ON messages.message_id = thread_stats.root_id '
+     'WHERE (thread_stats.last_timestamp, thread_stats.root_id) < (?, ?) '
+     'ORDER BY thread_stats.last_timestamp DESC, thread_stats.root_id DESC',
+     (1000, 10), 'idx_thread_stats_last_timestamp'),
+    ('diagnoses of a user',
+     'SELECT * FROM diagnosis WHERE user_id = ? ORDER BY diagnosis_id ASC',
+     (4,), 'idx_diagnosis_user_id'),
+    ('diagnoses of a message',
+     'SELECT * FROM diagnosis WHERE message_id = ? ORDER BY diagnosis_id ASC',
+     (1,), 'idx_diagnosis_message_id'),
+    ('deletion of the diagnoses of a user',
+     'DELETE FROM diagnosis WHERE user_id = ?',
+     (4,), 'idx_diagnosis_user_id'),
+    ('doctors by speciality',
+     'SELECT user_id FROM users_profile WHERE user_type = ? AND speciality = ?',
+     (1, 'head'), 'idx_users_profile_type_speciality'),
+    ('users by number of messages',
+     'SELECT * FROM users, users_profile WHERE users.user_id = users_profile.user_id '
+     'AND (users.msg_count, users.user_id) < (?, ?) '
+     'ORDER BY users.msg_count DESC, users.user_id DESC',
+     (3, 18), 'idx_users_msg_count'),
+)
+
+
+class DatabaseIndexesTestCase(unittest.TestCase):
+    """
+    Test cases for the creation and the use of the secondary indexes
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """ Remove the database structure from previous sessions and create tables again """
+        print("Testing started for: ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+        ENGINE.populate_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        """ Remove the testing database """
+        print("Testing has ENDED for: ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        self.con = sqlite3.connect(DB_PATH)
+
+    def tearDown(self):
+        self.con.close()
+
+    def _index_names(self):
+        cursor = self.con.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        return set(row[0] for row in cursor.fetchall())
+
+    def test_indexes_created(self):
+        """
+        Check that create_tables creates every managed index
+        """
+        print('(' + self.test_indexes_created.__name__ + ')',
+              self.test_indexes_created.__doc__)
+        names = self._index_names()
+        for name, _, _ in INDEXES:
+            self.assertIn(name, names)
+
+    def test_create_indexes_idempotent(self):
+        """
+        Check that create_indexes only creates the missing indexes
+        """
+        print('(' + self.test_create_indexes_idempotent.__name__ + ')',
+              self.test_create_indexes_idempotent.__doc__)
+        self.assertEqual(ENGINE.create_indexes(), [])
+
+        # An existing database created before the indexes were managed
+        with self.con:
+            self.con.execute('DROP INDEX idx_messages_reply_to')
+            self.con.execute('DROP INDEX idx_diagnosis_user_id')
+        self.assertEqual(sorted(ENGINE.create_indexes()),
+                         ['idx_diagnosis_user_id', 'idx_messages_reply_to'])
+        self.assertEqual(ENGINE.create_indexes(), [])
+        self.assertIn('idx_messages_reply_to', self._index_names())
+
+    def test_create_search_index(self):
+        """
+        Check that create_search_index fills a new index from the existing
+        messages and that rebuild_search_index repairs an index out of date
+        """
+        print('(' + self.test_create_search_index.__name__ + ')',
+              self.test_create_search_index.__doc__)
+        self.assertEqual(ENGINE.create_search_index(), [])
+        match = "SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'throat'"
+
+        # An existing database created before the index was managed
+        with self.con:
+            self.con.execute('DROP TABLE messages_fts')
+            self.con.execute('DROP TRIGGER trg_messages_update_search')
+        self.assertEqual(sorted(ENGINE.create_search_index()),
+                         ['messages_fts', 'trg_messages_update_search'])
+        self.assertEqual(self.con.execute(match).fetchall(), [(1,)])
+
+        # Messages modified without the triggers
+        with self.con:
+            self.con.execute('DROP TRIGGER trg_messages_update_search')
+            self.con.execute("UPDATE messages SET body = 'Throat' WHERE message_id = 2")
+        self.assertEqual(self.con.execute(match).fetchall(), [(1,)])
+        count = self.con.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+        self.assertEqual(ENGINE.rebuild_search_index(), count)
+        self.assertEqual(self.con.execute(match).fetchall(), [(1,), (2,)])
+        self.assertEqual(ENGINE.create_search_index(), [])
+
+    def test_create_thread_stats(self):
+        """
+        Check that create_thread_stats fills new aggregates from the existing
+        messages and that check_thread_stats finds and repairs the wrong ones
+        """
+        print('(' + self.test_create_thread_stats.__name__ + ')',
+              self.test_create_thread_stats.__doc__)
+        self.assertEqual(ENGINE.create_thread_stats(), [])
+        stats = 'SELECT * FROM thread_stats ORDER BY root_id'
+        expected = self.con.execute(stats).fetchall()
+        self.assertEqual(expected[0], (1, 2, 1519474612, 3))
+
+        # An existing database created before the aggregates were managed
+        with self.con:
+            for table in ('thread_stats', 'thread_participants', 'thread_messages'):
+                self.con.execute('DROP TABLE %s' % table)
+            self.con.execute('DROP TRIGGER trg_messages_delete_threads')
+        self.assertEqual(sorted(ENGINE.create_thread_stats()),
+                         ['thread_stats', 'trg_messages_delete_threads'])
+        self.assertEqual(self.con.execute(stats).fetchall(), expected)
+        self.assertEqual(ENGINE.check_thread_stats(), [])
+
+        # A message moved to another thread, which the triggers do not follow
+        with self.con:
+            self.con.execute('UPDATE messages SET reply_to = 1 WHERE message_id = 3')
+        self.assertEqual(ENGINE.check_thread_stats(), [1, 3])
+        self.assertEqual(ENGINE.check_thread_stats(repair=True), [1, 3])
+        self.assertEqual(ENGINE.check_thread_stats(), [])
+        self.assertEqual(self.con.execute(stats).fetchone(), (1, 7, 1519474612, 7))
+
+    def test_create_message_counts(self):
+        """
+        Check that create_message_counts counts the messages of the users
+        again when the triggers are created and that rebuild_message_counts
+        fixes the wrong numbers
+        """
+        print('(' + self.test_create_message_counts.__name__ + ')',
+              self.test_create_message_counts.__doc__)
+        self.assertEqual(ENGINE.create_message_counts(), [])
+        counts = ('SELECT user_id, msg_count FROM users WHERE msg_count IS NOT '
+                  '(SELECT COUNT(*) FROM messages WHERE messages.user_id = users.user_id)')
+        self.assertEqual(self.con.execute(counts).fetchall(), [])
+
+        # An existing database created before the numbers were kept
+        with self.con:
+            self.con.execute('DROP TRIGGER trg_messages_insert_msg_count')
+            self.con.execute('UPDATE users SET msg_count = NULL')
+        self.assertEqual(ENGINE.create_message_counts(), ['trg_messages_insert_msg_count'])
+        self.assertEqual(self.con.execute(counts).fetchall(), [])
+
+        # Users modified without the triggers
+        with self.con:
+            self.con.execute('UPDATE users SET msg_count = 84 WHERE user_id IN (2, 18)')
+        self.assertEqual(self.con.execute(counts).fetchall(), [(2, 84), (18, 84)])
+        self.assertEqual(ENGINE.rebuild_message_counts(), 2)
+        self.assertEqual(self.con.execute(counts).fetchall(), [])
+        self.assertEqual(ENGINE.rebuild_message_counts(), 0)
+        self.assertEqual(self.con.execute('SELECT msg_count FROM users WHERE user_id = 18')
+                         .fetchone(), (3,))
+
+    def test_hot_queries_use_index(self):
+        """
+        Check with EXPLAIN QUERY PLAN that every hot query searches an index
+        """
+        print('(' + self.test_hot_queries_use_index.__name__ + ')',
+              self.test_hot_queries_use_index.__doc__)
+        for description, query, pvalue, index in HOT_QUERIES:
+            with self.subTest(description):
+                plan = self.con.execute('EXPLAIN QUERY PLAN ' + query, pvalue).fetchall()
+                details = ' '.join(row[-1] for row in plan)
+                self.assertIn('INDEX ' + index, details)
+                self.assertNotRegex(details, r'SCAN (TABLE )?(messages|diagnosis|users_profile)\b(?! USING)')
+
+
+if __name__ == '__main__':
+    print('Running database indexes tests')
+    unittest.main()
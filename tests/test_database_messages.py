@@ -8,6 +8,9 @@ Database API testing unit for messages related methods from medical_forum/databa
 
 # Importing required modules
 import unittest
+from unittest.mock import patch
+
+from medical_forum import database_connection
 # import helper different methods
 from .utils import execute_query, ENGINE, test_table_populated
 from .utils import MESSAGES_TABLE, INITIAL_MESSAGES_COUNT
@@ -192,6 +195,280 @@ class DatabaseMessagesTestCase(unittest.TestCase):
         messages = self.connection.get_messages(number_of_messages=10)
         self.assertEqual(len(messages), 10)
 
+    def test_iter_messages(self):
+        """
+        Check that iter_messages yields the messages of get_messages in chunks
+        """
+        print('(' + self.test_iter_messages.__name__+')',
+              self.test_iter_messages.__doc__)
+        messages = self.connection.iter_messages()
+        # A generator, not a list
+        self.assertFalse(isinstance(messages, list))
+        self.assertEqual(next(messages), self.connection.get_messages()[0])
+        with patch.object(database_connection, 'FETCH_CHUNK_SIZE', 4):
+            self.assertEqual(list(self.connection.iter_messages()),
+                             self.connection.get_messages())
+            # No message is older than the epoch
+            self.assertEqual(list(self.connection.iter_messages(start_after=(0, 0))),
+                             [])
+            # Walking backwards from the oldest message returns the ones before it
+            oldest = self.connection.get_messages()[-1]
+            previous = list(self.connection.iter_messages(
+                number_of_messages=2,
+                end_before=(oldest['timestamp'], int(oldest['message_id'][4:]))))
+            self.assertEqual(previous, self.connection.get_messages()[-3:-1])
+
+    def test_get_messages_columns(self):
+        """
+        Check that only the requested columns are read, the others being None
+        """
+        print('(' + self.test_get_messages_columns.__name__+')',
+              self.test_get_messages_columns.__doc__)
+        messages = self.connection.get_messages(columns=['title'])
+        self.assertEqual(len(messages), INITIAL_MESSAGES_COUNT)
+        # The sort key is always read
+        self.assertEqual([(m['message_id'], m['timestamp']) for m in messages],
+                         [(m['message_id'], m['timestamp'])
+                          for m in self.connection.get_messages()])
+        for message in messages:
+            if message['message_id'] == MESSAGE_1_ID:
+                self.assertEqual(message['title'], MESSAGE_1['title'])
+                self.assertIsNone(message['sender'])
+        message = self.connection.get_message(MESSAGE_1_ID, columns=['message_id', 'title'])
+        self.assertEqual(message['title'], MESSAGE_1['title'])
+        self.assertIsNone(message['body'])
+        self.assertIsNone(message['sender'])
+
+    def test_get_messages_statements(self):
+        """
+        Check that get_messages binds its arguments instead of writing them in the SQL
+        """
+        print('(' + self.test_get_messages_statements.__name__+')',
+              self.test_get_messages_statements.__doc__)
+        statements = []
+        execute = database_connection.Select.execute
+
+        def record(query, con):
+            statements.append(query.sql())
+            return execute(query, con)
+        with patch.object(database_connection.Select, 'execute', record):
+            self.connection.get_messages(username='Dizzy', number_of_messages=2)
+            self.connection.get_messages(username='PoorGuy', number_of_messages=5)
+            self.connection.get_messages(username='PoorGuy')
+            # A quote in the username is a value, not SQL
+            self.assertEqual(self.connection.get_messages(username="x' OR '1'='1"), [])
+        self.assertEqual(len(set(statements)), 1)
+
+    def test_create_messages_bulk(self):
+        """
+        Test that several messages are created in one call, and none if a sender is unknown
+        """
+        print('(' + self.test_create_messages_bulk.__name__+')',
+              self.test_create_messages_bulk.__doc__)
+        messages = [{'title': 'first', 'body': 'first body', 'sender': 'Dizzy'},
+                    {'title': 'second', 'body': 'second body', 'sender': 'PoorGuy',
+                     'reply_to': 'msg-1'},
+                    {'title': 'third', 'body': 'third body', 'sender': 'Dizzy'}]
+        with self.assertRaises(KeyError):
+            self.connection.create_messages_bulk(
+                messages + [{'title': 't', 'body': 'b', 'sender': 'Nobody'}])
+        self.assertIsNone(self.connection.create_messages_bulk(
+            [{'title': 't', 'body': 'b', 'sender': 'Dizzy', 'reply_to': 'msg-200'}]))
+        self.assertEqual(len(self.connection.get_messages()), INITIAL_MESSAGES_COUNT)
+
+        ids = self.connection.create_messages_bulk(messages)
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(len(self.connection.get_messages()), INITIAL_MESSAGES_COUNT + 3)
+        for message_id, message in zip(ids, messages):
+            created = self.connection.get_message(message_id)
+            self.assertEqual(created['title'], message['title'])
+            self.assertEqual(created['sender'], message['sender'])
+            self.assertEqual(created['reply_to'], message.get('reply_to'))
+        self.assertEqual(self.connection.create_messages_bulk([]), [])
+
+    def test_get_versions(self):
+        """
+        Test that the triggers bump the version of the table and of the
+        modified message only
+        """
+        print('(' + self.test_get_versions.__name__ + ')',
+              self.test_get_versions.__doc__)
+        before = self.connection.get_versions('messages', 'messages/1', 'messages/2')
+        self.assertNotEqual(before[0], 0)
+        self.connection.modify_message('msg-1', 'new title', 'new body')
+        after = self.connection.get_versions('messages', 'messages/1', 'messages/2')
+        self.assertEqual(after, (before[0], before[1] + 1, before[2] + 1, before[3]))
+        # Unknown names have version 0
+        self.assertEqual(self.connection.get_versions('messages/1000')[1], 0)
+
+    def test_search_messages(self):
+        """
+        Test the full-text search of the messages: all the words must match,
+        the best match comes first and the pages follow each other
+        """
+        print('(' + self.test_search_messages.__name__ + ')',
+              self.test_search_messages.__doc__)
+        found = self.connection.search_messages('throat')
+        self.assertEqual([message['message_id'] for message in found], [MESSAGE_1_ID])
+        self.assertEqual(found[0]['title'], MESSAGE_1['title'])
+        self.assertIn('<b>throat</b>', found[0]['snippet'])
+        self.assertEqual(self.connection.search_messages('throat dizzy'), [])
+        self.assertEqual(self.connection.search_messages('THROAT')[0]['message_id'],
+                         MESSAGE_1_ID)
+        self.assertEqual(self.connection.search_messages('thro*')[0]['message_id'],
+                         MESSAGE_1_ID)
+        # The FTS5 syntax is searched as plain text
+        self.assertEqual(self.connection.search_messages('" OR NEAR(throat'), [])
+        with self.assertRaises(ValueError):
+            self.connection.search_messages('  * ')
+
+        # A match in the title ranks first
+        with self.connection.con:
+            self.connection.con.execute(
+                "INSERT INTO messages(message_id, user_id, username, title, body, views, "
+                "timestamp) VALUES(1000, 1, 'PoorGuy', 'Throat', 'sore', 0, 1)")
+        found = self.connection.search_messages('throat')
+        self.assertEqual([message['message_id'] for message in found], ['msg-1000', MESSAGE_1_ID])
+        self.assertLess(found[0]['rank'], found[1]['rank'])
+
+        found = self.connection.search_messages('tony car')
+        self.assertGreater(len(found), 4)
+        keys = [(message['rank'], int(message['message_id'][4:])) for message in found]
+        self.assertEqual(keys, sorted(keys))
+        page = self.connection.search_messages('tony car', 2, start_after=keys[1])
+        self.assertEqual(page, found[2:4])
+        page = self.connection.search_messages('tony car', 2, end_before=keys[4])
+        self.assertEqual(page, found[2:4])
+
+    def test_search_index_triggers(self):
+        """
+        Test that the full-text index follows the messages modified,
+        deleted and deleted with their author
+        """
+        print('(' + self.test_search_index_triggers.__name__ + ')',
+              self.test_search_index_triggers.__doc__)
+        self.connection.modify_message(MESSAGE_1_ID, 'Zebra crossing', 'new body')
+        self.assertEqual(self.connection.search_messages('throat'), [])
+        self.assertEqual(self.connection.search_messages('zebra')[0]['message_id'],
+                         MESSAGE_1_ID)
+        new_id = self.connection.create_message('Knee zebra', 'body', 'Dizzy')
+        self.assertEqual(len(self.connection.search_messages('zebra')), 2)
+        self.connection.delete_message(MESSAGE_1_ID)
+        self.assertEqual([message['message_id'] for message in
+                          self.connection.search_messages('zebra')], [new_id])
+        self.connection.delete_user('Dizzy')
+        self.assertEqual(self.connection.search_messages('zebra'), [])
+
+    def test_get_threads(self):
+        """
+        Test that the threads are listed by last activity with their
+        aggregates, one page at a time
+        """
+        print('(' + self.test_get_threads.__name__ + ')', self.test_get_threads.__doc__)
+        threads = self.connection.get_threads()
+        self.assertEqual([(thread['message_id'], thread['replies'], thread['participants'])
+                          for thread in threads],
+                         [('msg-1', 2, 3), ('msg-3', 4, 5), ('msg-2', 4, 5), ('msg-7', 2, 3),
+                          ('msg-4', 2, 3)])
+        self.assertEqual(threads[0]['last_activity'], 1519474612)
+        self.assertEqual(threads[0]['title'], MESSAGE_1['title'])
+        keys = [(thread['last_activity'], int(thread['message_id'][4:]))
+                for thread in threads]
+        self.assertEqual(self.connection.get_threads(2, start_after=keys[1]), threads[2:4])
+        self.assertEqual(self.connection.get_threads(2, end_before=keys[4]), threads[2:4])
+
+    def test_thread_stats_triggers(self):
+        """
+        Test that the aggregates of a thread follow the replies added and
+        deleted, with their message or with their author
+        """
+        print('(' + self.test_thread_stats_triggers.__name__ + ')',
+              self.test_thread_stats_triggers.__doc__)
+        def stats(message_id):
+            for thread in self.connection.get_threads():
+                if thread['message_id'] == message_id:
+                    return thread['replies'], thread['last_activity'], thread['participants']
+            return None
+        # msg-2 <- msg-5 <- msg-13, msg-11, msg-19
+        self.assertEqual(stats('msg-2'), (4, 211564, 5))
+        with patch('medical_forum.database_connection.time.mktime', return_value=1600000000):
+            self.connection.create_message('Reply', 'body', 'Neal', 'msg-13')
+        self.assertEqual(stats('msg-2'), (5, 1600000000, 5))
+        with patch('medical_forum.database_connection.time.mktime', return_value=1600000001):
+            self.connection.create_message('Reply', 'body', 'PoorGuy', 'msg-19')
+        self.assertEqual(stats('msg-2'), (6, 1600000001, 6))
+        # msg-13 and the reply of Neal are deleted with msg-5
+        self.connection.delete_message('msg-5')
+        self.assertEqual(stats('msg-2'), (3, 1600000001, 4))
+        self.connection.delete_user('PoorGuy')
+        self.assertEqual(stats('msg-2'), (2, 54984, 3))
+        self.assertIsNone(stats('msg-1'))
+        self.connection.delete_message('msg-2')
+        self.assertIsNone(stats('msg-2'))
+        self.assertEqual(ENGINE.check_thread_stats(), [])
+
+    def test_get_thread(self):
+        """
+        Test that a thread lists the message and all its replies depth first,
+        with their depth, up to the maximum depth
+        """
+        print('(' + self.test_get_thread.__name__ + ')', self.test_get_thread.__doc__)
+        thread = self.connection.get_thread('msg-1')
+        self.assertEqual([(message['message_id'], message['depth']) for message in thread],
+                         [('msg-1', 0), ('msg-8', 1), ('msg-16', 2)])
+        self.assertDictContainsSubset(MESSAGE_2, thread[1])
+        thread = self.connection.get_thread('msg-2', max_depth=1)
+        self.assertEqual([message['message_id'] for message in thread],
+                         ['msg-2', 'msg-5', 'msg-11', 'msg-19'])
+        self.assertEqual(len(self.connection.get_thread('msg-2', max_depth=0)), 1)
+        self.assertEqual(self.connection.get_thread(NON_EXIST_MESSAGE_ID), [])
+        with self.assertRaises(ValueError):
+            self.connection.get_thread(BAD_MESSAGE_ID)
+
+    def test_get_thread_pages(self):
+        """
+        Test that the pages of a thread follow and precede the message of the
+        cursor, which must be in the thread
+        """
+        print('(' + self.test_get_thread_pages.__name__ + ')',
+              self.test_get_thread_pages.__doc__)
+        def ids(messages):
+            return [message['message_id'] for message in messages]
+        # msg-2, msg-5, msg-13, msg-11, msg-19
+        self.assertEqual(ids(self.connection.get_thread('msg-2', number_of_messages=2)),
+                         ['msg-2', 'msg-5'])
+        self.assertEqual(ids(self.connection.get_thread('msg-2', number_of_messages=2,
+                                                        start_after=(13,))),
+                         ['msg-11', 'msg-19'])
+        self.assertEqual(ids(self.connection.get_thread('msg-2', start_after=(5,))),
+                         ['msg-13', 'msg-11', 'msg-19'])
+        self.assertEqual(ids(self.connection.get_thread('msg-2', number_of_messages=2,
+                                                        end_before=(19,))),
+                         ['msg-13', 'msg-11'])
+        self.assertEqual(ids(self.connection.get_thread('msg-2', end_before=(2,))), [])
+        with self.assertRaises(ValueError):
+            self.connection.get_thread('msg-2', start_after=(8,))
+
+    def test_large_message_id(self):
+        """
+        Test that messages with ids above 999 are read, modified and deleted
+        """
+        print('(' + self.test_large_message_id.__name__+')',
+              self.test_large_message_id.__doc__)
+        large_id = 2 ** 40
+        with self.connection.con:
+            self.connection.con.execute(
+                "INSERT INTO messages(message_id, user_id, username, title, body, views, "
+                "timestamp) VALUES(?, 1, 'PoorGuy', 'large', 'large id', 0, 1)", (large_id,))
+        message_id = 'msg-%d' % large_id
+        self.assertEqual(self.connection.get_message(message_id)['message_id'], message_id)
+        self.assertEqual(self.connection.modify_message(message_id, 'title', 'body'),
+                         message_id)
+        self.assertTrue(self.connection.delete_message(message_id))
+        self.assertIsNone(self.connection.get_message(message_id))
+        # Ids used to be truncated to their first three digits
+        self.assertIsNone(self.connection.get_message('msg-1000'))
+
     def test_delete_message(self):
         """
         Test deleting a message (msg-1) and whether it was successful or not
@@ -0,0 +1,327 @@
+"""
+Database API testing unit for the connections handed out by the Engine: the
+pool of reusable connections and the tuning profiles applied to them.
+"""
+
+import sqlite3
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from medical_forum import database_engine
+from medical_forum.database_connection import TUNED_PROFILE
+from .utils import DB_PATH, INITIAL_MESSAGES_COUNT
+
+
+class DatabasePoolTestCase(unittest.TestCase):
+    """
+    Test cases for borrowing and giving back pooled connections
+    """
+
+    def setUp(self):
+        """ Creates a fresh database with a small pool """
+        print("Testing started for: ", self.id())
+        self.engine = database_engine.Engine(DB_PATH, pool_size=2, max_idle=1)
+        self.engine.remove_database()
+        self.engine.create_tables()
+        self.engine.populate_tables()
+
+    def tearDown(self):
+        """ Remove the testing database """
+        self.engine.remove_database()
+
+    def test_connection_reused(self):
+        """
+        Check that a released connection is handed out again and counted as a hit
+        """
+        print('(' + self.test_connection_reused.__name__ + ')',
+              self.test_connection_reused.__doc__)
+        first = self.engine.acquire()
+        self.assertEqual(len(first.get_messages()), INITIAL_MESSAGES_COUNT)
+        self.engine.release(first)
+        second = self.engine.acquire()
+        self.engine.release(second)
+
+        self.assertIs(first, second)
+        stats = self.engine.pool_stats()
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['idle'], 1)
+
+    def test_max_idle(self):
+        """
+        Check that connections above max_idle are closed when released
+        """
+        print('(' + self.test_max_idle.__name__ + ')',
+              self.test_max_idle.__doc__)
+        first = self.engine.acquire()
+        second = self.engine.acquire()
+        self.engine.release(first)
+        self.engine.release(second)
+
+        self.assertFalse(first.isclosed())
+        self.assertTrue(second.isclosed())
+        stats = self.engine.pool_stats()
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['discarded'], 1)
+
+    def test_pool_exhausted(self):
+        """
+        Check that acquire waits for a released connection and times out otherwise
+        """
+        print('(' + self.test_pool_exhausted.__name__ + ')',
+              self.test_pool_exhausted.__doc__)
+        self.engine.pool.wait_timeout = 0.05
+        first = self.engine.acquire()
+        second = self.engine.acquire()
+        with self.assertRaises(sqlite3.OperationalError):
+            self.engine.acquire()
+        self.assertEqual(self.engine.pool_stats()['timeouts'], 1)
+
+        self.engine.pool.wait_timeout = 5
+        timer = threading.Timer(0.05, self.engine.release, (first,))
+        timer.start()
+        third = self.engine.acquire()
+        timer.join()
+        self.assertIs(third, first)
+        self.assertGreater(self.engine.pool_stats()['wait_max'], 0)
+        self.engine.release(second)
+        self.engine.release(third)
+
+    def test_removed_database_not_reused(self):
+        """
+        Check that idle connections to a removed database file are not handed out
+        """
+        print('(' + self.test_removed_database_not_reused.__name__ + ')',
+              self.test_removed_database_not_reused.__doc__)
+        first = self.engine.acquire()
+        self.engine.release(first)
+
+        # Another Engine removes and recreates the same file.
+        other = database_engine.Engine(DB_PATH)
+        other.remove_database()
+        other.create_tables()
+
+        second = self.engine.acquire()
+        self.assertIsNot(first, second)
+        self.assertTrue(first.isclosed())
+        self.assertEqual(second.get_messages(), [])
+        self.engine.release(second)
+
+    def test_health_check_skipped(self):
+        """
+        Check that a connection released a moment ago is handed out without
+        the health check, unless its last user got a database error
+        """
+        print('(' + self.test_health_check_skipped.__name__ + ')',
+              self.test_health_check_skipped.__doc__)
+        first = self.engine.acquire()
+        self.engine.release(first)
+        with patch('medical_forum.database_pool._file_identity') as identity:
+            second = self.engine.acquire()
+            self.assertIs(first, second)
+            self.assertFalse(identity.called)
+            # Suspect connections are checked, and discarded if the file changed
+            self.engine.release(second, failed=True)
+            third = self.engine.acquire()
+            self.assertTrue(identity.called)
+        self.assertIsNot(third, first)
+        self.assertTrue(first.isclosed())
+        self.engine.release(third)
+        # So are the connections idle for longer than check_after
+        self.engine.pool.check_after = 0
+        with patch('medical_forum.database_pool._file_identity') as identity:
+            fourth = self.engine.acquire()
+            self.assertTrue(identity.called)
+        self.assertIsNot(fourth, third)
+        self.engine.release(fourth)
+
+
+class DatabaseReadWriteTestCase(unittest.TestCase):
+    """
+    Test cases for the read-only connections and the single writer connection
+    """
+
+    def setUp(self):
+        """ Creates a fresh database """
+        print("Testing started for: ", self.id())
+        self.engine = database_engine.Engine(DB_PATH)
+        self.engine.remove_database()
+        self.engine.create_tables()
+        self.engine.populate_tables()
+
+    def tearDown(self):
+        """ Remove the testing database """
+        self.engine.remove_database()
+
+    def test_reader_read_only(self):
+        """
+        Check that readers can read but not write, and that the database is switched to WAL
+        """
+        print('(' + self.test_reader_read_only.__name__ + ')',
+              self.test_reader_read_only.__doc__)
+        reader = self.engine.acquire_reader()
+        try:
+            self.assertTrue(reader.read_only)
+            self.assertEqual(reader.get_pragma('journal_mode'), 'wal')
+            self.assertEqual(reader.get_pragma('foreign_keys'), 1)
+            self.assertEqual(len(reader.get_messages()), INITIAL_MESSAGES_COUNT)
+            with self.assertRaises(sqlite3.OperationalError):
+                reader.create_message('title', 'body', 'PoorGuy')
+        finally:
+            self.engine.release(reader)
+        self.assertEqual(self.engine.pool_stats('reader')['in_use'], 0)
+        # The writer was opened once to switch the journal mode, and is kept idle
+        self.assertEqual(self.engine.pool_stats('writer')['idle'], 1)
+
+    def test_reader_not_blocked(self):
+        """
+        Check that a reader does not wait for a writer in the middle of a transaction
+        """
+        print('(' + self.test_reader_not_blocked.__name__ + ')',
+              self.test_reader_not_blocked.__doc__)
+        writer = self.engine.acquire_writer()
+        reader = self.engine.acquire_reader()
+        try:
+            writer.con.execute('BEGIN IMMEDIATE')
+            writer.con.execute('DELETE FROM diagnosis')
+            writer.con.execute('DELETE FROM messages')
+            # The reader sees the last commited state
+            self.assertEqual(len(reader.get_messages()), INITIAL_MESSAGES_COUNT)
+        finally:
+            self.engine.release(writer)
+            self.engine.release(reader)
+        connection = self.engine.connect()
+        self.assertEqual(connection.get_messages(), [])
+        connection.close()
+
+    def test_writer_queue(self):
+        """
+        Check that the writer is handed out to one thread at a time, in arrival order
+        """
+        print('(' + self.test_writer_queue.__name__ + ')',
+              self.test_writer_queue.__doc__)
+        writer = self.engine.acquire_writer()
+        order = []
+
+        def write(number):
+            connection = self.engine.acquire_writer()
+            order.append(number)
+            self.engine.release(connection)
+
+        threads = []
+        for number in range(4):
+            thread = threading.Thread(target=write, args=(number,))
+            thread.start()
+            threads.append(thread)
+            # Wait until the thread is in the queue before starting the next one
+            while self.engine.pool_stats('writer')['waiting'] < number + 1:
+                time.sleep(0.001)
+        self.engine.release(writer)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, [0, 1, 2, 3])
+        stats = self.engine.pool_stats('writer')
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['checkouts'], 5)
+        self.assertEqual(stats['waiting'], 0)
+
+    def test_writer_no_barging(self):
+        """
+        Check that a thread asking for the writer after it was released waits
+        behind the threads that were already waiting
+        """
+        print('(' + self.test_writer_no_barging.__name__ + ')',
+              self.test_writer_no_barging.__doc__)
+        writer = self.engine.acquire_writer()
+        order = []
+
+        def write():
+            connection = self.engine.acquire_writer()
+            order.append('waiting')
+            self.engine.release(connection)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        while self.engine.pool_stats('writer')['waiting'] < 1:
+            time.sleep(0.001)
+        # The writer is idle for a moment, but it is the turn of the thread
+        self.engine.release(writer)
+        writer = self.engine.acquire_writer()
+        order.append('late')
+        self.engine.release(writer)
+        thread.join()
+
+        self.assertEqual(order, ['waiting', 'late'])
+
+
+class DatabaseProfileTestCase(unittest.TestCase):
+    """
+    Test cases for the tuning profiles applied when a connection is opened
+    """
+
+    def setUp(self):
+        """ Creates a fresh database """
+        print("Testing started for: ", self.id())
+        self.engine = database_engine.Engine(DB_PATH, profile=TUNED_PROFILE)
+        self.engine.remove_database()
+        self.engine.create_tables()
+        self.engine.populate_tables()
+
+    def tearDown(self):
+        """ Remove the testing database """
+        self.engine.remove_database()
+
+    def test_default_profile(self):
+        """
+        Check that plain connections have foreign keys enabled and no other tuning
+        """
+        print('(' + self.test_default_profile.__name__ + ')',
+              self.test_default_profile.__doc__)
+        connection = database_engine.Engine(DB_PATH).connect()
+        try:
+            self.assertEqual(connection.get_pragma('foreign_keys'), 1)
+            self.assertEqual(connection.get_pragma('journal_mode'), 'delete')
+        finally:
+            connection.close()
+
+    def test_tuned_profile(self):
+        """
+        Check that every PRAGMA of the tuned profile is set on pooled connections
+        """
+        print('(' + self.test_tuned_profile.__name__ + ')',
+              self.test_tuned_profile.__doc__)
+        connection = self.engine.acquire()
+        try:
+            self.assertEqual(connection.get_pragma('foreign_keys'), 1)
+            self.assertEqual(connection.get_pragma('journal_mode'), 'wal')
+            # synchronous NORMAL is 1, temp_store MEMORY is 2
+            self.assertEqual(connection.get_pragma('synchronous'), 1)
+            self.assertEqual(connection.get_pragma('temp_store'), 2)
+            self.assertEqual(connection.get_pragma('cache_size'),
+                             TUNED_PROFILE['cache_size'])
+            self.assertEqual(connection.get_pragma('busy_timeout'),
+                             TUNED_PROFILE['busy_timeout'])
+            self.assertEqual(len(connection.get_messages()), INITIAL_MESSAGES_COUNT)
+        finally:
+            self.engine.release(connection)
+
+    def test_wrong_profile(self):
+        """
+        Check that a profile with a malformed PRAGMA value raises and closes the connection
+        """
+        print('(' + self.test_wrong_profile.__name__ + ')',
+              self.test_wrong_profile.__doc__)
+        engine = database_engine.Engine(DB_PATH, profile={'cache_size': '1 1'})
+        with self.assertRaises(sqlite3.Error):
+            engine.connect()
+
+
+if __name__ == '__main__':
+    print("Running database pool tests")
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Database API testing unit for the builder of parameterized SELECT statements.
+"""
+
+import sqlite3
+import unittest
+
+from medical_forum.database_query import Select, projection
+
+
+class DatabaseQueryTestCase(unittest.TestCase):
+    """
+    Test cases for the SQL text and the parameters of the built statements
+    """
+
+    def test_no_conditions(self):
+        """
+        Check a statement without conditions, ordering or limit
+        """
+        print('(' + self.test_no_conditions.__name__ + ')',
+              self.test_no_conditions.__doc__)
+        query = Select('*', 'messages')
+        self.assertEqual(query.sql(), 'SELECT * FROM messages')
+        self.assertEqual(query.parameters(), ())
+
+    def test_conditions_joined(self):
+        """
+        Check that the conditions are joined with AND and the values bound in order
+        """
+        print('(' + self.test_conditions_joined.__name__ + ')',
+              self.test_conditions_joined.__doc__)
+        query = Select('*', 'diagnosis').where('user_id = ?', 9) \
+            .where('message_id = ?', 9).where('diagnosis_id > ?', 13) \
+            .order_by('diagnosis_id ASC').limit(5)
+        self.assertEqual(query.sql(), 'SELECT * FROM diagnosis WHERE user_id = ? AND '
+                                      'message_id = ? AND diagnosis_id > ? '
+                                      'ORDER BY diagnosis_id ASC LIMIT ?')
+        self.assertEqual(query.parameters(), (9, 9, 13, 5))
+
+    def test_same_shape(self):
+        """
+        Check that different values, including no limit, give the same SQL text
+        """
+        print('(' + self.test_same_shape.__name__ + ')',
+              self.test_same_shape.__doc__)
+        first = Select('*', 'messages').where('username = ?', 'Dizzy').limit(2)
+        second = Select('*', 'messages').where('username = ?', "O'Hara").limit(-1)
+        self.assertEqual(first.sql(), second.sql())
+        self.assertNotEqual(first.parameters(), second.parameters())
+
+    def test_execute(self):
+        """
+        Check that the statement is executed with its values bound
+        """
+        print('(' + self.test_execute.__name__ + ')',
+              self.test_execute.__doc__)
+        con = sqlite3.connect(':memory:')
+        try:
+            con.execute('CREATE TABLE numbers(value INTEGER)')
+            con.executemany('INSERT INTO numbers VALUES(?)', ((n,) for n in range(10)))
+            query = Select('value', 'numbers').where('value > ?', 3) \
+                .order_by('value DESC')
+            self.assertEqual([row[0] for row in query.limit(2).execute(con)], [9, 8])
+            self.assertEqual(len(query.limit(-1).execute(con).fetchall()), 6)
+        finally:
+            con.close()
+
+    def test_projection(self):
+        """
+        Check that the columns that are not wanted are selected as NULL under their name
+        """
+        print('(' + self.test_projection.__name__ + ')',
+              self.test_projection.__doc__)
+        columns = ('users.user_id', 'users.username', 'users_profile.picture')
+        self.assertEqual(projection(columns), 'users.user_id, users.username, '
+                                              'users_profile.picture')
+        self.assertEqual(projection(columns, frozenset(['username'])),
+                         'NULL AS user_id, users.username, NULL AS picture')
+        con = sqlite3.connect(':memory:')
+        try:
+            con.row_factory = sqlite3.Row
+            con.execute('CREATE TABLE notes(note_id INTEGER, body TEXT)')
+            con.execute("INSERT INTO notes VALUES(1, 'text')")
+            row = con.execute('SELECT %s FROM notes' % projection(
+                ('note_id', 'body'), frozenset(['note_id']))).fetchone()
+            self.assertEqual(dict(row), {'note_id': 1, 'body': None})
+        finally:
+            con.close()
+
+
+if __name__ == '__main__':
+    print('Running database query tests')
+    unittest.main()
@@ -8,6 +8,9 @@ Database API testing unit for users related methods from medical_forum/database.
 
 # Importing required modules
 import unittest
+from unittest.mock import patch
+
+from medical_forum import database_connection
 # import helper different methods
 from .utils import ENGINE, test_table_populated, execute_query, INITIAL_USERS_PROFILE_COUNT
 from .utils import USERS_PROFILE_TABLE, USERS_TABLE, INITIAL_USERS_COUNT
@@ -20,7 +23,8 @@ PATIENT = {'public_profile': {'reg_date': 1785505926,
                               'speciality': '',
                               'user_id': PATIENT_ID,
                               'user_type': 0,
-                              'picture': '192.219/dab/image.png'},
+                              'picture': '192.219/dab/image.png',
+                              'msg_count': 1},
            'restricted_profile': {'user_id': PATIENT_ID,
                                   'firstname': 'PoorGuy',
                                   'lastname': 'Jackie',
@@ -38,7 +42,8 @@ MODIFIED_PATIENT = {'public_profile': {'reg_date': 1785505926,
                                        'picture': None,
                                        'user_id': PATIENT_ID,
                                        'speciality': '',
-                                       'user_type': 0},
+                                       'user_type': 0,
+                                       'msg_count': 1},
                     'restricted_profile': {'user_id': PATIENT_ID,
                                            'firstname': 'PoorGuy',
                                            'lastname': 'Tell',
@@ -58,7 +63,8 @@ DOCTOR = {'public_profile': {'reg_date': 715581063,
                              'speciality': 'head',
                              'user_id': DOCTOR_ID,
                              'user_type': 1,
-                             'picture': '192.219/dab/image.png'},
+                             'picture': '192.219/dab/image.png',
+                             'msg_count': 1},
           'restricted_profile': {'user_id': DOCTOR_ID,
                                  'firstname': 'Clarissa',
                                  'lastname': 'Guadalupe',
@@ -179,6 +185,48 @@ class DatabaseUsersTestCase(unittest.TestCase):
               self.test_get_user_non_exist_id.__doc__)
         self.assertIsNone(self.connection.get_user(NON_EXIST_PATIENT_USERNAME))
 
+    def test_get_user_single_statement(self):
+        """
+        Test that get_user reads the user and its profile with one statement
+        """
+        print('(' + self.test_get_user_single_statement.__name__+')',
+              self.test_get_user_single_statement.__doc__)
+        statements = []
+        self.connection.con.set_trace_callback(statements.append)
+        try:
+            user = self.connection.get_user(DOCTOR_USERNAME)
+        finally:
+            self.connection.con.set_trace_callback(None)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(user, self.connection.get_users_by_ids([DOCTOR_ID])[DOCTOR_ID])
+
+    def test_get_users_by_usernames(self):
+        """
+        Test get_users_by_usernames with existing, repeated and missing usernames
+        """
+        print('(' + self.test_get_users_by_usernames.__name__+')',
+              self.test_get_users_by_usernames.__doc__)
+        users = self.connection.get_users_by_usernames(
+            [PATIENT_USERNAME, DOCTOR_USERNAME, PATIENT_USERNAME, NON_EXIST_PATIENT_USERNAME])
+        self.assertEqual(set(users), {PATIENT_USERNAME, DOCTOR_USERNAME})
+        self.assertEqual(users[PATIENT_USERNAME], self.connection.get_user(PATIENT_USERNAME))
+        self.assertEqual(users[DOCTOR_USERNAME], self.connection.get_user(DOCTOR_USERNAME))
+        self.assertEqual(self.connection.get_users_by_usernames([]), {})
+
+    def test_get_users_by_ids(self):
+        """
+        Test get_users_by_ids when the ids are split into several statements
+        """
+        print('(' + self.test_get_users_by_ids.__name__+')',
+              self.test_get_users_by_ids.__doc__)
+        user_ids = list(range(1, INITIAL_USERS_COUNT + 2))
+        with patch.object(database_connection, 'IN_CHUNK_SIZE', 2):
+            users = self.connection.get_users_by_ids(user_ids)
+        # The last id does not exist
+        self.assertEqual(len(users), INITIAL_USERS_COUNT)
+        self.assertEqual(users[PATIENT_ID]['public_profile']['username'], PATIENT_USERNAME)
+        self.assertEqual(users[DOCTOR_ID], self.connection.get_user(DOCTOR_USERNAME))
+
     def test_get_users(self):
         """
         Test that get_users work correctly and extract required user info
@@ -195,6 +243,51 @@ class DatabaseUsersTestCase(unittest.TestCase):
             elif user['username'] == DOCTOR_USERNAME:
                 self.assertDictContainsSubset(user, DOCTOR['public_profile'])
 
+    def test_get_users_by_msg_count(self):
+        """
+        Test that get_users sorts the users by number of messages, one page
+        at a time
+        """
+        print('(' + self.test_get_users_by_msg_count.__name__+')',
+              self.test_get_users_by_msg_count.__doc__)
+        users = self.connection.get_users(sort='msg_count')
+        self.assertEqual(len(users), INITIAL_USERS_COUNT)
+        self.assertEqual([(user['username'], user['msg_count']) for user in users[:4]],
+                         [('Dizzy', 3), ('Brendan', 2), ('Kirsten', 1), ('Neal', 1)])
+        self.assertEqual(users[-1]['username'], 'Alex77')
+        keys = [(user['msg_count'], user['user_id']) for user in users]
+        self.assertEqual(self.connection.get_users(3, start_after=keys[1], sort='msg_count'),
+                         users[2:5])
+        self.assertEqual(self.connection.get_users(3, end_before=keys[5], sort='msg_count'),
+                         users[2:5])
+        # The sort key is read even if it is not asked for
+        user = self.connection.get_users(1, columns=('username',), sort='msg_count')[0]
+        self.assertEqual((user['username'], user['msg_count'], user['user_id']), ('Dizzy', 3, 18))
+        with self.assertRaises(ValueError):
+            self.connection.get_users(sort='views')
+
+    def test_msg_count_triggers(self):
+        """
+        Test that the number of messages of the users follows the messages
+        created and deleted, with their thread or with their author
+        """
+        print('(' + self.test_msg_count_triggers.__name__+')',
+              self.test_msg_count_triggers.__doc__)
+        def msg_count(username):
+            return self.connection.get_user(username)['public_profile']['msg_count']
+        self.assertEqual(msg_count('Dizzy'), 3)
+        self.connection.create_message('Reply', 'body', 'Dizzy', 'msg-1')
+        self.assertEqual(msg_count('Dizzy'), 4)
+        # msg-9 of Dizzy and msg-18 of Clarissa are deleted with msg-3
+        self.connection.delete_message('msg-3')
+        self.assertEqual((msg_count('Dizzy'), msg_count(DOCTOR_USERNAME), msg_count('Isaac8')),
+                         (3, 0, 0))
+        # msg-8 and the new reply of Dizzy are deleted with msg-1
+        self.connection.delete_user(PATIENT_USERNAME)
+        self.assertEqual(msg_count('Dizzy'), 1)
+        self.connection.append_user(NEW_PATIENT_USERNAME, NEW_PATIENT)
+        self.assertEqual(msg_count(NEW_PATIENT_USERNAME), 0)
+
     def test_delete_user(self):
         """
         Test that the user PoorGuy is deleted
@@ -285,6 +378,30 @@ class DatabaseUsersTestCase(unittest.TestCase):
         self.assertIsNone(self.connection.append_user(
             PATIENT_USERNAME, NEW_PATIENT))
 
+    def test_append_users_bulk(self):
+        """
+        Test that several users are added in one call, and none if a username exists
+        """
+        print('(' + self.test_append_users_bulk.__name__+')',
+              self.test_append_users_bulk.__doc__)
+        initial = len(self.connection.get_users())
+        self.assertIsNone(self.connection.append_users_bulk(
+            [('bulk1', NEW_PATIENT), (PATIENT_USERNAME, NEW_PATIENT)]))
+        self.assertIsNone(self.connection.append_users_bulk(
+            [('bulk1', NEW_PATIENT), ('bulk1', NEW_PATIENT)]))
+        self.assertEqual(len(self.connection.get_users()), initial)
+
+        usernames = self.connection.append_users_bulk(
+            [('bulk1', NEW_PATIENT), ('bulk2', DOCTOR)])
+        self.assertEqual(usernames, ['bulk1', 'bulk2'])
+        self.assertEqual(len(self.connection.get_users()), initial + 2)
+        new_doctor = self.connection.get_user('bulk2')
+        self.assertEqual(new_doctor['public_profile']['user_type'], 1)
+        self.assertEqual(new_doctor['restricted_profile']['firstname'],
+                         DOCTOR['restricted_profile']['firstname'])
+        self.assertEqual(self.connection.get_user_id('bulk2'),
+                         self.connection.get_user_id('bulk1') + 1)
+
     def test_get_user_id(self):
         """
         Test that get_user_id returns the right value given a username
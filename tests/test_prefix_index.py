@@ -0,0 +1,191 @@
+"""
+Testing unit for the in-memory prefix indexes of the diseases and usernames.
+"""
+
+import unittest
+from unittest.mock import patch
+
+from medical_forum import prefix_index
+from medical_forum.prefix_index import PrefixIndex
+from .utils import ENGINE
+
+DOCTOR_ID = 4
+NEW_USER = {'public_profile': {'reg_date': 1519474612, 'username': 'alicia',
+                               'speciality': 'Pediatry', 'user_type': 1},
+            'restricted_profile': {'firstname': 'Alicia', 'lastname': 'Smith',
+                                   'work_address': 'Street 1', 'gender': 'female',
+                                   'age': 30, 'email': 'alicia@example.com',
+                                   'picture': None, 'phone': None, 'height': None,
+                                   'weight': None}}
+
+
+class PrefixIndexTestCase(unittest.TestCase):
+    """
+    Test cases for the sorted array searched by prefix
+    """
+
+    def setUp(self):
+        print("Testing started for: ", self.id())
+
+    def test_complete(self):
+        """
+        Test that the values starting with a prefix are returned in order,
+        ignoring the case, up to the limit
+        """
+        print('(' + self.test_complete.__name__ + ')', self.test_complete.__doc__)
+        index = PrefixIndex([('Asthma', 2), ('anemia', 1), ('Arthritis', 1), ('Flu', 3)])
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.complete('a', 10), ['anemia', 'Arthritis', 'Asthma'])
+        self.assertEqual(index.complete('AS', 10), ['Asthma'])
+        self.assertEqual(index.complete('a', 2), ['anemia', 'Arthritis'])
+        self.assertEqual(index.complete('', 10), ['anemia', 'Arthritis', 'Asthma', 'Flu'])
+        self.assertEqual(index.complete('b', 10), [])
+        self.assertEqual(index.complete('fluid', 10), [])
+
+    def test_add_discard(self):
+        """
+        Test that a value stays in the index until its last row is removed
+        """
+        print('(' + self.test_add_discard.__name__ + ')', self.test_add_discard.__doc__)
+        index = PrefixIndex([('Asthma', 2)])
+        index.add('Acne')
+        index.add('Acne')
+        self.assertEqual(index.complete('a', 10), ['Acne', 'Asthma'])
+        index.discard('Asthma')
+        index.discard('Acne')
+        self.assertEqual(index.complete('a', 10), ['Acne', 'Asthma'])
+        index.discard('Asthma')
+        self.assertEqual(index.complete('a', 10), ['Acne'])
+        index.discard('Unknown')
+        self.assertEqual(len(index), 1)
+
+
+class PrefixIndexDatabaseTestCase(unittest.TestCase):
+    """
+    Test cases for the indexes kept up to date with the database
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        print("Testing ", cls.__name__)
+        ENGINE.remove_database()
+        ENGINE.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        print("Testing ENDED for ", cls.__name__)
+        ENGINE.remove_database()
+
+    def setUp(self):
+        print("Testing started for: ", self.id())
+        ENGINE.populate_tables()
+        prefix_index.clear()
+        self.connection = ENGINE.connect()
+
+    def tearDown(self):
+        self.connection.close()
+        ENGINE.clear()
+        prefix_index.clear()
+
+    def _index(self, name):
+        return prefix_index._INDEXES[(self.connection.db_path, name)]
+
+    def test_complete_from_database(self):
+        """
+        Test that the indexes are built from the diseases and usernames
+        """
+        print('(' + self.test_complete_from_database.__name__ + ')',
+              self.test_complete_from_database.__doc__)
+        self.assertEqual(prefix_index.complete(self.connection, prefix_index.USERNAMES,
+                                               'al', 10), ['Alex77', 'Allyson'])
+        self.assertEqual(prefix_index.complete(self.connection, prefix_index.DISEASES,
+                                               'd', 10), ['dead', 'diabets'])
+
+    def test_incremental_updates(self):
+        """
+        Test that the writes of the Connection update the index in place
+        """
+        print('(' + self.test_incremental_updates.__name__ + ')',
+              self.test_incremental_updates.__doc__)
+        prefix_index.complete(self.connection, prefix_index.USERNAMES, '', 1)
+        prefix_index.complete(self.connection, prefix_index.DISEASES, '', 1)
+        usernames = self._index(prefix_index.USERNAMES)
+        diseases = self._index(prefix_index.DISEASES)
+
+        self.connection.append_user('alicia', NEW_USER)
+        self.connection.create_diagnosis({'user_id': DOCTOR_ID, 'message_id': 'msg-1',
+                                          'disease': 'Dermatitis',
+                                          'diagnosis_description': 'Rash'})
+        self.assertEqual(prefix_index.complete(self.connection, prefix_index.USERNAMES,
+                                               'al', 10), ['Alex77', 'alicia', 'Allyson'])
+        self.assertEqual(prefix_index.complete(self.connection, prefix_index.DISEASES,
+                                               'de', 10), ['dead', 'Dermatitis'])
+        self.connection.delete_user('Alex77')
+        self.assertEqual(prefix_index.complete(self.connection, prefix_index.USERNAMES,
+                                               'al', 10), ['alicia', 'Allyson'])
+        # A new message changes the user (msg_count), not the usernames
+        self.connection.create_message('Rash', 'Since yesterday', 'alicia')
+        self.assertEqual(prefix_index.complete(self.connection, prefix_index.USERNAMES,
+                                               'al', 10), ['alicia', 'Allyson'])
+        # Updated in place, not built again
+        self.assertIs(self._index(prefix_index.USERNAMES), usernames)
+        self.assertIs(self._index(prefix_index.DISEASES), diseases)
+
+    def test_other_connection_writes(self):
+        """
+        Test that an index is built again after a write of another connection
+        """
+        print('(' + self.test_other_connection_writes.__name__ + ')',
+              self.test_other_connection_writes.__doc__)
+        prefix_index.complete(self.connection, prefix_index.USERNAMES, '', 1)
+        usernames = self._index(prefix_index.USERNAMES)
+        other = ENGINE.connect()
+        try:
+            with other.con:
+                other.con.execute("UPDATE users SET username = 'Alfred' WHERE username = 'Chad'")
+        finally:
+            other.close()
+        # The index missed the write: the next local write leaves it alone
+        self.connection.append_user('alicia', NEW_USER)
+        self.assertEqual(prefix_index.complete(self.connection, prefix_index.USERNAMES,
+                                               'al', 10),
+                         ['Alex77', 'Alfred', 'alicia', 'Allyson'])
+        self.assertIsNot(self._index(prefix_index.USERNAMES), usernames)
+
+    def test_write_while_building(self):
+        """
+        Test that an index is not kept if a write comes in between the
+        version and the values, so the update of that write does not count
+        its value twice
+        """
+        print('(' + self.test_write_while_building.__name__ + ')',
+              self.test_write_while_building.__doc__)
+        other = ENGINE.connect()
+        get_versions = self.connection.get_versions
+        writes = []
+
+        def write_after_version(*names):
+            versions = get_versions(*names)
+            if not writes:
+                # The update of the writer comes once the index is built
+                with patch.object(prefix_index, 'update',
+                                  lambda *args, **kwargs: writes.append((args, kwargs))):
+                    other.append_user('alicia', NEW_USER)
+            return versions
+
+        try:
+            with patch.object(self.connection, 'get_versions', write_after_version):
+                self.assertEqual(prefix_index.complete(self.connection, prefix_index.USERNAMES,
+                                                       'al', 10), ['Alex77', 'alicia', 'Allyson'])
+            args, kwargs = writes[0]
+            prefix_index.update(*args, **kwargs)
+            other.delete_user('alicia')
+        finally:
+            other.close()
+        self.assertEqual(prefix_index.complete(self.connection, prefix_index.USERNAMES,
+                                               'al', 10), ['Alex77', 'Allyson'])
+
+
+if __name__ == '__main__':
+    print('Start running tests')
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Testing unit for the pre-forking production server.
+"""
+
+import http.client
+import os
+import signal
+import unittest
+
+from medical_forum import prefork
+
+
+def pid_app(environ, start_response):
+    """WSGI application answering with the pid of the worker"""
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid()).encode('ascii')]
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'os.fork is not available')
+class PreforkServerTestCase(unittest.TestCase):
+    """
+    Test cases for the workers of the server
+    """
+
+    def setUp(self):
+        print("Testing started for: ", self.id())
+        self.server = None
+        self.master = None
+
+    def tearDown(self):
+        if self.master is not None:
+            os.kill(self.master, signal.SIGTERM)
+            os.waitpid(self.master, 0)
+        if self.server is not None and self.server.socket is not None:
+            self.server.socket.close()
+
+    def _start(self, **options):
+        """Forks a master process serving pid_app on a free port"""
+        self.server = prefork.PreforkServer(pid_app, '127.0.0.1', 0, **options)
+        self.server.bind()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                self.server.serve_forever()
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        self.master = pid
+
+    def _get(self):
+        """The pid of the worker answering a request"""
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=10)
+        try:
+            connection.request('GET', '/')
+            response = connection.getresponse()
+            self.assertEqual(response.status, 200)
+            return int(response.read())
+        finally:
+            connection.close()
+
+    def test_wrong_options(self):
+        """
+        Checks that the server needs a worker and a positive request limit
+        """
+        print('(' + self.test_wrong_options.__name__ + ')',
+              self.test_wrong_options.__doc__)
+        with self.assertRaises(ValueError):
+            prefork.PreforkServer(pid_app, workers=0)
+        with self.assertRaises(ValueError):
+            prefork.PreforkServer(pid_app, max_requests=-1)
+
+    def test_workers_recycled(self):
+        """
+        Checks that the requests are served by the workers, not by the master,
+        and that a worker is replaced after its maximum number of requests
+        """
+        print('(' + self.test_workers_recycled.__name__ + ')',
+              self.test_workers_recycled.__doc__)
+        self._start(workers=1, max_requests=2)
+        pids = [self._get() for _ in range(6)]
+        self.assertNotIn(self.master, pids)
+        self.assertNotIn(os.getpid(), pids)
+        # Two requests per worker
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(len(set(pids)), 3)
+
+    def test_graceful_stop(self):
+        """
+        Checks that the master stops its workers and exits on SIGTERM
+        """
+        print('(' + self.test_graceful_stop.__name__ + ')',
+              self.test_graceful_stop.__doc__)
+        self._start(workers=2)
+        worker = self._get()
+        os.kill(self.master, signal.SIGTERM)
+        _, status = os.waitpid(self.master, 0)
+        self.master = None
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        with self.assertRaises(ProcessLookupError):
+            os.kill(worker, 0)
+
+
+if __name__ == '__main__':
+    print('Running prefork server tests')
+    unittest.main()
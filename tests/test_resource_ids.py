@@ -0,0 +1,76 @@
+"""
+Testing unit for the codec of the message and diagnosis ids.
+"""
+
+import unittest
+
+from werkzeug.exceptions import NotFound
+
+from medical_forum import resource_ids
+from medical_forum import resources
+
+
+class ResourceIdsTestCase(unittest.TestCase):
+    """
+    Test cases for parsing and formatting msg-N and dgs-N ids
+    """
+
+    def test_parse(self):
+        """
+        Check that ids are parsed into their database key, up to 64 bits
+        """
+        print('(' + self.test_parse.__name__ + ')', self.test_parse.__doc__)
+        self.assertEqual(resource_ids.parse_message_id('msg-1'), 1)
+        self.assertEqual(resource_ids.parse_message_id('msg-1000'), 1000)
+        self.assertEqual(resource_ids.parse_diagnosis_id('dgs-0042'), 42)
+        self.assertEqual(resource_ids.parse_message_id('msg-%d' % resource_ids.MAX_ID),
+                         resource_ids.MAX_ID)
+
+    def test_parse_malformed(self):
+        """
+        Check that malformed or out of range ids raise ValueError
+        """
+        print('(' + self.test_parse_malformed.__name__ + ')',
+              self.test_parse_malformed.__doc__)
+        for wrong in ('msg-', 'msg-12a', 'msg--1', 'msg-+1', 'msg- 1', 'dgs-1', '100',
+                      'msg-²', 'msg-٣', 'msg-%d' % (resource_ids.MAX_ID + 1),
+                      'msg-1' + '0' * 19, None, 1):
+            with self.subTest(wrong=wrong):
+                with self.assertRaises(ValueError):
+                    resource_ids.parse_message_id(wrong)
+
+    def test_format(self):
+        """
+        Check that formatting and parsing are inverse of each other
+        """
+        print('(' + self.test_format.__name__ + ')', self.test_format.__doc__)
+        for key in (0, 7, 999, 1000, 2 ** 32, resource_ids.MAX_ID):
+            self.assertEqual(
+                resource_ids.parse_message_id(resource_ids.format_message_id(key)), key)
+            self.assertEqual(
+                resource_ids.parse_diagnosis_id(resource_ids.format_diagnosis_id(key)), key)
+        self.assertEqual(resource_ids.format_message_id(15), 'msg-15')
+        self.assertEqual(resource_ids.format_diagnosis_id(15), 'dgs-15')
+
+    def test_routes(self):
+        """
+        Check the routes of messages and diagnoses with large and wrong ids
+        """
+        print('(' + self.test_routes.__name__ + ')', self.test_routes.__doc__)
+        adapter = resources.APP.url_map.bind('localhost:5000')
+        endpoint, values = adapter.match('/medical_forum/api/messages/msg-1000000/')
+        self.assertEqual((endpoint, values), ('message', {'message_id': 'msg-1000000'}))
+        endpoint, values = adapter.match('/medical_forum/api/diagnoses/dgs-4294967296/')
+        self.assertEqual(endpoint, 'diagnosis')
+        endpoint, values = adapter.match('/medical_forum/api/diagnoses/msg-12/')
+        self.assertEqual(endpoint, 'diagnoses_message')
+        self.assertEqual(adapter.build('message', {'message_id': 1000}),
+                         '/medical_forum/api/messages/msg-1000/')
+        too_large = '/medical_forum/api/messages/msg-%d/' % (resource_ids.MAX_ID + 1)
+        with self.assertRaises(NotFound):
+            adapter.match(too_large)
+
+
+if __name__ == '__main__':
+    print('Running resource ids tests')
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Testing unit for the LRU cache of response bodies in
+medical_forum/response_cache.py.
+"""
+
+import unittest
+from unittest.mock import patch
+
+from medical_forum import response_cache
+from medical_forum.response_cache import ResponseCache
+
+CONTENT_TYPE = "application/vnd.mason+json;/profiles/message-profile/"
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """
+    Test cases for the bounds, the validation and the invalidation of the entries
+    """
+
+    def setUp(self):
+        print("Testing started for: ", self.id())
+        self.cache = ResponseCache(max_entries=3, max_bytes=10, max_entry_bytes=5, ttl=60)
+
+    def test_get_put(self):
+        """
+        Check that an entry is only served with the entity tag it was stored with
+        """
+        print('(' + self.test_get_put.__name__ + ')', self.test_get_put.__doc__)
+        key = ("/messages/", b"limit=2")
+        self.assertIsNone(self.cache.get(key, "a"))
+        self.cache.put(key, "a", b"body", CONTENT_TYPE)
+        self.assertEqual(self.cache.get(key, "a"), (b"body", CONTENT_TYPE))
+        self.assertIsNone(self.cache.get(("/messages/", b""), "a"))
+        # The representation changed: the entry is dropped
+        self.assertIsNone(self.cache.get(key, "b"))
+        self.assertIsNone(self.cache.get(key, "a"))
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 4)
+        self.assertEqual(stats["stale"], 1)
+        self.assertEqual(stats["hit_rate"], 0.2)
+        self.assertEqual(stats["entries"], 0)
+        self.assertEqual(stats["bytes"], 0)
+
+    def test_eviction(self):
+        """
+        Check that the least recently used entries are evicted above the limits
+        """
+        print('(' + self.test_eviction.__name__ + ')', self.test_eviction.__doc__)
+        for number in range(3):
+            self.cache.put(("/%d/" % number, b""), "a", b"12", CONTENT_TYPE)
+        # /0/ becomes the most recently used
+        self.assertIsNotNone(self.cache.get(("/0/", b""), "a"))
+        self.cache.put(("/3/", b""), "a", b"12", CONTENT_TYPE)
+        self.assertIsNone(self.cache.get(("/1/", b""), "a"))
+        self.assertIsNotNone(self.cache.get(("/0/", b""), "a"))
+        # Larger than an entry can be
+        self.cache.put(("/4/", b""), "a", b"123456", CONTENT_TYPE)
+        self.assertIsNone(self.cache.get(("/4/", b""), "a"))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+        # Above the total size of the bodies
+        cache = ResponseCache(max_entries=10, max_bytes=10, max_entry_bytes=5)
+        for number in range(3):
+            cache.put(("/%d/" % number, b""), "a", b"1234", CONTENT_TYPE)
+        self.assertIsNone(cache.get(("/0/", b""), "a"))
+        self.assertIsNotNone(cache.get(("/2/", b""), "a"))
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["bytes"], 8)
+
+    def test_ttl(self):
+        """
+        Check that the entries expire after the time to live
+        """
+        print('(' + self.test_ttl.__name__ + ')', self.test_ttl.__doc__)
+        with patch.object(response_cache.time, "monotonic", return_value=100.0):
+            self.cache.put(("/0/", b""), "a", b"12", CONTENT_TYPE)
+        with patch.object(response_cache.time, "monotonic", return_value=159.0):
+            self.assertIsNotNone(self.cache.get(("/0/", b""), "a"))
+        with patch.object(response_cache.time, "monotonic", return_value=161.0):
+            self.assertIsNone(self.cache.get(("/0/", b""), "a"))
+        self.assertEqual(self.cache.stats()["expired"], 1)
+
+    def test_invalidate(self):
+        """
+        Check that invalidate drops the entries of a path whatever their query
+        """
+        print('(' + self.test_invalidate.__name__ + ')', self.test_invalidate.__doc__)
+        self.cache.put(("/messages/", b""), "a", b"1", CONTENT_TYPE)
+        self.cache.put(("/messages/", b"limit=2"), "a", b"2", CONTENT_TYPE)
+        self.cache.put(("/users/", b""), "a", b"3", CONTENT_TYPE)
+        self.cache.invalidate("/messages/", "/diagnoses/")
+        self.assertIsNone(self.cache.get(("/messages/", b""), "a"))
+        self.assertIsNone(self.cache.get(("/messages/", b"limit=2"), "a"))
+        self.assertIsNotNone(self.cache.get(("/users/", b""), "a"))
+        self.assertEqual(self.cache.stats()["invalidations"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Testing unit for the serialization of the response bodies in
+medical_forum/serializer.py.
+"""
+
+import json
+import unittest
+
+from medical_forum import serializer
+from medical_forum.controls import freeze
+from medical_forum.forum_object import ForumObject
+
+DOCUMENT = {
+    "@namespaces": {"medical_forum": {"name": "/medical_forum/link-relations/"}},
+    "headline": "Fever & \"cough\" </script>",
+    "articleBody": "Kipeä kurkku   \U0001F912 \\ tab\t",
+    "views": 9223372036854775807,
+    "height": 1.75,
+    "editor": None,
+    "approved": True,
+    "required": ("headline", "articleBody"),
+    "items": [{"id": "msg-1"}, {"id": "msg-2"}]
+}
+
+
+class SerializerTestCase(unittest.TestCase):
+    """
+    Test cases for the encoders of the response bodies
+    """
+
+    def setUp(self):
+        print("Testing started for: ", self.id())
+
+    def tearDown(self):
+        serializer.use(next(iter(serializer.ENCODERS)))
+
+    def test_encoders_same_bytes(self):
+        """
+        Check that every installed encoder writes the same compact UTF-8 JSON
+        """
+        print('(' + self.test_encoders_same_bytes.__name__ + ')',
+              self.test_encoders_same_bytes.__doc__)
+        document = ForumObject(**DOCUMENT)
+        document["@controls"] = freeze({"self": {"href": "/medical_forum/api/messages/"}})
+        expected = json.dumps(document, ensure_ascii=False,
+                              separators=(",", ":")).encode("utf-8")
+        self.assertNotIn(b", ", expected)
+        for name in serializer.ENCODERS:
+            with self.subTest(encoder=name):
+                serializer.use(name)
+                self.assertEqual(serializer.ENCODER, name)
+                self.assertEqual(serializer.dumps(document), expected)
+                self.assertEqual(json.loads(serializer.dumps(document).decode("utf-8")),
+                                 json.loads(json.dumps(document)))
+
+    def test_use_unknown_encoder(self):
+        """
+        Check that only installed encoders can be selected
+        """
+        print('(' + self.test_use_unknown_encoder.__name__ + ')',
+              self.test_use_unknown_encoder.__doc__)
+        encoder = serializer.ENCODER
+        with self.assertRaises(ValueError):
+            serializer.use("simplejson")
+        self.assertEqual(serializer.ENCODER, encoder)
+
+
+if __name__ == '__main__':
+    unittest.main()
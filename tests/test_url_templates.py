@@ -0,0 +1,83 @@
+"""
+Testing unit for the url templates of the item resources in
+medical_forum/url_templates.py.
+"""
+
+import unittest
+
+from medical_forum import resources, url_templates
+from medical_forum.resources import API
+from medical_forum.message_resources import Message
+
+# Values of the variables of the routes: the ids and usernames the API
+# creates, and values that the converters quote or format
+VALUES = ["msg-1", "dgs-42", "PoorGuy", "Mystery_1", "a.b-c~d", "Poor Guy", "a/b",
+          "50%", "Ääkkönen", "?#&=", "", 7]
+
+
+def api_rules():
+    """The rules of the url map routed to the resources of the API"""
+    for rule in resources.APP.url_map.iter_rules():
+        view = resources.APP.view_functions[rule.endpoint]
+        resource = getattr(view, "view_class", None)
+        if resource is not None:
+            yield rule, resource
+
+
+class UrlTemplatesTestCase(unittest.TestCase):
+    """
+    Test cases for the urls built with the templates
+    """
+
+    def setUp(self):
+        print("Testing started for: ", self.id())
+        url_templates.reset()
+
+    def test_templates_outside_request(self):
+        """
+        Check that the templates are only created inside a request context
+        """
+        print('(' + self.test_templates_outside_request.__name__ + ')',
+              self.test_templates_outside_request.__doc__)
+        with self.assertRaises(RuntimeError):
+            url_templates.url_template(Message, "message_id")
+
+    def test_templates_all_endpoints(self):
+        """
+        Check that the templates build the urls of url_for for every endpoint of the API
+        """
+        print('(' + self.test_templates_all_endpoints.__name__ + ')',
+              self.test_templates_all_endpoints.__doc__)
+        rules = list(api_rules())
+        self.assertEqual(len(rules), 16)
+        for base_url in ("http://localhost:5000/", "http://localhost:5000/forum/",
+                         "https://example.com/"):
+            with resources.APP.test_request_context(base_url=base_url):
+                for rule, resource in rules:
+                    self.assertLessEqual(len(rule.arguments), 1)
+                    if not rule.arguments:
+                        template = url_templates.url_template(resource)
+                        self.assertEqual(template.expand(), API.url_for(resource))
+                        continue
+                    argument = next(iter(rule.arguments))
+                    template = url_templates.url_template(resource, argument)
+                    self.assertIsNotNone(template.prefix)
+                    for value in VALUES:
+                        with self.subTest(base_url=base_url, rule=rule.rule, value=value):
+                            self.assertEqual(template.expand(value),
+                                             API.url_for(resource, **{argument: value}))
+
+    def test_template_cached(self):
+        """
+        Check that a template is created once for each root url
+        """
+        print('(' + self.test_template_cached.__name__ + ')', self.test_template_cached.__doc__)
+        with resources.APP.test_request_context(base_url="http://localhost:5000/"):
+            template = url_templates.url_template(Message, "message_id")
+            self.assertIs(url_templates.url_template(Message, "message_id"), template)
+        with resources.APP.test_request_context(base_url="http://localhost:5000/forum/"):
+            self.assertIsNot(url_templates.url_template(Message, "message_id"), template)
+
+
+if __name__ == '__main__':
+    unittest.main()